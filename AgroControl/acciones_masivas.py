@@ -0,0 +1,91 @@
+# AgroControl/acciones_masivas.py
+"""
+Piezas comunes de las acciones masivas (finalizar / cancelar varias tareas
+en un solo POST) de riego, aplicaciones y mantenimiento.
+
+Petición:
+- Formulario: 'accion' + 'ids' repetido (checkboxes de la tabla). Responde
+  con mensajes y redirige al listado.
+- JSON ({"accion": "finalizar", "ids": [1, 2, 3]}): responde
+    {"correctos": [1, 3], "errores": [{"id": 2, "error": "..."}]}
+
+Cada módulo procesa los ids en orden ascendente (bloqueos deterministas) y
+anota en ResultadoLote qué tareas se aplicaron y cuáles fallaron y por qué;
+una falla no deshace las demás.
+"""
+
+import json
+
+from django.contrib import messages
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+ACCIONES = ('finalizar', 'cancelar')
+MAX_IDS_LOTE = 500
+
+
+class ResultadoLote:
+    def __init__(self):
+        self.correctos = []
+        self.errores = []
+
+    def error(self, pk, mensaje):
+        self.errores.append((pk, str(mensaje)))
+
+    def como_dict(self):
+        return {
+            'correctos': self.correctos,
+            'errores': [{'id': pk, 'error': mensaje} for pk, mensaje in sorted(self.errores)],
+        }
+
+
+def pide_json(request):
+    return request.content_type == 'application/json'
+
+
+def leer_peticion(request):
+    """(accion, ids ordenados sin repetir). ValueError si la petición no es válida."""
+    if pide_json(request):
+        try:
+            datos = json.loads(request.body)
+        except ValueError:
+            raise ValueError('JSON inválido.')
+        if not isinstance(datos, dict):
+            raise ValueError('JSON inválido.')
+        accion, ids = datos.get('accion'), datos.get('ids')
+    else:
+        accion, ids = request.POST.get('accion'), request.POST.getlist('ids')
+
+    if accion not in ACCIONES:
+        raise ValueError(f"'accion' debe ser una de: {', '.join(ACCIONES)}.")
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('Seleccione al menos un registro.')
+    try:
+        ids = sorted({int(pk) for pk in ids})
+    except (TypeError, ValueError):
+        raise ValueError("'ids' debe ser una lista de números.")
+    if len(ids) > MAX_IDS_LOTE:
+        raise ValueError(f'Máximo {MAX_IDS_LOTE} registros por acción.')
+    return accion, ids
+
+
+def responder(request, es_json, resultado, destino, etiqueta):
+    """JsonResponse, o mensajes + redirect a 'destino'. 'etiqueta' arma el nombre de cada registro."""
+    if es_json:
+        return JsonResponse(resultado.como_dict())
+    if resultado.correctos:
+        messages.success(
+            request,
+            f"{len(resultado.correctos)} registro(s) procesados: "
+            f"{', '.join(etiqueta(pk) for pk in resultado.correctos)}."
+        )
+    for pk, mensaje in sorted(resultado.errores):
+        messages.error(request, f'{etiqueta(pk)}: {mensaje}')
+    return redirect(destino)
+
+
+def error_peticion(request, es_json, mensaje, destino):
+    if es_json:
+        return JsonResponse({'error': mensaje}, status=400)
+    messages.error(request, mensaje)
+    return redirect(destino)
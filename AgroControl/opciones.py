@@ -0,0 +1,202 @@
+# AgroControl/opciones.py
+"""
+Caché versionada de opciones para los <select> de los formularios
+(productos, cuarteles, equipos y usuarios por rol).
+
+- Cada lista se consulta UNA vez y se reutiliza en todos los formularios
+  (y en todas las filas de un formset) mientras su versión no cambie.
+- La versión de cada modelo sube con post_save / post_delete.
+  Las versiones viven en el caché de Django: con un backend compartido
+  (Redis, Memcached) la invalidación llega a todos los procesos; con el
+  LocMem por defecto, 'TTL_OPCIONES' acota cuánto puede quedar desfasado
+  otro proceso.
+"""
+
+import threading
+import time
+
+from django import forms
+from django.db.models.signals import post_save, post_delete
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+
+from autenticacion.models import Usuario, Rol
+from cuarteles.models import Cuartel
+from inventario.models import Producto, EquipoAgricola
+from .versiones import leer_version, subir_version
+
+TTL_OPCIONES = 300  # segundos
+
+
+class ListaOpciones:
+    """Una lista cacheable: queryset + cómo armar cada fila (pk, etiqueta, grupo)."""
+
+    def __init__(self, modelo, queryset, etiqueta=str, grupo=None):
+        self.modelo = modelo
+        self._queryset = queryset
+        self.etiqueta = etiqueta
+        self.grupo = grupo
+
+    def queryset(self):
+        return self._queryset()
+
+    def filas(self):
+        return [
+            (obj.pk, self.etiqueta(obj), self.grupo(obj) if self.grupo else None)
+            for obj in self.queryset()
+        ]
+
+
+def _usuarios_con_rol(nombre_rol):
+    return lambda: Usuario.objects.filter(esta_activo=True, rol__nombre=nombre_rol).order_by('nombres')
+
+
+LISTAS = {
+    'productos_activos': ListaOpciones(
+        Producto, lambda: Producto.objects.filter(esta_activo=True).order_by('nombre')
+    ),
+    'fertilizantes_activos': ListaOpciones(
+        Producto, lambda: Producto.objects.filter(tipo='fertilizante', esta_activo=True).order_by('nombre')
+    ),
+    'cuarteles': ListaOpciones(
+        Cuartel, lambda: Cuartel.objects.all().order_by('nombre')
+    ),
+    'cuarteles_con_numero': ListaOpciones(
+        Cuartel, lambda: Cuartel.objects.all().order_by('nombre'),
+        etiqueta=lambda c: f"{c.nombre} (Cuartel {c.numero})"
+    ),
+    'equipos_operativos': ListaOpciones(
+        EquipoAgricola, lambda: EquipoAgricola.objects.filter(estado='operativo').order_by('nombre')
+    ),
+    'equipos_operativos_con_stock': ListaOpciones(
+        EquipoAgricola, lambda: EquipoAgricola.objects.filter(estado='operativo').order_by('nombre'),
+        etiqueta=lambda e: f"{e.nombre} (Stock: {e.stock_actual})",
+        grupo=lambda e: e.tipo
+    ),
+    'aplicadores': ListaOpciones(Usuario, _usuarios_con_rol('aplicador')),
+    'regadores': ListaOpciones(
+        Usuario, _usuarios_con_rol('regador'), etiqueta=lambda u: u.get_full_name()
+    ),
+    'encargados_mantencion': ListaOpciones(
+        Usuario, _usuarios_con_rol('encargado de mantencion'), etiqueta=lambda u: u.get_full_name()
+    ),
+}
+
+# Campos que cambian alguna etiqueta o filtro; si un save(update_fields=...)
+# no toca ninguno (p. ej. solo 'stock_actual' de un producto), no se invalida.
+CAMPOS_RELEVANTES = {
+    Producto: {'nombre', 'tipo', 'esta_activo'},
+    Cuartel: {'nombre', 'numero'},
+    EquipoAgricola: {'nombre', 'tipo', 'estado', 'stock_actual'},
+    Usuario: {'nombres', 'apellidos', 'nombre_usuario', 'esta_activo', 'rol'},
+    Rol: {'nombre'},
+}
+# Un cambio de Rol afecta a las listas de usuarios
+DEPENDENCIAS = {Rol: Usuario}
+
+
+# ---------------------------------------------------------------
+# VERSIONES + CACHÉ DEL PROCESO
+# ---------------------------------------------------------------
+_locales = {}
+_lock = threading.Lock()
+
+
+def _clave_version(modelo):
+    return f'opciones:version:{modelo._meta.label_lower}'
+
+
+def version_de(modelo):
+    return leer_version(_clave_version(modelo))
+
+
+def invalidar(modelo):
+    subir_version(_clave_version(modelo))
+
+
+def opciones(nombre):
+    """Filas [(pk, etiqueta, grupo), ...] de la lista 'nombre', desde el caché si está vigente."""
+    lista = LISTAS[nombre]
+    version = version_de(lista.modelo)
+    ahora = time.monotonic()
+
+    guardado = _locales.get(nombre)
+    if guardado and guardado[0] == version and ahora - guardado[1] < TTL_OPCIONES:
+        return guardado[2]
+
+    with _lock:
+        filas = lista.filas()
+        _locales[nombre] = (version, ahora, filas)
+    return filas
+
+
+def _al_cambiar(sender, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not (set(update_fields) & CAMPOS_RELEVANTES[sender]):
+        return
+    invalidar(DEPENDENCIAS.get(sender, sender))
+
+
+for _modelo in CAMPOS_RELEVANTES:
+    post_save.connect(_al_cambiar, sender=_modelo, dispatch_uid=f'opciones_save_{_modelo.__name__}')
+    post_delete.connect(_al_cambiar, sender=_modelo, dispatch_uid=f'opciones_delete_{_modelo.__name__}')
+
+
+# ---------------------------------------------------------------
+# CAMPO DE FORMULARIO
+# ---------------------------------------------------------------
+class OpcionesCacheadasIterator(ModelChoiceIterator):
+    """Itera las opciones desde el caché; si el form cambió el queryset, consulta normal."""
+
+    def __iter__(self):
+        if self.field.lista_opciones is None:
+            yield from super().__iter__()
+            return
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for pk, etiqueta, _ in opciones(self.field.lista_opciones):
+            yield (ModelChoiceIteratorValue(pk, None), etiqueta)
+
+    def __len__(self):
+        if self.field.lista_opciones is None:
+            return super().__len__()
+        return len(opciones(self.field.lista_opciones)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        if self.field.lista_opciones is None:
+            return super().__bool__()
+        return self.field.empty_label is not None or bool(opciones(self.field.lista_opciones))
+
+
+class OpcionesCacheadasField(forms.ModelChoiceField):
+    """
+    ModelChoiceField que renderiza sus opciones desde 'opciones(lista)'.
+    La validación sigue usando el queryset de la lista.
+    Si el formulario asigna otro queryset (p. ej. "solo el usuario actual"),
+    el campo vuelve a comportarse como un ModelChoiceField normal.
+    """
+    iterator = OpcionesCacheadasIterator
+
+    def __init__(self, lista, **kwargs):
+        super().__init__(queryset=LISTAS[lista].queryset(), **kwargs)
+        self.lista_opciones = lista
+
+    def _set_queryset(self, queryset):
+        super()._set_queryset(queryset)
+        self.lista_opciones = None
+
+    queryset = property(forms.ModelChoiceField._get_queryset, _set_queryset)
+
+    def usar_lista(self, lista):
+        """Vuelve a leer desde el caché (usa el queryset de 'lista' para validar)."""
+        self.queryset = LISTAS[lista].queryset()
+        self.lista_opciones = lista
+
+    def __deepcopy__(self, memo):
+        lista = self.lista_opciones
+        result = super().__deepcopy__(memo)
+        result.lista_opciones = lista
+        return result
+
+
+class OpcionesCacheadasMultipleField(OpcionesCacheadasField, forms.ModelMultipleChoiceField):
+    """Versión múltiple (p. ej. los cuarteles de una aplicación)."""
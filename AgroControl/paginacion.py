@@ -0,0 +1,132 @@
+# AgroControl/paginacion.py
+"""
+Paginación por cursor (keyset) para listados que crecen sin límite.
+
+A diferencia de OFFSET (Paginator), cada página se pide con un WHERE sobre
+las columnas del orden a partir de la última fila vista:
+
+    ORDER BY fecha DESC, horario_inicio DESC, id DESC
+    WHERE fecha <= f AND (fecha < f OR (fecha = f AND (horario_inicio < h OR ...)))
+
+- El costo no depende de la página (no se recorren las filas anteriores) y
+  con un índice sobre las primeras columnas del orden cada página es un
+  rango del índice (el 'fecha <= f' redundante lo deja usar).
+- Las columnas del orden no deben ser nulas y la última debe ser única
+  (normalmente '-id').
+- El cursor es opaco para el cliente: base64 de los valores de la fila
+  límite y la dirección. Un cursor inválido vuelve a la primera página.
+"""
+
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+POR_PAGINA = 25
+
+
+class PaginaKeyset:
+    """Una página: 'objetos' + cursores 'siguiente' / 'anterior' (None si no hay)."""
+
+    def __init__(self, objetos, siguiente=None, anterior=None):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    def __bool__(self):
+        return bool(self.objetos)
+
+    @property
+    def tiene_otras_paginas(self):
+        return bool(self.siguiente or self.anterior)
+
+
+class _CodificadorCursor(DjangoJSONEncoder):
+    """DjangoJSONEncoder recorta a milisegundos; el cursor necesita el valor exacto para el '='."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _codificar(direccion, valores):
+    texto = json.dumps([direccion, valores], cls=_CodificadorCursor, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor, cantidad):
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        direccion, valores = json.loads(texto)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None, None
+    if direccion not in ('s', 'a') or not isinstance(valores, list) or len(valores) != cantidad:
+        return None, None
+    return direccion, valores
+
+
+def _filtro_despues(orden, valores):
+    """Q de las filas que van DESPUÉS de 'valores' en 'orden'."""
+    campos = [(c.lstrip('-'), c.startswith('-')) for c in orden]
+    filtro = None
+    # Se arma de atrás hacia adelante: (a > x) OR (a = x AND (<resto>))
+    for (campo, desc), valor in reversed(list(zip(campos, valores))):
+        siguiente = Q(**{f'{campo}__{"lt" if desc else "gt"}': valor})
+        filtro = siguiente if filtro is None else siguiente | (Q(**{campo: valor}) & filtro)
+    # Cota redundante sobre la primera columna: deja recorrer el índice como rango
+    campo, desc = campos[0]
+    return Q(**{f'{campo}__{"lte" if desc else "gte"}': valores[0]}) & filtro
+
+
+def _invertir(orden):
+    return [c[1:] if c.startswith('-') else f'-{c}' for c in orden]
+
+
+def paginar_keyset(queryset, orden, cursor=None, por_pagina=POR_PAGINA):
+    """
+    Página de 'queryset' ordenado por 'orden' (lista de campos del modelo,
+    con '-' para descendente, el último único) a partir de 'cursor'.
+    """
+    direccion, valores = _decodificar(cursor, len(orden)) if cursor else (None, None)
+    hacia_atras = direccion == 'a'
+
+    orden_consulta = _invertir(orden) if hacia_atras else list(orden)
+    qs = queryset.order_by(*orden_consulta)
+    if valores:
+        try:
+            qs = qs.filter(_filtro_despues(orden_consulta, valores))
+        except (ValidationError, ValueError, TypeError):
+            # Cursor adulterado: primera página
+            hacia_atras, valores = False, None
+            qs = queryset.order_by(*orden)
+
+    filas = list(qs[:por_pagina + 1])
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+    if hacia_atras:
+        filas.reverse()
+    if not filas:
+        return PaginaKeyset(filas)
+
+    def valores_de(obj):
+        return [getattr(obj, c.lstrip('-')) for c in orden]
+
+    # Hacia adelante: hay siguiente si sobró una fila; hay anterior si se llegó con cursor.
+    # Hacia atrás, al revés.
+    con_siguiente = hay_mas if not hacia_atras else True
+    con_anterior = bool(valores) if not hacia_atras else hay_mas
+    return PaginaKeyset(
+        filas,
+        siguiente=_codificar('s', valores_de(filas[-1])) if con_siguiente else None,
+        anterior=_codificar('a', valores_de(filas[0])) if con_anterior else None,
+    )
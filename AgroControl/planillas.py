@@ -0,0 +1,57 @@
+# AgroControl/planillas.py
+"""
+Lectura de planillas CSV subidas por los usuarios (conteos de plantas,
+ET0 de la estación).
+
+- filas_csv(): genera las filas de un archivo binario UTF-8 (con o sin
+  BOM). El separador (',', ';' o tabulación) se detecta con una muestra
+  del inicio; si no se puede, se usa el de Excel.
+- indices_columnas(): ubica cada columna en el encabezado por sus nombres
+  aceptados (en minúsculas, sin espacios extremos), en cualquier orden.
+
+Los errores se informan con ErrorPlanilla; cada importación lo traduce a
+su propia excepción.
+"""
+
+import csv
+import io
+
+TAMANO_MUESTRA = 4096
+
+
+class ErrorPlanilla(ValueError):
+    pass
+
+
+def filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        # La muestra también decodifica: un CSV Latin-1 falla aquí
+        muestra = texto.read(TAMANO_MUESTRA)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        yield from csv.reader(texto, dialecto)
+    except UnicodeDecodeError:
+        raise ErrorPlanilla('El CSV debe estar codificado en UTF-8.')
+    finally:
+        texto.detach()
+
+
+def indices_columnas(encabezado, columnas, obligatorias=None):
+    """
+    {columna: índice} según 'columnas' ({columna: (nombres aceptados)}).
+    Las columnas ausentes quedan en None; si falta alguna de 'obligatorias'
+    (todas por defecto) se lanza ErrorPlanilla.
+    """
+    nombres = [str(c).strip().lower() if c is not None else '' for c in encabezado]
+    indices = {
+        columna: next((i for i, nombre in enumerate(nombres) if nombre in alias), None)
+        for columna, alias in columnas.items()
+    }
+    for columna in (columnas if obligatorias is None else obligatorias):
+        if indices[columna] is None:
+            raise ErrorPlanilla(f"Falta la columna '{columna}' en el encabezado.")
+    return indices
@@ -107,6 +107,10 @@ DATABASES = {
     )
 }
 
+# Los formsets de hileras envían 3-4 campos por hilera: con el límite por
+# defecto (1000) un cuartel de ~300 hileras ya no se puede editar.
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+
 
 # Configuración para login/logout
 LOGIN_URL = '/login/'  
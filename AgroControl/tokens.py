@@ -0,0 +1,44 @@
+# AgroControl/tokens.py
+"""
+Tokens de los equipos que llaman a la API sin sesión (caudalímetros,
+tablets de sincronización).
+
+- Cada equipo tiene un código y guarda solo el SHA-256 de su token en
+  'token_hash'. El token se muestra una vez, al generarlo.
+- Petición: header 'Authorization: Token <token>' y el código del equipo
+  en el body o la query (lo define cada API).
+"""
+
+import hashlib
+import hmac
+import secrets
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def generar_token(equipo):
+    """Genera un token nuevo (invalida el anterior) y lo devuelve en claro."""
+    token = secrets.token_urlsafe(32)
+    equipo.token_hash = _hash_token(token)
+    equipo.save(update_fields=['token_hash'])
+    return token
+
+
+def token_de_cabecera(request):
+    """Token del header 'Authorization: Token <token>' ('' si no viene)."""
+    esquema, _, token = request.headers.get('Authorization', '').partition(' ')
+    return token.strip() if esquema == 'Token' else ''
+
+
+def autenticar(queryset, codigo, token):
+    """Equipo activo de 'queryset' con ese código y token, o None."""
+    if not codigo or not token:
+        return None
+    equipo = queryset.filter(codigo=codigo, activo=True).first()
+    if equipo is None or not equipo.token_hash:
+        return None
+    if not hmac.compare_digest(equipo.token_hash, _hash_token(token)):
+        return None
+    return equipo
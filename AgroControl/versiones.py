@@ -0,0 +1,33 @@
+# AgroControl/versiones.py
+"""
+Contadores de versión en el caché de Django, para invalidar cachés
+derivados (opciones de formularios, estadísticas, mapa de cuarteles).
+
+- leer_version(): versión vigente; si la clave no existe se crea con
+  'inicial' (sin vencimiento).
+- subir_version(): incrementa la versión. Si la clave no existe (caché
+  nuevo, reiniciado o desalojado) la fija en 'inicial', que debe ser
+  distinta de la que pudo quedar guardada junto a los datos viejos.
+
+'inicial' puede ser un valor o una función sin argumentos.
+"""
+
+from django.core.cache import cache
+
+
+def _valor(inicial):
+    return inicial() if callable(inicial) else inicial
+
+
+def leer_version(clave, inicial=1):
+    return cache.get_or_set(clave, inicial, timeout=None)
+
+
+def subir_version(clave, inicial=2):
+    """Incrementa la versión de 'clave' y la devuelve."""
+    try:
+        return cache.incr(clave)
+    except ValueError:
+        version = _valor(inicial)
+        cache.set(clave, version, timeout=None)
+        return version
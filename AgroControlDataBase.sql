@@ -462,4 +462,472 @@ CREATE TABLE IF NOT EXISTS tareas_operarios (
         REFERENCES usuarios (id) MATCH SIMPLE
         ON UPDATE NO ACTION
         ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+-- -----------------------------------------------------
+-- Table: alertas_stock
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS alertas_stock (
+    id BIGSERIAL PRIMARY KEY,
+    producto_id BIGINT NOT NULL UNIQUE,
+    estado VARCHAR(20) NOT NULL,
+    fecha_cambio TIMESTAMP WITH TIME ZONE NOT NULL,
+    CONSTRAINT alertas_stock_producto_id_fk_productos_id FOREIGN KEY (producto_id)
+        REFERENCES productos (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS alertas_stock_estado_idx ON alertas_stock (estado);
+-- Alertas abiertas de los productos existentes (misma regla que
+-- 'calcular_estado_stock': agotado si stock = 0, bajo si stock < minimo)
+INSERT INTO alertas_stock (producto_id, estado, fecha_cambio)
+SELECT id,
+       CASE WHEN stock_actual = 0 THEN 'agotado' ELSE 'bajo' END,
+       NOW()
+FROM productos
+WHERE stock_actual = 0 OR stock_actual < stock_minimo
+ON CONFLICT (producto_id) DO NOTHING;
+
+-- -----------------------------------------------------
+-- Table: eventos_alerta_stock
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS eventos_alerta_stock (
+    id BIGSERIAL PRIMARY KEY,
+    producto_id BIGINT NOT NULL,
+    estado_anterior VARCHAR(20) NOT NULL,
+    estado_nuevo VARCHAR(20) NOT NULL,
+    stock_registrado NUMERIC NOT NULL,
+    stock_minimo NUMERIC NOT NULL,
+    movimiento_id BIGINT NULL,
+    fecha TIMESTAMP WITH TIME ZONE NOT NULL,
+    CONSTRAINT eventos_alerta_stock_producto_id_fk_productos_id FOREIGN KEY (producto_id)
+        REFERENCES productos (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT eventos_alerta_stock_movimiento_id_fk_movimientos FOREIGN KEY (movimiento_id)
+        REFERENCES movimientos_inventario (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL
+);
+
+-- -----------------------------------------------------
+-- Búsqueda por trigramas (pg_trgm) para productos y equipos
+-- (expresión UPPER(col) = la que genera '__icontains' en Django)
+-- -----------------------------------------------------
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS productos_nombre_trgm_idx ON productos USING gin (UPPER(nombre::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS productos_ingrediente_activo_trgm_idx ON productos USING gin (UPPER(ingrediente_activo::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS productos_proveedor_trgm_idx ON productos USING gin (UPPER(proveedor::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS productos_numero_registro_trgm_idx ON productos USING gin (UPPER(numero_registro::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS equipos_agricolas_nombre_trgm_idx ON equipos_agricolas USING gin (UPPER(nombre::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS equipos_agricolas_modelo_trgm_idx ON equipos_agricolas USING gin (UPPER(modelo::text) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS equipos_agricolas_numero_serie_trgm_idx ON equipos_agricolas USING gin (UPPER(numero_serie::text) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS movimientos_inventario_fecha_movimiento_idx ON movimientos_inventario (fecha_movimiento);
+
+-- -----------------------------------------------------
+-- Table: temporadas_archivadas
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS temporadas_archivadas (
+    id BIGSERIAL PRIMARY KEY,
+    anio SMALLINT NOT NULL UNIQUE,
+    movimientos INTEGER NOT NULL,
+    detalles INTEGER NOT NULL,
+    archivo_exportado VARCHAR(255) NOT NULL,
+    fecha_archivado TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- -----------------------------------------------------
+-- Table: movimientos_inventario_archivo
+-- (particionada por temporada; 'archivar_temporadas' crea la partición de cada año)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS movimientos_inventario_archivo (
+    id BIGINT NOT NULL,
+    temporada SMALLINT NOT NULL,
+    tipo_movimiento VARCHAR(20) NOT NULL,
+    fecha_movimiento TIMESTAMP WITH TIME ZONE NOT NULL,
+    motivo VARCHAR(200) NOT NULL,
+    referencia VARCHAR(100) NULL,
+    fecha_registro TIMESTAMP WITH TIME ZONE NOT NULL,
+    aplicacion_id BIGINT NULL,
+    realizado_por_id BIGINT NOT NULL,
+    PRIMARY KEY (id, temporada),
+    CONSTRAINT movimientos_inventario_archivo_aplicacion_id_fk FOREIGN KEY (aplicacion_id)
+        REFERENCES aplicaciones_fitosanitarias (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL,
+    CONSTRAINT movimientos_inventario_archivo_realizado_por_id_fk FOREIGN KEY (realizado_por_id)
+        REFERENCES usuarios (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE RESTRICT
+) PARTITION BY RANGE (temporada);
+CREATE INDEX IF NOT EXISTS movimientos_inventario_archivo_fecha_idx ON movimientos_inventario_archivo (fecha_movimiento);
+
+-- -----------------------------------------------------
+-- Table: detalles_movimiento_archivo
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS detalles_movimiento_archivo (
+    id BIGINT NOT NULL,
+    temporada SMALLINT NOT NULL,
+    cantidad NUMERIC NOT NULL,
+    stock_anterior NUMERIC NOT NULL,
+    stock_posterior NUMERIC NOT NULL,
+    movimiento_id BIGINT NOT NULL,
+    producto_id BIGINT NOT NULL,
+    PRIMARY KEY (id, temporada),
+    CONSTRAINT detalles_movimiento_archivo_producto_id_fk FOREIGN KEY (producto_id)
+        REFERENCES productos (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE RESTRICT
+) PARTITION BY RANGE (temporada);
+CREATE INDEX IF NOT EXISTS detalles_movimiento_archivo_movimiento_idx ON detalles_movimiento_archivo (movimiento_id);
+CREATE INDEX IF NOT EXISTS detalles_movimiento_archivo_producto_idx ON detalles_movimiento_archivo (producto_id);
+
+-- -----------------------------------------------------
+-- Totales de plantas cacheados en cuarteles_cuartel
+-- (ver: python manage.py verificar_conteos_cuarteles --reparar --todos)
+-- -----------------------------------------------------
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS plantas_totales INTEGER NOT NULL DEFAULT 0 CHECK (plantas_totales >= 0);
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS plantas_vivas INTEGER NOT NULL DEFAULT 0 CHECK (plantas_vivas >= 0);
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS plantas_muertas INTEGER NOT NULL DEFAULT 0 CHECK (plantas_muertas >= 0);
+UPDATE cuarteles_cuartel c SET
+    plantas_totales = COALESCE(h.totales, 0),
+    plantas_vivas = COALESCE(h.vivas, 0),
+    plantas_muertas = COALESCE(h.muertas, 0)
+FROM (
+    SELECT cuartel_id,
+           SUM(plantas_totales_iniciales) AS totales,
+           SUM(plantas_vivas_actuales) AS vivas,
+           SUM(plantas_muertas_actuales) AS muertas
+    FROM cuarteles_hilera
+    GROUP BY cuartel_id
+) h
+WHERE h.cuartel_id = c.id;
+
+-- -----------------------------------------------------
+-- Sincronización offline de seguimientos (tablets)
+-- -----------------------------------------------------
+ALTER TABLE cuarteles_hilera ADD COLUMN IF NOT EXISTS fecha_conteo TIMESTAMP WITH TIME ZONE NULL;
+ALTER TABLE cuarteles_hilera ADD COLUMN IF NOT EXISTS modificado_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW();
+CREATE INDEX IF NOT EXISTS cuarteles_hilera_modificado_en_idx ON cuarteles_hilera (modificado_en);
+ALTER TABLE cuarteles_registrohilera ADD COLUMN IF NOT EXISTS contado_en TIMESTAMP WITH TIME ZONE NULL;
+
+CREATE TABLE IF NOT EXISTS cuarteles_sincronizacionseguimiento (
+    id BIGSERIAL PRIMARY KEY,
+    clave VARCHAR(64) NOT NULL UNIQUE,
+    dispositivo VARCHAR(100) NOT NULL,
+    fecha_recepcion TIMESTAMP WITH TIME ZONE NOT NULL,
+    seguimiento_id BIGINT NOT NULL,
+    usuario_id INTEGER NULL,
+    CONSTRAINT cuarteles_sincronizacion_seguimiento_id_fk FOREIGN KEY (seguimiento_id)
+        REFERENCES cuarteles_seguimientocuartel (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT cuarteles_sincronizacion_usuario_id_fk FOREIGN KEY (usuario_id)
+        REFERENCES usuarios (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS cuarteles_sincronizacion_seguimiento_idx ON cuarteles_sincronizacionseguimiento (seguimiento_id);
+
+-- -----------------------------------------------------
+-- Geometría de cuarteles (GeoJSON, sin PostGIS) para el mapa
+-- -----------------------------------------------------
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS geometria JSONB NULL;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS centroide_lon DOUBLE PRECISION NULL;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS centroide_lat DOUBLE PRECISION NULL;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS bbox_min_lon DOUBLE PRECISION NULL;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS bbox_min_lat DOUBLE PRECISION NULL;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS bbox_max_lon DOUBLE PRECISION NULL;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS bbox_max_lat DOUBLE PRECISION NULL;
+CREATE INDEX IF NOT EXISTS cuartel_bbox_lon_idx ON cuarteles_cuartel (bbox_min_lon, bbox_max_lon);
+CREATE INDEX IF NOT EXISTS cuartel_bbox_lat_idx ON cuarteles_cuartel (bbox_min_lat, bbox_max_lat);
+
+-- -----------------------------------------------------
+-- Jerarquía fundo -> sector -> cuartel (ruta materializada)
+-- y agregados cacheados por agrupación
+-- (ver: python manage.py recalcular_agrupaciones)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS cuarteles_agrupacion (
+    id BIGSERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    tipo VARCHAR(10) NOT NULL DEFAULT 'sector',
+    padre_id BIGINT NULL,
+    ruta VARCHAR(255) NOT NULL DEFAULT '',
+    profundidad SMALLINT NOT NULL DEFAULT 0 CHECK (profundidad >= 0),
+    cantidad_cuarteles INTEGER NOT NULL DEFAULT 0 CHECK (cantidad_cuarteles >= 0),
+    area_hectareas NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    plantas_totales INTEGER NOT NULL DEFAULT 0 CHECK (plantas_totales >= 0),
+    plantas_vivas INTEGER NOT NULL DEFAULT 0 CHECK (plantas_vivas >= 0),
+    plantas_muertas INTEGER NOT NULL DEFAULT 0 CHECK (plantas_muertas >= 0),
+    volumen_agua_m3 NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    agregados_actualizados_en TIMESTAMP WITH TIME ZONE NULL,
+    CONSTRAINT cuarteles_agrupacion_padre_id_fk FOREIGN KEY (padre_id)
+        REFERENCES cuarteles_agrupacion (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE RESTRICT
+);
+CREATE INDEX IF NOT EXISTS cuarteles_agrupacion_padre_idx ON cuarteles_agrupacion (padre_id);
+CREATE INDEX IF NOT EXISTS cuarteles_agrupacion_ruta_idx ON cuarteles_agrupacion (ruta varchar_pattern_ops);
+
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS agrupacion_id BIGINT NULL
+    REFERENCES cuarteles_agrupacion (id) ON DELETE RESTRICT;
+ALTER TABLE cuarteles_cuartel ADD COLUMN IF NOT EXISTS ruta_agrupacion VARCHAR(255) NOT NULL DEFAULT '';
+CREATE INDEX IF NOT EXISTS cuarteles_cuartel_agrupacion_idx ON cuarteles_cuartel (agrupacion_id);
+-- varchar_pattern_ops: el filtro por prefijo (LIKE 'ruta%') usa el índice con cualquier collation
+CREATE INDEX IF NOT EXISTS cuarteles_cuartel_ruta_agrupacion_idx ON cuarteles_cuartel (ruta_agrupacion varchar_pattern_ops);
+
+-- -----------------------------------------------------
+-- Programas de riego recurrentes
+-- (ver: python manage.py generar_riegos_programados)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS programa_riego (
+    id BIGSERIAL PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    dias_semana JSONB NOT NULL DEFAULT '[]',
+    horario_inicio TIME WITHOUT TIME ZONE NOT NULL,
+    horario_fin TIME WITHOUT TIME ZONE NOT NULL,
+    caudal_m3h NUMERIC(10, 2) NOT NULL,
+    encargado_riego_id BIGINT NULL,
+    fecha_inicio DATE NOT NULL,
+    fecha_fin DATE NULL,
+    activo BOOLEAN NOT NULL DEFAULT TRUE,
+    observaciones TEXT NULL,
+    generado_hasta DATE NULL,
+    creado_en TIMESTAMP WITH TIME ZONE NOT NULL,
+    creado_por_id BIGINT NULL,
+    CONSTRAINT programa_riego_encargado_riego_id_fk FOREIGN KEY (encargado_riego_id)
+        REFERENCES usuarios (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL,
+    CONSTRAINT programa_riego_creado_por_id_fk FOREIGN KEY (creado_por_id)
+        REFERENCES usuarios (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL
+);
+
+CREATE TABLE IF NOT EXISTS programa_riego_cuarteles (
+    id BIGSERIAL PRIMARY KEY,
+    programariego_id BIGINT NOT NULL,
+    cuartel_id BIGINT NOT NULL,
+    CONSTRAINT programa_riego_cuarteles_programariego_id_fk FOREIGN KEY (programariego_id)
+        REFERENCES programa_riego (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT programa_riego_cuarteles_cuartel_id_fk FOREIGN KEY (cuartel_id)
+        REFERENCES cuarteles_cuartel (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT programa_riego_cuarteles_uniq UNIQUE (programariego_id, cuartel_id)
+);
+CREATE INDEX IF NOT EXISTS programa_riego_cuarteles_cuartel_idx ON programa_riego_cuarteles (cuartel_id);
+
+CREATE TABLE IF NOT EXISTS programa_riego_fertilizantes (
+    id BIGSERIAL PRIMARY KEY,
+    cantidad_kg NUMERIC(10, 2) NOT NULL,
+    programa_id BIGINT NOT NULL,
+    producto_id BIGINT NOT NULL,
+    CONSTRAINT programa_riego_fertilizantes_programa_id_fk FOREIGN KEY (programa_id)
+        REFERENCES programa_riego (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT programa_riego_fertilizantes_producto_id_fk FOREIGN KEY (producto_id)
+        REFERENCES productos (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE RESTRICT,
+    CONSTRAINT programa_riego_fertilizantes_uniq UNIQUE (programa_id, producto_id)
+);
+
+ALTER TABLE control_riego ADD COLUMN IF NOT EXISTS programa_id BIGINT NULL
+    REFERENCES programa_riego (id) ON DELETE SET NULL;
+CREATE INDEX IF NOT EXISTS riego_programa_fecha_idx ON control_riego (programa_id, fecha);
+
+-- -----------------------------------------------------
+-- Índices del dashboard de riego (paginación por cursor)
+-- (ver: python manage.py verificar_indices_riego)
+-- -----------------------------------------------------
+CREATE INDEX IF NOT EXISTS riego_estado_fecha_idx ON control_riego (estado, fecha);
+CREATE INDEX IF NOT EXISTS riego_cuartel_fecha_idx ON control_riego (cuartel_id, fecha);
+CREATE INDEX IF NOT EXISTS riego_orden_idx ON control_riego (fecha, horario_inicio, id);
+
+-- -----------------------------------------------------
+-- Caudalímetros: lecturas reales agregadas por minuto
+-- (ver riego/caudalimetros.py y: python manage.py simular_caudalimetros)
+-- -----------------------------------------------------
+ALTER TABLE control_riego ADD COLUMN IF NOT EXISTS volumen_medido_m3 NUMERIC(10, 2) NULL;
+
+CREATE TABLE IF NOT EXISTS riego_caudalimetro (
+    id BIGSERIAL PRIMARY KEY,
+    codigo VARCHAR(50) NOT NULL UNIQUE,
+    nombre VARCHAR(100) NOT NULL DEFAULT '',
+    cuartel_id BIGINT NOT NULL,
+    activo BOOLEAN NOT NULL DEFAULT TRUE,
+    token_hash VARCHAR(64) NOT NULL DEFAULT '',
+    ultimo_totalizador_m3 DOUBLE PRECISION NULL,
+    ultima_lectura_en TIMESTAMP WITH TIME ZONE NULL,
+    CONSTRAINT riego_caudalimetro_cuartel_id_fk FOREIGN KEY (cuartel_id)
+        REFERENCES cuarteles_cuartel (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS riego_caudalimetro_cuartel_idx ON riego_caudalimetro (cuartel_id);
+
+-- Una fila por medidor y minuto; la clave única sirve también para leer por rango
+CREATE TABLE IF NOT EXISTS riego_lectura_caudal (
+    id BIGSERIAL PRIMARY KEY,
+    caudalimetro_id BIGINT NOT NULL,
+    minuto TIMESTAMP WITH TIME ZONE NOT NULL,
+    volumen_m3 DOUBLE PRECISION NOT NULL DEFAULT 0,
+    muestras INTEGER NOT NULL DEFAULT 0 CHECK (muestras >= 0),
+    CONSTRAINT riego_lectura_caudal_caudalimetro_id_fk FOREIGN KEY (caudalimetro_id)
+        REFERENCES riego_caudalimetro (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT riego_lectura_minuto_uniq UNIQUE (caudalimetro_id, minuto)
+);
+
+-- -----------------------------------------------------
+-- Recomendaciones de riego por evapotranspiración
+-- (python manage.py importar_et0 archivo.csv / recomendar_riego)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS riego_et0_diaria (
+    id BIGSERIAL PRIMARY KEY,
+    fecha DATE NOT NULL UNIQUE,
+    et0_mm NUMERIC(5, 2) NOT NULL,
+    precipitacion_mm NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    fuente VARCHAR(100) NOT NULL DEFAULT '',
+    importado_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS riego_coeficiente_cultivo (
+    id BIGSERIAL PRIMARY KEY,
+    tipo_planta VARCHAR(100) NOT NULL,
+    variedad VARCHAR(100) NOT NULL DEFAULT '',
+    kc NUMERIC(4, 2) NOT NULL,
+    CONSTRAINT riego_coeficiente_cultivo_tipo_variedad_uniq UNIQUE (tipo_planta, variedad)
+);
+
+CREATE TABLE IF NOT EXISTS riego_recomendacion (
+    id BIGSERIAL PRIMARY KEY,
+    cuartel_id BIGINT NOT NULL,
+    fecha DATE NOT NULL,
+    et0_mm NUMERIC(5, 2) NOT NULL,
+    kc NUMERIC(4, 2) NOT NULL,
+    kc_por_defecto BOOLEAN NOT NULL DEFAULT FALSE,
+    demanda_m3 NUMERIC(10, 2) NOT NULL,
+    aplicado_m3 NUMERIC(10, 2) NOT NULL,
+    volumen_recomendado_m3 NUMERIC(10, 2) NOT NULL,
+    caudal_m3h NUMERIC(10, 2) NULL,
+    duracion_sugerida_minutos INTEGER NULL CHECK (duracion_sugerida_minutos >= 0),
+    calculado_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT riego_recomendacion_cuartel_id_fk FOREIGN KEY (cuartel_id)
+        REFERENCES cuarteles_cuartel (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    -- (fecha, cuartel): el dashboard lee las de una fecha por rango del índice
+    CONSTRAINT riego_recomendacion_uniq UNIQUE (fecha, cuartel_id)
+);
+CREATE INDEX IF NOT EXISTS riego_recomendacion_cuartel_idx ON riego_recomendacion (cuartel_id);
+
+-- -----------------------------------------------------
+-- Presupuesto de agua por cuartel y temporada, con su curva acumulada
+-- (se mantiene al finalizar riegos; ver riego/presupuesto.py)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS riego_presupuesto_agua (
+    id BIGSERIAL PRIMARY KEY,
+    cuartel_id BIGINT NOT NULL,
+    temporada SMALLINT NOT NULL CHECK (temporada >= 0),
+    fecha_inicio DATE NOT NULL,
+    fecha_fin DATE NOT NULL,
+    presupuesto_m3_ha NUMERIC(10, 2) NOT NULL,
+    area_hectareas NUMERIC(10, 2) NOT NULL,
+    consumido_m3 NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    ultimo_riego DATE NULL,
+    actualizado_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT riego_presupuesto_agua_cuartel_id_fk FOREIGN KEY (cuartel_id)
+        REFERENCES cuarteles_cuartel (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    -- (temporada, cuartel): el tablero lee una temporada completa por rango del índice
+    CONSTRAINT riego_presupuesto_uniq UNIQUE (temporada, cuartel_id)
+);
+CREATE INDEX IF NOT EXISTS riego_presupuesto_cuartel_idx ON riego_presupuesto_agua (cuartel_id);
+
+CREATE TABLE IF NOT EXISTS riego_curva_agua (
+    id BIGSERIAL PRIMARY KEY,
+    presupuesto_id BIGINT NOT NULL,
+    fecha DATE NOT NULL,
+    m3_dia NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    m3_ha_acumulado NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    CONSTRAINT riego_curva_agua_presupuesto_id_fk FOREIGN KEY (presupuesto_id)
+        REFERENCES riego_presupuesto_agua (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT riego_curva_agua_uniq UNIQUE (presupuesto_id, fecha)
+);
+
+-- -----------------------------------------------------
+-- Carencia y reingreso: intervalos por producto y restricción vigente por
+-- cuartel (tabla materializada; ver aplicaciones/restricciones.py)
+-- -----------------------------------------------------
+ALTER TABLE productos ADD COLUMN IF NOT EXISTS dias_carencia INTEGER NOT NULL DEFAULT 0 CHECK (dias_carencia >= 0);
+ALTER TABLE productos ADD COLUMN IF NOT EXISTS horas_reingreso INTEGER NOT NULL DEFAULT 0 CHECK (horas_reingreso >= 0);
+
+CREATE TABLE IF NOT EXISTS aplicaciones_restriccion_cuartel (
+    id BIGSERIAL PRIMARY KEY,
+    cuartel_id BIGINT NOT NULL UNIQUE,
+    reingreso_hasta TIMESTAMP WITH TIME ZONE NULL,
+    aplicacion_reingreso_id BIGINT NULL,
+    producto_reingreso_id BIGINT NULL,
+    cosecha_desde DATE NULL,
+    aplicacion_carencia_id BIGINT NULL,
+    producto_carencia_id BIGINT NULL,
+    actualizado_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT apl_restr_cuartel_id_fk FOREIGN KEY (cuartel_id)
+        REFERENCES cuarteles_cuartel (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE CASCADE,
+    CONSTRAINT apl_restr_apl_reingreso_fk FOREIGN KEY (aplicacion_reingreso_id)
+        REFERENCES aplicaciones_fitosanitarias (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL,
+    CONSTRAINT apl_restr_prod_reingreso_fk FOREIGN KEY (producto_reingreso_id)
+        REFERENCES productos (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL,
+    CONSTRAINT apl_restr_apl_carencia_fk FOREIGN KEY (aplicacion_carencia_id)
+        REFERENCES aplicaciones_fitosanitarias (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL,
+    CONSTRAINT apl_restr_prod_carencia_fk FOREIGN KEY (producto_carencia_id)
+        REFERENCES productos (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL
+);
+-- "¿Qué cuarteles están restringidos en X?" por rango de cada índice
+CREATE INDEX IF NOT EXISTS apl_restr_reingreso_idx ON aplicaciones_restriccion_cuartel (reingreso_hasta);
+CREATE INDEX IF NOT EXISTS apl_restr_cosecha_idx ON aplicaciones_restriccion_cuartel (cosecha_desde);
+
+-- -----------------------------------------------------
+-- Listado de aplicaciones: orden / cursor (fecha_aplicacion, id) y filtro por estado
+-- -----------------------------------------------------
+CREATE INDEX IF NOT EXISTS apl_orden_idx ON aplicaciones_fitosanitarias (fecha_aplicacion, id);
+CREATE INDEX IF NOT EXISTS apl_estado_fecha_idx ON aplicaciones_fitosanitarias (estado, fecha_aplicacion);
+
+-- -----------------------------------------------------
+-- Tablets de sincronización (token propio, sin sesión)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS cuarteles_dispositivosincronizacion (
+    id BIGSERIAL PRIMARY KEY,
+    codigo VARCHAR(50) NOT NULL UNIQUE,
+    nombre VARCHAR(100) NOT NULL DEFAULT '',
+    usuario_id INTEGER NULL,
+    activo BOOLEAN NOT NULL DEFAULT TRUE,
+    token_hash VARCHAR(64) NOT NULL DEFAULT '',
+    ultima_sincronizacion TIMESTAMP WITH TIME ZONE NULL,
+    CONSTRAINT cuarteles_dispositivo_usuario_id_fk FOREIGN KEY (usuario_id)
+        REFERENCES usuarios (id) MATCH SIMPLE
+        ON UPDATE NO ACTION
+        ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS cuarteles_dispositivo_usuario_idx ON cuarteles_dispositivosincronizacion (usuario_id);
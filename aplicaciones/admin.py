@@ -1,7 +1,9 @@
 # aplicaciones/admin.py
 
 from django.contrib import admin
-from .models import AplicacionFitosanitaria, AplicacionProducto
+from .models import AplicacionFitosanitaria, AplicacionProducto, RestriccionCuartel
+from .dosis import recalcular_area_y_dosis
+from .restricciones import actualizar_por_aplicaciones, recalcular_restricciones
 from .forms import AplicacionProductoForm # Usamos el form customizado
 # --- CORRECCIÓN 1: Importar tu modelo Usuario ---
 from autenticacion.models import Usuario 
@@ -81,14 +83,50 @@ class AplicacionFitosanitariaAdmin(admin.ModelAdmin):
 
     def save_related(self, request, form, formsets, change):
         """
-        Recalcula el área después de guardar los M2M (cuarteles)
+        Recalcula área y dosis después de guardar los M2M (cuarteles)
         y los inlines (productos).
         """
         super().save_related(request, form, formsets, change)
-        # Asegurar que el área se recalcule después de guardar M2M
-        form.instance.save() # Esto llama al save() del modelo
+        recalcular_area_y_dosis([form.instance.id])
+        # Aquí se puede cambiar estado, fecha, cuarteles o productos de una realizada
+        previos = [getattr(c, 'pk', c) for c in form.initial.get('cuarteles', [])]
+        actualizar_por_aplicaciones([form.instance.id], cuarteles_previos=previos)
+
+    def delete_model(self, request, obj):
+        cuarteles = list(obj.cuarteles.values_list('id', flat=True))
+        super().delete_model(request, obj)
+        recalcular_restricciones(cuarteles)
+
+    def delete_queryset(self, request, queryset):
+        cuarteles = list(
+            AplicacionFitosanitaria.cuarteles.through.objects.filter(
+                aplicacionfitosanitaria__in=queryset
+            ).values_list('cuartel_id', flat=True)
+        )
+        super().delete_queryset(request, queryset)
+        recalcular_restricciones(cuarteles)
 
 
     def get_queryset(self, request):
         # Optimizar la carga
-        return super().get_queryset(request).prefetch_related('aplicacionproducto_set__producto')
\ No newline at end of file
+        return super().get_queryset(request).prefetch_related('aplicacionproducto_set__producto')
+
+
+@admin.register(RestriccionCuartel)
+class RestriccionCuartelAdmin(admin.ModelAdmin):
+    """Solo lectura: la tabla se recalcula desde las aplicaciones"""
+    list_display = ('cuartel', 'reingreso_hasta', 'producto_reingreso', 'cosecha_desde', 'producto_carencia', 'actualizado_en')
+    list_select_related = ('cuartel', 'producto_reingreso', 'producto_carencia')
+    ordering = ('cuartel__numero',)
+    actions = ['recalcular']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Recalcular todas las restricciones')
+    def recalcular(self, request, queryset):
+        total = recalcular_restricciones()
+        self.message_user(request, f'{total} cuarteles con restricción vigente.')
@@ -0,0 +1,113 @@
+# aplicaciones/dosis.py
+"""
+Área tratada de cada aplicación (suma de sus cuarteles) y dosis por
+hectárea de cada producto, recalculadas juntas y en bloque.
+
+- recalcular_area_y_dosis(): se llama al guardar una aplicación, después
+  de save_m2m (cuarteles) y del formset (productos), y cuando cambia el
+  área de un cuartel, para todas sus aplicaciones (ver signals.py).
+- En PostgreSQL es UNA sentencia: el área se agrega en un CTE, otro CTE
+  (UPDATE) escribe 'area_tratada' y el UPDATE … FROM final escribe
+  'dosis_por_hectarea' de todos los productos. En otros motores son dos
+  UPDATE con subconsultas correlacionadas.
+- Los modelos ya no recalculan nada en save() (antes: un aggregate por
+  aplicación y una lectura de la aplicación por cada producto).
+"""
+
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import GreaterThan
+
+from cuarteles.models import Cuartel
+from .models import AplicacionFitosanitaria, AplicacionProducto
+
+AREA = DecimalField(max_digits=10, decimal_places=2)
+CuartelesAplicacion = AplicacionFitosanitaria.cuarteles.through
+
+
+def recalcular_area_y_dosis(aplicacion_ids=None, cuartel_ids=None):
+    """
+    Recalcula área y dosis de las aplicaciones 'aplicacion_ids', o de las
+    que tratan alguno de 'cuartel_ids' (todas si no se indica ninguno).
+    """
+    if aplicacion_ids is not None:
+        aplicacion_ids = list(aplicacion_ids)
+        if not aplicacion_ids:
+            return
+    if cuartel_ids is not None:
+        cuartel_ids = list(cuartel_ids)
+        if not cuartel_ids:
+            return
+
+    if connection.vendor == 'postgresql':
+        _recalcular_postgresql(aplicacion_ids, cuartel_ids)
+    else:
+        _recalcular_orm(aplicacion_ids, cuartel_ids)
+
+
+def _recalcular_postgresql(aplicacion_ids, cuartel_ids):
+    aplicaciones = AplicacionFitosanitaria._meta.db_table
+    productos = AplicacionProducto._meta.db_table
+    intermedia = CuartelesAplicacion._meta.db_table
+    cuarteles = Cuartel._meta.db_table
+
+    filtro, parametros = 'TRUE', []
+    if aplicacion_ids is not None:
+        filtro, parametros = 'a.id = ANY(%s)', [aplicacion_ids]
+    elif cuartel_ids is not None:
+        filtro = f'a.id IN (SELECT aplicacionfitosanitaria_id FROM {intermedia} WHERE cuartel_id = ANY(%s))'
+        parametros = [cuartel_ids]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'WITH areas AS ('
+            '    SELECT a.id, COALESCE(SUM(c.area_hectareas), 0) AS area'
+            f'    FROM {aplicaciones} a'
+            f'    LEFT JOIN {intermedia} ac ON ac.aplicacionfitosanitaria_id = a.id'
+            f'    LEFT JOIN {cuarteles} c ON c.id = ac.cuartel_id'
+            f'    WHERE {filtro}'
+            '    GROUP BY a.id'
+            '), escritas AS ('
+            f'    UPDATE {aplicaciones} a SET area_tratada = areas.area'
+            '    FROM areas WHERE a.id = areas.id AND a.area_tratada IS DISTINCT FROM areas.area'
+            ') '
+            f'UPDATE {productos} d '
+            'SET dosis_por_hectarea = CASE WHEN areas.area > 0 THEN d.cantidad_utilizada / areas.area ELSE 0 END '
+            'FROM areas WHERE d.aplicacion_id = areas.id',
+            parametros
+        )
+
+
+def _recalcular_orm(aplicacion_ids, cuartel_ids):
+    aplicaciones = AplicacionFitosanitaria.objects.all()
+    if aplicacion_ids is not None:
+        aplicaciones = aplicaciones.filter(pk__in=aplicacion_ids)
+    elif cuartel_ids is not None:
+        aplicaciones = aplicaciones.filter(pk__in=CuartelesAplicacion.objects.filter(
+            cuartel_id__in=cuartel_ids
+        ).values('aplicacionfitosanitaria_id'))
+
+    aplicaciones.update(area_tratada=Coalesce(
+        Subquery(
+            CuartelesAplicacion.objects.filter(aplicacionfitosanitaria_id=OuterRef('pk')).order_by()
+            .values('aplicacionfitosanitaria_id').annotate(total=Sum('cuartel__area_hectareas')).values('total')[:1],
+            output_field=AREA
+        ),
+        Value(Decimal('0')), output_field=AREA
+    ))
+
+    area = Subquery(
+        AplicacionFitosanitaria.objects.filter(pk=OuterRef('aplicacion_id')).values('area_tratada')[:1],
+        output_field=AREA
+    )
+    # SQLite guarda 10.00 como entero y 10 / 4 daría 2: se divide en punto flotante
+    dosis = Cast(F('cantidad_utilizada'), FloatField()) / area
+    AplicacionProducto.objects.filter(aplicacion__in=aplicaciones.values('pk')).update(
+        dosis_por_hectarea=Case(
+            When(GreaterThan(area, 0), then=ExpressionWrapper(dosis, output_field=AREA)),
+            default=Value(Decimal('0')), output_field=AREA,
+        )
+    )
@@ -1,22 +1,24 @@
 from django import forms
 from django.forms import inlineformset_factory
 from .models import AplicacionFitosanitaria, AplicacionProducto
-from cuarteles.models import Cuartel
-from inventario.models import Producto, EquipoAgricola
+from inventario.forms import ProductoAutocompleteSelect
 from autenticacion.models import Usuario 
+from AgroControl.opciones import OpcionesCacheadasField, OpcionesCacheadasMultipleField
+from .restricciones import describir_reingreso, reingreso_restringido
 
 class AplicacionForm(forms.ModelForm):
     
     # --- Campos personalizados ---
     # Inicialmente definimos el queryset vacío o general,
     # pero lo filtraremos dinámicamente en el __init__
-    aplicador = forms.ModelChoiceField(
-        queryset=Usuario.objects.none(), # Se llena en __init__
+    # Las listas se leen del caché compartido (ver AgroControl/opciones.py)
+    aplicador = OpcionesCacheadasField(
+        'aplicadores', # Se ajusta en __init__ según el usuario
         widget=forms.Select(attrs={'class': 'form-control'})
     )
     
-    cuarteles = forms.ModelMultipleChoiceField(
-        queryset=Cuartel.objects.all().order_by('nombre'), 
+    cuarteles = OpcionesCacheadasMultipleField(
+        'cuarteles',
         widget=forms.SelectMultiple(attrs={'class': 'form-control', 'size': '5'})
     )
     fecha_aplicacion = forms.DateTimeField(
@@ -27,8 +29,8 @@ class AplicacionForm(forms.ModelForm):
         input_formats=['%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M:%S']
     )
 
-    equipo_utilizado = forms.ModelChoiceField(
-        queryset=EquipoAgricola.objects.filter(estado='operativo').order_by('nombre'),
+    equipo_utilizado = OpcionesCacheadasField(
+        'equipos_operativos',
         required=False,
         widget=forms.Select(attrs={'class': 'form-control'}),
         label='Equipo Utilizado (Opcional)'
@@ -58,10 +60,7 @@ class AplicacionForm(forms.ModelForm):
         if self.usuario_actual:
             # 1. Si es Administrador: Ve a TODOS los aplicadores activos
             if self.usuario_actual.es_administrador:
-                self.fields['aplicador'].queryset = Usuario.objects.filter(
-                    esta_activo=True, 
-                    rol__nombre='aplicador' 
-                ).order_by('nombres')
+                self.fields['aplicador'].usar_lista('aplicadores')
             
             # 2. Si es un Aplicador normal: Solo se ve a sí mismo
             else:
@@ -78,32 +77,36 @@ class AplicacionForm(forms.ModelForm):
 
     def clean(self):
         """
-        Validación central y cálculos de área.
+        Validación central. El área tratada y las dosis se calculan al
+        guardar (aplicaciones/dosis.py).
         """
         cleaned_data = super().clean()
         
         cuarteles = cleaned_data.get('cuarteles')
 
-        if cuarteles:
-            try:
-                area_total = sum(c.area_hectareas for c in cuarteles if c.area_hectareas)
-                if area_total <= 0:
-                        raise forms.ValidationError(
-                            "El área total de los cuarteles seleccionados debe ser mayor a 0."
-                        )
-                cleaned_data['area_tratada'] = area_total 
-            except Exception as e:
-                raise forms.ValidationError(f"Error al calcular el área: {e}")
-        else:
-             cleaned_data['area_tratada'] = 0
+        if cuarteles and sum(c.area_hectareas or 0 for c in cuarteles) <= 0:
+            raise forms.ValidationError(
+                "El área total de los cuarteles seleccionados debe ser mayor a 0."
+            )
+
+        # Quien aplica puede entrar con su equipo de protección: no se bloquea,
+        # la vista lo muestra como advertencia
+        fecha = cleaned_data.get('fecha_aplicacion')
+        self.avisos_reingreso = []
+        if cuarteles and fecha:
+            restringidos = reingreso_restringido([c.pk for c in cuarteles], fecha)
+            self.avisos_reingreso = [
+                f'{c.nombre}: {describir_reingreso(restringidos[c.pk])}'
+                for c in cuarteles if c.pk in restringidos
+            ]
 
         return cleaned_data
 
 # --- El resto del archivo (AplicacionProductoForm y FormSet) sigue igual ---
 class AplicacionProductoForm(forms.ModelForm):
-    producto = forms.ModelChoiceField(
-        queryset=Producto.objects.filter(esta_activo=True).order_by('nombre'),
-        widget=forms.Select(attrs={'class': 'form-control producto-select'})
+    producto = OpcionesCacheadasField(
+        'productos_activos',
+        widget=ProductoAutocompleteSelect()
     )
     
     cantidad_utilizada = forms.DecimalField(
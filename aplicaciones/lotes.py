@@ -0,0 +1,116 @@
+# aplicaciones/lotes.py
+"""
+Finalización / cancelación de varias aplicaciones 'programada' en una
+transacción (ver AgroControl/acciones_masivas.py).
+
+- Aplicaciones bloqueadas en orden de id, luego los productos (ReservaStock).
+- Productos de todas las aplicaciones y movimientos ya existentes: UNA
+  consulta cada uno.
+- Cada aplicación conserva su MovimientoInventario (queda enlazado a ella
+  por 'aplicacion'), pero movimientos y detalles se insertan con
+  bulk_create y el stock se escribe una sola vez por producto.
+- Una aplicación sin stock suficiente falla sola; las demás se finalizan.
+- Las restricciones de carencia / reingreso de los cuarteles de las
+  finalizadas se recalculan juntas (ver restricciones.py).
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from AgroControl.acciones_masivas import ResultadoLote
+from inventario.models import DetalleMovimiento, MovimientoInventario
+from inventario.salidas import ReservaStock
+from .models import AplicacionFitosanitaria, AplicacionProducto
+from .restricciones import actualizar_por_aplicaciones
+
+
+def procesar_aplicaciones(ids, accion, usuario_id, es_admin=False):
+    """
+    Aplica 'finalizar' o 'cancelar' a las aplicaciones 'ids'. Quien no es
+    administrador solo puede procesar las suyas. Devuelve un ResultadoLote.
+    """
+    resultado = ResultadoLote()
+    with transaction.atomic():
+        aplicaciones = {
+            a.id: a for a in AplicacionFitosanitaria.objects.select_for_update().filter(pk__in=ids)
+            .order_by('id').only('id', 'estado', 'aplicador_id', 'fecha_aplicacion')
+        }
+        pendientes = []
+        for pk in sorted(ids):
+            aplicacion = aplicaciones.get(pk)
+            if aplicacion is None:
+                resultado.error(pk, 'No existe.')
+            elif not es_admin and aplicacion.aplicador_id != usuario_id:
+                resultado.error(pk, f'No tienes permiso para {accion} tareas de otros.')
+            elif aplicacion.estado != 'programada':
+                resultado.error(pk, f'Esta aplicación no se puede {accion}.')
+            else:
+                pendientes.append(aplicacion)
+
+        estado = 'cancelada'
+        if accion == 'finalizar':
+            estado = 'realizada'
+            pendientes = _descontar_stock(pendientes, usuario_id, resultado)
+
+        aceptados = [a.id for a in pendientes]
+        AplicacionFitosanitaria.objects.filter(pk__in=aceptados).update(
+            estado=estado, fecha_actualizacion=timezone.now()
+        )
+        if estado == 'realizada' and aceptados:
+            actualizar_por_aplicaciones(aceptados)
+        resultado.correctos = aceptados
+    return resultado
+
+
+def _descontar_stock(aplicaciones, usuario_id, resultado):
+    """Misma regla que 'crear_movimiento_salida_para_app', para varias. Devuelve las que se pueden finalizar."""
+    ids = [a.id for a in aplicaciones]
+    # Si ya tiene movimiento (se descontó al crearla) no se vuelve a descontar
+    con_movimiento = set(
+        MovimientoInventario.objects.filter(aplicacion_id__in=ids).values_list('aplicacion_id', flat=True)
+    )
+    lineas = defaultdict(list)
+    for aplicacion_id, producto_id, cantidad in AplicacionProducto.objects.filter(
+        aplicacion_id__in=[pk for pk in ids if pk not in con_movimiento]
+    ).order_by('aplicacion_id', 'producto_id').values_list('aplicacion_id', 'producto_id', 'cantidad_utilizada'):
+        lineas[aplicacion_id].append((producto_id, cantidad))
+
+    reserva = ReservaStock(p for filas in lineas.values() for p, _ in filas)
+    aceptadas, salidas = [], []
+    for aplicacion in aplicaciones:
+        if aplicacion.id not in con_movimiento:
+            if not lineas[aplicacion.id]:
+                resultado.error(aplicacion.id, 'No se puede finalizar una aplicación sin productos.')
+                continue
+            try:
+                salidas.append((aplicacion, reserva.reservar(lineas[aplicacion.id])))
+            except ValidationError as e:
+                resultado.error(aplicacion.id, e.message)
+                continue
+        aceptadas.append(aplicacion)
+
+    movimientos = MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(
+            tipo_movimiento='salida',
+            fecha_movimiento=aplicacion.fecha_aplicacion,
+            motivo=f"Salida por Aplicación Fitosanitaria ID: {aplicacion.id}",
+            referencia=f"APL-{aplicacion.id}",
+            realizado_por_id=usuario_id,
+            aplicacion=aplicacion,
+        )
+        for aplicacion, _ in salidas
+    ])
+    DetalleMovimiento.objects.bulk_create([
+        DetalleMovimiento(
+            movimiento=movimiento, producto=producto, cantidad=cantidad,
+            stock_anterior=anterior, stock_posterior=posterior,
+        )
+        for movimiento, (_, detalles) in zip(movimientos, salidas)
+        for producto, cantidad, anterior, posterior in detalles
+    ])
+    # Las alertas quedan asociadas al último movimiento del lote
+    reserva.guardar(movimientos[-1] if movimientos else None)
+    return aceptadas
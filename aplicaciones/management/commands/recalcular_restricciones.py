@@ -0,0 +1,20 @@
+# Guardar en: aplicaciones/management/commands/recalcular_restricciones.py
+
+from django.core.management.base import BaseCommand
+
+from aplicaciones.models import RestriccionCuartel
+from aplicaciones.restricciones import recalcular_restricciones
+
+class Command(BaseCommand):
+    help = (
+        'Rehace la tabla de restricciones de carencia / reingreso por cuartel desde '
+        'las aplicaciones REALIZADAS. Se mantiene sola al finalizar aplicaciones; '
+        'sirve tras cargar datos históricos y, a diario, para limpiar las ya vencidas.'
+    )
+
+    def handle(self, *args, **options):
+        antes = RestriccionCuartel.objects.count()
+        cantidad = recalcular_restricciones()
+        self.stdout.write(self.style.SUCCESS(
+            f'{cantidad} cuarteles con restricción vigente (antes {antes}).'
+        ))
@@ -1,7 +1,6 @@
 # aplicaciones/models.py
 
 from django.db import models
-from django.db.models import Sum
 from autenticacion.models import Usuario as User
 from inventario.models import Producto, EquipoAgricola
 from cuarteles.models import Cuartel
@@ -51,7 +50,7 @@ class AplicacionFitosanitaria(models.Model):
         verbose_name='Cuarteles Tratados'
     )
     
-    # Este AHORA es un campo calculado (se calcula en el form/save)
+    # Campo calculado: suma del área de los cuarteles (ver aplicaciones/dosis.py)
     area_tratada = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -105,6 +104,11 @@ class AplicacionFitosanitaria(models.Model):
         verbose_name = 'Aplicación Fitosanitaria'
         verbose_name_plural = 'Aplicaciones Fitosanitarias'
         ordering = ['-fecha_aplicacion']
+        indexes = [
+            # Listado: orden (y cursor) sin filtro, y filtrado por estado
+            models.Index(fields=['fecha_aplicacion', 'id'], name='apl_orden_idx'),
+            models.Index(fields=['estado', 'fecha_aplicacion'], name='apl_estado_fecha_idx'),
+        ]
 
     def __str__(self):
         # Usar 'self.get_primer_producto()' que definimos abajo
@@ -112,14 +116,6 @@ class AplicacionFitosanitaria(models.Model):
         nombre_prod = primer_prod.producto.nombre if primer_prod else "N/A"
         return f"Aplicación de {nombre_prod} el {self.fecha_aplicacion.strftime('%d/%m/%Y')}"
 
-    def save(self, *args, **kwargs):
-        # Calcular el área tratada total al guardar la aplicación
-        if self.pk: # Solo si ya existe y tiene cuarteles
-             # Usamos .all() que funciona después de que el form M2M se guarda
-            area_total = self.cuarteles.all().aggregate(Sum('area_hectareas'))['area_hectareas__sum']
-            self.area_tratada = area_total or 0
-        super().save(*args, **kwargs)
-
     # --- MÉTODOS HELPER PARA TEMPLATES ---
 
     def get_primer_producto(self):
@@ -167,7 +163,7 @@ class AplicacionProducto(models.Model):
         decimal_places=2,
         verbose_name='Cantidad Total Utilizada'
     )
-    # Este campo se calculará
+    # Campo calculado junto con el área de la aplicación (ver aplicaciones/dosis.py)
     dosis_por_hectarea = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -185,11 +181,49 @@ class AplicacionProducto(models.Model):
 
     def __str__(self):
         return f"{self.producto.nombre} ({self.cantidad_utilizada} {self.producto.unidad_medida})"
-    
-    def save(self, *args, **kwargs):
-        # Calcular dosis/ha al guardar
-        if self.aplicacion.area_tratada and self.aplicacion.area_tratada > 0:
-            self.dosis_por_hectarea = self.cantidad_utilizada / self.aplicacion.area_tratada
-        else:
-            self.dosis_por_hectarea = 0
-        super().save(*args, **kwargs)
\ No newline at end of file
+
+class RestriccionCuartel(models.Model):
+    """
+    Restricción vigente de cada cuartel por las aplicaciones realizadas
+    (tabla materializada, la mantiene aplicaciones/restricciones.py).
+    Una fila por cuartel con el reingreso y la carencia que terminan más tarde.
+    """
+    cuartel = models.OneToOneField(
+        Cuartel,
+        on_delete=models.CASCADE,
+        related_name='restriccion',
+        verbose_name='Cuartel'
+    )
+    reingreso_hasta = models.DateTimeField(null=True, blank=True, verbose_name='Reingreso restringido hasta')
+    aplicacion_reingreso = models.ForeignKey(
+        AplicacionFitosanitaria, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    producto_reingreso = models.ForeignKey(
+        Producto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    cosecha_desde = models.DateField(null=True, blank=True, verbose_name='Cosecha permitida desde')
+    aplicacion_carencia = models.ForeignKey(
+        AplicacionFitosanitaria, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    producto_carencia = models.ForeignKey(
+        Producto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'aplicaciones_restriccion_cuartel'
+        verbose_name = 'Restricción de Cuartel'
+        verbose_name_plural = 'Restricciones de Cuarteles'
+        indexes = [
+            models.Index(fields=['reingreso_hasta'], name='apl_restr_reingreso_idx'),
+            models.Index(fields=['cosecha_desde'], name='apl_restr_cosecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Restricción {self.cuartel}"
+
+    def reingreso_restringido(self, momento):
+        return self.reingreso_hasta is not None and self.reingreso_hasta > momento
+
+    def cosecha_restringida(self, fecha):
+        return self.cosecha_desde is not None and self.cosecha_desde > fecha
@@ -0,0 +1,139 @@
+# aplicaciones/restricciones.py
+"""
+Carencia (días hasta poder cosechar) y reingreso (horas sin entrar) de
+cada cuartel, materializados en RestriccionCuartel.
+
+- Cada producto define 'dias_carencia' y 'horas_reingreso'. Una aplicación
+  realizada restringe sus cuarteles hasta 'fecha_aplicacion + horas'
+  (reingreso) y hasta el día 'fecha_aplicacion + días' (cosecha).
+- recalcular_restricciones(): rehace las filas de los cuarteles pedidos
+  desde las aplicaciones realizadas con UNA consulta (otra más lee el mayor
+  intervalo de los productos, que acota las fechas leídas). Solo quedan
+  filas con alguna restricción aún vigente.
+- Se llama al finalizar o cancelar aplicaciones (una o un lote), al
+  crearlas / editarlas como realizadas y al cambiar los intervalos de un
+  producto. El comando 'recalcular_restricciones' rehace toda la tabla.
+- "¿Qué cuarteles están restringidos en X?" lee solo esta tabla, por
+  índice: reingreso_restringido() (riegos, aplicaciones) y
+  restricciones_vigentes() (planificación de cosecha).
+
+Cada fila guarda la restricción que termina más tarde: sirve para
+consultar desde ahora en adelante, no para reconstruir el pasado.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from inventario.models import Producto
+from .models import AplicacionFitosanitaria, AplicacionProducto, RestriccionCuartel
+
+CAMPOS = [
+    'reingreso_hasta', 'aplicacion_reingreso', 'producto_reingreso',
+    'cosecha_desde', 'aplicacion_carencia', 'producto_carencia', 'actualizado_en',
+]
+
+
+def _desde(ahora):
+    """Aplicaciones anteriores a esta fecha ya no restringen nada."""
+    maximos = Producto.objects.aggregate(dias=Max('dias_carencia'), horas=Max('horas_reingreso'))
+    dias = max(maximos['dias'] or 0, -(-(maximos['horas'] or 0) // 24))
+    # Un día de holgura por el paso a fecha local
+    return ahora - timedelta(days=dias + 1)
+
+
+def recalcular_restricciones(cuartel_ids=None, ahora=None):
+    """
+    Rehace RestriccionCuartel de 'cuartel_ids' (todos si es None) desde las
+    aplicaciones realizadas. Devuelve cuántos cuarteles quedaron restringidos.
+    """
+    ahora = ahora or timezone.now()
+    hoy = timezone.localdate(ahora)
+    if cuartel_ids is not None:
+        cuartel_ids = set(cuartel_ids)
+        if not cuartel_ids:
+            return 0
+
+    filas = AplicacionProducto.objects.filter(
+        Q(producto__dias_carencia__gt=0) | Q(producto__horas_reingreso__gt=0),
+        aplicacion__estado='realizada',
+        aplicacion__fecha_aplicacion__gte=_desde(ahora),
+    )
+    if cuartel_ids is not None:
+        filas = filas.filter(aplicacion__cuarteles__in=cuartel_ids)
+
+    restricciones = {}
+    for cuartel_id, aplicacion_id, fecha, producto_id, dias, horas in filas.order_by(
+        'aplicacion_id', 'producto_id'
+    ).values_list(
+        'aplicacion__cuarteles', 'aplicacion_id', 'aplicacion__fecha_aplicacion',
+        'producto_id', 'producto__dias_carencia', 'producto__horas_reingreso',
+    ):
+        if cuartel_id is None:
+            continue
+        reingreso = fecha + timedelta(hours=horas)
+        cosecha = timezone.localdate(fecha) + timedelta(days=dias)
+        if reingreso <= ahora and cosecha <= hoy:
+            continue
+        r = restricciones.setdefault(cuartel_id, RestriccionCuartel(cuartel_id=cuartel_id))
+        if reingreso > ahora and (r.reingreso_hasta is None or reingreso > r.reingreso_hasta):
+            r.reingreso_hasta = reingreso
+            r.aplicacion_reingreso_id, r.producto_reingreso_id = aplicacion_id, producto_id
+        if cosecha > hoy and (r.cosecha_desde is None or cosecha > r.cosecha_desde):
+            r.cosecha_desde = cosecha
+            r.aplicacion_carencia_id, r.producto_carencia_id = aplicacion_id, producto_id
+
+    with transaction.atomic():
+        sobrantes = RestriccionCuartel.objects.exclude(cuartel_id__in=list(restricciones))
+        if cuartel_ids is not None:
+            sobrantes = sobrantes.filter(cuartel_id__in=cuartel_ids)
+        sobrantes.delete()
+        RestriccionCuartel.objects.bulk_create(
+            list(restricciones.values()), batch_size=1000,
+            update_conflicts=True, unique_fields=['cuartel'], update_fields=CAMPOS,
+        )
+    return len(restricciones)
+
+
+def actualizar_por_aplicaciones(aplicacion_ids, cuarteles_previos=()):
+    """
+    Recalcula los cuarteles de las aplicaciones (y 'cuarteles_previos', los
+    que tenían antes de editarlas).
+    """
+    cuarteles = set(
+        AplicacionFitosanitaria.cuarteles.through.objects.filter(
+            aplicacionfitosanitaria_id__in=aplicacion_ids
+        ).values_list('cuartel_id', flat=True)
+    )
+    return recalcular_restricciones(cuarteles | set(cuarteles_previos))
+
+
+# ---------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------
+
+def reingreso_restringido(cuartel_ids, momento):
+    """{cuartel_id: RestriccionCuartel} de los que no se puede ingresar en 'momento'."""
+    return {
+        r.cuartel_id: r
+        for r in RestriccionCuartel.objects.filter(
+            cuartel_id__in=cuartel_ids, reingreso_hasta__gt=momento
+        ).select_related('producto_reingreso')
+    }
+
+
+def restricciones_vigentes(fecha=None):
+    """Cuarteles con reingreso o cosecha restringidos durante el día 'fecha' (hoy por defecto)."""
+    fecha = fecha or timezone.localdate()
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return RestriccionCuartel.objects.filter(
+        Q(reingreso_hasta__gt=inicio) | Q(cosecha_desde__gt=fecha)
+    ).select_related('cuartel', 'producto_reingreso', 'producto_carencia').order_by('cuartel__numero')
+
+
+def describir_reingreso(restriccion):
+    hasta = timezone.localtime(restriccion.reingreso_hasta)
+    producto = restriccion.producto_reingreso.nombre if restriccion.producto_reingreso else 'producto eliminado'
+    return f"reingreso restringido hasta {hasta:%d/%m/%Y %H:%M} ({producto}, APL-{restriccion.aplicacion_reingreso_id})"
@@ -1,7 +1,10 @@
 # aplicaciones/signals.py
 
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from cuarteles.models import Cuartel
+from .dosis import recalcular_area_y_dosis
 from .models import AplicacionFitosanitaria
 # from inventario.models import MovimientoInventario # Ya no se usa aquí
 
@@ -31,4 +34,22 @@ def crear_movimiento_salida(sender, instance, created, **kwargs):
     #         referencia=f"APL-{instance.id}",
     #         realizado_por_id=instance.creado_por_id, 
     #         aplicacion=instance # ¡La conexión clave!
-    #     )
\ No newline at end of file
+    #     )
+
+
+@receiver(post_save, sender=Cuartel)
+def dosis_por_cambio_de_area(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Si cambió el área de un cuartel, recalcula área tratada y dosis de sus
+    aplicaciones (un solo UPDATE, después del commit).
+    """
+    if created or (update_fields is not None and 'area_hectareas' not in update_fields):
+        return
+    # Campo diferido (only/defer) y sin asignar: no cambió, y leerlo costaría una consulta
+    if 'area_hectareas' not in instance.__dict__:
+        return
+    if getattr(instance, '_area_leida', None) == instance.area_hectareas:
+        return
+    instance._area_leida = instance.area_hectareas
+    cuartel_id = instance.pk
+    transaction.on_commit(lambda: recalcular_area_y_dosis(cuartel_ids=[cuartel_id]))
@@ -10,4 +10,7 @@ urlpatterns = [
     path('<int:app_id>/editar/', views.editar_aplicacion, name='editar_aplicacion'),
     path('<int:app_id>/finalizar/', views.finalizar_aplicacion, name='finalizar_aplicacion'),
     path('<int:app_id>/cancelar/', views.cancelar_aplicacion, name='cancelar_aplicacion'),
+    path('acciones-masivas/', views.acciones_masivas_aplicaciones, name='acciones_masivas'),
+    path('restricciones/', views.restricciones_cuarteles, name='restricciones'),
+    path('api/restricciones/', views.api_restricciones, name='api_restricciones'),
 ]
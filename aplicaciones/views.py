@@ -1,54 +1,106 @@
 # aplicaciones/views.py
 
+from datetime import datetime, time
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.core.exceptions import ValidationError
 from django.db import transaction 
-from autenticacion.views import aplicador_required
+from django.db.models import Count, Exists, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_POST
+from autenticacion.views import aplicador_required, login_required
 
 # Models and Forms
 from .models import AplicacionFitosanitaria, AplicacionProducto
 from .forms import AplicacionForm, AplicacionProductoFormSet
 from cuarteles.models import Cuartel
 from inventario.models import Producto, MovimientoInventario, DetalleMovimiento
+from inventario.alertas import evaluar_alertas_stock
 from autenticacion.models import Usuario # Necesario para obtener el usuario
+from AgroControl.acciones_masivas import error_peticion, leer_peticion, pide_json, responder
+from AgroControl.paginacion import paginar_keyset
+from .lotes import procesar_aplicaciones
+from .dosis import recalcular_area_y_dosis
+from .restricciones import actualizar_por_aplicaciones, restricciones_vigentes
 
 # -----------------------------------------------------------------------------
 # VISTAS PRINCIPALES
 # -----------------------------------------------------------------------------
 
+# Orden del listado (y del cursor); índices en AplicacionFitosanitaria.Meta
+ORDEN_LISTA = ['-fecha_aplicacion', '-id']
+
+
+def _con_resumen_productos(queryset):
+    """
+    Anota cantidad de productos y el primero (nombre, cantidad, unidad) con
+    subconsultas por fila: la página sale en una sola consulta, sin prefetch.
+    """
+    detalles = AplicacionProducto.objects.filter(aplicacion=OuterRef('pk'))
+    primero = detalles.order_by('id')[:1]
+    return queryset.annotate(
+        total_productos=Coalesce(
+            Subquery(
+                detalles.order_by().values('aplicacion').annotate(n=Count('id')).values('n'),
+                output_field=IntegerField()
+            ),
+            Value(0)
+        ),
+        primer_producto_nombre=Subquery(primero.values('producto__nombre')),
+        primer_producto_cantidad=Subquery(primero.values('cantidad_utilizada')),
+        primer_producto_unidad=Subquery(primero.values('producto__unidad_medida')),
+    )
+
+
 @aplicador_required
 def lista_aplicaciones(request):
-    """Muestra un listado de todas las aplicaciones"""
+    """Listado de aplicaciones paginado por cursor, con filtros por estado y producto"""
     
-    aplicaciones_list = AplicacionFitosanitaria.objects.all().select_related(
-        'aplicador', 'equipo_utilizado'
-    ).prefetch_related(
-        'aplicacionproducto_set__producto'
-    ).order_by('-fecha_aplicacion')
+    aplicaciones_list = _con_resumen_productos(
+        AplicacionFitosanitaria.objects.select_related('aplicador', 'equipo_utilizado')
+    )
 
     # --- Lógica de Filtros ---
     filtro_estado = request.GET.get('estado')
-    filtro_producto_id = request.GET.get('producto')
+    try:
+        filtro_producto_id = int(request.GET.get('producto') or 0) or None
+    except ValueError:
+        filtro_producto_id = None
 
     if filtro_estado:
         aplicaciones_list = aplicaciones_list.filter(estado=filtro_estado)
     if filtro_producto_id:
-        aplicaciones_list = aplicaciones_list.filter(productos__id=filtro_producto_id).distinct()
+        # EXISTS en vez de JOIN + DISTINCT: usa el índice único (aplicacion, producto)
+        aplicaciones_list = aplicaciones_list.filter(Exists(
+            AplicacionProducto.objects.filter(aplicacion=OuterRef('pk'), producto_id=filtro_producto_id)
+        ))
+
+    # --- Paginación por cursor ---
+    pagina = paginar_keyset(aplicaciones_list, ORDEN_LISTA, request.GET.get('cursor'))
+    filtros = request.GET.copy()
+    filtros.pop('cursor', None)
     
-    # --- Estadísticas ---
-    total_aplicaciones = AplicacionFitosanitaria.objects.count()
-    total_programadas = AplicacionFitosanitaria.objects.filter(estado='programada').count()
-    total_realizadas = AplicacionFitosanitaria.objects.filter(estado='realizada').count()
+    # --- Estadísticas (UNA consulta) ---
+    conteos = AplicacionFitosanitaria.objects.aggregate(
+        total=Count('id'),
+        programadas=Count('id', filter=Q(estado='programada')),
+        realizadas=Count('id', filter=Q(estado='realizada')),
+    )
     
     context = {
-        'aplicaciones': aplicaciones_list,
-        'todos_los_productos': Producto.objects.filter(esta_activo=True).order_by('nombre'), 
-        'total_aplicaciones': total_aplicaciones,
-        'total_programadas': total_programadas,
-        'total_realizadas': total_realizadas,
+        'aplicaciones': pagina,
+        'pagina': pagina,
+        'filtros_query': filtros.urlencode(),
+        'todos_los_productos': Producto.objects.filter(esta_activo=True).order_by('nombre').only('id', 'nombre'), 
+        'total_aplicaciones': conteos['total'],
+        'total_programadas': conteos['programadas'],
+        'total_realizadas': conteos['realizadas'],
         'filtro_estado': filtro_estado,
-        'filtro_producto': int(filtro_producto_id) if filtro_producto_id else None,
+        'filtro_producto': filtro_producto_id,
     }
     return render(request, 'aplicaciones/lista_aplicaciones.html', context)
 
@@ -71,23 +123,25 @@ def crear_aplicacion(request):
             
             aplicacion.creado_por = usuario_logueado
             
-            # Asignamos el área calculada en el form.clean()
-            aplicacion.area_tratada = form.cleaned_data.get('area_tratada', 0)
-            
             aplicacion.save() 
             form.save_m2m() 
             
             formset.instance = aplicacion
             formset.save() 
+            # Área (cuarteles ya guardados) y dosis de cada producto
+            recalcular_area_y_dosis([aplicacion.id])
+            for aviso in form.avisos_reingreso:
+                messages.warning(request, f'Atención, {aviso}.')
             
             # Si se creó como "realizada", generar el movimiento AHORA
             if aplicacion.estado == 'realizada':
                 try:
                     crear_movimiento_salida_para_app(aplicacion, usuario_logueado.id)
+                    actualizar_por_aplicaciones([aplicacion.id])
                     messages.success(request, 'Aplicación registrada. Stock descontado.')
                 except ValidationError as e:
                     messages.error(request, f'Error de Stock: {e.message}')
-                    context = {'form': form, 'formset': formset}
+                    context = {'form': form, 'formset': formset, 'restricciones': restricciones_vigentes()}
                     return render(request, 'aplicaciones/crear_aplicacion.html', context)
             else:
                  messages.success(request, 'Aplicación programada exitosamente.')
@@ -104,6 +158,7 @@ def crear_aplicacion(request):
     context = {
         'form': form,
         'formset': formset,
+        'restricciones': restricciones_vigentes(),
     }
     return render(request, 'aplicaciones/crear_aplicacion.html', context)
 
@@ -159,18 +214,24 @@ def editar_aplicacion(request, app_id):
         
         if form.is_valid() and formset.is_valid():
             aplicacion = form.save(commit=False)
-            aplicacion.area_tratada = form.cleaned_data.get('area_tratada', 0)
             aplicacion.save()
             form.save_m2m()
             formset.save() 
+            recalcular_area_y_dosis([aplicacion.id])
+            for aviso in form.avisos_reingreso:
+                messages.warning(request, f'Atención, {aviso}.')
             
             if aplicacion.estado == 'realizada':
                 try:
                     crear_movimiento_salida_para_app(aplicacion, usuario_id)
+                    actualizar_por_aplicaciones([aplicacion.id])
                     messages.success(request, f'Aplicación APL-{aplicacion.id} actualizada y finalizada. Stock descontado.')
                 except ValidationError as e:
                     messages.error(request, f'Error de Stock: {e.message}')
-                    context = {'form': form, 'formset': formset, 'aplicacion': aplicacion}
+                    context = {
+                        'form': form, 'formset': formset, 'aplicacion': aplicacion,
+                        'restricciones': restricciones_vigentes(),
+                    }
                     return render(request, 'aplicaciones/crear_aplicacion.html', context)
             else:
                 messages.success(request, f'Aplicación APL-{aplicacion.id} actualizada.')
@@ -184,7 +245,8 @@ def editar_aplicacion(request, app_id):
         'form': form,
         'formset': formset, 
         'aplicacion': aplicacion,
-        'titulo': 'Editar Aplicación' # Agregué título para que se vea bien en el template
+        'titulo': 'Editar Aplicación', # Agregué título para que se vea bien en el template
+        'restricciones': restricciones_vigentes(),
     }
     return render(request, 'aplicaciones/crear_aplicacion.html', context)
 
@@ -216,6 +278,7 @@ def finalizar_aplicacion(request, app_id):
         
         aplicacion.estado = 'realizada'
         aplicacion.save(update_fields=['estado', 'fecha_actualizacion'])
+        actualizar_por_aplicaciones([aplicacion.id])
         messages.success(request, f'Aplicación APL-{aplicacion.id} finalizada. Stock descontado.')
 
     except ValidationError as e:
@@ -251,6 +314,102 @@ def cancelar_aplicacion(request, app_id):
     return redirect('aplicaciones:lista_aplicaciones')
 
 
+@aplicador_required
+@require_POST
+def acciones_masivas_aplicaciones(request):
+    """
+    Finaliza o cancela varias aplicaciones 'programada' en un solo POST
+    ('accion' + 'ids', o JSON). Las que fallan se informan una a una.
+    """
+    es_json = pide_json(request)
+    try:
+        accion, ids = leer_peticion(request)
+    except ValueError as e:
+        return error_peticion(request, es_json, str(e), 'aplicaciones:lista_aplicaciones')
+
+    resultado = procesar_aplicaciones(
+        ids, accion, request.session.get('usuario_id'),
+        es_admin=bool(request.session.get('es_administrador'))
+    )
+    return responder(request, es_json, resultado, 'aplicaciones:lista_aplicaciones', lambda pk: f'APL-{pk}')
+
+
+# =============================================================================
+# RESTRICCIONES DE CARENCIA / REINGRESO (planificación de cosecha)
+# =============================================================================
+
+def _restricciones_en(fecha):
+    """Filas de RestriccionCuartel vigentes durante 'fecha', con lo que restringe ese día."""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return [
+        {
+            'restriccion': r,
+            'reingreso': r.reingreso_restringido(inicio),
+            'cosecha': r.cosecha_restringida(fecha),
+        }
+        for r in restricciones_vigentes(fecha)
+    ]
+
+
+def _leer_fecha(request):
+    valor = request.GET.get('fecha')
+    if not valor:
+        return timezone.localdate()
+    fecha = parse_date(valor)   # ValueError si la fecha no existe
+    if fecha is None:
+        raise ValueError("Parámetro 'fecha' inválido (AAAA-MM-DD).")
+    return fecha
+
+
+@login_required
+def restricciones_cuarteles(request):
+    """Cuarteles sin cosecha o sin reingreso en una fecha (?fecha=AAAA-MM-DD, hoy por defecto)"""
+    try:
+        fecha = _leer_fecha(request)
+    except ValueError:
+        messages.error(request, 'Fecha inválida, se muestra la de hoy.')
+        fecha = timezone.localdate()
+
+    filas = _restricciones_en(fecha)
+    context = {
+        'filas': filas,
+        'fecha': fecha,
+        'sin_cosecha': sum(1 for f in filas if f['cosecha']),
+        'sin_reingreso': sum(1 for f in filas if f['reingreso']),
+    }
+    return render(request, 'aplicaciones/restricciones.html', context)
+
+
+@login_required
+def api_restricciones(request):
+    """
+    JSON de los cuarteles restringidos en una fecha.
+    GET ?fecha=AAAA-MM-DD (hoy por defecto)
+    """
+    try:
+        fecha = _leer_fecha(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    cuarteles = []
+    for fila in _restricciones_en(fecha):
+        r = fila['restriccion']
+        cuarteles.append({
+            'cuartel_id': r.cuartel_id,
+            'numero': r.cuartel.numero,
+            'nombre': r.cuartel.nombre,
+            'reingreso_restringido': fila['reingreso'],
+            'reingreso_hasta': r.reingreso_hasta.isoformat() if r.reingreso_hasta else None,
+            'producto_reingreso': r.producto_reingreso.nombre if r.producto_reingreso else None,
+            'aplicacion_reingreso': r.aplicacion_reingreso_id,
+            'cosecha_restringida': fila['cosecha'],
+            'cosecha_desde': r.cosecha_desde.isoformat() if r.cosecha_desde else None,
+            'producto_carencia': r.producto_carencia.nombre if r.producto_carencia else None,
+            'aplicacion_carencia': r.aplicacion_carencia_id,
+        })
+    return JsonResponse({'fecha': fecha.isoformat(), 'cuarteles': cuarteles})
+
+
 # --- FUNCIÓN AUXILIAR (REUTILIZABLE) ---
 def crear_movimiento_salida_para_app(aplicacion, usuario_id):
     """
@@ -310,4 +469,9 @@ def crear_movimiento_salida_para_app(aplicacion, usuario_id):
         )
         
         producto.stock_actual = stock_posterior
-        producto.save(update_fields=['stock_actual', 'fecha_actualizacion'])
\ No newline at end of file
+        producto.save(update_fields=['stock_actual', 'fecha_actualizacion'])
+
+    # 4. Re-evaluar alertas de los productos descontados
+    evaluar_alertas_stock(
+        [app_prod.producto_id for app_prod in productos_a_descontar], movimiento=movimiento
+    )
\ No newline at end of file
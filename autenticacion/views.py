@@ -2,8 +2,6 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q, Sum, Avg, F, Value
-from django.db.models.fields import DecimalField
-from django.db.models.functions import Coalesce
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.crypto import get_random_string
@@ -24,6 +22,7 @@ from cuarteles.models import Cuartel, Hilera
 from .forms import PerfilForm
 
 from inventario.models import Producto, EquipoAgricola
+from inventario.alertas import alertas_abiertas
 
 # ==================== AUTENTICACIÓN ====================
 
@@ -306,7 +305,7 @@ def dashboard(request):
     ahora = timezone.now()
     treinta_dias_despues = ahora.date() + timedelta(days=30)
 
-    alertas_stock = Producto.objects.filter(esta_activo=True, stock_actual__lt=F('stock_minimo'))
+    alertas_stock = [alerta.producto for alerta in alertas_abiertas()]
     
     alertas_mantencion = Mantenimiento.objects.filter(
         estado='PROGRAMADO', 
@@ -328,15 +327,12 @@ def dashboard(request):
         fecha_vencimiento_certificacion__range=[hoy_fecha, treinta_dias_despues]
     ).order_by('fecha_vencimiento_certificacion')
     
-    # Alerta Mortalidad
-    cuarteles_con_conteo = Cuartel.objects.annotate(
-        total_muertas=Coalesce(Sum('hileras__plantas_muertas_actuales', output_field=DecimalField()), Value(0, output_field=DecimalField())),
-        total_iniciales=Coalesce(Sum('hileras__plantas_totales_iniciales', output_field=DecimalField()), Value(0, output_field=DecimalField()))
-    ).filter(total_iniciales__gt=0)
+    # Alerta Mortalidad (columnas cacheadas del cuartel, sin JOIN con hileras)
+    cuarteles_con_conteo = Cuartel.objects.filter(plantas_totales__gt=0)
     
     alertas_mortalidad = cuarteles_con_conteo.annotate(
         porcentaje_mortalidad=ExpressionWrapper(
-            (F('total_muertas') * 100.0 / F('total_iniciales')),
+            (F('plantas_muertas') * 100.0 / F('plantas_totales')),
             output_field=FloatField()
         )
     ).filter(porcentaje_mortalidad__gt=5).order_by('-porcentaje_mortalidad')
@@ -368,8 +364,8 @@ def dashboard(request):
     cuartel_data = []
     for c in cuarteles_con_conteo:
         cuartel_labels.append(c.nombre)
-        muertas = float(c.total_muertas)
-        total = float(c.total_iniciales)
+        muertas = float(c.plantas_muertas)
+        total = float(c.plantas_totales)
         if total > 0:
             supervivencia = ((total - muertas) / total) * 100
         else:
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Cuartel, Hilera, SeguimientoCuartel, RegistroHilera
+from AgroControl.tokens import generar_token
+from .models import (
+    Agrupacion, Cuartel, Hilera, SeguimientoCuartel, RegistroHilera, SincronizacionSeguimiento, DispositivoSincronizacion,
+)
 from autenticacion.models import Usuario # Asegúrate de importar tu modelo Usuario
 
 class HileraInline(admin.TabularInline):
@@ -17,6 +20,30 @@ class RegistroHileraInline(admin.TabularInline):
     readonly_fields = ('hilera', 'plantas_vivas_registradas', 'plantas_muertas_registradas', 'observaciones_hilera')
     can_delete = False
 
+@admin.register(Agrupacion)
+class AgrupacionAdmin(admin.ModelAdmin):
+    list_display = [
+        '__str__', 'padre', 'cantidad_cuarteles', 'area_hectareas',
+        'plantas_vivas', 'get_porcentaje_supervivencia_display', 'volumen_agua_m3'
+    ]
+    list_filter = ['tipo']
+    search_fields = ['nombre']
+    readonly_fields = [
+        'ruta', 'cantidad_cuarteles', 'area_hectareas', 'plantas_totales', 'plantas_vivas',
+        'plantas_muertas', 'volumen_agua_m3', 'agregados_actualizados_en'
+    ]
+    fieldsets = (
+        ('Agrupación', {'fields': ('nombre', 'tipo', 'padre', 'ruta')}),
+        ('Totales del Subárbol (Calculado)', {'fields': (
+            'cantidad_cuarteles', 'area_hectareas', 'plantas_totales', 'plantas_vivas',
+            'plantas_muertas', 'volumen_agua_m3', 'agregados_actualizados_en'
+        )}),
+    )
+
+    def get_porcentaje_supervivencia_display(self, obj):
+        return f"{obj.get_porcentaje_supervivencia():.1f}%"
+    get_porcentaje_supervivencia_display.short_description = 'Supervivencia'
+
 @admin.register(Cuartel)
 class CuartelAdmin(admin.ModelAdmin):
     list_display = [
@@ -28,15 +55,16 @@ class CuartelAdmin(admin.ModelAdmin):
         'get_plantas_vivas_display',
         'get_porcentaje_supervivencia_display'
     ]
-    list_filter = ['tipo_riego', 'estado_cultivo', 'año_plantacion', 'creado_por']
+    list_filter = ['agrupacion', 'tipo_riego', 'estado_cultivo', 'año_plantacion', 'creado_por']
     search_fields = ['numero', 'nombre', 'variedad', 'ubicacion']
     readonly_fields = [
-        'fecha_creacion', 'fecha_actualizacion', 
+        'fecha_creacion', 'fecha_actualizacion', 'centroide_lon', 'centroide_lat',
         'get_total_plantas_display', 'get_plantas_vivas_display', 
         'get_plantas_muertas_display', 'get_porcentaje_supervivencia_display'
     ]
     fieldsets = (
-        ('Información Básica', {'fields': ('numero', 'nombre', 'ubicacion')}),
+        ('Información Básica', {'fields': ('numero', 'nombre', 'agrupacion', 'ubicacion')}),
+        ('Geometría', {'fields': ('geometria', 'centroide_lon', 'centroide_lat'), 'classes': ('collapse',)}),
         ('Información del Cultivo', {'fields': ('variedad', 'tipo_planta', 'año_plantacion', 'area_hectareas')}),
         ('Estructura del Cuartel', {'fields': ('cantidad_hileras',)}),
         ('Sistema de Riego y Estado', {'fields': ('tipo_riego', 'estado_cultivo')}),
@@ -45,6 +73,15 @@ class CuartelAdmin(admin.ModelAdmin):
     )
     inlines = [HileraInline]
 
+    def get_queryset(self, request):
+        # Totales y % de supervivencia en la misma consulta del listado
+        return super().get_queryset(request).with_survival()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Las hileras ya quedaron guardadas: recalcular los totales cacheados
+        Cuartel.objects.filter(pk=form.instance.pk).recalcular_conteos()
+
     # Métodos de display
     def get_total_plantas_display(self, obj):
         return obj.get_total_plantas()
@@ -88,4 +125,32 @@ class SeguimientoCuartelAdmin(admin.ModelAdmin):
                     obj.responsable = Usuario.objects.get(id=usuario_id)
                 except Usuario.DoesNotExist:
                     pass
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Registros del inline guardados: recalcular los totales cacheados del cuartel
+        Cuartel.objects.filter(pk=form.instance.cuartel_id).recalcular_conteos()
+
+@admin.register(SincronizacionSeguimiento)
+class SincronizacionSeguimientoAdmin(admin.ModelAdmin):
+    list_display = ['clave', 'dispositivo', 'seguimiento', 'usuario', 'fecha_recepcion']
+    list_filter = ['dispositivo', 'fecha_recepcion']
+    search_fields = ['clave', 'dispositivo', 'seguimiento__cuartel__numero']
+    readonly_fields = ['clave', 'seguimiento', 'dispositivo', 'usuario', 'fecha_recepcion']
+
+@admin.register(DispositivoSincronizacion)
+class DispositivoSincronizacionAdmin(admin.ModelAdmin):
+    """Tablets que sincronizan por cuarteles/api/sincronizacion/ (token, sin sesión)"""
+    list_select_related = ['usuario']
+    list_display = ['codigo', 'nombre', 'usuario', 'activo', 'ultima_sincronizacion']
+    list_filter = ['activo']
+    search_fields = ['codigo', 'nombre']
+    readonly_fields = ['ultima_sincronizacion']
+    actions = ['regenerar_token']
+
+    @admin.action(description='Generar token nuevo (invalida el anterior)')
+    def regenerar_token(self, request, queryset):
+        for dispositivo in queryset:
+            token = generar_token(dispositivo)
+            self.message_user(request, f'{dispositivo.codigo}: {token}')
@@ -0,0 +1,198 @@
+# cuarteles/analitica.py
+"""
+Analítica de supervivencia por hilera a partir del historial de RegistroHilera.
+
+- Carga los registros de un cuartel en matrices numpy (hilera × fecha)
+  con UNA consulta.
+- Calcula % de mortalidad, tasa de mortalidad (puntos % cada 30 días),
+  aceleración y hileras atípicas (z-score robusto: mediana / MAD).
+- El resultado se guarda en el caché por cuartel y versión. La versión
+  sale de la base (UNA consulta agregada): hileras y su última
+  modificación, registros y el último registro. Cualquier escritura la
+  cambia, venga de una vista, del registro en bloque (bulk_create /
+  bulk_update) o de un comando en otro proceso, sin depender de que el
+  caché se comparta ni de señales.
+"""
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from .models import Hilera, RegistroHilera
+
+DIAS_PERIODO = 30           # La tasa se expresa en puntos % por 30 días
+UMBRAL_ATIPICO = 3.5        # z-score robusto sobre el que una hilera es atípica
+TTL_ANALITICA = 60 * 60     # Solo libera versiones viejas: la vigente cambia con los datos
+SIN_DATO = -1               # Celda sin conteo en la matriz que va al template
+
+
+# ---------------------------------------------------------------
+# CARGA (hilera × fecha)
+# ---------------------------------------------------------------
+def cargar_matrices(cuartel_id):
+    """
+    Devuelve un dict con:
+    - 'numeros': número de cada hilera (fila), int32
+    - 'totales': plantas iniciales por hilera, float64
+    - 'fechas': fechas de seguimiento (columna), datetime64[D]
+    - 'muertas': plantas muertas registradas (float32, NaN = sin conteo ese día)
+    Si una hilera tiene más de un registro el mismo día, vale el último.
+    """
+    hileras = list(
+        Hilera.objects.filter(cuartel_id=cuartel_id).order_by('numero_hilera')
+        .values_list('id', 'numero_hilera', 'plantas_totales_iniciales')
+    )
+    registros = list(
+        RegistroHilera.objects.filter(hilera__cuartel_id=cuartel_id)
+        .order_by('seguimiento_batch__fecha_seguimiento', 'id')
+        .values_list('hilera_id', 'seguimiento_batch__fecha_seguimiento', 'plantas_muertas_registradas')
+    )
+
+    fila_de = {hilera_id: i for i, (hilera_id, _, _) in enumerate(hileras)}
+    numeros = np.array([h[1] for h in hileras], dtype=np.int32)
+    totales = np.array([h[2] for h in hileras], dtype=np.float64)
+
+    if not registros:
+        return {
+            'numeros': numeros, 'totales': totales,
+            'fechas': np.array([], dtype='datetime64[D]'),
+            'muertas': np.empty((len(hileras), 0), dtype=np.float32),
+        }
+
+    filas = np.fromiter((fila_de[r[0]] for r in registros), dtype=np.int32, count=len(registros))
+    dias = np.array([r[1] for r in registros], dtype='datetime64[D]')
+    valores = np.fromiter((r[2] for r in registros), dtype=np.float32, count=len(registros))
+
+    fechas, columnas = np.unique(dias, return_inverse=True)
+    muertas = np.full((len(hileras), len(fechas)), np.nan, dtype=np.float32)
+    # Los registros vienen ordenados por (fecha, id): la última asignación gana
+    muertas[filas, columnas] = valores
+
+    return {'numeros': numeros, 'totales': totales, 'fechas': fechas, 'muertas': muertas}
+
+
+def _rellenar_adelante(matriz):
+    """Propaga el último conteo conocido hacia la derecha (la hilera no se volvió a contar)."""
+    if matriz.shape[1] == 0:
+        return matriz
+    indices = np.where(np.isnan(matriz), 0, np.arange(matriz.shape[1]))
+    np.maximum.accumulate(indices, axis=1, out=indices)
+    return matriz[np.arange(matriz.shape[0])[:, None], indices]
+
+
+def _zscore_robusto(valores):
+    """z-score con mediana y MAD (NaN se ignora). Sin dispersión devuelve ceros."""
+    z = np.zeros_like(valores, dtype=np.float64)
+    validos = ~np.isnan(valores)
+    if validos.sum() < 3:
+        return z
+    x = valores[validos]
+    mediana = np.median(x)
+    mad = np.median(np.abs(x - mediana))
+    if mad > 0:
+        z[validos] = 0.6745 * (x - mediana) / mad
+    else:
+        # Más de la mitad de las hileras iguales: se usa la desviación media absoluta
+        media_abs = np.mean(np.abs(x - mediana))
+        if media_abs > 0:
+            z[validos] = (x - mediana) / (1.253314 * media_abs)
+    return z
+
+
+def _redondear(valor, decimales=1):
+    return None if valor is None or np.isnan(valor) else round(float(valor), decimales)
+
+
+# ---------------------------------------------------------------
+# CÁLCULO
+# ---------------------------------------------------------------
+def calcular_analitica(cuartel_id):
+    """
+    Analítica completa de un cuartel como estructuras simples (cacheables y
+    serializables a JSON para el heatmap).
+    """
+    datos = cargar_matrices(cuartel_id)
+    numeros, totales, fechas = datos['numeros'], datos['totales'], datos['fechas']
+    muertas = _rellenar_adelante(datos['muertas'])
+
+    con_plantas = totales > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mortalidad = np.where(con_plantas[:, None], muertas / totales[:, None] * 100, np.nan)
+
+        # Tasa (pp / 30 días) y aceleración entre seguimientos consecutivos
+        dias = np.diff(fechas).astype(np.float64)
+        tasa = np.diff(mortalidad, axis=1) / dias * DIAS_PERIODO
+        aceleracion = np.diff(tasa, axis=1) / dias[1:] * DIAS_PERIODO
+
+        # Serie del cuartel: muertas / iniciales de las hileras ya contadas
+        contadas = ~np.isnan(muertas) & con_plantas[:, None]
+        total_contado = np.where(contadas, totales[:, None], 0).sum(axis=0)
+        mortalidad_cuartel = np.where(contadas, muertas, 0).sum(axis=0) / total_contado * 100
+        tasa_cuartel = np.diff(mortalidad_cuartel) / dias * DIAS_PERIODO
+
+    def ultima(matriz):
+        return matriz[:, -1] if matriz.shape[1] else np.full(len(numeros), np.nan)
+
+    mortalidad_actual, tasa_actual, aceleracion_actual = ultima(mortalidad), ultima(tasa), ultima(aceleracion)
+    z_mortalidad = _zscore_robusto(mortalidad_actual)
+    z_tasa = _zscore_robusto(tasa_actual)
+    # Solo interesan las hileras PEOR que el resto
+    z = np.maximum(z_mortalidad, z_tasa)
+
+    atipicas = [
+        {
+            'numero_hilera': int(numeros[i]),
+            'mortalidad': _redondear(mortalidad_actual[i]),
+            'tasa': _redondear(tasa_actual[i], 2),
+            'aceleracion': _redondear(aceleracion_actual[i], 2),
+            'z': _redondear(z[i], 1),
+        }
+        for i in np.argsort(-z) if z[i] > UMBRAL_ATIPICO
+    ]
+
+    # Matriz compacta para el heatmap: décimas de punto %, SIN_DATO donde no hay conteo
+    heatmap = np.where(np.isnan(mortalidad), SIN_DATO, np.round(mortalidad * 10)).astype(np.int32)
+
+    return {
+        'fechas': [str(f) for f in fechas],
+        'hileras': numeros.tolist(),
+        'heatmap': heatmap.tolist(),
+        'serie_cuartel': [
+            {
+                'fecha': str(fechas[j]),
+                'mortalidad': _redondear(mortalidad_cuartel[j]),
+                'tasa': _redondear(tasa_cuartel[j - 1], 2) if j else None,
+            }
+            for j in range(len(fechas))
+        ],
+        'tasa_actual': _redondear(tasa_cuartel[-1], 2) if len(tasa_cuartel) else None,
+        'aceleracion_actual': (
+            _redondear((tasa_cuartel[-1] - tasa_cuartel[-2]) / dias[-1] * DIAS_PERIODO, 2)
+            if len(tasa_cuartel) > 1 else None
+        ),
+        'atipicas': atipicas,
+        'umbral_atipico': UMBRAL_ATIPICO,
+    }
+
+
+# ---------------------------------------------------------------
+# CACHÉ POR CUARTEL
+# ---------------------------------------------------------------
+def version_analitica(cuartel_id):
+    """Versión de los datos del cuartel leída de la base (una consulta)."""
+    datos = Hilera.objects.filter(cuartel_id=cuartel_id).aggregate(
+        total_hileras=Count('id', distinct=True), modificado=Max('modificado_en'),
+        total_registros=Count('registros'), ultimo=Max('registros__id'),
+    )
+    modificado = datos['modificado'].timestamp() if datos['modificado'] else 0
+    return f"{datos['total_hileras']}.{modificado}.{datos['total_registros']}.{datos['ultimo'] or 0}"
+
+
+def analitica_cuartel(cuartel_id):
+    """Analítica del cuartel desde el caché (se recalcula solo si cambió su versión)."""
+    clave = f'analitica_cuartel:{cuartel_id}:{version_analitica(cuartel_id)}'
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular_analitica(cuartel_id)
+        cache.set(clave, resultado, timeout=TTL_ANALITICA)
+    return resultado
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CuartelesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cuarteles'
+
+    def ready(self):
+        # Agregados de fundos / sectores
+        import cuarteles.jerarquia
@@ -0,0 +1,156 @@
+# cuarteles/estadisticas.py
+"""
+Estadísticas de cuarteles para la API JSON (clientes que hacen polling).
+
+- La versión de los datos se lee de la base (Cuartel.objects.version_datos:
+  cantidad, mayor id y última 'fecha_actualizacion', que también marca
+  'recalcular_conteos'). Así la ven igual todos los workers y los cambios
+  hechos desde comandos o la API de sincronización.
+- El payload se guarda en el caché por versión: mientras nada cambie,
+  las estadísticas no se recalculan.
+- La vista usa la versión como ETag y la fecha del último cambio como
+  Last-Modified, para responder 304 a los GET condicionales.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q
+
+from .models import Cuartel
+
+VERSION_API = 1
+TTL_ESTADISTICAS = 60 * 60
+
+# (clave, etiqueta, desde %, hasta %) — 'hasta' excluido salvo en el último tramo
+TRAMOS_SUPERVIVENCIA = [
+    ('critica', 'Menos de 50%', 0, 50),
+    ('baja', '50% a 70%', 50, 70),
+    ('media', '70% a 80%', 70, 80),
+    ('buena', '80% a 90%', 80, 90),
+    ('alta', '90% o más', 90, None),
+]
+
+
+# ---------------------------------------------------------------
+# VERSIÓN DE LOS DATOS
+# ---------------------------------------------------------------
+def version_datos(request=None):
+    """
+    (versión, fecha del último cambio) leídas de la base. Con 'request' se
+    leen una vez por petición (ETag, Last-Modified y payload).
+    """
+    datos = getattr(request, '_version_estadisticas', None)
+    if datos is None:
+        version, modificado = Cuartel.objects.version_datos()
+        # Last-Modified tiene resolución de segundos
+        datos = (version, modificado.replace(microsecond=0) if modificado else None)
+        if request is not None:
+            request._version_estadisticas = datos
+    return datos
+
+
+def etag_estadisticas(request=None):
+    version, _ = version_datos(request)
+    return f'cuarteles-v{VERSION_API}-{version}'
+
+
+def ultima_modificacion(request=None):
+    return version_datos(request)[1]
+
+
+# ---------------------------------------------------------------
+# CÁLCULO
+# ---------------------------------------------------------------
+def _con_etiquetas(filas, campo, choices):
+    etiquetas = dict(choices)
+    return [
+        {
+            campo: fila[campo],
+            'etiqueta': etiquetas.get(fila[campo], fila[campo]),
+            'total': fila['total'],
+            'area_hectareas': float(fila['area'] or 0),
+        }
+        for fila in filas
+    ]
+
+
+def calcular_estadisticas():
+    """Todas las estadísticas con 5 consultas agregadas (sin recorrer cuarteles en Python)."""
+    totales = Cuartel.objects.aggregate(
+        total=Count('id'),
+        activos=Count('id', filter=Q(estado_cultivo='activo')),
+        area=Sum('area_hectareas'),
+        hileras=Sum('cantidad_hileras'),
+        plantas_totales=Sum('plantas_totales'),
+        plantas_vivas=Sum('plantas_vivas'),
+        plantas_muertas=Sum('plantas_muertas'),
+    )
+    plantas_totales = totales['plantas_totales'] or 0
+    plantas_vivas = totales['plantas_vivas'] or 0
+
+    por_riego = Cuartel.objects.order_by('tipo_riego').values('tipo_riego').annotate(
+        total=Count('id'), area=Sum('area_hectareas')
+    )
+    por_estado = Cuartel.objects.order_by('estado_cultivo').values('estado_cultivo').annotate(
+        total=Count('id'), area=Sum('area_hectareas')
+    )
+
+    # Tramos de supervivencia: un COUNT filtrado por tramo, en la misma consulta
+    conteos_tramo = {'sin_plantas': Count('id', filter=Q(plantas_totales=0))}
+    for clave, _, desde, hasta in TRAMOS_SUPERVIVENCIA:
+        condicion = Q(plantas_totales__gt=0, porcentaje_supervivencia__gte=desde)
+        if hasta is not None:
+            condicion &= Q(porcentaje_supervivencia__lt=hasta)
+        conteos_tramo[clave] = Count('id', filter=condicion)
+    tramos = Cuartel.objects.con_porcentaje().aggregate(**conteos_tramo)
+
+    por_variedad = Cuartel.objects.values('variedad').annotate(
+        total=Count('id'), area=Sum('area_hectareas'), plantas=Sum('plantas_totales')
+    ).order_by('-area', 'variedad')
+
+    return {
+        # Claves de la versión anterior de la API (compatibilidad)
+        'total': totales['total'],
+        'activos': totales['activos'],
+        'por_tipo_riego': [{'tipo_riego': f['tipo_riego'], 'total': f['total']} for f in por_riego],
+
+        'version_api': VERSION_API,
+        'totales': {
+            'cuarteles': totales['total'],
+            'activos': totales['activos'],
+            'area_hectareas': float(totales['area'] or 0),
+            'hileras': totales['hileras'] or 0,
+            'plantas_totales': plantas_totales,
+            'plantas_vivas': plantas_vivas,
+            'plantas_muertas': totales['plantas_muertas'] or 0,
+            'supervivencia': round(plantas_vivas * 100 / plantas_totales, 1) if plantas_totales else None,
+        },
+        'riego': _con_etiquetas(por_riego, 'tipo_riego', Cuartel.TIPO_RIEGO_CHOICES),
+        'estado': _con_etiquetas(por_estado, 'estado_cultivo', Cuartel.ESTADO_CULTIVO_CHOICES),
+        'supervivencia': [
+            {'tramo': clave, 'etiqueta': etiqueta, 'desde': desde, 'hasta': hasta, 'total': tramos[clave]}
+            for clave, etiqueta, desde, hasta in TRAMOS_SUPERVIVENCIA
+        ] + [{'tramo': 'sin_plantas', 'etiqueta': 'Sin plantas registradas', 'desde': None, 'hasta': None,
+              'total': tramos['sin_plantas']}],
+        'variedades': [
+            {
+                'variedad': f['variedad'],
+                'total': f['total'],
+                'area_hectareas': float(f['area'] or 0),
+                'plantas_totales': f['plantas'] or 0,
+            }
+            for f in por_variedad
+        ],
+    }
+
+
+def estadisticas_cuarteles(request=None):
+    """Payload desde el caché de la versión vigente (se calcula una vez por versión)."""
+    version, modificado = version_datos(request)
+    clave = f'cuarteles:estadisticas:{VERSION_API}:{version}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = calcular_estadisticas()
+        datos['version_datos'] = version
+        datos['modificado'] = modificado.isoformat() if modificado else None
+        cache.set(clave, datos, timeout=TTL_ESTADISTICAS)
+    return datos
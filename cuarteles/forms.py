@@ -1,6 +1,7 @@
 from django import forms
 from .models import Cuartel, Hilera, SeguimientoCuartel, RegistroHilera
-from django.forms import inlineformset_factory
+from .importacion import MODOS, FORMATOS
+from django.forms import inlineformset_factory, BaseInlineFormSet
 
 class CuartelForm(forms.ModelForm):
     plantas_iniciales_predeterminadas = forms.IntegerField(
@@ -15,13 +16,15 @@ class CuartelForm(forms.ModelForm):
     class Meta:
         model = Cuartel
         fields = [
-            'numero', 'nombre', 'ubicacion', 'variedad', 'tipo_planta',
+            'numero', 'nombre', 'agrupacion', 'ubicacion', 'variedad', 'tipo_planta',
             'año_plantacion', 'tipo_riego', 'estado_cultivo', 'area_hectareas',
-            'cantidad_hileras', 'plantas_iniciales_predeterminadas', 'observaciones'
+            'cantidad_hileras', 'plantas_iniciales_predeterminadas', 'observaciones',
+            'geometria'
         ]
         widgets = {
             'numero': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ej: C-001'}),
             'nombre': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre descriptivo'}),
+            'agrupacion': forms.Select(attrs={'class': 'form-select'}),
             'ubicacion': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'variedad': forms.TextInput(attrs={'class': 'form-control'}),
             'tipo_planta': forms.TextInput(attrs={'class': 'form-control'}),
@@ -31,6 +34,10 @@ class CuartelForm(forms.ModelForm):
             'area_hectareas': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'cantidad_hileras': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
             'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
+            'geometria': forms.Textarea(attrs={
+                'class': 'form-control font-monospace', 'rows': 4,
+                'placeholder': '{"type": "Polygon", "coordinates": [[[-71.5, -34.2], [-71.49, -34.2], [-71.49, -34.19], [-71.5, -34.2]]]}'
+            }),
         }
         labels = {
             'numero': 'Número único de cuartel *',
@@ -47,6 +54,8 @@ class CuartelForm(forms.ModelForm):
         return numero
 
     def save(self, commit=True):
+        # Se decide ANTES de guardar: después del save() el cuartel ya tiene pk
+        self.es_nuevo = self.instance.pk is None
         cuartel = super().save(commit=False)
         if commit:
             cuartel.save()
@@ -54,23 +63,41 @@ class CuartelForm(forms.ModelForm):
         return cuartel
 
     def crear_actualizar_hileras(self, cuartel):
+        """
+        Ajusta las hileras a 'cantidad_hileras' con un bulk_create (crecer)
+        o UN delete filtrado (achicar; sus registros caen en cascada).
+        Deja en 'self.hileras_eliminadas' los ids borrados, para que la
+        vista no vuelva a guardar esas filas del formset.
+        """
         cantidad_nueva = self.cleaned_data.get('cantidad_hileras', cuartel.cantidad_hileras)
-        plantas_ini = self.cleaned_data.get('plantas_iniciales_predeterminadas', 0)
-        hileras_actuales = list(cuartel.hileras.all())
+        plantas_ini = self.cleaned_data.get('plantas_iniciales_predeterminadas') or 0
+        # Las plantas predeterminadas solo se aplican al crear el cuartel
+        es_nuevo = getattr(self, 'es_nuevo', False)
+        # (id, numero_hilera) ordenadas por número
+        hileras_actuales = list(
+            Hilera.objects.filter(cuartel=cuartel).order_by('numero_hilera').values_list('id', 'numero_hilera')
+        )
         count_actual = len(hileras_actuales)
+        self.hileras_eliminadas = set()
 
         if cantidad_nueva > count_actual:
-            for i in range(count_actual + 1, cantidad_nueva + 1):
-                Hilera.objects.create(
+            # Numerar después de la última existente (evita choques si hubo huecos)
+            siguiente = hileras_actuales[-1][1] + 1 if hileras_actuales else 1
+            Hilera.objects.bulk_create([
+                Hilera(
                     cuartel=cuartel,
-                    numero_hilera=i,
-                    plantas_totales_iniciales=plantas_ini if self.instance.pk is None else 0,
-                    plantas_vivas_actuales=plantas_ini if self.instance.pk is None else 0,
+                    numero_hilera=numero,
+                    plantas_totales_iniciales=plantas_ini if es_nuevo else 0,
+                    plantas_vivas_actuales=plantas_ini if es_nuevo else 0,
                     plantas_muertas_actuales=0
                 )
+                for numero in range(siguiente, siguiente + cantidad_nueva - count_actual)
+            ])
         elif cantidad_nueva < count_actual:
-            for hilera in hileras_actuales[cantidad_nueva:]:
-                hilera.delete()
+            # Se conservan las primeras 'cantidad_nueva' (mismo criterio que antes)
+            ultima_conservada = hileras_actuales[cantidad_nueva - 1][1] if cantidad_nueva else 0
+            self.hileras_eliminadas = {hilera_id for hilera_id, _ in hileras_actuales[cantidad_nueva:]}
+            Hilera.objects.filter(cuartel=cuartel, numero_hilera__gt=ultima_conservada).delete()
 
 class HileraForm(forms.ModelForm):
     class Meta:
@@ -98,8 +125,52 @@ class SeguimientoCuartelForm(forms.ModelForm):
             'fecha_seguimiento': 'Fecha del Seguimiento *'
         }
 
+class ImportarConteosForm(forms.Form):
+    archivo = forms.FileField(
+        label="Planilla (XLSX o CSV) *",
+        help_text="Columnas: cuartel, hilera, vivas, muertas (la primera fila es el encabezado).",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': ','.join(FORMATOS)})
+    )
+    modo = forms.ChoiceField(
+        choices=MODOS, initial='seguimiento', label="Tipo de conteo",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    fecha_seguimiento = forms.DateField(
+        label="Fecha del Seguimiento", required=False,
+        help_text="Solo para recuentos. Por defecto, hoy.",
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    observaciones = forms.CharField(
+        required=False, label="Observaciones",
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Importado desde planilla'})
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith(FORMATOS):
+            raise forms.ValidationError("Formato no soportado: use .xlsx o .csv.")
+        return archivo
+
+class HileraRegistroField(forms.ModelChoiceField):
+    """
+    Si el formset le entrega las hileras del cuartel ('hileras_cuartel'),
+    valida contra ese diccionario: sin un SELECT por fila y sin aceptar
+    hileras de otro cuartel.
+    """
+    hileras_cuartel = None
+
+    def to_python(self, value):
+        if self.hileras_cuartel is None or value in self.empty_values:
+            return super().to_python(value)
+        try:
+            return self.hileras_cuartel[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
 # === CORREGIDO (para arreglar FieldError) ===
 class RegistroHileraForm(forms.ModelForm):
+    hilera = HileraRegistroField(queryset=Hilera.objects.all(), widget=forms.HiddenInput())
+
     class Meta:
         model = RegistroHilera
         fields = ['hilera', 'plantas_vivas_registradas', 'plantas_muertas_registradas', 'observaciones_hilera']
@@ -115,6 +186,38 @@ class RegistroHileraForm(forms.ModelForm):
             'hilera': forms.HiddenInput(),
         }
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # Si la hilera ya se validó contra las del cuartel, el modelo no
+        # necesita volver a comprobar que existe (un SELECT por fila)
+        if self.fields['hilera'].hileras_cuartel is not None:
+            exclude.add('hilera')
+        return exclude
+
+class BaseRegistroHileraFormSet(BaseInlineFormSet):
+    """Formset de registros que valida las hileras contra las del cuartel."""
+
+    def __init__(self, *args, hileras=None, **kwargs):
+        self.hileras_cuartel = {h.pk: h for h in hileras} if hileras is not None else None
+        super().__init__(*args, **kwargs)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['hilera'].hileras_cuartel = self.hileras_cuartel
+        return form
+
+def registro_hilera_formset(extra):
+    """Clase del formset de registros con 'extra' filas (una por hilera del cuartel)."""
+    return inlineformset_factory(
+        SeguimientoCuartel,
+        RegistroHilera,
+        form=RegistroHileraForm,
+        formset=BaseRegistroHileraFormSet,
+        fields=['hilera', 'plantas_vivas_registradas', 'plantas_muertas_registradas', 'observaciones_hilera'],
+        extra=extra,
+        can_delete=False
+    )
+
 # # === CORREGIDO (para arreglar FieldError) ===
 # RegistroHileraFormSet = inlineformset_factory(
 #     SeguimientoCuartel,
@@ -0,0 +1,232 @@
+# cuarteles/geo.py
+"""
+Geometría de cuarteles en Python puro (sin PostGIS ni librerías GIS).
+
+Las geometrías se guardan como GeoJSON (Polygon o MultiPolygon) en WGS84,
+coordenadas [lon, lat]. Para distancias se proyecta localmente a metros
+(equirectangular): a la escala de un fundo el error es despreciable.
+"""
+
+import math
+
+RADIO_TIERRA_M = 6371008.8
+METROS_POR_GRADO = math.pi * RADIO_TIERRA_M / 180
+
+
+class GeometriaInvalida(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------
+# VALIDACIÓN
+# ---------------------------------------------------------------
+def _normalizar_anillo(anillo):
+    if not isinstance(anillo, (list, tuple)):
+        raise GeometriaInvalida('Cada anillo debe ser una lista de coordenadas [lon, lat].')
+    puntos = []
+    for punto in anillo:
+        if not isinstance(punto, (list, tuple)) or len(punto) < 2:
+            raise GeometriaInvalida('Cada coordenada debe ser [lon, lat].')
+        try:
+            lon, lat = float(punto[0]), float(punto[1])
+        except (TypeError, ValueError):
+            raise GeometriaInvalida('Las coordenadas deben ser numéricas.')
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+            raise GeometriaInvalida(f'Coordenada fuera de rango: [{lon}, {lat}].')
+        puntos.append([lon, lat])
+    # GeoJSON exige anillos cerrados: se cierra si el usuario no lo hizo
+    if puntos and puntos[0] != puntos[-1]:
+        puntos.append(list(puntos[0]))
+    if len(puntos) < 4:
+        raise GeometriaInvalida('Un polígono necesita al menos 3 vértices distintos.')
+    return puntos
+
+
+def normalizar_geometria(geojson):
+    """
+    Valida un GeoJSON Polygon / MultiPolygon (también acepta un Feature)
+    y lo devuelve normalizado (anillos cerrados, coordenadas float).
+    """
+    if not isinstance(geojson, dict):
+        raise GeometriaInvalida('La geometría debe ser un objeto GeoJSON.')
+    if geojson.get('type') == 'Feature':
+        return normalizar_geometria(geojson.get('geometry'))
+
+    tipo, coordenadas = geojson.get('type'), geojson.get('coordinates')
+    if tipo == 'Polygon':
+        poligonos = [coordenadas]
+    elif tipo == 'MultiPolygon':
+        poligonos = coordenadas
+    else:
+        raise GeometriaInvalida('Solo se aceptan geometrías Polygon o MultiPolygon.')
+    if not isinstance(poligonos, (list, tuple)) or not poligonos:
+        raise GeometriaInvalida('La geometría no tiene coordenadas.')
+
+    normalizados = []
+    for poligono in poligonos:
+        if not isinstance(poligono, (list, tuple)) or not poligono:
+            raise GeometriaInvalida('Cada polígono debe tener al menos un anillo exterior.')
+        normalizados.append([_normalizar_anillo(anillo) for anillo in poligono])
+
+    if tipo == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': normalizados[0]}
+    return {'type': 'MultiPolygon', 'coordinates': normalizados}
+
+
+def poligonos(geometria):
+    """Lista de polígonos (cada uno: [exterior, agujero, ...]) de una geometría normalizada."""
+    if geometria['type'] == 'Polygon':
+        return [geometria['coordinates']]
+    return geometria['coordinates']
+
+
+# ---------------------------------------------------------------
+# MEDIDAS
+# ---------------------------------------------------------------
+def bbox(geometria):
+    """(min_lon, min_lat, max_lon, max_lat)."""
+    lons, lats = [], []
+    for poligono in poligonos(geometria):
+        for lon, lat in poligono[0]:
+            lons.append(lon)
+            lats.append(lat)
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def _area_y_centroide(anillo):
+    """Área con signo (grados²) y centroide de un anillo (fórmula del polígono)."""
+    area = cx = cy = 0.0
+    for (x0, y0), (x1, y1) in zip(anillo, anillo[1:]):
+        cruz = x0 * y1 - x1 * y0
+        area += cruz
+        cx += (x0 + x1) * cruz
+        cy += (y0 + y1) * cruz
+    area /= 2
+    if area == 0:
+        return 0.0, None
+    return area, (cx / (6 * area), cy / (6 * area))
+
+
+def centroide(geometria):
+    """(lon, lat) del centroide de área (descontando agujeros)."""
+    suma_area = suma_x = suma_y = 0.0
+    for poligono in poligonos(geometria):
+        for i, anillo in enumerate(poligono):
+            area, c = _area_y_centroide(anillo)
+            if c is None:
+                continue
+            # El exterior suma y los agujeros restan, sin importar la orientación
+            area = abs(area) if i == 0 else -abs(area)
+            suma_area += area
+            suma_x += c[0] * area
+            suma_y += c[1] * area
+    if suma_area:
+        return suma_x / suma_area, suma_y / suma_area
+    # Polígono degenerado (área 0): promedio de los vértices exteriores
+    vertices = [p for poligono in poligonos(geometria) for p in poligono[0][:-1]]
+    return (sum(p[0] for p in vertices) / len(vertices), sum(p[1] for p in vertices) / len(vertices))
+
+
+def _punto_en_anillo(lon, lat, anillo):
+    """Ray casting (par/impar)."""
+    dentro = False
+    for (x0, y0), (x1, y1) in zip(anillo, anillo[1:]):
+        if (y0 > lat) != (y1 > lat):
+            x_corte = x0 + (lat - y0) * (x1 - x0) / (y1 - y0)
+            if lon < x_corte:
+                dentro = not dentro
+    return dentro
+
+
+def contiene_punto(geometria, lon, lat):
+    for poligono in poligonos(geometria):
+        if _punto_en_anillo(lon, lat, poligono[0]) and not any(
+            _punto_en_anillo(lon, lat, agujero) for agujero in poligono[1:]
+        ):
+            return True
+    return False
+
+
+def _distancia_segmento(px, py, x0, y0, x1, y1):
+    dx, dy = x1 - x0, y1 - y0
+    largo2 = dx * dx + dy * dy
+    t = 0.0 if largo2 == 0 else max(0.0, min(1.0, ((px - x0) * dx + (py - y0) * dy) / largo2))
+    return math.hypot(px - (x0 + t * dx), py - (y0 + t * dy))
+
+
+def distancia_m(geometria, lon, lat):
+    """Distancia en metros desde el punto al borde (0 si el punto está dentro)."""
+    if contiene_punto(geometria, lon, lat):
+        return 0.0
+    escala_lon = math.cos(math.radians(lat))
+    minima = math.inf
+    for poligono in poligonos(geometria):
+        for anillo in poligono:
+            for (x0, y0), (x1, y1) in zip(anillo, anillo[1:]):
+                d = _distancia_segmento(
+                    lon * escala_lon, lat, x0 * escala_lon, y0, x1 * escala_lon, y1
+                )
+                minima = min(minima, d)
+    return minima * METROS_POR_GRADO
+
+
+def distancia_bbox_m(caja, lon, lat):
+    """Cota inferior de la distancia (m) del punto a cualquier geometría dentro de 'caja'."""
+    min_lon, min_lat, max_lon, max_lat = caja
+    dx = max(min_lon - lon, 0, lon - max_lon) * math.cos(math.radians(lat))
+    dy = max(min_lat - lat, 0, lat - max_lat)
+    return math.hypot(dx, dy) * METROS_POR_GRADO
+
+
+# ---------------------------------------------------------------
+# SIMPLIFICACIÓN (Douglas-Peucker)
+# ---------------------------------------------------------------
+def _simplificar_anillo(anillo, tolerancia):
+    if len(anillo) <= 4:
+        return anillo
+    conservar = [False] * len(anillo)
+    conservar[0] = conservar[-1] = True
+    # Anillo cerrado: el primer corte va al vértice más lejano del inicio,
+    # si no la recta inicio-fin es un punto y todo colapsa.
+    x0, y0 = anillo[0]
+    lejano = max(range(1, len(anillo) - 1), key=lambda i: math.hypot(anillo[i][0] - x0, anillo[i][1] - y0))
+    conservar[lejano] = True
+    pendientes = [(0, lejano), (lejano, len(anillo) - 1)]
+    while pendientes:
+        inicio, fin = pendientes.pop()
+        if fin - inicio < 2:
+            continue
+        (ax, ay), (bx, by) = anillo[inicio], anillo[fin]
+        mayor, indice = -1.0, None
+        for i in range(inicio + 1, fin):
+            d = _distancia_segmento(anillo[i][0], anillo[i][1], ax, ay, bx, by)
+            if d > mayor:
+                mayor, indice = d, i
+        if mayor > tolerancia:
+            conservar[indice] = True
+            pendientes.append((inicio, indice))
+            pendientes.append((indice, fin))
+    resultado = [p for p, c in zip(anillo, conservar) if c]
+    return resultado if len(resultado) >= 4 else None
+
+
+def simplificar(geometria, tolerancia):
+    """
+    Geometría simplificada con tolerancia en grados. Los agujeros que
+    colapsan se descartan; un exterior que colapsaría se deja como está.
+    """
+    if tolerancia <= 0:
+        return geometria
+    simplificados = []
+    for poligono in poligonos(geometria):
+        exterior = _simplificar_anillo(poligono[0], tolerancia) or poligono[0]
+        agujeros = [a for a in (_simplificar_anillo(h, tolerancia) for h in poligono[1:]) if a]
+        simplificados.append([exterior] + agujeros)
+    if geometria['type'] == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': simplificados[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplificados}
+
+
+def tolerancia_zoom(zoom, pixeles=0.5):
+    """Grados que ocupa 'pixeles' en un mapa web (teselas de 256 px) a ese zoom."""
+    return 360.0 / (256 * 2 ** zoom) * pixeles
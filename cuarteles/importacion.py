@@ -0,0 +1,282 @@
+# cuarteles/importacion.py
+"""
+Importación masiva de conteos de plantas desde una planilla (XLSX o CSV).
+
+Columnas (la primera fila es el encabezado, en cualquier orden):
+    cuartel (número), hilera (número), vivas, muertas
+
+- La planilla se lee fila a fila (openpyxl en modo read_only / csv), sin
+  cargar el libro completo en memoria.
+- Las hileras se resuelven con UN mapa precargado en una sola consulta:
+  (número de cuartel, número de hilera) -> hilera.
+- Modo 'seguimiento' (recuento): un SeguimientoCuartel por cuartel con un
+  RegistroHilera por cada hilera de la planilla, cambie o no (misma regla
+  que 'registrar_seguimiento_masivo'), todo con bulk_create, y las hileras
+  con bulk_update. El conteo lleva la fecha del seguimiento (ver
+  _momento_conteo) y, como en la sincronización de tablets, no pisa los
+  contadores de una hilera con un conteo más reciente: queda solo en el
+  historial.
+- Modo 'inicial': fija plantas iniciales (vivas + muertas) y actuales de
+  cada hilera, sin seguimiento.
+- Todo o nada: si alguna fila tiene errores no se escribe nada. Con
+  'simular=True' solo se devuelve la diferencia (vista previa).
+"""
+
+import os
+from datetime import datetime, time
+
+from django.db import transaction
+from django.utils import timezone
+
+from AgroControl.planillas import ErrorPlanilla, filas_csv, indices_columnas
+from .models import Cuartel, Hilera, SeguimientoCuartel, RegistroHilera
+from .seguimiento import CAMPOS_CONTEO
+
+MODOS = [('seguimiento', 'Recuento (registra un seguimiento por cuartel)'), ('inicial', 'Conteo inicial de plantas')]
+FORMATOS = ('.xlsx', '.csv')
+
+# Nombres de columna aceptados (en minúsculas, sin espacios extremos)
+COLUMNAS = {
+    'cuartel': ('cuartel', 'numero_cuartel', 'cuartel_numero', 'n° cuartel', 'nro cuartel'),
+    'hilera': ('hilera', 'numero_hilera', 'hilera_numero', 'n° hilera', 'nro hilera'),
+    'vivas': ('vivas', 'plantas_vivas', 'plantas vivas'),
+    'muertas': ('muertas', 'plantas_muertas', 'plantas muertas'),
+}
+
+
+class ErrorImportacion(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------
+# LECTURA (fila a fila)
+# ---------------------------------------------------------------
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except Exception:
+        raise ErrorImportacion('No se pudo leer el archivo XLSX.')
+    try:
+        yield from libro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _texto(valor):
+    # Excel entrega los números de cuartel como float (12.0 -> '12')
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return '' if valor is None else str(valor).strip()
+
+
+def _entero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        # Celdas numéricas del XLSX: mismo criterio que el texto (sin negativos)
+        if valor < 0:
+            raise ValueError
+        return valor
+    texto = _texto(valor)
+    if not texto.isdigit():
+        raise ValueError
+    return int(texto)
+
+
+def leer_planilla(archivo, nombre):
+    """
+    Genera (línea, numero_cuartel, numero_hilera, vivas, muertas, error) por
+    cada fila con datos. 'error' es None si la fila es válida.
+    """
+    extension = os.path.splitext(nombre)[1].lower()
+    if extension not in FORMATOS:
+        raise ErrorImportacion('Formato no soportado: use .xlsx o .csv.')
+    try:
+        yield from _leer_filas(archivo, extension)
+    except ErrorPlanilla as e:
+        raise ErrorImportacion(str(e)) from None
+
+
+def _leer_filas(archivo, extension):
+    filas = _filas_xlsx(archivo) if extension == '.xlsx' else filas_csv(archivo)
+
+    encabezado = next(filas, None)
+    if encabezado is None:
+        raise ErrorImportacion('El archivo está vacío.')
+    indices = indices_columnas(encabezado, COLUMNAS)
+    ultima = max(indices.values())
+
+    for linea, fila in enumerate(filas, start=2):
+        if not fila or all(_texto(v) == '' for v in fila):
+            continue
+        fila = list(fila) + [None] * (ultima + 1 - len(fila))
+        cuartel = _texto(fila[indices['cuartel']])
+        try:
+            hilera = _entero(fila[indices['hilera']])
+            vivas = _entero(fila[indices['vivas']])
+            muertas = _entero(fila[indices['muertas']])
+        except ValueError:
+            yield linea, cuartel, None, None, None, 'Hilera, vivas y muertas deben ser enteros no negativos.'
+            continue
+        if not cuartel:
+            yield linea, cuartel, hilera, vivas, muertas, 'Falta el número de cuartel.'
+            continue
+        yield linea, cuartel, hilera, vivas, muertas, None
+
+
+# ---------------------------------------------------------------
+# IMPORTACIÓN
+# ---------------------------------------------------------------
+def importar_conteos(archivo, nombre, modo='seguimiento', fecha=None, responsable_id=None,
+                     simular=False, observaciones=''):
+    """
+    Devuelve un dict con 'cambios' (diferencia por hilera), 'errores',
+    'advertencias', 'sin_cambios', 'cuarteles' y 'aplicado'.
+    """
+    if modo not in dict(MODOS):
+        raise ErrorImportacion(f"Modo inválido: '{modo}'.")
+    fecha = fecha or timezone.localdate()
+    contado_en = _momento_conteo(fecha)
+
+    filas, errores = [], []
+    for linea, cuartel, hilera, vivas, muertas, error in leer_planilla(archivo, nombre):
+        if error:
+            errores.append({'linea': linea, 'error': error})
+        else:
+            filas.append((linea, cuartel, hilera, vivas, muertas))
+
+    # Mapa precargado: una consulta para todas las hileras de los cuarteles del archivo
+    numeros = {f[1] for f in filas}
+    mapa = {
+        (h.cuartel.numero, h.numero_hilera): h
+        for h in Hilera.objects.filter(cuartel__numero__in=numeros).select_related('cuartel').order_by()
+    }
+
+    resultado = {
+        'modo': modo, 'fecha': fecha, 'filas': len(filas) + len(errores),
+        'cambios': [], 'errores': errores, 'advertencias': [], 'sin_cambios': 0,
+        'cuarteles': 0, 'aplicado': False,
+    }
+    vistas, por_cuartel = {}, {}
+    for linea, cuartel, numero_hilera, vivas, muertas in filas:
+        hilera = mapa.get((cuartel, numero_hilera))
+        if hilera is None:
+            errores.append({'linea': linea, 'error': f'No existe la hilera {numero_hilera} en el cuartel {cuartel}.'})
+            continue
+        if hilera.pk in vistas:
+            errores.append({'linea': linea, 'error': f'Hilera {numero_hilera} del cuartel {cuartel} repetida (línea {vistas[hilera.pk]}).'})
+            continue
+        vistas[hilera.pk] = linea
+
+        if modo == 'seguimiento' and vivas + muertas > hilera.plantas_totales_iniciales:
+            resultado['advertencias'].append({
+                'linea': linea,
+                'error': f'Cuartel {cuartel}, hilera {numero_hilera}: vivas + muertas ({vivas + muertas}) '
+                         f'supera las plantas iniciales ({hilera.plantas_totales_iniciales}).'
+            })
+        if modo == 'seguimiento':
+            # Recuento: toda hilera queda en el historial, cambie o no
+            por_cuartel.setdefault(hilera.cuartel, []).append((hilera, vivas, muertas))
+            if hilera.fecha_conteo and contado_en < hilera.fecha_conteo:
+                resultado['advertencias'].append({
+                    'linea': linea,
+                    'error': f'Cuartel {cuartel}, hilera {numero_hilera}: tiene un conteo más reciente '
+                             f'({timezone.localtime(hilera.fecha_conteo):%d/%m/%Y %H:%M}); '
+                             f'este queda solo en el historial.'
+                })
+                resultado['sin_cambios'] += 1
+                continue
+
+        antes = (hilera.plantas_vivas_actuales, hilera.plantas_muertas_actuales)
+        iniciales_cambian = modo == 'inicial' and hilera.plantas_totales_iniciales != vivas + muertas
+        if antes == (vivas, muertas) and not iniciales_cambian:
+            resultado['sin_cambios'] += 1
+            continue
+        resultado['cambios'].append({
+            'linea': linea, 'cuartel': cuartel, 'hilera': numero_hilera,
+            'vivas_antes': antes[0], 'muertas_antes': antes[1],
+            'vivas': vivas, 'muertas': muertas,
+            'iniciales_antes': hilera.plantas_totales_iniciales,
+            'iniciales': vivas + muertas if modo == 'inicial' else hilera.plantas_totales_iniciales,
+        })
+        if modo == 'inicial':
+            por_cuartel.setdefault(hilera.cuartel, []).append((hilera, vivas, muertas))
+
+    errores.sort(key=lambda e: e['linea'])
+    resultado['cuarteles'] = len(por_cuartel)
+    if simular or errores or not por_cuartel:
+        return resultado
+
+    with transaction.atomic():
+        if modo == 'seguimiento':
+            _guardar_seguimientos(por_cuartel, fecha, contado_en, responsable_id, observaciones)
+        else:
+            _guardar_iniciales(por_cuartel)
+        afectados = [c.pk for c in por_cuartel]
+        Cuartel.objects.filter(pk__in=afectados).recalcular_conteos()
+
+    resultado['aplicado'] = True
+    return resultado
+
+
+def _momento_conteo(fecha):
+    """
+    Instante de un conteo importado (la planilla solo trae el día): ahora
+    si es de hoy; si es de un día pasado, el inicio de ese día, que cede
+    ante cualquier conteo con hora de ese día o posterior.
+    """
+    ahora = timezone.now()
+    if fecha >= timezone.localdate(ahora):
+        return ahora
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _guardar_seguimientos(por_cuartel, fecha, contado_en, responsable_id, observaciones):
+    cuarteles = list(por_cuartel)
+    seguimientos = SeguimientoCuartel.objects.bulk_create([
+        SeguimientoCuartel(
+            cuartel=c, fecha_seguimiento=fecha, responsable_id=responsable_id,
+            observaciones=observaciones or 'Importado desde planilla',
+        )
+        for c in cuarteles
+    ])
+    # Conteo vigente de cada hilera, releído con bloqueo (la vista previa pudo quedar vieja)
+    vigentes = dict(
+        Hilera.objects.select_for_update().filter(
+            pk__in=[h.pk for filas in por_cuartel.values() for h, _, _ in filas]
+        ).order_by('id').values_list('id', 'fecha_conteo')
+    )
+    ahora = timezone.now()
+    registros, hileras = [], []
+    for cuartel, seguimiento in zip(cuarteles, seguimientos):
+        for hilera, vivas, muertas in por_cuartel[cuartel]:
+            registros.append(RegistroHilera(
+                seguimiento_batch=seguimiento, hilera=hilera, contado_en=contado_en,
+                plantas_vivas_registradas=vivas, plantas_muertas_registradas=muertas,
+            ))
+            # Last-write-wins por 'fecha_conteo', igual que la sincronización de tablets
+            vigente = vigentes.get(hilera.pk)
+            if vigente and contado_en < vigente:
+                continue
+            hilera.plantas_vivas_actuales = vivas
+            hilera.plantas_muertas_actuales = muertas
+            hilera.fecha_conteo = contado_en
+            # 'modificado_en' es el cambio de la fila (cambios para las tablets): ahora
+            hilera.modificado_en = ahora
+            hileras.append(hilera)
+    RegistroHilera.objects.bulk_create(registros, batch_size=1000)
+    Hilera.objects.bulk_update(hileras, CAMPOS_CONTEO, batch_size=1000)
+
+
+def _guardar_iniciales(por_cuartel):
+    ahora = timezone.now()
+    hileras = []
+    for filas in por_cuartel.values():
+        for hilera, vivas, muertas in filas:
+            hilera.plantas_totales_iniciales = vivas + muertas
+            hilera.plantas_vivas_actuales = vivas
+            hilera.plantas_muertas_actuales = muertas
+            hilera.fecha_conteo = hilera.modificado_en = ahora
+            hileras.append(hilera)
+    Hilera.objects.bulk_update(hileras, ['plantas_totales_iniciales'] + CAMPOS_CONTEO, batch_size=1000)
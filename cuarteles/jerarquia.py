@@ -0,0 +1,76 @@
+# cuarteles/jerarquia.py
+"""
+Mantención de los agregados cacheados de fundos y sectores.
+
+Leer los totales de un fundo o sector es leer SU fila (una consulta por pk).
+Los agregados se recalculan después del commit, solo para las agrupaciones
+afectadas (las que aparecen en la ruta del cuartel que cambió):
+- Cuartel guardado / borrado: área, cantidad y, si cambió de agrupación,
+  la ruta vieja y la nueva.
+- 'recalcular_conteos' (plantas): la señal no dice qué cuarteles cambiaron,
+  así que se recalculan todas (es un solo UPDATE sobre pocas filas).
+- Riego guardado / borrado: volumen de agua (medido si lo hay, si no el
+  calculado), del cuartel actual y, si el riego cambió de cuartel, del
+  anterior. También al conciliar los caudalímetros (riego/caudalimetros.py).
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Agrupacion, Cuartel, conteos_recalculados
+
+
+def recalcular_agrupaciones(*rutas):
+    """Recalcula las agrupaciones de las rutas dadas (todas si no se indica ninguna)."""
+    agrupaciones = Agrupacion.objects.de_rutas(*rutas) if rutas else Agrupacion.objects.all()
+    return agrupaciones.recalcular_agregados()
+
+
+def _al_confirmar(*rutas):
+    rutas = [r for r in rutas if r]
+    if rutas:
+        transaction.on_commit(lambda: recalcular_agrupaciones(*rutas))
+
+
+@receiver(post_save, sender=Cuartel)
+def agregados_por_cuartel_guardado(sender, instance, **kwargs):
+    _al_confirmar(*getattr(instance, '_rutas_afectadas', {instance.ruta_agrupacion}))
+
+
+@receiver(post_delete, sender=Cuartel)
+def agregados_por_cuartel_borrado(sender, instance, **kwargs):
+    _al_confirmar(instance.ruta_agrupacion)
+
+
+@receiver(post_save, sender=Agrupacion)
+def agregados_por_agrupacion(sender, instance, **kwargs):
+    # Una agrupación nueva o movida cambia los subárboles de sus ancestros viejos y nuevos
+    transaction.on_commit(lambda: recalcular_agrupaciones())
+
+
+@receiver(conteos_recalculados)
+def agregados_por_conteos(sender, **kwargs):
+    transaction.on_commit(lambda: recalcular_agrupaciones())
+
+
+def agrupaciones_de_cuarteles_al_confirmar(cuartel_ids):
+    """Después del commit, recalcula las agrupaciones de las rutas de esos cuarteles."""
+    cuartel_ids = {c for c in cuartel_ids if c}
+    if not cuartel_ids:
+        return
+
+    def recalcular():
+        rutas = Cuartel.objects.filter(pk__in=cuartel_ids).values_list('ruta_agrupacion', flat=True)
+        rutas = [r for r in rutas if r]
+        # Sin rutas no hay nada que recalcular (sin argumentos se recalcularían todas)
+        if rutas:
+            recalcular_agrupaciones(*rutas)
+    transaction.on_commit(recalcular)
+
+
+@receiver([post_save, post_delete], sender='riego.ControlRiego')
+def agregados_por_riego(sender, instance, **kwargs):
+    # Si el riego cambió de cuartel, el anterior también pierde su volumen
+    agrupaciones_de_cuarteles_al_confirmar({instance.cuartel_id, getattr(instance, '_cuartel_leido', None)})
+    instance._cuartel_leido = instance.cuartel_id
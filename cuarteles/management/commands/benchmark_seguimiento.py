@@ -0,0 +1,96 @@
+# Guardar en: cuarteles/management/commands/benchmark_seguimiento.py
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from cuarteles.forms import SeguimientoCuartelForm, registro_hilera_formset
+from cuarteles.models import Cuartel, Hilera, SeguimientoCuartel, RegistroHilera
+from cuarteles.seguimiento import registrar_seguimiento_masivo
+
+class Command(BaseCommand):
+    help = (
+        'Compara el registro de un seguimiento hilera por hilera (save + señal) '
+        'con el registro en bloque (bulk_create + bulk_update). '
+        'Usa un cuartel temporal y deshace todo al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hileras', type=int, nargs='+', default=[50, 200, 1000],
+            help='Tamaños de cuartel a medir (default: 50 200 1000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'Hileras':>8} {'Ruta':<12} {'Consultas':>10} {'Escrituras':>11} {'Tiempo (ms)':>12}")
+        for cantidad in options['hileras']:
+            for ruta, medir in (('por fila', self._por_fila), ('en bloque', self._en_bloque)):
+                consultas, escrituras, ms = self._medir(cantidad, medir)
+                self.stdout.write(f'{cantidad:>8} {ruta:<12} {consultas:>10} {escrituras:>11} {ms:>12.1f}')
+        self.stdout.write(self.style.SUCCESS('Benchmark terminado (sin cambios en la base de datos).'))
+
+    def _medir(self, cantidad, medir):
+        with transaction.atomic():
+            cuartel = Cuartel.objects.create(
+                numero=f'__benchmark_{cantidad}__', nombre='Benchmark', ubicacion='-',
+                variedad='-', tipo_planta='-', año_plantacion=timezone.localdate().year,
+                area_hectareas=1, cantidad_hileras=cantidad,
+            )
+            Hilera.objects.bulk_create([
+                Hilera(cuartel=cuartel, numero_hilera=i, plantas_totales_iniciales=100,
+                       plantas_vivas_actuales=100, plantas_muertas_actuales=0)
+                for i in range(1, cantidad + 1)
+            ])
+            hileras = list(cuartel.hileras.all())
+
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as capturadas:
+                medir(cuartel, hileras)
+            ms = (time.perf_counter() - inicio) * 1000
+
+            transaction.set_rollback(True)
+
+        sql = [q['sql'].lstrip().upper() for q in capturadas.captured_queries]
+        escrituras = sum(1 for q in sql if q.startswith(('INSERT', 'UPDATE', 'DELETE')))
+        return len(sql), escrituras, ms
+
+    def _por_fila(self, cuartel, hileras):
+        """Como lo hacía la vista antes: formset normal, un save() por registro y la señal guarda la hilera."""
+        form_seguimiento, formset = self._formularios(hileras, validar_contra_cuartel=False)
+        if not (form_seguimiento.is_valid() and formset.is_valid()):
+            raise CommandError(f'Formulario inválido: {formset.errors}')
+        with transaction.atomic():
+            seguimiento = form_seguimiento.save(commit=False)
+            seguimiento.cuartel = cuartel
+            seguimiento.save()
+            for registro in formset.save(commit=False):
+                registro.seguimiento_batch = seguimiento
+                registro.save()
+
+    def _en_bloque(self, cuartel, hileras):
+        """Misma ruta que la vista actual, validación del formset incluida."""
+        form_seguimiento, formset = self._formularios(hileras)
+        if not registrar_seguimiento_masivo(cuartel, form_seguimiento, formset):
+            raise CommandError(f'Formulario inválido: {formset.errors}')
+
+    def _formularios(self, hileras, validar_contra_cuartel=True):
+        prefijo = RegistroHilera.seguimiento_batch.field.remote_field.get_accessor_name()
+        datos = {
+            'fecha_seguimiento': timezone.localdate().isoformat(),
+            'observaciones': '',
+            f'{prefijo}-TOTAL_FORMS': len(hileras),
+            f'{prefijo}-INITIAL_FORMS': 0,
+        }
+        for i, hilera in enumerate(hileras):
+            datos[f'{prefijo}-{i}-hilera'] = hilera.pk
+            datos[f'{prefijo}-{i}-plantas_vivas_registradas'] = 90
+            datos[f'{prefijo}-{i}-plantas_muertas_registradas'] = 10
+
+        formset = registro_hilera_formset(extra=len(hileras))(
+            datos, instance=SeguimientoCuartel(), queryset=RegistroHilera.objects.none(),
+            hileras=hileras if validar_contra_cuartel else None
+        )
+        return SeguimientoCuartelForm(datos), formset
@@ -0,0 +1,57 @@
+# Guardar en: cuarteles/management/commands/importar_conteos.py
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cuarteles.importacion import importar_conteos, ErrorImportacion, MODOS
+
+class Command(BaseCommand):
+    help = (
+        'Importa conteos de plantas (cuartel, hilera, vivas, muertas) desde una '
+        'planilla XLSX o CSV. Con --dry-run solo muestra la diferencia.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta de la planilla (.xlsx o .csv)')
+        parser.add_argument('--modo', choices=[m for m, _ in MODOS], default='seguimiento',
+                            help='seguimiento (recuento, default) o inicial')
+        parser.add_argument('--fecha', type=date.fromisoformat, default=None,
+                            help='Fecha del seguimiento AAAA-MM-DD (default: hoy)')
+        parser.add_argument('--observaciones', default='', help='Observaciones de los seguimientos creados')
+        parser.add_argument('--dry-run', action='store_true', help='No escribir: solo mostrar la diferencia')
+        parser.add_argument('--mostrar', type=int, default=50, help='Cambios/errores a listar (default: 50)')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_conteos(
+                    archivo, options['archivo'], modo=options['modo'], fecha=options['fecha'],
+                    observaciones=options['observaciones'], simular=options['dry_run'],
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {e}')
+        except ErrorImportacion as e:
+            raise CommandError(str(e))
+
+        mostrar = options['mostrar']
+        for c in resultado['cambios'][:mostrar]:
+            self.stdout.write(
+                f"  línea {c['linea']}: cuartel {c['cuartel']} hilera {c['hilera']}: "
+                f"vivas {c['vivas_antes']} -> {c['vivas']}, muertas {c['muertas_antes']} -> {c['muertas']}"
+            )
+        for e in resultado['advertencias'][:mostrar]:
+            self.stdout.write(self.style.WARNING(f"  línea {e['linea']}: {e['error']}"))
+        for e in resultado['errores'][:mostrar]:
+            self.stdout.write(self.style.ERROR(f"  línea {e['linea']}: {e['error']}"))
+
+        self.stdout.write(
+            f"{resultado['filas']} filas: {len(resultado['cambios'])} cambios en {resultado['cuarteles']} cuarteles, "
+            f"{resultado['sin_cambios']} sin cambios, {len(resultado['errores'])} con errores."
+        )
+        if resultado['errores']:
+            raise CommandError('No se importó nada: corrija los errores de la planilla.')
+        if resultado['aplicado']:
+            self.stdout.write(self.style.SUCCESS('Importación aplicada.'))
+        else:
+            self.stdout.write(self.style.WARNING('Sin escrituras (--dry-run o sin cambios).'))
@@ -0,0 +1,42 @@
+# Guardar en: cuarteles/management/commands/recalcular_agrupaciones.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from cuarteles.models import Agrupacion, Cuartel
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye las rutas materializadas de fundos y sectores (y su copia '
+        'en cada cuartel) y recalcula los agregados cacheados de cada agrupación. '
+        'Útil después de cargar datos por SQL.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            agrupaciones = {a.pk: a for a in Agrupacion.objects.only('id', 'padre_id', 'ruta', 'profundidad')}
+
+            def ruta(pk, visitados=()):
+                if pk in visitados:
+                    raise ValueError(f'Ciclo en la jerarquía (agrupación {pk}).')
+                a = agrupaciones[pk]
+                base = ruta(a.padre_id, visitados + (pk,)) if a.padre_id else '/'
+                return f'{base}{pk}/'
+
+            cambiadas = []
+            for a in agrupaciones.values():
+                nueva = ruta(a.pk)
+                if a.ruta != nueva:
+                    a.ruta, a.profundidad = nueva, nueva.count('/') - 2
+                    cambiadas.append(a)
+            Agrupacion.objects.bulk_update(cambiadas, ['ruta', 'profundidad'])
+
+            cuarteles = Cuartel.objects.update(ruta_agrupacion=Coalesce(
+                Subquery(Agrupacion.objects.filter(pk=OuterRef('agrupacion_id')).values('ruta')[:1]), Value('')
+            ))
+            total = Agrupacion.objects.all().recalcular_agregados()
+
+        self.stdout.write(f'{len(cambiadas)} rutas corregidas, {cuarteles} cuarteles revisados.')
+        self.stdout.write(self.style.SUCCESS(f'{total} agrupaciones recalculadas.'))
@@ -0,0 +1,42 @@
+# Guardar en: cuarteles/management/commands/verificar_conteos_cuarteles.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from cuarteles.models import Cuartel
+
+class Command(BaseCommand):
+    help = (
+        'Compara los totales cacheados de cada cuartel (plantas_totales, '
+        'plantas_vivas, plantas_muertas) con la suma de sus hileras y, '
+        'opcionalmente, los corrige. Pensado para ejecutarse cada noche.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Recalcular los cuarteles con descuadre')
+        parser.add_argument('--todos', action='store_true', help='Recalcular TODOS los cuarteles (con --reparar)')
+        parser.add_argument('--mostrar', type=int, default=50, help='Descuadres a listar (default: 50)')
+
+    def handle(self, *args, **options):
+        descuadres = list(Cuartel.objects.descuadres_conteo().order_by('numero'))
+
+        if not descuadres:
+            self.stdout.write(self.style.SUCCESS('Los totales cacheados coinciden con las hileras.'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(descuadres)} cuarteles con descuadre:'))
+            for c in descuadres[:options['mostrar']]:
+                self.stdout.write(
+                    f'  [{c.numero}] {c.nombre}: '
+                    f'totales {c.plantas_totales}/{c.sup_total}, '
+                    f'vivas {c.plantas_vivas}/{c.sup_vivas}, '
+                    f'muertas {c.plantas_muertas}/{c.sup_muertas} (cacheado/hileras)'
+                )
+
+        if not options['reparar'] or not (descuadres or options['todos']):
+            return
+
+        with transaction.atomic():
+            if options['todos']:
+                total = Cuartel.objects.all().recalcular_conteos()
+            else:
+                total = Cuartel.objects.filter(pk__in=[c.pk for c in descuadres]).recalcular_conteos()
+        self.stdout.write(self.style.SUCCESS(f'{total} cuarteles recalculados.'))
@@ -0,0 +1,206 @@
+# cuarteles/mapa.py
+"""
+Índice espacial y capa del mapa de cuarteles (sin PostGIS).
+
+- IndiceGrilla: grilla uniforme en grados; cada cuartel queda en las celdas
+  que toca su bbox. "¿En qué cuartel está este punto?" revisa una celda;
+  "¿cuáles están más cerca?" recorre anillos de celdas alrededor del punto
+  hasta que ninguna celda sin revisar pueda tener algo más cerca.
+- El índice y la capa GeoJSON simplificada por zoom se guardan en el caché
+  bajo la versión de los cuarteles leída de la base
+  (Cuartel.objects.version_datos), que cambia con cada cuartel guardado,
+  borrado o recontado, en cualquier proceso. Además, cada proceso guarda
+  el último índice que armó para no deserializarlo en cada consulta.
+"""
+
+import math
+from collections import defaultdict
+from statistics import median
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from . import geo
+from .models import Cuartel
+
+TTL_MAPA = 60 * 60 * 24
+ZOOM_MIN, ZOOM_MAX = 0, 22
+CELDA_MINIMA = 0.0005       # ~55 m: evita grillas enormes con cuarteles diminutos
+MAX_CERCANOS = 20
+
+
+# ---------------------------------------------------------------
+# ÍNDICE EN GRILLA
+# ---------------------------------------------------------------
+class IndiceGrilla:
+    def __init__(self, tamano_celda):
+        self.tamano_celda = tamano_celda
+        self.celdas = defaultdict(list)
+        self.elementos = {}          # id -> (bbox, geometria)
+        self.limites = None          # rango de celdas ocupadas (i_min, j_min, i_max, j_max)
+
+    @classmethod
+    def construir(cls, elementos):
+        """'elementos': iterable de (id, geometria normalizada)."""
+        elementos = [(pk, geo.bbox(g), g) for pk, g in elementos]
+        # Celda del orden del tamaño típico de un cuartel: cada uno cae en pocas celdas
+        lados = [max(b[2] - b[0], b[3] - b[1]) for _, b, _ in elementos]
+        indice = cls(max(median(lados), CELDA_MINIMA) if lados else CELDA_MINIMA)
+        for pk, caja, geometria in elementos:
+            indice.agregar(pk, caja, geometria)
+        return indice
+
+    def _celda(self, lon, lat):
+        return math.floor(lon / self.tamano_celda), math.floor(lat / self.tamano_celda)
+
+    def agregar(self, pk, caja, geometria):
+        self.elementos[pk] = (caja, geometria)
+        i0, j0 = self._celda(caja[0], caja[1])
+        i1, j1 = self._celda(caja[2], caja[3])
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.celdas[(i, j)].append(pk)
+        if self.limites is None:
+            self.limites = (i0, j0, i1, j1)
+        else:
+            a, b, c, d = self.limites
+            self.limites = (min(a, i0), min(b, j0), max(c, i1), max(d, j1))
+
+    def __len__(self):
+        return len(self.elementos)
+
+    def buscar_punto(self, lon, lat):
+        """Ids de los cuarteles que contienen el punto."""
+        resultado = []
+        for pk in self.celdas.get(self._celda(lon, lat), ()):
+            caja, geometria = self.elementos[pk]
+            if caja[0] <= lon <= caja[2] and caja[1] <= lat <= caja[3] and geo.contiene_punto(geometria, lon, lat):
+                resultado.append(pk)
+        return resultado
+
+    def _anillo(self, ci, cj, r):
+        """Celdas a distancia de Chebyshev exactamente r de (ci, cj), recortadas a la zona ocupada."""
+        i_min, j_min, i_max, j_max = self.limites
+        for i in range(max(ci - r, i_min), min(ci + r, i_max) + 1):
+            for j in {cj - r, cj + r}:
+                if j_min <= j <= j_max:
+                    yield i, j
+        for j in range(max(cj - r + 1, j_min), min(cj + r - 1, j_max) + 1):
+            for i in {ci - r, ci + r}:
+                if i_min <= i <= i_max:
+                    yield i, j
+
+    def mas_cercanos(self, lon, lat, cantidad=5, radio_m=None):
+        """[(id, distancia_m)] de los 'cantidad' cuarteles más cercanos (0 = el punto está dentro)."""
+        if not self.elementos:
+            return []
+        ci, cj = self._celda(lon, lat)
+        i_min, j_min, i_max, j_max = self.limites
+        # Fuera de [r_min, r_max] los anillos no tocan la zona ocupada
+        r_min = max(i_min - ci, ci - i_max, j_min - cj, cj - j_max, 0)
+        r_max = max(ci - i_min, i_max - ci, cj - j_min, j_max - cj, 0)
+        # Metros que cubre como mínimo un anillo de celdas (el lado lon se achica con la latitud)
+        metros_celda = self.tamano_celda * geo.METROS_POR_GRADO * min(1.0, math.cos(math.radians(lat)))
+
+        vistos, encontrados = set(), []
+        for r in range(r_min, r_max + 1):
+            for celda in self._anillo(ci, cj, r):
+                for pk in self.celdas.get(celda, ()):
+                    if pk in vistos:
+                        continue
+                    vistos.add(pk)
+                    caja, geometria = self.elementos[pk]
+                    # Descarta por bbox antes de medir contra el polígono
+                    if radio_m is not None and geo.distancia_bbox_m(caja, lon, lat) > radio_m:
+                        continue
+                    distancia = geo.distancia_m(geometria, lon, lat)
+                    if radio_m is None or distancia <= radio_m:
+                        encontrados.append((pk, distancia))
+            # Todo lo que falta revisar está al menos a r celdas completas del punto
+            cota = r * metros_celda
+            encontrados.sort(key=lambda x: x[1])
+            if len(encontrados) >= cantidad and encontrados[cantidad - 1][1] <= cota:
+                break
+            if radio_m is not None and cota > radio_m:
+                break
+        return [(pk, round(d, 1)) for pk, d in encontrados[:cantidad]]
+
+
+# ---------------------------------------------------------------
+# VERSIÓN Y CACHÉ
+# ---------------------------------------------------------------
+_indice_local = (None, None)   # (versión, índice) del proceso actual
+
+
+def version_mapa():
+    return Cuartel.objects.version_datos()[0]
+
+
+def _geometrias():
+    return Cuartel.objects.filter(geometria__isnull=False).order_by().values_list('id', 'geometria')
+
+
+def indice_cuarteles():
+    """Índice de la versión vigente: memoria del proceso -> caché -> base de datos."""
+    global _indice_local
+    version = version_mapa()
+    if _indice_local[0] == version:
+        return _indice_local[1]
+    clave = f'cuarteles:mapa:indice:{version}'
+    indice = cache.get(clave)
+    if indice is None:
+        indice = IndiceGrilla.construir(_geometrias())
+        cache.set(clave, indice, timeout=TTL_MAPA)
+    _indice_local = (version, indice)
+    return indice
+
+
+def capa_mapa(zoom):
+    """FeatureCollection (como dict) de todos los cuarteles, simplificada para 'zoom'."""
+    version = version_mapa()
+    clave = f'cuarteles:mapa:capa:{version}:{zoom}'
+    capa = cache.get(clave)
+    if capa is None:
+        tolerancia = geo.tolerancia_zoom(zoom)
+        cuarteles = (
+            Cuartel.objects.filter(geometria__isnull=False).con_porcentaje()
+            .values('id', 'numero', 'nombre', 'variedad', 'estado_cultivo', 'geometria',
+                    'bbox_min_lon', 'bbox_min_lat', 'bbox_max_lon', 'bbox_max_lat',
+                    'centroide_lon', 'centroide_lat', 'porcentaje_supervivencia')
+        )
+        capa = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'id': c['id'],
+                    'bbox': [c['bbox_min_lon'], c['bbox_min_lat'], c['bbox_max_lon'], c['bbox_max_lat']],
+                    'geometry': geo.simplificar(c['geometria'], tolerancia),
+                    'properties': {
+                        'numero': c['numero'],
+                        'nombre': c['nombre'],
+                        'variedad': c['variedad'],
+                        'estado_cultivo': c['estado_cultivo'],
+                        'supervivencia': round(c['porcentaje_supervivencia'], 1),
+                        'centroide': [c['centroide_lon'], c['centroide_lat']],
+                        'url': reverse('cuarteles:detalle_cuartel', args=[c['id']]),
+                    },
+                }
+                for c in cuarteles
+            ],
+        }
+        cache.set(clave, capa, timeout=TTL_MAPA)
+    return capa
+
+
+def recortar_capa(capa, caja):
+    """Solo los features cuyo bbox toca la caja (min_lon, min_lat, max_lon, max_lat)."""
+    min_lon, min_lat, max_lon, max_lat = caja
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            f for f in capa['features']
+            if f['bbox'][0] <= max_lon and f['bbox'][2] >= min_lon
+            and f['bbox'][1] <= max_lat and f['bbox'][3] >= min_lat
+        ],
+    }
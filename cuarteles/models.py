@@ -1,8 +1,243 @@
-from django.db import models
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from autenticacion.models import Usuario
-from django.db.models import Sum
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models import (
+    Sum, Count, Max, Case, When, F, Q, Value, FloatField, DecimalField, IntegerField, ExpressionWrapper, OuterRef,
+    Subquery, Func
+)
+from django.db.models.functions import Coalesce, Concat, Substr
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .geo import GeometriaInvalida, normalizar_geometria, bbox as bbox_geometria, centroide as centroide_geometria
+
+# Se emite cuando 'recalcular_conteos' reescribe los totales cacheados
+# (un queryset.update() no dispara post_save).
+conteos_recalculados = Signal()
+
+
+def _porcentaje(vivas, total):
+    """vivas * 100 / total (0 si no hay plantas), como expresión SQL."""
+    return Case(
+        When(**{f'{total}__gt': 0}, then=ExpressionWrapper(
+            F(vivas) * 100.0 / F(total), output_field=FloatField()
+        )),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+class CuartelQuerySet(models.QuerySet):
+    def with_survival(self):
+        """
+        Anota totales de plantas y % de supervivencia en UNA consulta agrupada:
+        sup_total, sup_vivas, sup_muertas, sup_porcentaje.
+        Calcula desde las hileras (valor exacto); para listados basta con
+        las columnas cacheadas (plantas_totales / plantas_vivas / plantas_muertas).
+        """
+        return self.annotate(
+            sup_total=Coalesce(Sum('hileras__plantas_totales_iniciales'), 0),
+            sup_vivas=Coalesce(Sum('hileras__plantas_vivas_actuales'), 0),
+            sup_muertas=Coalesce(Sum('hileras__plantas_muertas_actuales'), 0),
+        ).annotate(
+            sup_porcentaje=_porcentaje('sup_vivas', 'sup_total')
+        )
+
+    def con_porcentaje(self):
+        """Anota 'porcentaje_supervivencia' desde las columnas cacheadas (sin JOIN)."""
+        return self.annotate(porcentaje_supervivencia=_porcentaje('plantas_vivas', 'plantas_totales'))
+
+    def baja_supervivencia(self, umbral=80):
+        """Cuarteles con supervivencia bajo 'umbral' (%), filtrado en SQL."""
+        return self.con_porcentaje().filter(porcentaje_supervivencia__lt=umbral)
+
+    def recalcular_conteos(self):
+        """
+        Recalcula las columnas cacheadas de plantas desde las hileras
+        con UN solo UPDATE (subconsultas correlacionadas).
+        Devuelve el número de cuarteles actualizados.
+        """
+        def suma(campo):
+            return Coalesce(Subquery(
+                Hilera.objects.filter(cuartel=OuterRef('pk')).order_by()
+                .values('cuartel').annotate(total=Sum(campo)).values('total')[:1]
+            ), 0)
+
+        actualizados = self.update(
+            plantas_totales=suma('plantas_totales_iniciales'),
+            plantas_vivas=suma('plantas_vivas_actuales'),
+            plantas_muertas=suma('plantas_muertas_actuales'),
+            # Cambian los totales: las versiones leídas de la base (ver version_datos) también
+            fecha_actualizacion=timezone.now(),
+        )
+        conteos_recalculados.send(sender=self.model)
+        return actualizados
+
+    def version_datos(self):
+        """
+        (versión, último cambio) de los cuarteles leídos de la base en UNA
+        consulta: cuántos hay, el mayor id y la mayor 'fecha_actualizacion'.
+        Sirve de clave de caché compartida por todos los procesos (web y
+        comandos). Un borrado cambia la versión, pero no el último cambio.
+        """
+        datos = self.aggregate(total=Count('id'), ultimo=Max('id'), modificado=Max('fecha_actualizacion'))
+        modificado = datos['modificado']
+        marca = modificado.timestamp() if modificado else 0
+        return f"{datos['total']}.{datos['ultimo'] or 0}.{marca}", modificado
+
+    def en_agrupacion(self, agrupacion):
+        """Cuarteles del subárbol de la agrupación (filtro por prefijo, indexado)."""
+        return self.filter(ruta_agrupacion__startswith=agrupacion.ruta)
+
+    def en_bbox(self, min_lon, min_lat, max_lon, max_lat):
+        """Cuarteles con geometría cuyo bbox toca la caja dada (columnas indexadas, sin PostGIS)."""
+        return self.filter(
+            bbox_min_lon__lte=max_lon, bbox_max_lon__gte=min_lon,
+            bbox_min_lat__lte=max_lat, bbox_max_lat__gte=min_lat,
+        )
+
+    def descuadres_conteo(self):
+        """Cuarteles cuyas columnas cacheadas no coinciden con sus hileras."""
+        return self.with_survival().filter(
+            ~Q(plantas_totales=F('sup_total')) |
+            ~Q(plantas_vivas=F('sup_vivas')) |
+            ~Q(plantas_muertas=F('sup_muertas'))
+        )
+
+
+# ---------------------------------------------------------------
+# JERARQUÍA: FUNDO -> SECTOR -> CUARTEL (ruta materializada)
+# ---------------------------------------------------------------
+def ids_de_ruta(ruta):
+    """'/3/7/' -> [3, 7] (la agrupación y todos sus ancestros)."""
+    return [int(parte) for parte in ruta.split('/') if parte]
+
+
+def _suma_subarbol(queryset, campo, output_field, funcion='SUM'):
+    """
+    SUM/COUNT del queryset como subconsulta escalar. Se usa Func y no Sum
+    para que Django no agregue GROUP BY: es un solo total por fila externa.
+    """
+    return Coalesce(
+        Subquery(
+            queryset.order_by().annotate(total=Func(F(campo), function=funcion, output_field=output_field))
+            .values('total')[:1],
+            output_field=output_field,
+        ),
+        Value(0),
+        output_field=output_field,
+    )
+
+
+class AgrupacionQuerySet(models.QuerySet):
+    def de_rutas(self, *rutas):
+        """Agrupaciones que aparecen en alguna de las rutas (ancestros incluidos)."""
+        return self.filter(pk__in={pk for ruta in rutas if ruta for pk in ids_de_ruta(ruta)})
+
+    def recalcular_agregados(self):
+        """
+        Recalcula los agregados cacheados del subárbol de cada agrupación con
+        UN solo UPDATE (subconsultas por prefijo de ruta). Devuelve el número
+        de agrupaciones actualizadas.
+        """
+        # riego depende de cuarteles: se resuelve el modelo en tiempo de ejecución
+        ControlRiego = apps.get_model('riego', 'ControlRiego')
+        cuarteles = Cuartel.objects.filter(ruta_agrupacion__startswith=OuterRef('ruta'))
+        riegos = ControlRiego.objects.filter(
+            estado=ControlRiego.EstadoRiego.REALIZADO, cuartel__ruta_agrupacion__startswith=OuterRef('ruta')
+        ).annotate(volumen=Coalesce('volumen_medido_m3', 'volumen_total_m3'))  # El medido, si lo hay
+        entero = IntegerField()
+        decimal = DecimalField(max_digits=14, decimal_places=2)
+        return self.update(
+            cantidad_cuarteles=_suma_subarbol(cuarteles, 'id', entero, funcion='COUNT'),
+            area_hectareas=_suma_subarbol(cuarteles, 'area_hectareas', decimal),
+            plantas_totales=_suma_subarbol(cuarteles, 'plantas_totales', entero),
+            plantas_vivas=_suma_subarbol(cuarteles, 'plantas_vivas', entero),
+            plantas_muertas=_suma_subarbol(cuarteles, 'plantas_muertas', entero),
+            volumen_agua_m3=_suma_subarbol(riegos, 'volumen', decimal),
+            agregados_actualizados_en=timezone.now(),
+        )
+
+
+class Agrupacion(models.Model):
+    """
+    Fundo o sector. 'ruta' es la ruta materializada ('/<fundo>/<sector>/'),
+    copiada también en cada cuartel ('Cuartel.ruta_agrupacion'): el subárbol
+    completo es un filtro por prefijo sobre una columna indexada.
+    """
+    TIPO_CHOICES = [('fundo', 'Fundo'), ('sector', 'Sector')]
+
+    nombre = models.CharField(max_length=100, verbose_name="Nombre")
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, default='sector', verbose_name="Tipo")
+    padre = models.ForeignKey(
+        'self', on_delete=models.PROTECT, null=True, blank=True,
+        related_name='hijos', verbose_name="Pertenece a"
+    )
+    ruta = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    profundidad = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Agregados cacheados del subárbol ('recalcular_agregados'); ver cuarteles/jerarquia.py
+    cantidad_cuarteles = models.PositiveIntegerField(default=0, editable=False, verbose_name="Cuarteles")
+    area_hectareas = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False, verbose_name="Área (ha)")
+    plantas_totales = models.PositiveIntegerField(default=0, editable=False, verbose_name="Plantas Totales")
+    plantas_vivas = models.PositiveIntegerField(default=0, editable=False, verbose_name="Plantas Vivas")
+    plantas_muertas = models.PositiveIntegerField(default=0, editable=False, verbose_name="Plantas Muertas")
+    volumen_agua_m3 = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False, verbose_name="Agua aplicada (m³)")
+    agregados_actualizados_en = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = AgrupacionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Agrupación (Fundo / Sector)"
+        verbose_name_plural = "Agrupaciones (Fundos / Sectores)"
+        ordering = ['ruta']
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.nombre}"
+
+    def clean(self):
+        super().clean()
+        if self.tipo == 'fundo' and self.padre_id:
+            raise ValidationError({'padre': 'Un fundo no puede pertenecer a otra agrupación.'})
+        if self.tipo == 'sector' and not self.padre_id:
+            raise ValidationError({'padre': 'Un sector debe pertenecer a un fundo o a otro sector.'})
+        if self.padre_id and self.pk and self.padre.ruta.startswith(self.ruta):
+            raise ValidationError({'padre': 'Una agrupación no puede quedar dentro de sí misma.'})
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.pk is None:
+                # La ruta lleva el propio id: primero se inserta
+                super().save(*args, **kwargs)
+                args, kwargs = (), {'update_fields': ['ruta', 'profundidad']}
+            ruta_anterior = self.ruta
+            base = self.padre.ruta if self.padre_id else '/'
+            if ruta_anterior and base.startswith(ruta_anterior):
+                raise ValueError('Una agrupación no puede quedar dentro de sí misma.')
+            self.ruta = f'{base}{self.pk}/'
+            self.profundidad = self.ruta.count('/') - 2
+            super().save(*args, **kwargs)
+
+            if ruta_anterior and ruta_anterior != self.ruta:
+                # Se movió: se reescribe el prefijo de todo el subárbol (2 UPDATE)
+                resto = len(ruta_anterior) + 1
+                Agrupacion.objects.filter(ruta__startswith=ruta_anterior).exclude(pk=self.pk).update(
+                    ruta=Concat(Value(self.ruta), Substr('ruta', resto)),
+                    profundidad=F('profundidad') + (self.ruta.count('/') - ruta_anterior.count('/')),
+                )
+                Cuartel.objects.filter(ruta_agrupacion__startswith=ruta_anterior).update(
+                    ruta_agrupacion=Concat(Value(self.ruta), Substr('ruta_agrupacion', resto))
+                )
+
+    def cuarteles_subarbol(self):
+        return Cuartel.objects.en_agrupacion(self)
+
+    def get_porcentaje_supervivencia(self):
+        if self.plantas_totales > 0:
+            return (self.plantas_vivas / self.plantas_totales) * 100
+        return 0
+
 
 class Cuartel(models.Model):
     TIPO_RIEGO_CHOICES = [('goteo', 'Riego por Goteo'), ('aspersion', 'Riego por Aspersión'), ('inundacion', 'Riego por Inundación'), ('microaspersion', 'Microaspersión')]
@@ -19,28 +254,99 @@ class Cuartel(models.Model):
     estado_cultivo = models.CharField(max_length=20, choices=ESTADO_CULTIVO_CHOICES, default='activo', verbose_name="Estado del cultivo")
     area_hectareas = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Área en hectáreas")
     observaciones = models.TextField(blank=True, verbose_name="Observaciones")
+    agrupacion = models.ForeignKey(
+        Agrupacion, on_delete=models.PROTECT, null=True, blank=True,
+        related_name='cuarteles', verbose_name="Fundo / Sector"
+    )
+    # Copia de 'agrupacion.ruta' (se mantiene en save() y al mover una agrupación)
+    ruta_agrupacion = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
+    # Geometría opcional: GeoJSON Polygon/MultiPolygon en WGS84 ([lon, lat]).
+    # Centroide y bbox se derivan al guardar (ver cuarteles/geo.py y cuarteles/mapa.py).
+    geometria = models.JSONField(null=True, blank=True, verbose_name="Geometría (GeoJSON)")
+    centroide_lon = models.FloatField(null=True, blank=True, editable=False)
+    centroide_lat = models.FloatField(null=True, blank=True, editable=False)
+    bbox_min_lon = models.FloatField(null=True, blank=True, editable=False)
+    bbox_min_lat = models.FloatField(null=True, blank=True, editable=False)
+    bbox_max_lon = models.FloatField(null=True, blank=True, editable=False)
+    bbox_max_lat = models.FloatField(null=True, blank=True, editable=False)
+    # Totales cacheados de las hileras: se recalculan una vez por seguimiento
+    # o edición de hileras ('recalcular_conteos'; al confirmar si se guarda una
+    # Hilera suelta, ver 'conteos_por_hilera'); ver 'verificar_conteos_cuarteles'.
+    plantas_totales = models.PositiveIntegerField(default=0, editable=False, verbose_name="Plantas Totales")
+    plantas_vivas = models.PositiveIntegerField(default=0, editable=False, verbose_name="Plantas Vivas")
+    plantas_muertas = models.PositiveIntegerField(default=0, editable=False, verbose_name="Plantas Muertas")
     creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, related_name='cuarteles_creados')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
 
+    objects = CuartelQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Cuartel"
         verbose_name_plural = "Cuarteles"
         ordering = ['numero']
+        indexes = [
+            models.Index(fields=['bbox_min_lon', 'bbox_max_lon'], name='cuartel_bbox_lon_idx'),
+            models.Index(fields=['bbox_min_lat', 'bbox_max_lat'], name='cuartel_bbox_lat_idx'),
+        ]
 
     def __str__(self):
         return f"Cuartel {self.numero} - {self.nombre}"
 
+    def clean(self):
+        super().clean()
+        if self.geometria:
+            try:
+                self.geometria = normalizar_geometria(self.geometria)
+            except GeometriaInvalida as e:
+                raise ValidationError({'geometria': str(e)})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        cuartel = super().from_db(db, field_names, values)
+        # Área leída: al guardar se sabe si cambió (dosis de las aplicaciones, ver aplicaciones/signals.py)
+        cuartel._area_leida = cuartel.__dict__.get('area_hectareas')
+        return cuartel
+
+    def save(self, *args, **kwargs):
+        self.actualizar_datos_geometria()
+        ruta = self.agrupacion.ruta if self.agrupacion_id else ''
+        # Ruta vieja y nueva: las agrupaciones de ambas recalculan sus agregados
+        self._rutas_afectadas = {self.ruta_agrupacion, ruta}
+        self.ruta_agrupacion = ruta
+        super().save(*args, **kwargs)
+
+    def actualizar_datos_geometria(self):
+        """Deriva centroide y bbox de 'geometria' (se espera ya normalizada)."""
+        if self.geometria:
+            self.centroide_lon, self.centroide_lat = centroide_geometria(self.geometria)
+            self.bbox_min_lon, self.bbox_min_lat, self.bbox_max_lon, self.bbox_max_lat = bbox_geometria(self.geometria)
+        else:
+            self.centroide_lon = self.centroide_lat = None
+            self.bbox_min_lon = self.bbox_min_lat = self.bbox_max_lon = self.bbox_max_lat = None
+
+    # Si el cuartel viene de 'Cuartel.objects.with_survival()' se usan
+    # las anotaciones (exactas); si no, las columnas cacheadas.
     def get_total_plantas(self):
-        return self.hileras.aggregate(total=Sum('plantas_totales_iniciales'))['total'] or 0
+        if hasattr(self, 'sup_total'):
+            return self.sup_total
+        return self.plantas_totales
 
     def get_plantas_vivas(self):
-        return self.hileras.aggregate(total=Sum('plantas_vivas_actuales'))['total'] or 0
+        if hasattr(self, 'sup_vivas'):
+            return self.sup_vivas
+        return self.plantas_vivas
 
     def get_plantas_muertas(self):
-        return self.hileras.aggregate(total=Sum('plantas_muertas_actuales'))['total'] or 0
+        if hasattr(self, 'sup_muertas'):
+            return self.sup_muertas
+        return self.plantas_muertas
 
     def get_porcentaje_supervivencia(self):
+        if hasattr(self, 'sup_porcentaje'):
+            return self.sup_porcentaje
+        if hasattr(self, 'porcentaje_supervivencia'):
+            return self.porcentaje_supervivencia
         total = self.get_total_plantas()
         vivas = self.get_plantas_vivas()
         if total > 0:
@@ -53,6 +359,10 @@ class Hilera(models.Model):
     plantas_totales_iniciales = models.PositiveIntegerField(default=0, verbose_name="Plantas Totales (Inicial)")
     plantas_vivas_actuales = models.PositiveIntegerField(default=0, verbose_name="Plantas Vivas (Actual)")
     plantas_muertas_actuales = models.PositiveIntegerField(default=0, verbose_name="Plantas Muertas (Actual)")
+    # Momento del conteo vigente (last-write-wins de la sincronización offline)
+    fecha_conteo = models.DateTimeField(null=True, blank=True, verbose_name="Fecha del Conteo")
+    # Para los deltas de sincronización (bulk_update debe incluirlo a mano)
+    modificado_en = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Hilera"
@@ -88,12 +398,51 @@ class RegistroHilera(models.Model):
     plantas_muertas_registradas = models.PositiveIntegerField(verbose_name="Plantas Muertas Registradas", default=0)
     
     observaciones_hilera = models.TextField(blank=True, verbose_name="Observaciones de la Hilera")
+    # Cuándo se contó en terreno (puede ser anterior a la sincronización)
+    contado_en = models.DateTimeField(null=True, blank=True, verbose_name="Contado en")
 
     class Meta:
         verbose_name = "Registro de Hilera"
         verbose_name_plural = "Registros de Hileras"
         ordering = ['hilera__numero_hilera']
 
+class SincronizacionSeguimiento(models.Model):
+    """Clave de idempotencia de un seguimiento recibido desde una tablet."""
+    clave = models.CharField(max_length=64, unique=True, verbose_name="Clave de idempotencia")
+    seguimiento = models.ForeignKey(SeguimientoCuartel, on_delete=models.CASCADE, related_name='sincronizaciones')
+    dispositivo = models.CharField(max_length=100, blank=True, verbose_name="Dispositivo")
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True)
+    fecha_recepcion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Sincronización de Seguimiento"
+        verbose_name_plural = "Sincronizaciones de Seguimientos"
+        ordering = ['-fecha_recepcion']
+
+    def __str__(self):
+        return f"{self.clave} ({self.dispositivo or 'sin dispositivo'})"
+
+class DispositivoSincronizacion(models.Model):
+    """
+    Tablet que sincroniza seguimientos (cuarteles/api/sincronizacion/) con
+    un token propio, sin sesión. Lo registrado queda a nombre de 'usuario'.
+    """
+    codigo = models.CharField(max_length=50, unique=True, verbose_name="Código")
+    nombre = models.CharField(max_length=100, blank=True, verbose_name="Nombre")
+    usuario = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Usuario responsable")
+    activo = models.BooleanField(default=True, verbose_name="Activo")
+    # SHA-256 del token (el token solo se muestra al generarlo)
+    token_hash = models.CharField(max_length=64, blank=True, editable=False)
+    ultima_sincronizacion = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "Dispositivo de Sincronización"
+        verbose_name_plural = "Dispositivos de Sincronización"
+        ordering = ['codigo']
+
+    def __str__(self):
+        return f"{self.codigo} ({self.nombre})" if self.nombre else self.codigo
+
 # === SEÑAL CORREGIDA ===
 @receiver(post_save, sender=RegistroHilera)
 def actualizar_conteo_hilera(sender, instance, created, **kwargs):
@@ -109,5 +458,42 @@ def actualizar_conteo_hilera(sender, instance, created, **kwargs):
         # a los nuevos valores que se registraron.
         hilera.plantas_vivas_actuales = instance.plantas_vivas_registradas
         hilera.plantas_muertas_actuales = instance.plantas_muertas_registradas
+        hilera.fecha_conteo = instance.contado_en or timezone.now()
             
-        hilera.save()
\ No newline at end of file
+        hilera.save()
+        # (el post_save de la hilera recalcula los totales del cuartel)
+
+
+class _RecalculoConteos:
+    """
+    Callback de on_commit que recalcula los totales cacheados de varios
+    cuarteles con UN solo UPDATE (no uno por hilera guardada).
+    """
+    def __init__(self, cuartel_id):
+        self.cuartel_ids = {cuartel_id}
+        self.ejecutado = False
+
+    def __call__(self):
+        self.ejecutado = True
+        Cuartel.objects.filter(pk__in=self.cuartel_ids).recalcular_conteos()
+
+
+def _recalcular_conteos_al_confirmar(cuartel_id):
+    conexion = transaction.get_connection()
+    # Si la transacción ya tiene un recálculo pendiente, se suma a ese
+    for _, callback, _ in getattr(conexion, 'run_on_commit', []):
+        if isinstance(callback, _RecalculoConteos) and not callback.ejecutado:
+            callback.cuartel_ids.add(cuartel_id)
+            return
+    transaction.on_commit(_RecalculoConteos(cuartel_id))
+
+
+@receiver([post_save, post_delete], sender=Hilera)
+def conteos_por_hilera(sender, instance, **kwargs):
+    """
+    Cualquier escritura de una hilera (vista, admin, registro de seguimiento)
+    deja al día las columnas cacheadas del cuartel al confirmar.
+    Las rutas en bloque (bulk_create / bulk_update) llaman a
+    'recalcular_conteos' por su cuenta.
+    """
+    _recalcular_conteos_al_confirmar(instance.cuartel_id)
@@ -0,0 +1,59 @@
+# cuarteles/seguimiento.py
+"""
+Registro masivo de un seguimiento por hileras.
+
+'registro.save()' + la señal 'actualizar_conteo_hilera' cuestan 2 escrituras
+por hilera. Aquí, para todo el seguimiento:
+- 1 INSERT del SeguimientoCuartel
+- bulk_create de los RegistroHilera (no dispara post_save)
+- 1 UPDATE de las hileras (bulk_update)
+- 1 UPDATE de los totales cacheados del cuartel
+
+La señal sigue vigente para los registros guardados de a uno
+(admin, shell, etc.).
+"""
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cuartel, Hilera, RegistroHilera
+
+CAMPOS_CONTEO = ['plantas_vivas_actuales', 'plantas_muertas_actuales', 'fecha_conteo', 'modificado_en']
+
+
+def registrar_seguimiento_masivo(cuartel, form_seguimiento, formset, responsable_id=None):
+    """
+    Valida el formulario y el formset; si son válidos guarda el seguimiento
+    y devuelve el SeguimientoCuartel creado. Si no, devuelve None (los
+    errores quedan en los formularios, como siempre).
+    Se registran todas las hileras enviadas, cambien o no: el seguimiento
+    es un recuento completo y queda en el historial (analítica).
+    """
+    if not (form_seguimiento.is_valid() and formset.is_valid()):
+        return None
+
+    with transaction.atomic():
+        seguimiento = form_seguimiento.save(commit=False)
+        seguimiento.cuartel = cuartel
+        seguimiento.responsable_id = responsable_id
+        seguimiento.save()
+
+        registros = formset.save(commit=False)
+        ahora = timezone.now()
+        hileras = []
+        for registro in registros:
+            registro.seguimiento_batch = seguimiento
+            # Misma regla que la señal: el registro FIJA el conteo de la hilera
+            hilera = registro.hilera
+            hilera.plantas_vivas_actuales = registro.plantas_vivas_registradas
+            hilera.plantas_muertas_actuales = registro.plantas_muertas_registradas
+            # bulk_update no aplica 'auto_now': se fija a mano
+            hilera.fecha_conteo = hilera.modificado_en = ahora
+            registro.contado_en = ahora
+            hileras.append(hilera)
+
+        RegistroHilera.objects.bulk_create(registros)
+        Hilera.objects.bulk_update(hileras, CAMPOS_CONTEO)
+        Cuartel.objects.filter(pk=cuartel.pk).recalcular_conteos()
+
+    return seguimiento
@@ -0,0 +1,297 @@
+# cuarteles/sincronizacion.py
+"""
+Sincronización de seguimientos capturados offline (tablets en terreno).
+
+Entrada (POST JSON, header 'Authorization: Token <token>'):
+    {
+      "dispositivo": "tablet-07",
+      "token": "<token de la sincronización anterior o null>",
+      "seguimientos": [
+        {
+          "clave": "<uuid generado en la tablet>",
+          "cuartel_id": 3,
+          "fecha_seguimiento": "2025-10-01",
+          "observaciones": "",
+          "registros": [
+            {"hilera_id": 10, "vivas": 95, "muertas": 5,
+             "observaciones": "", "contado_en": "2025-10-01T10:22:00-03:00"}
+          ]
+        }
+      ]
+    }
+
+- 'dispositivo' es el código de un DispositivoSincronizacion activo y el
+  token del header es el suyo (se genera en el admin). Lo recibido queda a
+  nombre del usuario responsable del dispositivo.
+- 'clave' hace idempotente cada seguimiento: si ya se recibió, se
+  informa como 'duplicado' y no se vuelve a escribir.
+- Por hilera gana el conteo más reciente ('contado_en'): el historial
+  (RegistroHilera) se guarda siempre, pero los contadores actuales de la
+  hilera solo se pisan con un conteo igual o más nuevo.
+- Todo el lote se escribe en UNA transacción con escrituras en bloque.
+
+Salida: resultado por seguimiento + los cambios del servidor desde
+'token' y un token nuevo para la próxima sincronización.
+"""
+
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Cuartel, Hilera, SeguimientoCuartel, RegistroHilera, SincronizacionSeguimiento
+
+MAX_SEGUIMIENTOS_POR_LOTE = 500
+MAX_REGISTROS_POR_LOTE = 20000
+# Los cambios se piden con un margen hacia atrás: una transacción que empezó
+# antes del token puede confirmarse después. Repetir filas es inofensivo.
+MARGEN_TOKEN = timedelta(minutes=5)
+SAL_TOKEN = 'cuarteles.sincronizacion'
+
+COLUMNAS_HILERA = [
+    'id', 'cuartel_id', 'numero_hilera', 'plantas_totales_iniciales',
+    'plantas_vivas_actuales', 'plantas_muertas_actuales', 'fecha_conteo',
+]
+
+
+class ErrorSincronizacion(ValueError):
+    """Lote mal formado (se responde 400 sin escribir nada)."""
+
+
+# ---------------------------------------------------------------
+# TOKEN
+# ---------------------------------------------------------------
+def crear_token(momento):
+    return signing.dumps({'t': momento.isoformat()}, salt=SAL_TOKEN, compress=True)
+
+
+def leer_token(token):
+    """Momento codificado en el token (None = sin token: se envía todo)."""
+    if not token:
+        return None
+    try:
+        return datetime.fromisoformat(signing.loads(token, salt=SAL_TOKEN)['t'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        raise ErrorSincronizacion('Token de sincronización inválido.')
+
+
+# ---------------------------------------------------------------
+# VALIDACIÓN
+# ---------------------------------------------------------------
+def _entero_no_negativo(valor, campo):
+    if isinstance(valor, bool) or not isinstance(valor, int) or valor < 0:
+        raise ValueError(f"'{campo}' debe ser un entero mayor o igual a 0.")
+    return valor
+
+
+def _validar_seguimiento(item, cuarteles, hileras):
+    """Devuelve el seguimiento normalizado o lanza ValueError con el motivo."""
+    cuartel_id = item.get('cuartel_id')
+    if not isinstance(cuartel_id, int) or cuartel_id not in cuarteles:
+        raise ValueError(f'El cuartel {cuartel_id} no existe.')
+
+    fecha = parse_date(str(item.get('fecha_seguimiento') or ''))
+    if fecha is None:
+        raise ValueError("'fecha_seguimiento' debe tener formato AAAA-MM-DD.")
+    # Conteos sin hora: se asumen al inicio del día del seguimiento
+    contado_por_defecto = timezone.make_aware(datetime.combine(fecha, time.min))
+
+    registros = item.get('registros')
+    if not isinstance(registros, list) or not registros:
+        raise ValueError("'registros' debe ser una lista no vacía.")
+
+    normalizados = []
+    for r in registros:
+        if not isinstance(r, dict):
+            raise ValueError('Cada registro debe ser un objeto.')
+        hilera_id = r.get('hilera_id')
+        hilera = hileras.get(hilera_id) if isinstance(hilera_id, int) else None
+        if hilera is None or hilera.cuartel_id != cuartel_id:
+            raise ValueError(f"La hilera {r.get('hilera_id')} no pertenece al cuartel {cuartel_id}.")
+        contado_en = contado_por_defecto
+        if r.get('contado_en'):
+            contado_en = parse_datetime(str(r['contado_en']))
+            if contado_en is None:
+                raise ValueError("'contado_en' debe ser una fecha y hora ISO 8601.")
+            if timezone.is_naive(contado_en):
+                contado_en = timezone.make_aware(contado_en)
+        normalizados.append({
+            'hilera': hilera,
+            'vivas': _entero_no_negativo(r.get('vivas'), 'vivas'),
+            'muertas': _entero_no_negativo(r.get('muertas'), 'muertas'),
+            'observaciones': str(r.get('observaciones') or ''),
+            'contado_en': contado_en,
+        })
+
+    return {
+        'clave': item['clave'],
+        'cuartel_id': cuartel_id,
+        'fecha': fecha,
+        'observaciones': str(item.get('observaciones') or ''),
+        'registros': normalizados,
+    }
+
+
+# ---------------------------------------------------------------
+# APLICAR UN LOTE
+# ---------------------------------------------------------------
+def aplicar_lote(seguimientos, usuario_id=None, dispositivo=''):
+    """
+    Aplica los seguimientos válidos del lote en una transacción.
+    Devuelve {'aplicados': [...], 'duplicados': [...], 'rechazados': [...]}.
+    Un seguimiento inválido se rechaza solo; el resto del lote se aplica.
+    """
+    if not isinstance(seguimientos, list):
+        raise ErrorSincronizacion("'seguimientos' debe ser una lista.")
+    if len(seguimientos) > MAX_SEGUIMIENTOS_POR_LOTE:
+        raise ErrorSincronizacion(f'Máximo {MAX_SEGUIMIENTOS_POR_LOTE} seguimientos por lote.')
+    total_registros = sum(
+        len(s['registros']) for s in seguimientos
+        if isinstance(s, dict) and isinstance(s.get('registros'), list)
+    )
+    if total_registros > MAX_REGISTROS_POR_LOTE:
+        raise ErrorSincronizacion(f'Máximo {MAX_REGISTROS_POR_LOTE} registros por lote.')
+
+    resultado = {'aplicados': [], 'duplicados': [], 'rechazados': []}
+
+    # Claves: sin repetir dentro del lote ni contra lo ya recibido
+    vistos, pendientes = set(), []
+    for item in seguimientos:
+        clave = item.get('clave') if isinstance(item, dict) else None
+        if not isinstance(clave, str) or not clave.strip() or len(clave) > 64:
+            resultado['rechazados'].append({'clave': clave, 'error': "'clave' es obligatoria (máx. 64 caracteres)."})
+        elif clave in vistos:
+            resultado['duplicados'].append({'clave': clave, 'seguimiento_id': None})
+        else:
+            vistos.add(clave)
+            pendientes.append(item)
+
+    ya_recibidas = dict(
+        SincronizacionSeguimiento.objects.filter(clave__in=vistos).values_list('clave', 'seguimiento_id')
+    )
+    for clave, seguimiento_id in ya_recibidas.items():
+        resultado['duplicados'].append({'clave': clave, 'seguimiento_id': seguimiento_id})
+    pendientes = [item for item in pendientes if item['clave'] not in ya_recibidas]
+    if not pendientes:
+        return resultado
+
+    # Solo ids enteros: lo demás lo rechaza la validación de cada seguimiento
+    cuartel_ids = {item.get('cuartel_id') for item in pendientes if isinstance(item.get('cuartel_id'), int)}
+    hilera_ids = {
+        r.get('hilera_id') for item in pendientes if isinstance(item.get('registros'), list)
+        for r in item['registros'] if isinstance(r, dict) and isinstance(r.get('hilera_id'), int)
+    }
+    cuarteles = set(Cuartel.objects.filter(id__in=cuartel_ids).values_list('id', flat=True))
+
+    with transaction.atomic():
+        # Bloquear las hileras del lote (PostgreSQL) para que el LWW no compita con otro lote
+        hileras = Hilera.objects.select_for_update().in_bulk(hilera_ids)
+
+        validos = []
+        for item in pendientes:
+            try:
+                validos.append(_validar_seguimiento(item, cuarteles, hileras))
+            except ValueError as e:
+                resultado['rechazados'].append({'clave': item['clave'], 'error': str(e)})
+        if not validos:
+            return resultado
+
+        nuevos = SeguimientoCuartel.objects.bulk_create([
+            SeguimientoCuartel(
+                cuartel_id=v['cuartel_id'], fecha_seguimiento=v['fecha'],
+                observaciones=v['observaciones'], responsable_id=usuario_id,
+            )
+            for v in validos
+        ])
+
+        ahora = timezone.now()
+        registros, ganadores = [], {}
+        for v, seguimiento in zip(validos, nuevos):
+            for r in v['registros']:
+                registros.append(RegistroHilera(
+                    seguimiento_batch=seguimiento, hilera=r['hilera'],
+                    plantas_vivas_registradas=r['vivas'], plantas_muertas_registradas=r['muertas'],
+                    observaciones_hilera=r['observaciones'], contado_en=r['contado_en'],
+                ))
+                # Last-write-wins: el conteo más nuevo del lote para cada hilera...
+                actual = ganadores.get(r['hilera'].pk)
+                if actual is None or r['contado_en'] >= actual[1]['contado_en']:
+                    ganadores[r['hilera'].pk] = (v['clave'], r)
+
+        # ...y solo si es igual o más nuevo que el vigente en el servidor
+        actualizadas, hileras_por_clave = [], Counter()
+        for clave, r in ganadores.values():
+            hilera = r['hilera']
+            if hilera.fecha_conteo and r['contado_en'] < hilera.fecha_conteo:
+                continue
+            hilera.plantas_vivas_actuales = r['vivas']
+            hilera.plantas_muertas_actuales = r['muertas']
+            hilera.fecha_conteo = r['contado_en']
+            hilera.modificado_en = ahora  # bulk_update no aplica 'auto_now'
+            actualizadas.append(hilera)
+            hileras_por_clave[clave] += 1
+
+        RegistroHilera.objects.bulk_create(registros)
+        Hilera.objects.bulk_update(
+            actualizadas,
+            ['plantas_vivas_actuales', 'plantas_muertas_actuales', 'fecha_conteo', 'modificado_en']
+        )
+        SincronizacionSeguimiento.objects.bulk_create([
+            SincronizacionSeguimiento(clave=v['clave'], seguimiento=s, dispositivo=dispositivo[:100], usuario_id=usuario_id)
+            for v, s in zip(validos, nuevos)
+        ])
+
+        afectados = {v['cuartel_id'] for v in validos}
+        Cuartel.objects.filter(pk__in=afectados).recalcular_conteos()
+
+    for v, seguimiento in zip(validos, nuevos):
+        resultado['aplicados'].append({
+            'clave': v['clave'],
+            'seguimiento_id': seguimiento.pk,
+            'registros': len(v['registros']),
+            # Hileras cuyo conteo vigente quedó con este seguimiento (LWW)
+            'hileras_actualizadas': hileras_por_clave[v['clave']],
+        })
+    return resultado
+
+
+# ---------------------------------------------------------------
+# CAMBIOS DEL SERVIDOR DESDE UN TOKEN
+# ---------------------------------------------------------------
+def cambios_desde(token):
+    """
+    Delta compacto para la tablet:
+    - 'cuarteles': cuarteles creados/editados desde el token, con la lista
+      completa de sus hileras (para descartar las eliminadas).
+    - 'hileras': filas [COLUMNAS_HILERA] modificadas desde el token.
+    - 'cuartel_ids': ids vigentes (para descartar cuarteles eliminados).
+    """
+    desde = leer_token(token)
+    ahora = timezone.now()
+
+    cuarteles = Cuartel.objects.all()
+    hileras = Hilera.objects.all()
+    if desde is not None:
+        cuarteles = cuarteles.filter(fecha_actualizacion__gte=desde - MARGEN_TOKEN)
+        hileras = hileras.filter(modificado_en__gte=desde - MARGEN_TOKEN)
+
+    cuarteles = list(cuarteles.order_by('id').values(
+        'id', 'numero', 'nombre', 'variedad', 'cantidad_hileras', 'estado_cultivo'
+    ))
+    por_cuartel = {c['id']: [] for c in cuarteles}
+    for cuartel_id, hilera_id in Hilera.objects.filter(cuartel_id__in=por_cuartel).order_by('numero_hilera').values_list('cuartel_id', 'id'):
+        por_cuartel[cuartel_id].append(hilera_id)
+    for c in cuarteles:
+        c['hilera_ids'] = por_cuartel[c['id']]
+
+    return {
+        'token': crear_token(ahora),
+        'completo': desde is None,
+        'cuarteles': cuarteles,
+        'cuartel_ids': list(Cuartel.objects.order_by('id').values_list('id', flat=True)),
+        'columnas_hilera': COLUMNAS_HILERA,
+        'hileras': [list(fila) for fila in hileras.order_by('id').values_list(*COLUMNAS_HILERA)],
+    }
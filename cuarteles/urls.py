@@ -6,7 +6,9 @@ app_name = 'cuarteles'
 urlpatterns = [
     path('', views.lista_cuarteles, name='lista_cuarteles'),
     path('dashboard/', views.dashboard_cuarteles, name='dashboard_cuarteles'),
+    path('mapa/', views.mapa_cuarteles, name='mapa_cuarteles'),
     path('crear/', views.crear_cuartel, name='crear_cuartel'),
+    path('importar-conteos/', views.importar_conteos, name='importar_conteos'),
     path('<int:cuartel_id>/', views.detalle_cuartel, name='detalle_cuartel'),
     path('<int:cuartel_id>/editar/', views.editar_cuartel, name='editar_cuartel'),
     path('<int:cuartel_id>/eliminar/', views.eliminar_cuartel, name='eliminar_cuartel'),
@@ -15,4 +17,8 @@ urlpatterns = [
     path('<int:cuartel_id>/seguimiento/', views.registrar_seguimiento, name='registrar_seguimiento'),
     
     path('api/estadisticas/', views.api_estadisticas_cuarteles, name='api_estadisticas'),
+    path('api/v1/estadisticas/', views.api_estadisticas_cuarteles, name='api_estadisticas_v1'),
+    path('api/mapa/', views.api_mapa_cuarteles, name='api_mapa'),
+    path('api/mapa/ubicar/', views.api_ubicar_cuartel, name='api_ubicar_cuartel'),
+    path('api/sincronizacion/', views.api_sincronizacion, name='api_sincronizacion'),
 ]
\ No newline at end of file
@@ -4,15 +4,25 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.db.models import Count
 from django.utils import timezone
-from .models import Cuartel , Hilera, SeguimientoCuartel, RegistroHilera
-from .forms import CuartelForm, SeguimientoCuartelForm, RegistroHileraForm, HileraFormSet
-from django.forms import inlineformset_factory 
-from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from AgroControl.tokens import autenticar, token_de_cabecera
+from .models import Cuartel , Hilera, SeguimientoCuartel, RegistroHilera, DispositivoSincronizacion
+from .forms import CuartelForm, SeguimientoCuartelForm, HileraFormSet, ImportarConteosForm, registro_hilera_formset
+from .seguimiento import registrar_seguimiento_masivo
+from .importacion import importar_conteos as importar_conteos_planilla, ErrorImportacion
+from .analitica import analitica_cuartel
+from .mapa import indice_cuarteles, capa_mapa, recortar_capa, ZOOM_MIN, ZOOM_MAX, MAX_CERCANOS
+from .estadisticas import estadisticas_cuarteles, etag_estadisticas, ultima_modificacion
+from .sincronizacion import aplicar_lote, cambios_desde, ErrorSincronizacion
+from django.db import transaction, IntegrityError
+import json
 
 @login_required 
 def lista_cuarteles(request):
-    # (Sin cambios, esta vista está bien)
-    cuarteles = Cuartel.objects.all().order_by('numero')
+    # Supervivencia anotada en la misma consulta (antes: 2 aggregates por fila)
+    cuarteles = Cuartel.objects.with_survival().order_by('numero')
     tipo_riego = request.GET.get('tipo_riego')
     estado = request.GET.get('estado')
     if tipo_riego:
@@ -36,7 +46,8 @@ def lista_cuarteles(request):
 def detalle_cuartel(request, cuartel_id):
     # --- VISTA SIMPLIFICADA ---
     # (Se eliminó toda la lógica de formularios POST)
-    cuartel = get_object_or_404(Cuartel.objects.prefetch_related('hileras'), id=cuartel_id)
+    # Totales y % de supervivencia en la misma consulta del cuartel
+    cuartel = get_object_or_404(Cuartel.objects.with_survival().prefetch_related('hileras'), id=cuartel_id)
     
     # Obtenemos los últimos 5 batches de seguimiento para mostrar el historial
     seguimientos_batch = cuartel.seguimientos_batch.all().order_by('-fecha_seguimiento')[:5]
@@ -45,6 +56,8 @@ def detalle_cuartel(request, cuartel_id):
         'cuartel': cuartel,
         'hileras': cuartel.hileras.all(),
         'seguimientos_batch': seguimientos_batch,
+        # Mortalidad por hilera en el tiempo (cacheada por cuartel)
+        'analitica': analitica_cuartel(cuartel.id),
         'page_title': f'Detalle Cuartel: {cuartel.nombre}'
     }
     return render(request, 'cuarteles/detalle_cuartel.html', context)
@@ -57,7 +70,9 @@ def crear_cuartel(request):
         if form.is_valid():
             cuartel = form.save(commit=False)
             cuartel.creado_por_id = request.session.get('usuario_id')
-            cuartel = form.save() 
+            with transaction.atomic():
+                cuartel = form.save()
+                Cuartel.objects.filter(pk=cuartel.pk).recalcular_conteos()
             messages.success(request, f'Cuartel {cuartel.numero} y sus {cuartel.cantidad_hileras} hileras han sido creados.')
             messages.info(request, 'Ahora puede definir las plantas iniciales para cada hilera.')
             return redirect('cuarteles:editar_cuartel', cuartel_id=cuartel.id)
@@ -84,12 +99,19 @@ def editar_cuartel(request, cuartel_id):
                 # === CORRECCIÓN BUG 1 (SUPERVIVENCIA 0%) ===
                 hileras = formset_hileras.save(commit=False)
                 for hilera_form_instance in hileras:
+                    # Hilera borrada al reducir 'cantidad_hileras': no recrearla
+                    if hilera_form_instance.pk in form.hileras_eliminadas:
+                        continue
                     # Al guardar las plantas iniciales, ASUMIMOS que todas están vivas.
                     hilera_form_instance.plantas_vivas_actuales = hilera_form_instance.plantas_totales_iniciales
                     hilera_form_instance.plantas_muertas_actuales = 0
                     hilera_form_instance.save()
                 # ============================================
 
+                # Hileras nuevas (bulk_create del form) no emiten post_save:
+                # totales cacheados recalculados aquí, una vez por guardado
+                Cuartel.objects.filter(pk=cuartel.pk).recalcular_conteos()
+
             messages.success(request, f'Cuartel {cuartel.numero} actualizado exitosamente.')
             return redirect('cuarteles:detalle_cuartel', cuartel_id=cuartel.id)
         else:
@@ -125,20 +147,14 @@ def eliminar_cuartel(request, cuartel_id):
 
 @admin_required
 def registrar_seguimiento(request, cuartel_id):
-    cuartel = get_object_or_404(Cuartel.objects.prefetch_related('hileras'), id=cuartel_id)
-    hileras_del_cuartel = cuartel.hileras.all()
-    numero_de_hileras = hileras_del_cuartel.count()
+    # Totales y % de supervivencia en la misma consulta del cuartel
+    cuartel = get_object_or_404(Cuartel.objects.with_survival().prefetch_related('hileras'), id=cuartel_id)
+    hileras_del_cuartel = list(cuartel.hileras.all())
+    numero_de_hileras = len(hileras_del_cuartel)
 
     # --- MODIFICACIÓN 3: Creamos la *clase* del formset dinámicamente ---
     # El 'extra' va aquí, en la fábrica, no en el constructor.
-    RegistroHileraFormSet_Clase = inlineformset_factory(
-        SeguimientoCuartel,
-        RegistroHilera,
-        form=RegistroHileraForm,
-        fields=['hilera', 'plantas_vivas_registradas', 'plantas_muertas_registradas', 'observaciones_hilera'],
-        extra=numero_de_hileras, # <-- Esta es la corrección
-        can_delete=False
-    )
+    RegistroHileraFormSet_Clase = registro_hilera_formset(extra=numero_de_hileras)
 
     # Tu lógica 'initial' está perfecta
     initial_data_para_seguimiento = [
@@ -156,29 +172,23 @@ def registrar_seguimiento(request, cuartel_id):
         formset_registro_hileras = RegistroHileraFormSet_Clase(
             request.POST,
             instance=SeguimientoCuartel(), # Instancia vacía para 'create'
-            queryset=RegistroHilera.objects.none()
+            queryset=RegistroHilera.objects.none(),
+            hileras=hileras_del_cuartel
         )
         
-        if form_seguimiento.is_valid() and formset_registro_hileras.is_valid():
-            try:
-                with transaction.atomic():
-                    seguimiento_batch = form_seguimiento.save(commit=False)
-                    seguimiento_batch.cuartel = cuartel
-                    seguimiento_batch.responsable_id = request.session.get('usuario_id')
-                    seguimiento_batch.save()
-
-                    registros = formset_registro_hileras.save(commit=False)
-                    for registro in registros:
-                        registro.seguimiento_batch = seguimiento_batch
-                        registro.save() 
-                        # La señal 'post_save' se dispara aquí
-
-                    messages.success(request, 'Seguimiento por hileras registrado exitosamente.')
-                    return redirect('cuarteles:detalle_cuartel', cuartel_id=cuartel.id)
-            except Exception as e:
-                messages.error(request, f'Error al guardar el seguimiento: {e}')
-        else:
+        # Validación + registro en bloque (bulk_create / bulk_update),
+        # en vez de un save() y una señal por hilera
+        try:
+            seguimiento_batch = registrar_seguimiento_masivo(
+                cuartel, form_seguimiento, formset_registro_hileras,
+                responsable_id=request.session.get('usuario_id')
+            )
+            if seguimiento_batch:
+                messages.success(request, 'Seguimiento por hileras registrado exitosamente.')
+                return redirect('cuarteles:detalle_cuartel', cuartel_id=cuartel.id)
             messages.error(request, 'Por favor corrija los errores en el formulario.')
+        except Exception as e:
+            messages.error(request, f'Error al guardar el seguimiento: {e}')
     
     else: # Método GET
         form_seguimiento = SeguimientoCuartelForm(initial={'fecha_seguimiento': timezone.now().date()})
@@ -187,7 +197,8 @@ def registrar_seguimiento(request, cuartel_id):
         formset_registro_hileras = RegistroHileraFormSet_Clase(
             instance=SeguimientoCuartel(),
             queryset=RegistroHilera.objects.none(),
-            initial=initial_data_para_seguimiento # <-- 'initial' sí va en el constructor
+            initial=initial_data_para_seguimiento, # <-- 'initial' sí va en el constructor
+            hileras=hileras_del_cuartel
         )
     
     context = {
@@ -198,6 +209,52 @@ def registrar_seguimiento(request, cuartel_id):
     }
     return render(request, 'cuarteles/registrar_seguimiento.html', context)
 
+@admin_required
+def importar_conteos(request):
+    """
+    Conteos de plantas desde una planilla (ver cuarteles/importacion.py).
+    'Vista previa' muestra la diferencia sin escribir; 'Importar' la aplica
+    (todo o nada). El archivo se vuelve a enviar en cada paso.
+    """
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarConteosForm(request.POST, request.FILES)
+        if form.is_valid():
+            simular = request.POST.get('accion') != 'importar'
+            try:
+                resultado = importar_conteos_planilla(
+                    form.cleaned_data['archivo'], form.cleaned_data['archivo'].name,
+                    modo=form.cleaned_data['modo'],
+                    fecha=form.cleaned_data['fecha_seguimiento'],
+                    responsable_id=request.session.get('usuario_id'),
+                    observaciones=form.cleaned_data['observaciones'],
+                    simular=simular,
+                )
+            except ErrorImportacion as e:
+                messages.error(request, str(e))
+            else:
+                if resultado['aplicado']:
+                    messages.success(
+                        request,
+                        f"Importación aplicada: {len(resultado['cambios'])} hileras actualizadas "
+                        f"en {resultado['cuarteles']} cuarteles."
+                    )
+                    return redirect('cuarteles:lista_cuarteles')
+                if not simular and resultado['errores']:
+                    messages.error(request, 'No se importó nada: corrija los errores de la planilla.')
+                elif not simular:
+                    messages.info(request, 'La planilla no trae cambios respecto de los conteos actuales.')
+    else:
+        form = ImportarConteosForm(initial={'fecha_seguimiento': timezone.localdate()})
+
+    context = {
+        'form': form,
+        'resultado': resultado,
+        'page_title': 'Importar Conteos de Plantas'
+    }
+    return render(request, 'cuarteles/importar_conteos.html', context)
+
+
 @admin_required 
 def dashboard_cuarteles(request):
     # (Toda tu lógica de dashboard está bien)
@@ -205,11 +262,8 @@ def dashboard_cuarteles(request):
     cuarteles_activos = Cuartel.objects.filter(estado_cultivo='activo').count()
     riego_stats = Cuartel.objects.values('tipo_riego').annotate(total=Count('id'))
     
-    baja_supervivencia = []
-    # ¡ACTUALIZADO! Usamos el nuevo método get_porcentaje_supervivencia
-    for cuartel in Cuartel.objects.all():
-        if cuartel.get_porcentaje_supervivencia() < 80:
-            baja_supervivencia.append(cuartel)
+    # Filtro de baja supervivencia (< 80%) en SQL, sobre las columnas cacheadas
+    baja_supervivencia = Cuartel.objects.baja_supervivencia(umbral=80)
     
     context = {
         'total_cuarteles': total_cuarteles,
@@ -221,13 +275,145 @@ def dashboard_cuarteles(request):
     return render(request, 'cuarteles/dashboard.html', context)
 
 @admin_required 
+@condition(
+    etag_func=lambda request, *args, **kwargs: etag_estadisticas(request),
+    last_modified_func=lambda request, *args, **kwargs: ultima_modificacion(request),
+)
 def api_estadisticas_cuarteles(request):
-    data = {
-        'total': Cuartel.objects.count(),
-        'activos': Cuartel.objects.filter(estado_cultivo='activo').count(),
-        'por_tipo_riego': list(Cuartel.objects.values('tipo_riego').annotate(total=Count('id'))),
+    """
+    Estadísticas de cuarteles (ver cuarteles/estadisticas.py).
+    Responde 304 si el ETag (versión de los datos) o Last-Modified del
+    cliente siguen vigentes; si no, el payload sale del caché de la versión.
+    """
+    response = JsonResponse(estadisticas_cuarteles(request))
+    # Datos de administración: el navegador puede guardarlos pero debe revalidar siempre
+    patch_cache_control(response, private=True, max_age=0, must_revalidate=True)
+    return response
+
+
+# ---------------------------------------------------------------
+# MAPA DE CUARTELES (ver cuarteles/mapa.py)
+# ---------------------------------------------------------------
+@login_required
+def mapa_cuarteles(request):
+    context = {
+        'total_con_geometria': Cuartel.objects.filter(geometria__isnull=False).count(),
+        'total_cuarteles': Cuartel.objects.count(),
     }
-    return JsonResponse(data)
+    return render(request, 'cuarteles/mapa.html', context)
+
+
+def _leer_bbox(texto):
+    try:
+        valores = [float(v) for v in texto.split(',')]
+    except ValueError:
+        valores = []
+    if len(valores) != 4:
+        raise ValueError("Parámetro 'bbox' inválido (min_lon,min_lat,max_lon,max_lat).")
+    return valores
+
+
+@login_required
+def api_mapa_cuarteles(request):
+    """
+    GeoJSON de los cuarteles simplificado para el zoom del mapa.
+    GET ?zoom=15&bbox=min_lon,min_lat,max_lon,max_lat (bbox opcional)
+    """
+    try:
+        zoom = min(max(int(request.GET.get('zoom', 15)), ZOOM_MIN), ZOOM_MAX)
+    except ValueError:
+        return JsonResponse({'error': "Parámetro 'zoom' inválido."}, status=400)
+    try:
+        caja = _leer_bbox(request.GET['bbox']) if request.GET.get('bbox') else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    capa = capa_mapa(zoom)
+    if caja:
+        capa = recortar_capa(capa, caja)
+    response = JsonResponse(capa)
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+
+@login_required
+def api_ubicar_cuartel(request):
+    """
+    Cuartel que contiene un punto y los más cercanos.
+    GET ?lat=-34.2&lon=-71.5[&cantidad=5][&radio=500]
+    """
+    try:
+        lat, lon = float(request.GET['lat']), float(request.GET['lon'])
+        cantidad = min(max(int(request.GET.get('cantidad', 5)), 1), MAX_CERCANOS)
+        radio = float(request.GET['radio']) if request.GET.get('radio') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Parámetros 'lat' y 'lon' requeridos (y 'cantidad'/'radio' numéricos)."}, status=400)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return JsonResponse({'error': 'Coordenadas fuera de rango.'}, status=400)
+
+    indice = indice_cuarteles()
+    contiene = indice.buscar_punto(lon, lat)
+    cercanos = indice.mas_cercanos(lon, lat, cantidad=cantidad, radio_m=radio)
+    cuarteles = Cuartel.objects.only('id', 'numero', 'nombre').in_bulk(set(contiene) | {pk for pk, _ in cercanos})
+
+    def resumen(pk):
+        c = cuarteles[pk]
+        return {'id': pk, 'numero': c.numero, 'nombre': c.nombre}
+
+    return JsonResponse({
+        'contiene': [resumen(pk) for pk in contiene if pk in cuarteles],
+        'cercanos': [dict(resumen(pk), distancia_m=d) for pk, d in cercanos if pk in cuarteles],
+    })
+
+
+@csrf_exempt
+def api_sincronizacion(request):
+    """
+    Sincronización de tablets (ver cuarteles/sincronizacion.py), sin sesión:
+    header 'Authorization: Token <token del dispositivo>'.
+    GET  ?dispositivo=...&token=...  -> solo los cambios del servidor desde 'token'.
+    POST {dispositivo, token, seguimientos: [...]} -> aplica el lote y
+         devuelve el resultado + los cambios desde 'token'.
+    """
+    if request.method not in ('GET', 'POST'):
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+
+    datos = request.GET
+    if request.method == 'POST':
+        try:
+            datos = json.loads(request.body or b'{}')
+            if not isinstance(datos, dict):
+                raise ErrorSincronizacion('Se esperaba un objeto JSON.')
+        except (ValueError, ErrorSincronizacion) as e:
+            # json.JSONDecodeError también es ValueError
+            return JsonResponse({'error': str(e)}, status=400)
+
+    dispositivo = autenticar(
+        DispositivoSincronizacion.objects.all(), str(datos.get('dispositivo') or ''), token_de_cabecera(request)
+    )
+    if dispositivo is None:
+        return JsonResponse({'error': 'Dispositivo o token inválido.'}, status=401)
+    DispositivoSincronizacion.objects.filter(pk=dispositivo.pk).update(ultima_sincronizacion=timezone.now())
+
+    if request.method == 'GET':
+        try:
+            return JsonResponse({'cambios': cambios_desde(datos.get('token'))})
+        except ErrorSincronizacion as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    try:
+        resultado = aplicar_lote(
+            datos.get('seguimientos') or [],
+            usuario_id=dispositivo.usuario_id,
+            dispositivo=dispositivo.codigo,
+        )
+        resultado['cambios'] = cambios_desde(datos.get('token'))
+    except (ValueError, ErrorSincronizacion) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except IntegrityError:
+        # Otra tablet envió la misma clave al mismo tiempo: reintentar devuelve 'duplicado'
+        return JsonResponse({'error': 'Conflicto de claves, reintente el lote.'}, status=409)
+    return JsonResponse(resultado)
 
 
 # (No es necesario cambiar 'eliminar_cuartel', 'dashboard_cuarteles' o 'api_estadisticas_cuarteles'
@@ -4,8 +4,11 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.db import models
 from django.db import transaction  # <--- ✨ ¡AQUÍ ESTÁ LA CORRECCIÓN! ✨
-from .models import Producto , MovimientoInventario, EquipoAgricola, DetalleMovimiento
+from .models import Producto , MovimientoInventario, EquipoAgricola, DetalleMovimiento, AlertaStock, EventoAlertaStock, TemporadaArchivada
 from .forms import DetalleMovimientoForm
+from .alertas import evaluar_alertas_stock
+from .busqueda import buscar_productos, buscar_equipos
+from aplicaciones.restricciones import recalcular_restricciones
 
 # --- CORRECCIÓN 1: Importar tu Usuario personalizado ---
 from autenticacion.models import Usuario
@@ -29,7 +32,14 @@ class ProductoAdmin(admin.ModelAdmin):
         'proveedor'
     ]
     
-    search_fields = ['nombre', 'proveedor', 'ingrediente_activo']
+    search_fields = ['nombre', 'proveedor', 'ingrediente_activo', 'numero_registro']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Trigramas (índice GIN en PostgreSQL) en vez de varios '__icontains' sin índice
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        ids = [pk for pk, _ in buscar_productos(search_term, limite=None, solo_activos=False)]
+        return queryset.filter(id__in=ids), False
     
     readonly_fields = ['fecha_creacion', 'fecha_actualizacion', 'estado_stock_display']
     
@@ -44,7 +54,7 @@ class ProductoAdmin(admin.ModelAdmin):
             'fields': ('proveedor', 'numero_registro', 'ingrediente_activo', 'concentracion')
         }),
         ('Seguridad', {
-            'fields': ('instrucciones_uso', 'precauciones')
+            'fields': ('instrucciones_uso', 'precauciones', 'dias_carencia', 'horas_reingreso')
         }),
         ('Auditoría', {
             'fields': ('creado_por', 'fecha_creacion', 'fecha_actualizacion')
@@ -66,7 +76,8 @@ class ProductoAdmin(admin.ModelAdmin):
 
     # RF028: Acción para productos con stock bajo
     def productos_stock_bajo(self, request, queryset):
-        productos_bajos = queryset.filter(stock_actual__lt=models.F('stock_minimo'))
+        # Lookup indexado sobre 'alertas_stock' en vez de comparar columnas
+        productos_bajos = queryset.filter(alerta_stock__estado__in=AlertaStock.ESTADOS_ABIERTOS)
         self.message_user(
             request, 
             f"Se encontraron {productos_bajos.count()} productos con stock bajo"
@@ -87,6 +98,9 @@ class ProductoAdmin(admin.ModelAdmin):
                 # Si no lo encuentra, lo deja en blanco
                 pass 
         super().save_model(request, obj, form, change)
+        evaluar_alertas_stock([obj.id])
+        if change and {'dias_carencia', 'horas_reingreso'} & set(form.changed_data):
+            recalcular_restricciones()
 
 
 # --- NUEVO INLINE ---
@@ -168,6 +182,7 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
             
             # formsets[0] es nuestro DetalleMovimientoInline
             # Iteramos sobre los formularios guardados
+            productos_tocados = []
             for detalle in movimiento.detalles.all():
                 
                 # Si el stock_anterior no está seteado, es nuevo o necesita recálculo
@@ -189,6 +204,9 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
                     
                     producto.stock_actual = stock_posterior
                     producto.save(update_fields=['stock_actual'])
+                    productos_tocados.append(producto.id)
+            
+            evaluar_alertas_stock(productos_tocados, movimiento=movimiento)
 
 
 @admin.register(EquipoAgricola)
@@ -201,6 +219,12 @@ class EquipoAgricolaAdmin(admin.ModelAdmin):
     list_filter = ['tipo', 'estado', 'fecha_compra']
     search_fields = ['nombre', 'modelo', 'numero_serie']
     readonly_fields = ['creado_en']
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        ids = [pk for pk, _ in buscar_equipos(search_term, limite=None)]
+        return queryset.filter(id__in=ids), False
     fieldsets = (
         ('Información Básica', {
             'fields': ('nombre', 'tipo', 'estado', 'modelo', 'numero_serie')
@@ -216,4 +240,30 @@ class EquipoAgricolaAdmin(admin.ModelAdmin):
             'fields': ('creado_en',) 
         }),
     )
-    # NOTA: Este modelo no tiene 'creado_por', así que no necesita save_model
\ No newline at end of file
+    # NOTA: Este modelo no tiene 'creado_por', así que no necesita save_model
+
+@admin.register(EventoAlertaStock)
+class EventoAlertaStockAdmin(admin.ModelAdmin):
+    """Historial de cruces de umbral (solo lectura, lo genera 'inventario/alertas.py')"""
+    list_display = ['producto', 'estado_anterior', 'estado_nuevo', 'stock_registrado', 'stock_minimo', 'movimiento', 'fecha']
+    list_filter = ['estado_nuevo', 'fecha']
+    search_fields = ['producto__nombre']
+    list_select_related = ['producto', 'movimiento']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TemporadaArchivada)
+class TemporadaArchivadaAdmin(admin.ModelAdmin):
+    """Temporadas movidas al archivo (las crea el comando 'archivar_temporadas')"""
+    list_display = ['anio', 'movimientos', 'detalles', 'archivo_exportado', 'fecha_archivado']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
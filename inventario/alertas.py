@@ -0,0 +1,137 @@
+# inventario/alertas.py
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Count
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from autenticacion.models import Usuario
+from .models import Producto, AlertaStock, EventoAlertaStock
+
+# Se emite (después del commit) SOLO cuando algún producto cambia de estado.
+# Argumento: eventos (lista de EventoAlertaStock recién creados)
+alerta_stock_cambiada = Signal()
+
+
+def calcular_estado_stock(stock_actual, stock_minimo):
+    """Misma regla que 'Producto.estado_stock', pero sin instanciar el producto."""
+    if stock_actual == 0:
+        return 'agotado'
+    if stock_actual < stock_minimo:
+        return 'bajo'
+    return 'normal'
+
+
+def evaluar_alertas_stock(producto_ids, movimiento=None, notificar=True):
+    """
+    Re-evalúa el estado de alerta SOLO de los productos indicados
+    (los que tocó un movimiento o una edición).
+
+    - 2 lecturas (productos + alertas actuales) sin importar cuántos productos.
+    - Escribe únicamente si el estado cambió, y deja un EventoAlertaStock.
+    Devuelve la lista de eventos creados (vacía si nada cambió).
+    """
+    producto_ids = {pid for pid in producto_ids if pid}
+    if not producto_ids:
+        return []
+
+    productos = Producto.objects.filter(id__in=producto_ids).values_list(
+        'id', 'stock_actual', 'stock_minimo'
+    )
+    alertas = {
+        alerta.producto_id: alerta
+        for alerta in AlertaStock.objects.filter(producto_id__in=producto_ids)
+    }
+
+    ahora = timezone.now()
+    nuevas, cambiadas, eventos = [], [], []
+    for producto_id, stock_actual, stock_minimo in productos:
+        estado = calcular_estado_stock(stock_actual, stock_minimo)
+        alerta = alertas.get(producto_id)
+        estado_anterior = alerta.estado if alerta else 'normal'
+
+        if estado == estado_anterior:
+            continue
+
+        if alerta is None:
+            nuevas.append(AlertaStock(producto_id=producto_id, estado=estado, fecha_cambio=ahora))
+        else:
+            alerta.estado = estado
+            alerta.fecha_cambio = ahora
+            cambiadas.append(alerta)
+
+        eventos.append(EventoAlertaStock(
+            producto_id=producto_id,
+            estado_anterior=estado_anterior,
+            estado_nuevo=estado,
+            stock_registrado=stock_actual,
+            stock_minimo=stock_minimo,
+            movimiento=movimiento,
+        ))
+
+    if not eventos:
+        return []
+
+    AlertaStock.objects.bulk_create(nuevas)
+    AlertaStock.objects.bulk_update(cambiadas, ['estado', 'fecha_cambio'])
+    EventoAlertaStock.objects.bulk_create(eventos)
+
+    # Notificar solo si la transacción se confirma
+    if notificar:
+        transaction.on_commit(
+            lambda: alerta_stock_cambiada.send(sender=AlertaStock, eventos=eventos)
+        )
+    return eventos
+
+
+def alertas_abiertas():
+    """Alertas 'bajo' o 'agotado' de productos activos (consulta indexada por estado)."""
+    return AlertaStock.objects.filter(
+        estado__in=AlertaStock.ESTADOS_ABIERTOS,
+        producto__esta_activo=True
+    ).select_related('producto')
+
+
+def contar_alertas():
+    """Devuelve {'bajo': n, 'agotado': n} con una sola consulta."""
+    conteo = {estado: 0 for estado in AlertaStock.ESTADOS_ABIERTOS}
+    filas = AlertaStock.objects.filter(
+        estado__in=AlertaStock.ESTADOS_ABIERTOS
+    ).values_list('estado').annotate(total=Count('id')).order_by()
+    for estado, total in filas:
+        conteo[estado] = total
+    return conteo
+
+
+# ---------------------------------------------------------------
+# NOTIFICACIÓN POR CORREO (solo ante cambios reales de estado)
+# ---------------------------------------------------------------
+@receiver(alerta_stock_cambiada)
+def notificar_administradores(sender, eventos, **kwargs):
+    destinatarios = list(
+        Usuario.objects.filter(
+            es_administrador=True, esta_activo=True, correo_electronico__isnull=False
+        ).exclude(correo_electronico='').values_list('correo_electronico', flat=True)
+    )
+    if not destinatarios:
+        return
+
+    nombres = dict(
+        Producto.objects.filter(id__in=[e.producto_id for e in eventos]).values_list('id', 'nombre')
+    )
+    estados = dict(AlertaStock.ESTADO_CHOICES)
+    lineas = [
+        f"- {nombres.get(e.producto_id, e.producto_id)}: "
+        f"{estados[e.estado_anterior]} → {estados[e.estado_nuevo]} "
+        f"(Stock: {e.stock_registrado}, Mínimo: {e.stock_minimo})"
+        for e in eventos
+    ]
+    send_mail(
+        'Cambios en alertas de stock - AgroControl',
+        'Los siguientes productos cambiaron de estado de stock:\n\n' + '\n'.join(lineas),
+        settings.DEFAULT_FROM_EMAIL,
+        destinatarios,
+        fail_silently=True,
+    )
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class InventarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventario'
+
+    def ready(self):
+        # Registrar el receptor de notificaciones de alertas de stock
+        import inventario.alertas
+
+        # Índices trigram (solo PostgreSQL) e invalidación del índice en memoria
+        from inventario.busqueda import asegurar_indices_trigram
+        post_migrate.connect(asegurar_indices_trigram, sender=self)
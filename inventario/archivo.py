@@ -0,0 +1,296 @@
+# inventario/archivo.py
+"""
+Archivo de temporadas cerradas del inventario.
+
+'movimientos_inventario' y 'detalles_movimiento' guardan solo las
+temporadas abiertas; las cerradas se mueven (mismo id) a
+'movimientos_inventario_archivo' / 'detalles_movimiento_archivo'.
+
+- PostgreSQL: si las tablas de archivo están particionadas
+  (ver AgroControlDataBase.sql) se crea una partición por año.
+- SQLite: además se exporta cada temporada a un JSONL comprimido (.jsonl.gz).
+
+Las vistas consultan el archivo SOLO cuando el rango pedido
+empieza antes de la 'frontera' (inicio de la primera temporada viva).
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import (
+    Producto, MovimientoInventario, DetalleMovimiento, EventoAlertaStock,
+    TemporadaArchivada, MovimientoArchivado, DetalleMovimientoArchivado
+)
+
+CAMPOS_MOVIMIENTO = [
+    'id', 'tipo_movimiento', 'fecha_movimiento', 'motivo', 'referencia',
+    'aplicacion_id', 'realizado_por_id', 'fecha_registro',
+]
+CAMPOS_DETALLE = [
+    'id', 'movimiento_id', 'producto_id', 'cantidad', 'stock_anterior', 'stock_posterior',
+]
+
+
+def rango_temporada(anio):
+    """(inicio, fin) de la temporada como datetimes 'aware' (fin excluido)."""
+    return (
+        timezone.make_aware(datetime(anio, 1, 1)),
+        timezone.make_aware(datetime(anio + 1, 1, 1)),
+    )
+
+
+def directorio_exportacion_por_defecto():
+    """En SQLite se exporta siempre; en PostgreSQL solo si se pide."""
+    if connection.vendor == 'sqlite':
+        return os.path.join(settings.BASE_DIR, 'archivo_inventario')
+    return None
+
+
+# ---------------------------------------------------------------
+# LECTURA: ¿hace falta el archivo para este rango?
+# ---------------------------------------------------------------
+def frontera_archivo():
+    """Inicio de la primera temporada NO archivada (None si no hay archivo)."""
+    ultimo = TemporadaArchivada.objects.order_by('-anio').values_list('anio', flat=True).first()
+    return rango_temporada(ultimo)[1] if ultimo else None
+
+
+def rango_requiere_archivo(desde=None):
+    """
+    True si un rango que empieza en 'desde' (date, datetime o None = desde siempre)
+    puede incluir movimientos archivados.
+    """
+    frontera = frontera_archivo()
+    if frontera is None:
+        return False
+    if desde is None:
+        return True
+    if isinstance(desde, datetime):
+        return desde < frontera
+    return desde < timezone.localtime(frontera).date()
+
+
+class HistorialCombinado:
+    """
+    Secuencia paginable (para 'Paginator') que entrega primero los
+    movimientos vivos y, a continuación, los archivados (todo el archivo
+    es anterior a lo vivo: ver archivar_temporada). El archivo solo se
+    consulta si la página pedida llega hasta él.
+    """
+
+    def __init__(self, vivos, archivados=None):
+        self.vivos = vivos
+        self.archivados = archivados
+        self._total_vivos = None
+        self._total = None
+
+    def _contar_vivos(self):
+        if self._total_vivos is None:
+            self._total_vivos = self.vivos.count()
+        return self._total_vivos
+
+    def count(self):
+        if self._total is None:
+            self._total = self._contar_vivos()
+            if self.archivados is not None:
+                self._total += self.archivados.count()
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, indice):
+        if not isinstance(indice, slice):
+            return self[indice:indice + 1][0]
+        inicio, fin = indice.start or 0, indice.stop
+        total_vivos = self._contar_vivos()
+
+        resultado = []
+        if inicio < total_vivos:
+            resultado.extend(self.vivos[inicio:min(fin, total_vivos)])
+        if self.archivados is not None and fin > total_vivos:
+            resultado.extend(self.archivados[max(inicio - total_vivos, 0):fin - total_vivos])
+        return resultado
+
+
+def _ultimo_stock(modelo_detalle, producto_ids, fecha):
+    """{producto_id: stock_posterior} del último detalle con fecha <= 'fecha'."""
+    ultimo = modelo_detalle.objects.filter(
+        producto=OuterRef('pk'),
+        movimiento__fecha_movimiento__lte=fecha
+    ).order_by('-movimiento__fecha_movimiento', '-movimiento_id').values('stock_posterior')[:1]
+    filas = Producto.objects.filter(id__in=producto_ids).annotate(
+        stock=Subquery(ultimo)
+    ).filter(stock__isnull=False).values_list('id', 'stock')
+    return dict(filas)
+
+
+def _primer_stock_anterior(modelo_detalle, producto_ids, fecha):
+    """{producto_id: stock_anterior} del primer detalle con fecha > 'fecha'."""
+    primero = modelo_detalle.objects.filter(
+        producto=OuterRef('pk'),
+        movimiento__fecha_movimiento__gt=fecha
+    ).order_by('movimiento__fecha_movimiento', 'movimiento_id').values('stock_anterior')[:1]
+    filas = Producto.objects.filter(id__in=producto_ids).annotate(
+        stock=Subquery(primero)
+    ).filter(stock__isnull=False).values_list('id', 'stock')
+    return dict(filas)
+
+
+def stock_a_fecha(producto_ids, fecha):
+    """
+    Stock de cada producto al instante 'fecha' (datetime).
+    Primero busca en las tablas vivas; el archivo solo se lee para los
+    productos que no tienen movimientos vivos anteriores a 'fecha'
+    y solo si 'fecha' cae antes de la frontera del archivo.
+    """
+    producto_ids = set(producto_ids)
+    resultado = _ultimo_stock(DetalleMovimiento, producto_ids, fecha)
+    pendientes = producto_ids - set(resultado)
+
+    usar_archivo = pendientes and rango_requiere_archivo(desde=fecha)
+    if usar_archivo:
+        resultado.update(_ultimo_stock(DetalleMovimientoArchivado, pendientes, fecha))
+        pendientes -= set(resultado)
+
+    # Sin movimientos hasta 'fecha': el stock previo al primer movimiento posterior
+    if pendientes and usar_archivo:
+        resultado.update(_primer_stock_anterior(DetalleMovimientoArchivado, pendientes, fecha))
+        pendientes -= set(resultado)
+    if pendientes:
+        resultado.update(_primer_stock_anterior(DetalleMovimiento, pendientes, fecha))
+        pendientes -= set(resultado)
+
+    # Nunca tuvo movimientos: el stock actual
+    if pendientes:
+        resultado.update(Producto.objects.filter(id__in=pendientes).values_list('id', 'stock_actual'))
+    return resultado
+
+
+# ---------------------------------------------------------------
+# ESCRITURA: mover una temporada cerrada al archivo
+# ---------------------------------------------------------------
+def temporadas_por_archivar(conservar=1):
+    """Años con movimientos vivos anteriores a (año actual - conservar)."""
+    limite = timezone.localdate().year - conservar
+    inicio_limite = rango_temporada(limite)[0]
+    fechas = MovimientoInventario.objects.filter(
+        fecha_movimiento__lt=inicio_limite
+    ).dates('fecha_movimiento', 'year')
+    return sorted({f.year for f in fechas})
+
+
+def _asegurar_particion(anio):
+    """Si las tablas de archivo están particionadas (PostgreSQL), crea la del año."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for tabla in (MovimientoArchivado._meta.db_table, DetalleMovimientoArchivado._meta.db_table):
+            cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [tabla])
+            if cursor.fetchone():
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS {tabla}_{anio} PARTITION OF {tabla} '
+                    f'FOR VALUES FROM ({anio}) TO ({anio + 1})'
+                )
+
+
+@transaction.atomic
+def archivar_temporada(anio, directorio=None, lote=1000):
+    """
+    Mueve los movimientos (y sus detalles) del año 'anio' al archivo,
+    en lotes de 'lote' movimientos y dentro de una sola transacción.
+    Las temporadas se archivan en orden: si queda alguna anterior viva,
+    lanza ValueError.
+    Devuelve la TemporadaArchivada actualizada.
+    """
+    if anio >= timezone.localdate().year:
+        raise ValueError(f'La temporada {anio} aún no está cerrada.')
+
+    inicio, fin = rango_temporada(anio)
+    # El archivo debe ser todo anterior a lo vivo (HistorialCombinado, frontera_archivo)
+    anterior = MovimientoInventario.objects.filter(fecha_movimiento__lt=inicio).order_by(
+        'fecha_movimiento'
+    ).values_list('fecha_movimiento', flat=True).first()
+    if anterior is not None:
+        anio_anterior = timezone.localtime(anterior).year
+        raise ValueError(
+            f'La temporada {anio_anterior} sigue en las tablas vivas: '
+            f'archívela antes que la {anio}.'
+        )
+    movimiento_ids = list(
+        MovimientoInventario.objects.filter(
+            fecha_movimiento__gte=inicio, fecha_movimiento__lt=fin
+        ).order_by('fecha_movimiento', 'id').values_list('id', flat=True)
+    )
+
+    _asegurar_particion(anio)
+
+    ruta_final = ruta_temporal = salida = None
+    if directorio and movimiento_ids:
+        os.makedirs(directorio, exist_ok=True)
+        marca = timezone.localtime().strftime('%Y%m%d%H%M%S')
+        ruta_final = os.path.join(directorio, f'movimientos_{anio}_{marca}.jsonl.gz')
+        ruta_temporal = ruta_final + '.tmp'
+        salida = gzip.open(ruta_temporal, 'wt', encoding='utf-8')
+
+    total_movimientos = total_detalles = 0
+    try:
+        for i in range(0, len(movimiento_ids), lote):
+            ids = movimiento_ids[i:i + lote]
+            movimientos = list(MovimientoInventario.objects.filter(id__in=ids).values(*CAMPOS_MOVIMIENTO))
+            detalles = list(DetalleMovimiento.objects.filter(movimiento_id__in=ids).values(*CAMPOS_DETALLE))
+
+            MovimientoArchivado.objects.bulk_create(
+                [MovimientoArchivado(temporada=anio, **m) for m in movimientos]
+            )
+            DetalleMovimientoArchivado.objects.bulk_create(
+                [DetalleMovimientoArchivado(temporada=anio, **d) for d in detalles]
+            )
+
+            if salida:
+                por_movimiento = {}
+                for d in detalles:
+                    por_movimiento.setdefault(d['movimiento_id'], []).append(d)
+                for m in movimientos:
+                    linea = dict(m, temporada=anio, detalles=por_movimiento.get(m['id'], []))
+                    salida.write(json.dumps(linea, cls=DjangoJSONEncoder) + '\n')
+
+            # Los eventos de alerta conservan el producto, pero pierden el enlace (SET_NULL)
+            EventoAlertaStock.objects.filter(movimiento_id__in=ids).update(movimiento=None)
+            DetalleMovimiento.objects.filter(movimiento_id__in=ids).delete()
+            MovimientoInventario.objects.filter(id__in=ids).delete()
+
+            total_movimientos += len(movimientos)
+            total_detalles += len(detalles)
+    finally:
+        if salida:
+            salida.close()
+
+    if ruta_temporal:
+        # El archivo JSONL solo "existe" si la transacción se confirma
+        transaction.on_commit(lambda: os.replace(ruta_temporal, ruta_final))
+
+    temporada, creada = TemporadaArchivada.objects.get_or_create(anio=anio)
+    TemporadaArchivada.objects.filter(pk=temporada.pk).update(
+        movimientos=F('movimientos') + total_movimientos,
+        detalles=F('detalles') + total_detalles,
+        archivo_exportado=ruta_final or temporada.archivo_exportado,
+    )
+    temporada.refresh_from_db()
+    return temporada
+
+
+def leer_exportacion(ruta):
+    """Itera los movimientos (con sus detalles) de un .jsonl.gz exportado."""
+    with gzip.open(ruta, 'rt', encoding='utf-8') as entrada:
+        for linea in entrada:
+            if linea.strip():
+                yield json.loads(linea)
@@ -0,0 +1,227 @@
+# inventario/busqueda.py
+"""
+Búsqueda rankeada (autocompletado) de Productos y Equipos.
+
+- PostgreSQL: coincide si el campo contiene el texto ('icontains') O si
+  su word_similarity supera UMBRAL_SIMILITUD (operador '%>', tolera
+  errores de tipeo). Ambos usan los índices GIN 'pg_trgm' sobre
+  UPPER(campo) (ver 'asegurar_indices_trigram'); el ranking también es
+  word_similarity.
+- Otros motores (SQLite en pruebas/desarrollo): índice de n-gramas
+  en memoria del proceso, reconstruido solo cuando cambian los datos.
+"""
+
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection, connections
+from django.db.models import Q, Value
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Producto, EquipoAgricola
+
+# Campos buscables y su peso en el ranking (el nombre pesa más)
+CAMPOS_PRODUCTO = {
+    'nombre': 1.0,
+    'ingrediente_activo': 0.7,
+    'proveedor': 0.6,
+    'numero_registro': 0.6,
+}
+CAMPOS_EQUIPO = {
+    'nombre': 1.0,
+    'modelo': 0.7,
+    'numero_serie': 0.7,
+}
+
+UMBRAL_SIMILITUD = 0.3
+LIMITE_POR_DEFECTO = 10
+
+
+# ---------------------------------------------------------------
+# API PÚBLICA
+# ---------------------------------------------------------------
+def buscar_productos(texto, limite=LIMITE_POR_DEFECTO, solo_activos=True):
+    """Devuelve [(producto_id, puntaje), ...] ordenado por relevancia."""
+    filtros = {'esta_activo': True} if solo_activos else {}
+    return _buscar(Producto, CAMPOS_PRODUCTO, texto, limite, filtros)
+
+
+def buscar_equipos(texto, limite=LIMITE_POR_DEFECTO):
+    """Devuelve [(equipo_id, puntaje), ...] ordenado por relevancia."""
+    return _buscar(EquipoAgricola, CAMPOS_EQUIPO, texto, limite, {})
+
+
+def _buscar(modelo, campos, texto, limite, filtros):
+    texto = (texto or '').strip()
+    if not texto:
+        return []
+    if connection.vendor == 'postgresql':
+        return _buscar_trigram_postgres(modelo, campos, texto, limite, filtros)
+    return _indice_para(modelo, campos).buscar(texto, limite, filtros)
+
+
+# ---------------------------------------------------------------
+# POSTGRESQL (pg_trgm)
+# ---------------------------------------------------------------
+def _buscar_trigram_postgres(modelo, campos, texto, limite, filtros):
+    # Import diferido: 'contrib.postgres' requiere psycopg
+    from django.contrib.postgres.lookups import TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models.functions import Greatest, Upper
+
+    # Umbral del operador '%>' para esta sesión (por defecto pg_trgm usa 0.6)
+    with connection.cursor() as cursor:
+        cursor.execute('SET pg_trgm.word_similarity_threshold = %s', [UMBRAL_SIMILITUD])
+
+    coincide = Q()
+    for campo in campos:
+        # Misma expresión UPPER(campo) que los índices: '%>' también los usa
+        coincide |= Q(**{f'{campo}__icontains': texto}) | Q(TrigramWordSimilar(Upper(campo), Value(texto.upper())))
+
+    puntajes = [TrigramWordSimilarity(Value(texto), campo) * peso for campo, peso in campos.items()]
+    qs = (
+        modelo.objects.filter(coincide, **filtros)
+        .annotate(puntaje=Greatest(*puntajes))
+        .order_by('-puntaje', 'nombre')
+        .values_list('id', 'puntaje')
+    )
+    if limite:
+        qs = qs[:limite]
+    return [(pk, float(puntaje or 0)) for pk, puntaje in qs]
+
+
+def asegurar_indices_trigram(using='default', **kwargs):
+    """
+    Crea la extensión 'pg_trgm' y los índices GIN sobre UPPER(campo),
+    que es la expresión que genera '__icontains' en PostgreSQL.
+    Se conecta a 'post_migrate' (ver apps.py); en otros motores no hace nada.
+    """
+    conexion = connections[using]
+    if conexion.vendor != 'postgresql':
+        return
+    tablas = [
+        (Producto._meta.db_table, CAMPOS_PRODUCTO),
+        (EquipoAgricola._meta.db_table, CAMPOS_EQUIPO),
+    ]
+    with conexion.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for tabla, campos in tablas:
+            for campo in campos:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {tabla}_{campo}_trgm_idx '
+                    f'ON {tabla} USING gin (UPPER({campo}::text) gin_trgm_ops)'
+                )
+
+
+# ---------------------------------------------------------------
+# RESPALDO EN MEMORIA (n-gramas)
+# ---------------------------------------------------------------
+def normalizar(texto):
+    """Minúsculas y sin tildes ('Fungicida Cúprico' -> 'fungicida cuprico')."""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ' '.join(''.join(c for c in texto if not unicodedata.combining(c)).split())
+
+
+def trigramas(texto):
+    """Trigramas por palabra con el mismo relleno que pg_trgm ('  pa', ' pal', ...)."""
+    resultado = set()
+    for palabra in normalizar(texto).split():
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+class IndiceNGramas:
+    """
+    Índice invertido trigrama -> ids, construido con UNA consulta.
+    Se marca como 'sucio' con las señales del modelo y se reconstruye
+    en la siguiente búsqueda.
+    """
+
+    def __init__(self, modelo, campos):
+        self.modelo = modelo
+        self.campos = campos
+        self.sucio = True
+        self._lock = threading.Lock()
+        self._documentos = {}
+        self._invertido = defaultdict(set)
+
+    def _construir(self):
+        columnas = list(self.campos)
+        extras = ['esta_activo'] if self.modelo is Producto else []
+        documentos, invertido = {}, defaultdict(set)
+        for fila in self.modelo.objects.values_list('id', *columnas, *extras):
+            pk, valores = fila[0], fila[1:len(columnas) + 1]
+            textos = {campo: normalizar(valor) for campo, valor in zip(columnas, valores) if valor}
+            atributos = dict(zip(extras, fila[len(columnas) + 1:]))
+            documentos[pk] = (textos, atributos)
+            for texto in textos.values():
+                for trigrama in trigramas(texto):
+                    invertido[trigrama].add(pk)
+        self._documentos, self._invertido = documentos, invertido
+        self.sucio = False
+
+    def buscar(self, texto, limite, filtros):
+        with self._lock:
+            if self.sucio:
+                self._construir()
+            documentos, invertido = self._documentos, self._invertido
+
+        consulta = normalizar(texto)
+        trigramas_consulta = trigramas(consulta)
+        if not trigramas_consulta:
+            return []
+
+        candidatos = set()
+        for trigrama in trigramas_consulta:
+            candidatos |= invertido.get(trigrama, set())
+
+        resultados = []
+        for pk in candidatos:
+            textos, atributos = documentos[pk]
+            if any(atributos.get(k) != v for k, v in filtros.items()):
+                continue
+            puntaje = max(
+                self._puntaje_campo(consulta, trigramas_consulta, textos[campo]) * peso
+                for campo, peso in self.campos.items() if campo in textos
+            )
+            if puntaje >= UMBRAL_SIMILITUD:
+                resultados.append((pk, puntaje, textos.get('nombre', '')))
+
+        resultados.sort(key=lambda r: (-r[1], r[2]))
+        if limite:
+            resultados = resultados[:limite]
+        return [(pk, puntaje) for pk, puntaje, _ in resultados]
+
+    @staticmethod
+    def _puntaje_campo(consulta, trigramas_consulta, texto):
+        # Aproximación a word_similarity + bonus si coincide el texto tal cual
+        puntaje = len(trigramas_consulta & trigramas(texto)) / len(trigramas_consulta)
+        if texto.startswith(consulta):
+            puntaje += 1.0
+        elif consulta in texto:
+            puntaje += 0.5
+        return puntaje
+
+
+_indices = {}
+
+
+def _indice_para(modelo, campos):
+    if modelo not in _indices:
+        _indices[modelo] = IndiceNGramas(modelo, campos)
+    return _indices[modelo]
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=EquipoAgricola)
+def invalidar_indice_busqueda(sender, **kwargs):
+    # Un cambio de stock no altera el texto buscable
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not (set(update_fields) & (set(CAMPOS_PRODUCTO) | set(CAMPOS_EQUIPO) | {'esta_activo'})):
+        return
+    indice = _indices.get(sender)
+    if indice:
+        indice.sucio = True
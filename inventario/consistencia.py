@@ -0,0 +1,100 @@
+# inventario/consistencia.py
+"""
+Conciliación del stock cacheado ('Producto.stock_actual') con el libro
+de movimientos ('DetalleMovimiento').
+
+El saldo del libro de un producto es el 'stock_posterior' de su último
+detalle registrado: los ajustes FIJAN el stock, así que no basta con
+sumar cantidades.
+"""
+
+from decimal import Decimal
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Producto, MovimientoInventario, DetalleMovimiento, DetalleMovimientoArchivado
+from .archivo import frontera_archivo
+from .alertas import evaluar_alertas_stock
+
+
+def saldos_libro(modelo_detalle=DetalleMovimiento):
+    """[(producto_id, saldo), ...] con UNA consulta (MAX(id) agrupado por producto)."""
+    ultimos = modelo_detalle.objects.order_by().values('producto_id').annotate(
+        ultimo=Max('id')
+    ).values('ultimo')
+    return list(
+        modelo_detalle.objects.filter(id__in=ultimos).values_list('producto_id', 'stock_posterior')
+    )
+
+
+def comparar_stock_con_libro():
+    """
+    Devuelve {'descuadres': DataFrame, 'productos': n, 'sin_movimientos': n}.
+    El DataFrame trae producto_id, nombre, stock_actual, saldo_libro y diferencia
+    de los productos cuyo stock no coincide con el libro.
+    """
+    libro = dict(saldos_libro())
+    # Productos cuyo último movimiento ya está en una temporada archivada
+    if frontera_archivo() is not None:
+        for producto_id, saldo in saldos_libro(DetalleMovimientoArchivado):
+            libro.setdefault(producto_id, saldo)
+
+    productos = pd.DataFrame.from_records(
+        list(Producto.objects.values_list('id', 'nombre', 'stock_actual')),
+        columns=['producto_id', 'nombre', 'stock_actual']
+    )
+    saldos = pd.DataFrame(list(libro.items()), columns=['producto_id', 'saldo_libro'])
+    df = productos.merge(saldos, on='producto_id', how='inner')
+
+    # Comparación vectorizada y exacta en centésimas (DecimalField de 2 decimales)
+    stock_cent = (df['stock_actual'].astype(float) * 100).round().astype('int64')
+    libro_cent = (df['saldo_libro'].astype(float) * 100).round().astype('int64')
+    df['diferencia'] = (stock_cent - libro_cent) / 100
+
+    return {
+        'descuadres': df[stock_cent != libro_cent].sort_values('nombre').reset_index(drop=True),
+        'productos': len(productos),
+        'sin_movimientos': len(productos) - len(df),
+    }
+
+
+@transaction.atomic
+def reparar_desde_libro(descuadres, lote=500, notificar=False):
+    """El libro manda: 'stock_actual' = saldo del libro (bulk_update por lotes)."""
+    ahora = timezone.now()
+    productos = [
+        Producto(id=fila.producto_id, stock_actual=Decimal(fila.saldo_libro), fecha_actualizacion=ahora)
+        for fila in descuadres.itertuples(index=False)
+    ]
+    Producto.objects.bulk_update(productos, ['stock_actual', 'fecha_actualizacion'], batch_size=lote)
+    evaluar_alertas_stock([p.id for p in productos], notificar=notificar)
+    return len(productos)
+
+
+@transaction.atomic
+def registrar_ajuste_conciliacion(descuadres, usuario, lote=500):
+    """
+    El stock físico manda: deja UN movimiento de 'ajuste' con un detalle por
+    producto (saldo del libro -> stock_actual), así el libro vuelve a cuadrar
+    sin tocar 'stock_actual'.
+    """
+    movimiento = MovimientoInventario.objects.create(
+        tipo_movimiento='ajuste',
+        fecha_movimiento=timezone.now(),
+        motivo='Conciliación de stock con el libro de movimientos',
+        realizado_por=usuario,
+    )
+    DetalleMovimiento.objects.bulk_create([
+        DetalleMovimiento(
+            movimiento=movimiento,
+            producto_id=fila.producto_id,
+            cantidad=Decimal(fila.stock_actual),  # El ajuste define el stock
+            stock_anterior=Decimal(fila.saldo_libro),
+            stock_posterior=Decimal(fila.stock_actual),
+        )
+        for fila in descuadres.itertuples(index=False)
+    ], batch_size=lote)
+    return movimiento
@@ -2,7 +2,31 @@
 
 from django import forms
 from django.forms import inlineformset_factory # Importar
+from django.urls import reverse
 from .models import Producto, MovimientoInventario, DetalleMovimiento, EquipoAgricola
+from AgroControl.opciones import OpcionesCacheadasField
+
+
+class ProductoAutocompleteSelect(forms.Select):
+    """
+    Select de productos con un buscador encima.
+    El buscador consulta 'inventario:api_buscar' (ranking por trigramas) y
+    reordena las opciones del select; sin JS sigue funcionando como un select normal.
+    """
+    template_name = 'inventario/widgets/producto_autocomplete.html'
+
+    class Media:
+        js = ['inventario/js/autocomplete_producto.js']
+
+    def __init__(self, attrs=None, tipo='productos'):
+        attrs = {'class': 'form-control producto-select', **(attrs or {})}
+        super().__init__(attrs)
+        self.tipo = tipo
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url_busqueda'] = f"{reverse('inventario:api_buscar')}?tipo={self.tipo}"
+        return context
 
 class ProductoForm(forms.ModelForm):
     """(SIN CAMBIOS)"""
@@ -12,7 +36,7 @@ class ProductoForm(forms.ModelForm):
             'nombre', 'tipo', 'nivel_peligrosidad', 'unidad_medida',
             'stock_actual', 'stock_minimo', 'proveedor', 'numero_registro',
             'ingrediente_activo', 'concentracion', 'instrucciones_uso',
-            'precauciones', 'esta_activo'
+            'precauciones', 'dias_carencia', 'horas_reingreso', 'esta_activo'
         ]
         widgets = {
             'nombre': forms.TextInput(attrs={'class': 'form-control'}),
@@ -33,6 +57,8 @@ class ProductoForm(forms.ModelForm):
             'concentracion': forms.TextInput(attrs={'class': 'form-control'}),
             'instrucciones_uso': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'precauciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
+            'dias_carencia': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
+            'horas_reingreso': forms.NumberInput(attrs={'class': 'form-control', 'min': '0'}),
             'esta_activo': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
         }
 
@@ -78,9 +104,10 @@ class MovimientoInventarioForm(forms.ModelForm):
 class DetalleMovimientoForm(forms.ModelForm):
     """(NUEVO) Formulario para el detalle (el producto y la cantidad)"""
     
-    producto = forms.ModelChoiceField(
-        queryset=Producto.objects.filter(esta_activo=True).order_by('nombre'),
-        widget=forms.Select(attrs={'class': 'form-control producto-select'})
+    # Opciones compartidas por todas las filas del formset (ver AgroControl/opciones.py)
+    producto = OpcionesCacheadasField(
+        'productos_activos',
+        widget=ProductoAutocompleteSelect()
     )
     
     cantidad = forms.DecimalField(
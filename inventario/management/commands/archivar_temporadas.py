@@ -0,0 +1,65 @@
+# Guardar en: inventario/management/commands/archivar_temporadas.py
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from inventario.models import MovimientoInventario
+from inventario.archivo import (
+    archivar_temporada, temporadas_por_archivar, rango_temporada,
+    directorio_exportacion_por_defecto
+)
+
+class Command(BaseCommand):
+    help = (
+        'Mueve las temporadas cerradas (años) de movimientos de inventario '
+        'a las tablas de archivo. Pensado para ejecutarse una vez al año.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--conservar', type=int, default=1,
+            help='Años cerrados que se mantienen en las tablas vivas además del actual (default: 1)'
+        )
+        parser.add_argument(
+            '--anio', type=int,
+            help='Archivar solo esta temporada (las anteriores deben estar ya archivadas)'
+        )
+        parser.add_argument(
+            '--exportar', metavar='DIRECTORIO',
+            help='Exportar cada temporada a .jsonl.gz (en SQLite se exporta siempre a archivo_inventario/)'
+        )
+        parser.add_argument('--lote', type=int, default=1000, help='Movimientos por lote (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo mostrar qué se archivaría')
+
+    def handle(self, *args, **options):
+        if options['anio']:
+            temporadas = [options['anio']]
+        else:
+            temporadas = temporadas_por_archivar(conservar=options['conservar'])
+
+        if not temporadas:
+            self.stdout.write(self.style.WARNING('No hay temporadas cerradas por archivar.'))
+            return
+
+        directorio = options['exportar'] or directorio_exportacion_por_defecto()
+
+        for anio in temporadas:
+            if options['dry_run']:
+                inicio, fin = rango_temporada(anio)
+                conteo = MovimientoInventario.objects.filter(
+                    fecha_movimiento__gte=inicio, fecha_movimiento__lt=fin
+                ).aggregate(movimientos=Count('id', distinct=True), detalles=Count('detalles'))
+                self.stdout.write(
+                    f"[dry-run] Temporada {anio}: {conteo['movimientos']} movimientos, "
+                    f"{conteo['detalles']} detalles."
+                )
+                continue
+
+            try:
+                temporada = archivar_temporada(anio, directorio=directorio, lote=options['lote'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            mensaje = f'Temporada {anio} archivada ({temporada.movimientos} movimientos, {temporada.detalles} detalles).'
+            if temporada.archivo_exportado:
+                mensaje += f' Exportación: {temporada.archivo_exportado}'
+            self.stdout.write(self.style.SUCCESS(mensaje))
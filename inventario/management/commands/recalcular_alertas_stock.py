@@ -0,0 +1,34 @@
+# Guardar en: inventario/management/commands/recalcular_alertas_stock.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventario.models import Producto
+from inventario.alertas import evaluar_alertas_stock
+
+class Command(BaseCommand):
+    help = (
+        'Evalúa el estado de alerta de TODOS los productos. '
+        'Solo es necesario la primera vez (o tras cargas masivas por SQL); '
+        'el día a día lo actualiza cada movimiento.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Productos por lote (default: 500)')
+        parser.add_argument('--notificar', action='store_true', help='Enviar correo por los cambios detectados')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        ids = list(Producto.objects.order_by('id').values_list('id', flat=True))
+        total_eventos = 0
+
+        for inicio in range(0, len(ids), lote):
+            with transaction.atomic():
+                total_eventos += len(
+                    evaluar_alertas_stock(ids[inicio:inicio + lote], notificar=options['notificar'])
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{len(ids)} productos evaluados, {total_eventos} cambios de estado registrados.'
+            )
+        )
@@ -0,0 +1,66 @@
+# Guardar en: inventario/management/commands/verificar_stock.py
+
+from django.core.management.base import BaseCommand, CommandError
+from autenticacion.models import Usuario
+from inventario.consistencia import (
+    comparar_stock_con_libro, reparar_desde_libro, registrar_ajuste_conciliacion
+)
+
+class Command(BaseCommand):
+    help = (
+        'Compara Producto.stock_actual con el saldo del libro de movimientos '
+        '(DetalleMovimiento) y, opcionalmente, repara los descuadres en bloque. '
+        'Pensado para ejecutarse cada noche.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reparar', action='store_true',
+            help='Corregir stock_actual con el saldo del libro'
+        )
+        parser.add_argument(
+            '--registrar-ajuste', metavar='NOMBRE_USUARIO',
+            help='En vez de tocar stock_actual, registrar un movimiento de ajuste a nombre de este usuario'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar, no escribir nada')
+        parser.add_argument('--lote', type=int, default=500, help='Filas por lote de escritura (default: 500)')
+        parser.add_argument('--mostrar', type=int, default=50, help='Descuadres a listar (default: 50)')
+        parser.add_argument('--notificar', action='store_true', help='Enviar correo por los cambios de alerta')
+
+    def handle(self, *args, **options):
+        if options['reparar'] and options['registrar_ajuste']:
+            raise CommandError('Use --reparar o --registrar-ajuste, no ambos.')
+
+        resultado = comparar_stock_con_libro()
+        descuadres = resultado['descuadres']
+
+        self.stdout.write(
+            f"{resultado['productos']} productos revisados "
+            f"({resultado['sin_movimientos']} sin movimientos en el libro)."
+        )
+        if descuadres.empty:
+            self.stdout.write(self.style.SUCCESS('El stock coincide con el libro de movimientos.'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'{len(descuadres)} productos con descuadre:'))
+        for fila in descuadres.head(options['mostrar']).itertuples(index=False):
+            self.stdout.write(
+                f'  [{fila.producto_id}] {fila.nombre}: stock {fila.stock_actual} / '
+                f'libro {fila.saldo_libro} (diferencia {fila.diferencia:+.2f})'
+            )
+
+        if options['dry_run'] or not (options['reparar'] or options['registrar_ajuste']):
+            return
+
+        if options['reparar']:
+            total = reparar_desde_libro(descuadres, lote=options['lote'], notificar=options['notificar'])
+            self.stdout.write(self.style.SUCCESS(f'{total} productos corregidos con el saldo del libro.'))
+        else:
+            try:
+                usuario = Usuario.objects.get(nombre_usuario=options['registrar_ajuste'])
+            except Usuario.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['registrar_ajuste']}'.")
+            movimiento = registrar_ajuste_conciliacion(descuadres, usuario, lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Ajuste MOV-{movimiento.id} registrado con {len(descuadres)} productos.'
+            ))
@@ -3,6 +3,7 @@
 from django.db import models
 from autenticacion.models import Usuario as User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from django.utils.html import format_html, escape # <--- ✨ IMPORTAR 'escape' ✨
 
 # ... (Todo el modelo Producto ... SIN CAMBIOS) ...
@@ -46,6 +47,17 @@ class Producto(models.Model):
     concentracion = models.CharField(max_length=100, blank=True, null=True, verbose_name='Concentración')
     instrucciones_uso = models.TextField(blank=True, null=True, verbose_name='Instrucciones de Uso')
     precauciones = models.TextField(blank=True, null=True, verbose_name='Precauciones de Seguridad')
+    # Intervalos de seguridad tras aplicarlo (ver aplicaciones/restricciones.py)
+    dias_carencia = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Carencia (días)',
+        help_text='Días entre la aplicación y la cosecha.'
+    )
+    horas_reingreso = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Reingreso (horas)',
+        help_text='Horas sin ingresar al cuartel tras la aplicación.'
+    )
     esta_activo = models.BooleanField(default=True, verbose_name='Producto Activo')
     creado_por = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name='Creado por')
     fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
@@ -84,7 +96,7 @@ class MovimientoInventario(models.Model):
         choices=TIPO_MOVIMIENTO_CHOICES,
         verbose_name='Tipo de Movimiento'
     )
-    fecha_movimiento = models.DateTimeField(verbose_name='Fecha del Movimiento')
+    fecha_movimiento = models.DateTimeField(db_index=True, verbose_name='Fecha del Movimiento')
     motivo = models.CharField(max_length=200, verbose_name='Motivo del Movimiento')
     referencia = models.CharField(
         max_length=100,
@@ -282,4 +294,185 @@ class EquipoAgricola(models.Model):
 
     @property
     def en_alerta_stock(self):
-        return self.estado_stock in ['bajo', 'agotado']
\ No newline at end of file
+        return self.estado_stock in ['bajo', 'agotado']
+
+# ---------------------------------------------------------------
+# ALERTAS DE STOCK (estado persistido + historial de cambios)
+# ---------------------------------------------------------------
+class AlertaStock(models.Model):
+    """
+    Estado de alerta de stock de cada producto.
+    Se actualiza solo para los productos tocados por un movimiento
+    (ver 'inventario/alertas.py'), así las vistas leen las alertas
+    abiertas con una consulta indexada en vez de recorrer 'productos'.
+    """
+    ESTADO_CHOICES = [
+        ('normal', 'Normal'),
+        ('bajo', 'Stock Bajo'),
+        ('agotado', 'Agotado'),
+    ]
+    ESTADOS_ABIERTOS = ['bajo', 'agotado']
+
+    producto = models.OneToOneField(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='alerta_stock',
+        verbose_name='Producto'
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='normal',
+        db_index=True,
+        verbose_name='Estado de Stock'
+    )
+    fecha_cambio = models.DateTimeField(default=timezone.now, verbose_name='Último Cambio de Estado')
+
+    class Meta:
+        db_table = 'alertas_stock'
+        verbose_name = 'Alerta de Stock'
+        verbose_name_plural = 'Alertas de Stock'
+
+    def __str__(self):
+        return f"{self.producto.nombre}: {self.get_estado_display()}"
+
+    @property
+    def esta_abierta(self):
+        return self.estado in self.ESTADOS_ABIERTOS
+
+
+class EventoAlertaStock(models.Model):
+    """Registro de cada vez que un producto cruza un umbral de stock."""
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='eventos_alerta_stock',
+        verbose_name='Producto'
+    )
+    estado_anterior = models.CharField(max_length=20, choices=AlertaStock.ESTADO_CHOICES, verbose_name='Estado Anterior')
+    estado_nuevo = models.CharField(max_length=20, choices=AlertaStock.ESTADO_CHOICES, verbose_name='Estado Nuevo')
+    stock_registrado = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Stock Registrado')
+    stock_minimo = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Stock Mínimo')
+    movimiento = models.ForeignKey(
+        MovimientoInventario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='eventos_alerta_stock',
+        verbose_name='Movimiento que lo provocó'
+    )
+    fecha = models.DateTimeField(auto_now_add=True, verbose_name='Fecha del Evento')
+
+    class Meta:
+        db_table = 'eventos_alerta_stock'
+        verbose_name = 'Evento de Alerta de Stock'
+        verbose_name_plural = 'Eventos de Alerta de Stock'
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.producto.nombre}: {self.estado_anterior} → {self.estado_nuevo}"
+
+
+# ---------------------------------------------------------------
+# ARCHIVO DE TEMPORADAS CERRADAS (ver 'inventario/archivo.py')
+# ---------------------------------------------------------------
+class TemporadaArchivada(models.Model):
+    """Registro de cada temporada (año) movida al archivo."""
+    anio = models.PositiveSmallIntegerField(unique=True, verbose_name='Temporada (Año)')
+    movimientos = models.PositiveIntegerField(default=0, verbose_name='Movimientos Archivados')
+    detalles = models.PositiveIntegerField(default=0, verbose_name='Detalles Archivados')
+    archivo_exportado = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Exportación JSONL comprimida'
+    )
+    fecha_archivado = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Archivado')
+
+    class Meta:
+        db_table = 'temporadas_archivadas'
+        verbose_name = 'Temporada Archivada'
+        verbose_name_plural = 'Temporadas Archivadas'
+        ordering = ['-anio']
+
+    def __str__(self):
+        return f"Temporada {self.anio} ({self.movimientos} movimientos)"
+
+
+class MovimientoArchivado(models.Model):
+    """
+    Copia de un MovimientoInventario de una temporada cerrada.
+    Conserva el MISMO id, así 'MOV-123' sigue siendo 'MOV-123'.
+    En PostgreSQL la tabla puede estar particionada por 'temporada'.
+    """
+    es_archivado = True
+
+    id = models.BigIntegerField(primary_key=True)
+    temporada = models.PositiveSmallIntegerField(db_index=True, verbose_name='Temporada')
+    tipo_movimiento = models.CharField(
+        max_length=20,
+        choices=MovimientoInventario.TIPO_MOVIMIENTO_CHOICES,
+        verbose_name='Tipo de Movimiento'
+    )
+    fecha_movimiento = models.DateTimeField(db_index=True, verbose_name='Fecha del Movimiento')
+    motivo = models.CharField(max_length=200, verbose_name='Motivo del Movimiento')
+    referencia = models.CharField(max_length=100, blank=True, null=True, verbose_name='Referencia')
+    aplicacion = models.ForeignKey(
+        'aplicaciones.AplicacionFitosanitaria',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='movimientos_archivados',
+        verbose_name='Aplicación Relacionada'
+    )
+    realizado_por = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name='movimientos_archivados',
+        verbose_name='Realizado por'
+    )
+    fecha_registro = models.DateTimeField(verbose_name='Fecha de Registro')
+
+    class Meta:
+        db_table = 'movimientos_inventario_archivo'
+        verbose_name = 'Movimiento Archivado'
+        verbose_name_plural = 'Movimientos Archivados'
+        ordering = ['-fecha_movimiento']
+
+    def __str__(self):
+        return f"MOV-{self.id} (archivado {self.temporada}): {self.get_tipo_movimiento_display()} - {self.motivo}"
+
+    # Mismos helpers que MovimientoInventario (usan 'self.detalles')
+    get_primer_detalle = MovimientoInventario.get_primer_detalle
+    get_total_detalles = MovimientoInventario.get_total_detalles
+    get_productos_display = MovimientoInventario.get_productos_display
+    get_detalles_display_html = MovimientoInventario.get_detalles_display_html
+
+
+class DetalleMovimientoArchivado(models.Model):
+    """Copia de un DetalleMovimiento de una temporada cerrada (mismo id)."""
+    id = models.BigIntegerField(primary_key=True)
+    temporada = models.PositiveSmallIntegerField(db_index=True, verbose_name='Temporada')
+    movimiento = models.ForeignKey(
+        MovimientoArchivado,
+        related_name='detalles',
+        on_delete=models.CASCADE,
+        # La tabla archivada puede estar particionada (PK compuesta en PostgreSQL)
+        db_constraint=False
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.PROTECT,
+        related_name='detalles_archivados'
+    )
+    cantidad = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Cantidad')
+    stock_anterior = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Stock Anterior')
+    stock_posterior = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Stock Posterior')
+
+    class Meta:
+        db_table = 'detalles_movimiento_archivo'
+        verbose_name = 'Detalle de Movimiento Archivado'
+        verbose_name_plural = 'Detalles de Movimiento Archivados'
+        ordering = ['producto__nombre']
+
+    def __str__(self):
+        return f"Detalle de {self.producto.nombre} para Mov. {self.movimiento_id} (archivado)"
@@ -0,0 +1,71 @@
+# inventario/salidas.py
+"""
+Descuento de stock de varias tareas a la vez (finalización masiva de riegos
+y aplicaciones).
+
+- ReservaStock bloquea los productos involucrados con UN SELECT ... FOR
+  UPDATE en orden de id (dos lotes concurrentes toman los bloqueos en el
+  mismo orden y no se interbloquean).
+- Cada tarea reserva sus cantidades en memoria, en orden: si alguna no
+  alcanza, esa tarea falla sola (ValidationError) y las demás siguen.
+- Al final se escribe UNA actualización por producto con la suma de lo
+  reservado (bulk_update) y se re-evalúan las alertas una sola vez.
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .alertas import evaluar_alertas_stock
+from .models import Producto
+
+
+class ReservaStock:
+    """Stock de los productos bloqueados, descontado en memoria hasta 'guardar'."""
+
+    def __init__(self, producto_ids):
+        self.productos = {
+            p.id: p for p in Producto.objects.select_for_update().filter(
+                id__in=set(producto_ids)
+            ).order_by('id')
+        }
+        self.disponible = {pid: p.stock_actual for pid, p in self.productos.items()}
+        self.descontado = defaultdict(int)
+
+    def reservar(self, lineas):
+        """
+        Reserva [(producto_id, cantidad)] de UNA tarea, todo o nada.
+        Devuelve [(producto, cantidad, stock_anterior, stock_posterior)].
+        """
+        por_producto = defaultdict(int)
+        for producto_id, cantidad in lineas:
+            por_producto[producto_id] += cantidad
+        for producto_id, cantidad in por_producto.items():
+            producto = self.productos[producto_id]
+            if cantidad > self.disponible[producto_id]:
+                raise ValidationError(
+                    f"Stock insuficiente para '{producto.nombre}'. "
+                    f"Requerido: {cantidad} {producto.unidad_medida}, "
+                    f"Disponible: {self.disponible[producto_id]} {producto.unidad_medida}."
+                )
+
+        detalles = []
+        for producto_id, cantidad in por_producto.items():
+            anterior = self.disponible[producto_id]
+            self.disponible[producto_id] = anterior - cantidad
+            self.descontado[producto_id] += cantidad
+            detalles.append((self.productos[producto_id], cantidad, anterior, anterior - cantidad))
+        return detalles
+
+    def guardar(self, movimiento=None):
+        """Escribe el stock de los productos tocados y re-evalúa sus alertas."""
+        productos = [self.productos[pid] for pid, total in self.descontado.items() if total]
+        if not productos:
+            return []
+        ahora = timezone.now()
+        for producto in productos:
+            producto.stock_actual = self.disponible[producto.id]
+            producto.fecha_actualizacion = ahora
+        Producto.objects.bulk_update(productos, ['stock_actual', 'fecha_actualizacion'])
+        return evaluar_alertas_stock([p.id for p in productos], movimiento=movimiento)
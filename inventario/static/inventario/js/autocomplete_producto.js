@@ -0,0 +1,74 @@
+// inventario/static/inventario/js/autocomplete_producto.js
+// Buscador de productos para los selects '.producto-select'.
+// Usa delegación de eventos para que funcione también en las filas
+// que se clonan desde el '#empty-form' de los formsets.
+(function () {
+    const ESPERA_MS = 200;
+    const temporizadores = new WeakMap();
+
+    function selectDe(input) {
+        const select = input.nextElementSibling;
+        return select && select.tagName === 'SELECT' ? select : null;
+    }
+
+    function restaurarOpciones(select) {
+        if (select.dataset.opcionesOriginales !== undefined) {
+            const valor = select.value;
+            select.innerHTML = select.dataset.opcionesOriginales;
+            select.value = valor;
+        }
+    }
+
+    function mostrarResultados(select, resultados) {
+        if (select.dataset.opcionesOriginales === undefined) {
+            select.dataset.opcionesOriginales = select.innerHTML;
+        }
+        select.innerHTML = '';
+        select.appendChild(new Option('---------', ''));
+        resultados.forEach(function (r) {
+            const opcion = new Option(r.texto + ' · ' + r.detalle, r.id);
+            select.appendChild(opcion);
+        });
+        if (resultados.length) {
+            select.value = String(resultados[0].id);
+        }
+        select.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+
+    function buscar(input) {
+        const select = selectDe(input);
+        if (!select) return;
+        const texto = input.value.trim();
+        if (!texto) {
+            restaurarOpciones(select);
+            return;
+        }
+        const url = input.dataset.url + '&q=' + encodeURIComponent(texto);
+        fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+            .then(function (respuesta) { return respuesta.json(); })
+            .then(function (datos) {
+                // Ignorar respuestas de búsquedas ya reemplazadas
+                if (input.value.trim() === texto) {
+                    mostrarResultados(select, datos.resultados);
+                }
+            })
+            .catch(function () { restaurarOpciones(select); });
+    }
+
+    document.addEventListener('input', function (evento) {
+        const input = evento.target;
+        if (!input.classList || !input.classList.contains('producto-busqueda')) return;
+        clearTimeout(temporizadores.get(input));
+        temporizadores.set(input, setTimeout(function () { buscar(input); }, ESPERA_MS));
+    });
+
+    // Evitar que 'Enter' en el buscador envíe el formulario
+    document.addEventListener('keydown', function (evento) {
+        const input = evento.target;
+        if (evento.key === 'Enter' && input.classList && input.classList.contains('producto-busqueda')) {
+            evento.preventDefault();
+            clearTimeout(temporizadores.get(input));
+            buscar(input);
+        }
+    });
+})();
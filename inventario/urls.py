@@ -26,4 +26,7 @@ urlpatterns = [
     path('maquinaria/crear/', views.crear_maquinaria, name='crear_maquinaria'),
     path('maquinaria/<int:equipo_id>/', views.detalle_maquinaria, name='detalle_maquinaria'),
     path('maquinaria/<int:equipo_id>/editar/', views.editar_maquinaria, name='editar_maquinaria'),
+
+    # Autocompletado (productos / equipos)
+    path('api/buscar/', views.api_buscar, name='api_buscar'),
 ]
\ No newline at end of file
@@ -6,7 +6,18 @@ from django.contrib import messages
 from django.db import models, transaction # Importar transaction
 from django.core.paginator import Paginator
 from django.core.exceptions import ValidationError
-from .models import Producto, MovimientoInventario, EquipoAgricola, DetalleMovimiento
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, time
+from .models import (
+    Producto, MovimientoInventario, EquipoAgricola, DetalleMovimiento,
+    MovimientoArchivado, DetalleMovimientoArchivado
+)
+from .archivo import HistorialCombinado, rango_requiere_archivo, stock_a_fecha
+from .alertas import evaluar_alertas_stock, alertas_abiertas, contar_alertas
+from .busqueda import buscar_productos, buscar_equipos
+from aplicaciones.restricciones import recalcular_restricciones
 from .forms import (
     ProductoForm, MovimientoInventarioForm, EquipoAgricolaForm,
     DetalleMovimientoFormSet # Importar el FormSet
@@ -19,10 +30,19 @@ def lista_productos(request):
     productos = Producto.objects.all().order_by('nombre')
     
     # Filtros
+    q = request.GET.get('q', '').strip()
     tipo = request.GET.get('tipo')
     estado_stock = request.GET.get('estado_stock')
     peligrosidad = request.GET.get('peligrosidad')
     
+    if q:
+        # Búsqueda rankeada (trigramas): se conserva el orden por relevancia
+        ids = [pk for pk, _ in buscar_productos(q, limite=None, solo_activos=False)]
+        orden = models.Case(
+            *[models.When(id=pk, then=posicion) for posicion, pk in enumerate(ids)],
+            output_field=models.IntegerField()
+        ) if ids else models.Value(0)
+        productos = productos.filter(id__in=ids).order_by(orden, 'nombre')
     if tipo:
         productos = productos.filter(tipo=tipo)
     if estado_stock:
@@ -35,19 +55,16 @@ def lista_productos(request):
     if peligrosidad:
         productos = productos.filter(nivel_peligrosidad=peligrosidad)
     
-    # Estadísticas
+    # Estadísticas (las alertas se leen de la tabla 'alertas_stock')
     total_productos = Producto.objects.count()
-    productos_bajo_stock = Producto.objects.filter(
-        stock_actual__lt=models.F('stock_minimo'),
-        stock_actual__gt=0
-    ).count()
-    productos_agotados = Producto.objects.filter(stock_actual=0).count()
+    conteo_alertas = contar_alertas()
+    productos_bajo_stock = conteo_alertas['bajo']
+    productos_agotados = conteo_alertas['agotado']
     
     # Productos en alerta para mostrar
-    productos_alerta = Producto.objects.filter(
-        models.Q(stock_actual__lt=models.F('stock_minimo')) | 
-        models.Q(stock_actual=0)
-    )[:5]
+    productos_alerta = [
+        alerta.producto for alerta in alertas_abiertas().order_by('-fecha_cambio')[:5]
+    ]
     
     context = {
         'productos': productos,
@@ -55,6 +72,7 @@ def lista_productos(request):
         'productos_bajo_stock': productos_bajo_stock,
         'productos_agotados': productos_agotados,
         'productos_alerta': productos_alerta,
+        'filtro_q': q,
         'filtro_tipo': tipo,
         'filtro_estado_stock': estado_stock,
         'filtro_peligrosidad': peligrosidad,
@@ -72,6 +90,7 @@ def crear_producto(request):
             # Asignamos el usuario desde la SESIÓN
             producto.creado_por_id = request.session.get('usuario_id') 
             producto.save()
+            evaluar_alertas_stock([producto.id])
             messages.success(request, f'Producto {producto.nombre} creado exitosamente.')
             return redirect('inventario:lista_productos')
     else:
@@ -85,6 +104,13 @@ def detalle_producto(request, producto_id):
     """(SIN CAMBIOS)"""
     producto = get_object_or_404(Producto, id=producto_id)
     context = {'producto': producto, 'page_title': f'Detalle: {producto.nombre}'} # Añadido page_title
+
+    # Stock a una fecha pasada (?fecha=AAAA-MM-DD, al cierre del día)
+    fecha = parse_date(request.GET.get('fecha') or '')
+    if fecha:
+        fin_del_dia = timezone.make_aware(datetime.combine(fecha, time.max))
+        context['fecha_consulta'] = fecha
+        context['stock_a_fecha'] = stock_a_fecha([producto.id], fin_del_dia).get(producto.id)
     return render(request, 'inventario/detalle_producto.html', context)
 
 
@@ -97,6 +123,10 @@ def editar_producto(request, producto_id):
         form = ProductoForm(request.POST, instance=producto)
         if form.is_valid():
             form.save()
+            # 'stock_actual' y 'stock_minimo' son editables aquí
+            evaluar_alertas_stock([producto.id])
+            if {'dias_carencia', 'horas_reingreso'} & set(form.changed_data):
+                recalcular_restricciones()
             messages.success(request, f'Producto {producto.nombre} actualizado exitosamente.')
             return redirect('inventario:detalle_producto', producto_id=producto.id)
     else:
@@ -168,6 +198,11 @@ def crear_movimiento(request, producto_id=None):
                 # pero para 'crear' no es necesario)
                 detalle.delete()
             
+            # Re-evaluar alertas solo de los productos tocados
+            evaluar_alertas_stock(
+                [d.producto_id for d in detalles_a_guardar], movimiento=movimiento
+            )
+            
             messages.success(request, 'Movimiento registrado exitosamente.')
             return redirect('inventario:historial_movimientos')
         else:
@@ -194,14 +229,7 @@ def crear_movimiento(request, producto_id=None):
 
 @login_required
 def historial_movimientos(request):
-    """(MODIFICADO) Vista de historial con prefetch"""
-    
-    # --- MODIFICADO: Usar prefetch_related para detalles ---
-    movimientos = MovimientoInventario.objects.all().select_related(
-        'realizado_por', 'aplicacion'
-    ).prefetch_related(
-        'detalles__producto' # Optimiza la carga para el tooltip
-    ).order_by('-fecha_movimiento')
+    """(MODIFICADO) Vista de historial con prefetch. Lee el archivo solo si el rango lo necesita."""
     
     # --- Filtros (MODIFICADOS) ---
     producto_id = request.GET.get('producto')
@@ -209,34 +237,56 @@ def historial_movimientos(request):
     fecha_desde = request.GET.get('fecha_desde')
     fecha_hasta = request.GET.get('fecha_hasta')
     
-    if producto_id:
-        # Filtrar si CUALQUIER detalle coincide
-        movimientos = movimientos.filter(detalles__producto_id=producto_id).distinct()
-    if tipo_movimiento:
-        movimientos = movimientos.filter(tipo_movimiento=tipo_movimiento)
-    if fecha_desde:
-        movimientos = movimientos.filter(fecha_movimiento__gte=fecha_desde)
-    if fecha_hasta:
-        # Añadir +1 día para incluir el día completo
-        # O asumir que el datepicker lo maneja. Por simpleza, lo dejamos así.
-        movimientos = movimientos.filter(fecha_movimiento__lte=fecha_hasta)
+    def filtrar(movimientos, modelo_detalle):
+        if producto_id:
+            # Filtrar si CUALQUIER detalle coincide (subconsulta, sin DISTINCT)
+            movimientos = movimientos.filter(
+                id__in=modelo_detalle.objects.filter(producto_id=producto_id).values('movimiento_id')
+            )
+        if tipo_movimiento:
+            movimientos = movimientos.filter(tipo_movimiento=tipo_movimiento)
+        if fecha_desde:
+            movimientos = movimientos.filter(fecha_movimiento__gte=fecha_desde)
+        if fecha_hasta:
+            # Añadir +1 día para incluir el día completo
+            # O asumir que el datepicker lo maneja. Por simpleza, lo dejamos así.
+            movimientos = movimientos.filter(fecha_movimiento__lte=fecha_hasta)
+        return movimientos
+
+    # --- MODIFICADO: Usar prefetch_related para detalles ---
+    movimientos = filtrar(MovimientoInventario.objects.all(), DetalleMovimiento).select_related(
+        'realizado_por', 'aplicacion'
+    ).prefetch_related(
+        'detalles__producto' # Optimiza la carga para el tooltip
+    ).order_by('-fecha_movimiento')
+    consultas = [movimientos]
+
+    # Temporadas cerradas: solo si el rango empieza antes de la frontera del archivo
+    archivados = None
+    if rango_requiere_archivo(desde=parse_date(fecha_desde) if fecha_desde else None):
+        archivados = filtrar(MovimientoArchivado.objects.all(), DetalleMovimientoArchivado).select_related(
+            'realizado_por', 'aplicacion'
+        ).prefetch_related('detalles__producto').order_by('-fecha_movimiento')
+        consultas.append(archivados)
     
-    paginator = Paginator(movimientos, 25)
+    paginator = Paginator(HistorialCombinado(movimientos, archivados), 25)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    total_movimientos = movimientos.count()
-    total_entradas = movimientos.filter(tipo_movimiento='entrada').count()
-    total_salidas = movimientos.filter(tipo_movimiento='salida').count()
-    total_ajustes = movimientos.filter(tipo_movimiento='ajuste').count()
+    # Totales por tipo: una consulta agrupada por tabla
+    totales = {'entrada': 0, 'salida': 0, 'ajuste': 0}
+    for consulta in consultas:
+        for fila in consulta.order_by().values('tipo_movimiento').annotate(total=models.Count('id')):
+            totales[fila['tipo_movimiento']] = totales.get(fila['tipo_movimiento'], 0) + fila['total']
     
     context = {
         'movimientos': page_obj,
         'productos': Producto.objects.all(),
-        'total_movimientos': total_movimientos,
-        'total_entradas': total_entradas,
-        'total_salidas': total_salidas,
-        'total_ajustes': total_ajustes,
+        'total_movimientos': paginator.count,
+        'total_entradas': totales['entrada'],
+        'total_salidas': totales['salida'],
+        'total_ajustes': totales['ajuste'],
+        'incluye_archivo': archivados is not None,
         'filtro_producto': producto_id,
         'filtro_tipo': tipo_movimiento,
         'filtro_fecha_desde': fecha_desde,
@@ -249,10 +299,16 @@ def historial_movimientos(request):
 @admin_required
 def detalle_movimiento(request, movimiento_id):
     """(NUEVA VISTA) Muestra el detalle de un movimiento y todos sus productos"""
-    movimiento = get_object_or_404(
-        MovimientoInventario.objects.prefetch_related('detalles__producto', 'realizado_por'),
-        id=movimiento_id
-    )
+    try:
+        movimiento = MovimientoInventario.objects.prefetch_related(
+            'detalles__producto', 'realizado_por'
+        ).get(id=movimiento_id)
+    except MovimientoInventario.DoesNotExist:
+        # Puede pertenecer a una temporada ya archivada (conserva el mismo id)
+        movimiento = get_object_or_404(
+            MovimientoArchivado.objects.prefetch_related('detalles__producto', 'realizado_por'),
+            id=movimiento_id
+        )
     
     context = {
         'movimiento': movimiento,
@@ -262,6 +318,40 @@ def detalle_movimiento(request, movimiento_id):
     return render(request, 'inventario/detalle_movimiento.html', context)
 
 
+@login_required
+def api_buscar(request):
+    """
+    Autocompletado de productos / equipos para los selects de los formularios.
+    GET ?q=texto&tipo=productos|equipos&limite=10
+    """
+    q = request.GET.get('q', '')
+    tipo = request.GET.get('tipo', 'productos')
+    try:
+        limite = min(max(int(request.GET.get('limite', 10)), 1), 50)
+    except ValueError:
+        limite = 10
+
+    if tipo == 'equipos':
+        ranking = buscar_equipos(q, limite=limite)
+        objetos = EquipoAgricola.objects.in_bulk([pk for pk, _ in ranking])
+        detalle = lambda e: ' - '.join(filter(None, [e.modelo, e.numero_serie]))
+    else:
+        ranking = buscar_productos(q, limite=limite)
+        objetos = Producto.objects.in_bulk([pk for pk, _ in ranking])
+        detalle = lambda p: f'Stock: {p.stock_actual} {p.unidad_medida}'
+
+    resultados = [
+        {
+            'id': pk,
+            'texto': str(objetos[pk]),
+            'detalle': detalle(objetos[pk]),
+            'puntaje': round(puntaje, 3),
+        }
+        for pk, puntaje in ranking if pk in objetos
+    ]
+    return JsonResponse({'resultados': resultados})
+
+
 @admin_required
 def lista_maquinaria(request):
     """
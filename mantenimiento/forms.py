@@ -2,15 +2,16 @@ from django import forms
 from .models import Mantenimiento
 from inventario.models import EquipoAgricola
 from autenticacion.models import Usuario
+from AgroControl.opciones import OpcionesCacheadasField, opciones
 
 class MantenimientoForm(forms.ModelForm):
     """
     Formulario principal para crear y editar Mantenimientos.
     """
 
-    # Inicializamos vacío, se llena en __init__
-    operario_responsable = forms.ModelChoiceField(
-        queryset=Usuario.objects.none(),
+    # Se ajusta en __init__ según el usuario (lista cacheada, ver AgroControl/opciones.py)
+    operario_responsable = OpcionesCacheadasField(
+        'encargados_mantencion',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
@@ -49,20 +50,21 @@ class MantenimientoForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         # --- 1. Lógica de Maquinaria (Optgroups) ---
-        equipos_operativos = EquipoAgricola.objects.filter(estado='operativo')
+        # Equipos operativos desde el caché (antes: 2 consultas por tipo de equipo)
+        equipos_para_mostrar = list(opciones('equipos_operativos_con_stock'))
         if self.instance and self.instance.pk:
-            equipos_actuales = EquipoAgricola.objects.filter(pk=self.instance.maquinaria.pk)
-            equipos_para_mostrar = (equipos_operativos | equipos_actuales).distinct().order_by('nombre')
-        else:
-            equipos_para_mostrar = equipos_operativos.order_by('nombre')
+            # El equipo actual se muestra aunque ya no esté operativo
+            if self.instance.maquinaria_id not in {pk for pk, _, _ in equipos_para_mostrar}:
+                equipo = self.instance.maquinaria
+                equipos_para_mostrar.append(
+                    (equipo.pk, f"{equipo.nombre} (Stock: {equipo.stock_actual})", equipo.tipo)
+                )
+                equipos_para_mostrar.sort(key=lambda fila: fila[1])
         
         grouped_choices = []
         for tipo_key, tipo_display in EquipoAgricola.TIPO_EQUIPO_CHOICES:
-            equipos_en_grupo = equipos_para_mostrar.filter(tipo=tipo_key)
-            if equipos_en_grupo.exists():
-                lista_opciones = [
-                    (equipo.id, f"{equipo.nombre} (Stock: {equipo.stock_actual})") for equipo in equipos_en_grupo
-                ]
+            lista_opciones = [(pk, etiqueta) for pk, etiqueta, tipo in equipos_para_mostrar if tipo == tipo_key]
+            if lista_opciones:
                 grouped_choices.append((tipo_display, lista_opciones))
 
         self.fields['maquinaria'].choices = [('', 'Seleccione un equipo')] + grouped_choices
@@ -73,14 +75,8 @@ class MantenimientoForm(forms.ModelForm):
         if self.usuario_actual:
             # Si es Admin: Ve a TODOS los encargados de mantención activos
             if self.usuario_actual.es_administrador:
-                try:
-                    self.fields['operario_responsable'].queryset = Usuario.objects.filter(
-                        esta_activo=True,
-                        rol__nombre='encargado de mantencion' # Nombre exacto del rol
-                    ).order_by('nombres')
-                except Exception:
-                    # Fallback si el rol no existe
-                    self.fields['operario_responsable'].queryset = Usuario.objects.filter(esta_activo=True)
+                # Rol 'encargado de mantencion' (nombre exacto del rol)
+                self.fields['operario_responsable'].usar_lista('encargados_mantencion')
             
             # Si NO es Admin (es Encargado): Solo se ve a sí mismo
             else:
@@ -0,0 +1,63 @@
+# mantenimiento/lotes.py
+"""
+Finalización / cancelación de varias mantenciones PROGRAMADO en una
+transacción (ver AgroControl/acciones_masivas.py).
+
+- Mantenciones bloqueadas en orden de id, luego los equipos (también en
+  orden de id).
+- Finalizar y cancelar devuelven las unidades al equipo, igual que las
+  vistas individuales: se suman por equipo y cada equipo se escribe una
+  sola vez. bulk_update no dispara post_save: las opciones cacheadas de
+  equipos se invalidan a mano (después del commit).
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+
+from AgroControl.opciones import invalidar as invalidar_opciones
+from AgroControl.acciones_masivas import ResultadoLote
+from inventario.models import EquipoAgricola
+from .models import Mantenimiento
+
+
+def procesar_mantenimientos(ids, accion, usuario_id, es_admin=False):
+    """
+    Aplica 'finalizar' o 'cancelar' a las mantenciones 'ids'. Quien no es
+    administrador solo puede procesar las suyas o las sin responsable.
+    Devuelve un ResultadoLote.
+    """
+    resultado = ResultadoLote()
+    with transaction.atomic():
+        mantenimientos = {
+            m.id: m for m in Mantenimiento.objects.select_for_update().filter(pk__in=ids)
+            .order_by('id').only('id', 'estado', 'operario_responsable_id', 'maquinaria_id', 'cantidad')
+        }
+        devolver = defaultdict(int)
+        for pk in sorted(ids):
+            mantenimiento = mantenimientos.get(pk)
+            if mantenimiento is None:
+                resultado.error(pk, 'No existe.')
+            elif not es_admin and mantenimiento.operario_responsable_id not in (None, usuario_id):
+                resultado.error(pk, f'No tienes permiso para {accion} mantenciones de otros.')
+            elif mantenimiento.estado != 'PROGRAMADO':
+                resultado.error(pk, f'Esta tarea ya no se puede {accion}.')
+            else:
+                devolver[mantenimiento.maquinaria_id] += mantenimiento.cantidad
+                resultado.correctos.append(pk)
+
+        equipos = list(
+            EquipoAgricola.objects.select_for_update().filter(pk__in=devolver).order_by('id')
+            .only('id', 'stock_actual', 'estado')
+        )
+        for equipo in equipos:
+            equipo.stock_actual += devolver[equipo.id]
+            equipo.estado = 'operativo'
+        EquipoAgricola.objects.bulk_update(equipos, ['stock_actual', 'estado'])
+        if equipos:
+            transaction.on_commit(lambda: invalidar_opciones(EquipoAgricola))
+
+        Mantenimiento.objects.filter(pk__in=resultado.correctos).update(
+            estado='REALIZADO' if accion == 'finalizar' else 'CANCELADO'
+        )
+    return resultado
@@ -23,4 +23,5 @@ urlpatterns = [
     # 5. Acciones (Botones de la tabla)
     path('<int:pk>/finalizar/', views.finalizar_mantenimiento, name='finalizar_mantenimiento'),
     path('<int:pk>/cancelar/', views.cancelar_mantenimiento, name='cancelar_mantenimiento'),
+    path('acciones-masivas/', views.acciones_masivas_mantenimiento, name='acciones_masivas'),
 ]
\ No newline at end of file
@@ -11,6 +11,8 @@ from autenticacion.models import Usuario
 from inventario.models import EquipoAgricola
 from .forms import MantenimientoForm
 from autenticacion.views import mantencion_required
+from AgroControl.acciones_masivas import error_peticion, leer_peticion, pide_json, responder
+from .lotes import procesar_mantenimientos
 
 
 # ===============================================================
@@ -295,4 +297,24 @@ def cancelar_mantenimiento(request, pk):
     
     except Exception as e:
         messages.error(request, f'Error al cancelar: {str(e)}')
-        return redirect('mantenimiento:dashboard')
\ No newline at end of file
+        return redirect('mantenimiento:dashboard')
+
+
+@mantencion_required
+@require_POST
+def acciones_masivas_mantenimiento(request):
+    """
+    Finaliza o cancela varias mantenciones PROGRAMADO en un solo POST
+    ('accion' + 'ids', o JSON) y devuelve el stock de sus equipos.
+    """
+    es_json = pide_json(request)
+    try:
+        accion, ids = leer_peticion(request)
+    except ValueError as e:
+        return error_peticion(request, es_json, str(e), 'mantenimiento:dashboard')
+
+    resultado = procesar_mantenimientos(
+        ids, accion, request.session.get('usuario_id'),
+        es_admin=bool(request.session.get('es_administrador'))
+    )
+    return responder(request, es_json, resultado, 'mantenimiento:dashboard', lambda pk: f'Mantención ID {pk}')
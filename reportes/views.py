@@ -15,7 +15,7 @@ from autenticacion.views import login_required, admin_required
 from riego.models import ControlRiego
 from aplicaciones.models import AplicacionFitosanitaria, AplicacionProducto
 from mantenimiento.models import Mantenimiento
-from cuarteles.models import Cuartel
+from cuarteles.models import Agrupacion, Cuartel
 from inventario.models import Producto, EquipoAgricola
 
 # ===============================================================
@@ -30,6 +30,7 @@ def pagina_reportes(request):
     """
     context = {
         'cuarteles': Cuartel.objects.all().order_by('nombre'),
+        'agrupaciones': Agrupacion.objects.all(),
         'tipos_producto': Producto.TIPO_CHOICES, 
         'tipos_equipo': EquipoAgricola.TIPO_EQUIPO_CHOICES, 
         'titulo': 'Generación de Reportes'
@@ -62,24 +63,28 @@ def generar_reporte(request):
         messages.error(request, "Formato de fecha inválido. Use AAAA-MM-DD.")
         return redirect('reportes:pagina_reportes')
 
+    # --- Filtro por cuartel o por fundo / sector (riego y aplicaciones) ---
+    cuartel_id = request.POST.get('filtro_cuartel')
+    agrupacion_id = request.POST.get('filtro_agrupacion') or ''
+    agrupacion = Agrupacion.objects.filter(pk=agrupacion_id).first() if agrupacion_id.isdigit() else None
+
     # --- Despachador de Reportes ---
     
     # --- REPORTE DE RIEGO ---
     if tipo_reporte == 'riego':
         if formato == 'excel':
-            return _generar_reporte_riego_excel(request, fecha_inicio, fecha_fin)
+            return _generar_reporte_riego_excel(request, fecha_inicio, fecha_fin, cuartel_id, agrupacion)
         elif formato == 'pdf':
-            return _generar_reporte_riego_pdf(request, fecha_inicio, fecha_fin)
+            return _generar_reporte_riego_pdf(request, fecha_inicio, fecha_fin, cuartel_id, agrupacion)
 
     # --- REPORTE DE APLICACIONES ---
     elif tipo_reporte == 'aplicacion':
-        cuartel_id = request.POST.get('filtro_cuartel')
         tipo_producto = request.POST.get('filtro_tipo_producto')
         
         if formato == 'excel':
-            return _generar_reporte_aplicaciones_excel(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto)
+            return _generar_reporte_aplicaciones_excel(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto, agrupacion)
         elif formato == 'pdf':
-            return _generar_reporte_aplicaciones_pdf(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto)
+            return _generar_reporte_aplicaciones_pdf(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto, agrupacion)
 
     # --- REPORTE DE MANTENIMIENTO ---
     elif tipo_reporte == 'mantenimiento':
@@ -98,13 +103,26 @@ def generar_reporte(request):
 #  3. FUNCIONES AUXILIARES (LAS QUE CREAN LOS ARCHIVOS)
 # ===============================================================
 
+def _filtrar_ubicacion(queryset, campo_cuartel, cuartel_id, agrupacion):
+    """
+    Filtra por un cuartel o por todo el subárbol de un fundo / sector
+    (prefijo de la ruta materializada, columna indexada).
+    """
+    if cuartel_id:
+        queryset = queryset.filter(**{f'{campo_cuartel}__id': cuartel_id})
+    if agrupacion:
+        queryset = queryset.filter(**{f'{campo_cuartel}__ruta_agrupacion__startswith': agrupacion.ruta})
+    return queryset
+
+
 # --- REPORTE DE RIEGO ---
 
-def _generar_reporte_riego_excel(request, fecha_inicio, fecha_fin):
+def _generar_reporte_riego_excel(request, fecha_inicio, fecha_fin, cuartel_id=None, agrupacion=None):
     riegos = ControlRiego.objects.filter(
         fecha__range=[fecha_inicio, fecha_fin],
         estado='REALIZADO'
     ).select_related('cuartel', 'encargado_riego').prefetch_related('fertilizantes__producto').order_by('fecha')
+    riegos = _filtrar_ubicacion(riegos, 'cuartel', cuartel_id, agrupacion)
     
     data = []
     for riego in riegos:
@@ -134,11 +152,12 @@ def _generar_reporte_riego_excel(request, fecha_inicio, fecha_fin):
     df.to_excel(response, index=False, sheet_name='Riegos')
     return response
 
-def _generar_reporte_riego_pdf(request, fecha_inicio, fecha_fin):
+def _generar_reporte_riego_pdf(request, fecha_inicio, fecha_fin, cuartel_id=None, agrupacion=None):
     riegos = ControlRiego.objects.filter(
         fecha__range=[fecha_inicio, fecha_fin],
         estado='REALIZADO'
     ).select_related('cuartel', 'encargado_riego').prefetch_related('fertilizantes__producto').order_by('fecha')
+    riegos = _filtrar_ubicacion(riegos, 'cuartel', cuartel_id, agrupacion)
     
     total_agua = riegos.aggregate(Sum('volumen_total_m3'))['volumen_total_m3__sum'] or 0
     
@@ -147,6 +166,7 @@ def _generar_reporte_riego_pdf(request, fecha_inicio, fecha_fin):
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
         'total_agua': total_agua,
+        'agrupacion': agrupacion,
         'fecha_generacion': timezone.now()
     }
     html_string = render_to_string('reportes/pdf_template_riego.html', context)
@@ -158,14 +178,13 @@ def _generar_reporte_riego_pdf(request, fecha_inicio, fecha_fin):
 
 # --- REPORTE DE APLICACIONES ---
 
-def _generar_reporte_aplicaciones_excel(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto):
+def _generar_reporte_aplicaciones_excel(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto, agrupacion=None):
     aplicaciones = AplicacionProducto.objects.filter(
         aplicacion__fecha_aplicacion__range=[fecha_inicio, fecha_fin],
         aplicacion__estado='realizada'
     ).select_related('aplicacion', 'producto', 'aplicacion__aplicador').order_by('aplicacion__fecha_aplicacion')
 
-    if cuartel_id: 
-        aplicaciones = aplicaciones.filter(aplicacion__cuarteles__id=cuartel_id)
+    aplicaciones = _filtrar_ubicacion(aplicaciones, 'aplicacion__cuarteles', cuartel_id, agrupacion)
     if tipo_producto:
         aplicaciones = aplicaciones.filter(producto__tipo=tipo_producto)
     aplicaciones = aplicaciones.distinct()
@@ -196,15 +215,17 @@ def _generar_reporte_aplicaciones_excel(request, fecha_inicio, fecha_fin, cuarte
     df.to_excel(response, index=False, sheet_name='Aplicaciones')
     return response
 
-def _generar_reporte_aplicaciones_pdf(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto):
+def _generar_reporte_aplicaciones_pdf(request, fecha_inicio, fecha_fin, cuartel_id, tipo_producto, agrupacion=None):
     aplicaciones = AplicacionProducto.objects.filter(
         aplicacion__fecha_aplicacion__range=[fecha_inicio, fecha_fin],
         aplicacion__estado='realizada'
     ).select_related('aplicacion', 'producto').order_by('aplicacion__fecha_aplicacion')
 
     titulo_reporte = "Reporte de Productos Aplicados"
+    aplicaciones = _filtrar_ubicacion(aplicaciones, 'aplicacion__cuarteles', cuartel_id, agrupacion)
+    if agrupacion:
+        titulo_reporte = f"Reporte de Aplicaciones en {agrupacion}"
     if cuartel_id: 
-        aplicaciones = aplicaciones.filter(aplicacion__cuarteles__id=cuartel_id)
         try:
             titulo_reporte = f"Reporte de Aplicaciones en {Cuartel.objects.get(id=cuartel_id).nombre}"
         except Cuartel.DoesNotExist: pass
@@ -1,7 +1,13 @@
 # riego/admin.py - CORREGIDO Y OPTIMIZADO
 from django.contrib import admin
 # Importar AMBOS modelos
-from .models import ControlRiego, FertilizanteRiego 
+from .models import (
+    ControlRiego, FertilizanteRiego, ProgramaRiego, FertilizanteProgramaRiego, Caudalimetro,
+    RegistroET0, CoeficienteCultivo, RecomendacionRiego, PresupuestoAgua,
+)
+from AgroControl.tokens import generar_token
+from .presupuesto import reconstruir_curvas
+from .forms import ProgramaRiegoForm
 
 # --- 1. Definir el Inline (como lo hiciste) ---
 class FertilizanteRiegoInline(admin.TabularInline):
@@ -53,6 +59,7 @@ class ControlRiegoAdmin(admin.ModelAdmin):
     readonly_fields = [
         'duracion_minutos',
         'volumen_total_m3',
+        'volumen_medido_m3',
         'creado_en'
     ]
     
@@ -70,12 +77,14 @@ class ControlRiegoAdmin(admin.ModelAdmin):
             'fields': (
                 'caudal_m3h',
                 'volumen_total_m3',
+                'volumen_medido_m3',
                 'incluye_fertilizante'
             )
         }),
         ('Personal', {
             'fields': (
                 'encargado_riego',  ## <-- CORREGIDO
+                'programa',
             )
         }),
         ('Observaciones', {
@@ -145,4 +154,111 @@ class FertilizanteRiegoAdmin(admin.ModelAdmin):
     
     def get_cantidad_display(self, obj):
         return f"{obj.cantidad_kg} kg"
-    get_cantidad_display.short_description = 'Cantidad'
\ No newline at end of file
+    get_cantidad_display.short_description = 'Cantidad'
+
+
+# --- 5. Programas de Riego Recurrentes ---
+class FertilizanteProgramaInline(admin.TabularInline):
+    model = FertilizanteProgramaRiego
+    extra = 1
+    fields = ['producto', 'cantidad_kg']
+    autocomplete_fields = ['producto']
+
+
+@admin.register(ProgramaRiego)
+class ProgramaRiegoAdmin(admin.ModelAdmin):
+    """Admin para ProgramaRiego (los riegos se generan desde riego/programas/)"""
+
+    form = ProgramaRiegoForm
+    list_select_related = ['encargado_riego']
+    list_display = ['nombre', 'get_dias_display', 'horario_inicio', 'horario_fin',
+                    'caudal_m3h', 'encargado_riego', 'activo', 'generado_hasta']
+    list_filter = ['activo', 'encargado_riego']
+    search_fields = ['nombre']
+    readonly_fields = ['generado_hasta', 'creado_en']
+    inlines = [FertilizanteProgramaInline]
+
+    def get_dias_display(self, obj):
+        return obj.get_dias_display()
+    get_dias_display.short_description = 'Días'
+
+
+# --- 6. Caudalímetros ---
+@admin.register(Caudalimetro)
+class CaudalimetroAdmin(admin.ModelAdmin):
+    """Admin para Caudalimetro (las lecturas llegan por riego/api/caudalimetros/lecturas/)"""
+
+    list_select_related = ['cuartel']
+    list_display = ['codigo', 'nombre', 'cuartel', 'activo', 'ultima_lectura_en', 'ultimo_totalizador_m3']
+    list_filter = ['activo', 'cuartel']
+    search_fields = ['codigo', 'nombre', 'cuartel__nombre']
+    readonly_fields = ['ultima_lectura_en', 'ultimo_totalizador_m3']
+    actions = ['regenerar_token']
+
+    @admin.action(description='Generar token nuevo (invalida el anterior)')
+    def regenerar_token(self, request, queryset):
+        for caudalimetro in queryset:
+            token = generar_token(caudalimetro)
+            self.message_user(request, f'{caudalimetro.codigo}: {token}')
+
+
+
+@admin.register(RegistroET0)
+class RegistroET0Admin(admin.ModelAdmin):
+    """Admin para RegistroET0 (se carga con: python manage.py importar_et0 archivo.csv)"""
+
+    list_display = ['fecha', 'et0_mm', 'precipitacion_mm', 'fuente', 'importado_en']
+    date_hierarchy = 'fecha'
+    search_fields = ['fuente']
+
+
+@admin.register(CoeficienteCultivo)
+class CoeficienteCultivoAdmin(admin.ModelAdmin):
+    """Admin para CoeficienteCultivo (Kc por tipo de planta / variedad)"""
+
+    list_display = ['tipo_planta', 'variedad', 'kc']
+    list_editable = ['kc']
+    search_fields = ['tipo_planta', 'variedad']
+
+
+@admin.register(RecomendacionRiego)
+class RecomendacionRiegoAdmin(admin.ModelAdmin):
+    """Admin de solo lectura para RecomendacionRiego (la calcula: python manage.py recomendar_riego)"""
+
+    list_select_related = ['cuartel']
+    list_display = [
+        'fecha', 'cuartel', 'et0_mm', 'kc', 'demanda_m3', 'aplicado_m3',
+        'volumen_recomendado_m3', 'duracion_sugerida_minutos',
+    ]
+    list_filter = ['fecha', 'kc_por_defecto']
+    date_hierarchy = 'fecha'
+    search_fields = ['cuartel__nombre']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PresupuestoAgua)
+class PresupuestoAguaAdmin(admin.ModelAdmin):
+    """Admin para PresupuestoAgua (el consumo lo mantiene la finalización de riegos)"""
+
+    list_select_related = ['cuartel']
+    list_display = ['cuartel', 'temporada', 'fecha_inicio', 'fecha_fin', 'presupuesto_m3_ha', 'consumido_m3', 'ultimo_riego']
+    list_filter = ['temporada']
+    search_fields = ['cuartel__nombre']
+    readonly_fields = ['consumido_m3', 'ultimo_riego', 'actualizado_en']
+    actions = ['recalcular']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Presupuesto nuevo o con otro período / área: la curva se rehace desde los riegos
+        if not change or {'fecha_inicio', 'fecha_fin', 'area_hectareas', 'cuartel'} & set(form.changed_data):
+            reconstruir_curvas([obj])
+
+    @admin.action(description='Recalcular curva y consumo desde los riegos realizados')
+    def recalcular(self, request, queryset):
+        cantidad = reconstruir_curvas(queryset)
+        self.message_user(request, f'{cantidad} presupuesto(s) recalculados.')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RiegoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'riego'
+
+    def ready(self):
+        # Presupuestos de agua al borrar riegos realizados
+        import riego.presupuesto
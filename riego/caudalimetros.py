@@ -0,0 +1,270 @@
+# riego/caudalimetros.py
+"""
+Ingesta de lecturas de caudalímetros y conciliación del volumen real.
+
+Entrada (POST JSON, header 'Authorization: Token <token>'):
+    {
+      "caudalimetro": "CM-01",
+      "lecturas": [[1760000000, 1523.412], [1760000005, 1523.447], ...]
+    }
+Cada lectura es [instante, totalizador_m3]: el instante en segundos epoch
+(o ISO 8601) y el totalizador son los m³ acumulados del medidor. También
+se acepta {"t": ..., "v": ...}.
+
+- El lote se agrega en memoria por minuto antes de escribir: el volumen
+  entre dos lecturas (diferencia de totalizador) se reparte entre los
+  minutos que cubre, proporcional al tiempo. Unas 60 filas por hora y
+  medidor, sin importar la frecuencia de envío.
+- El búfer es el lote: no se guardan lecturas en memoria entre peticiones.
+  Una lectura respondida con 200 y aún sin escribir se perdería al
+  reiniciarse el worker de gunicorn (redeploy, caída), y cada worker
+  tendría su propio búfer (render.yaml fija WEB_CONCURRENCY=2; gunicorn lo
+  toma como número de workers, sin él es uno solo). El controlador ya
+  agrupa sus lecturas: cada envío es un lote.
+- Los minutos se escriben de una vez (COPY a una tabla temporal + INSERT
+  ... ON CONFLICT en PostgreSQL; INSERT ... ON CONFLICT en lote en los
+  demás motores). Si otro lote ya escribió el minuto, se suman.
+- Lecturas anteriores a la última aceptada se descartan (reenvíos). Si el
+  totalizador baja (medidor reiniciado o cambiado) no se cuenta volumen y
+  esa lectura pasa a ser la nueva base.
+- Después se recalcula 'volumen_medido_m3' de los riegos del cuartel cuyo
+  horario toca los minutos recibidos. Si cambia el volumen de un riego ya
+  REALIZADO, se rehacen los presupuestos de agua que lo cubren y el
+  volumen de agua de su fundo / sector.
+"""
+
+import io
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from AgroControl.tokens import autenticar as autenticar_equipo
+from cuarteles.jerarquia import agrupaciones_de_cuarteles_al_confirmar
+from .models import Caudalimetro, ControlRiego, LecturaCaudal
+from .presupuesto import reconstruir_por_riegos, volumen_riego
+
+MAX_LECTURAS_POR_LOTE = 20000
+# Huecos más largos no se reparten: el volumen queda en el minuto de la lectura
+MAX_HUECO_REPARTIDO = timedelta(hours=6)
+MINUTO = timedelta(minutes=1)
+
+
+class ErrorLecturas(ValueError):
+    """Lote mal formado (se responde 400 sin escribir nada)."""
+
+
+# ---------------------------------------------------------------
+# TOKENS
+# ---------------------------------------------------------------
+def autenticar(codigo, token):
+    """Caudalímetro activo con ese código y token, o None."""
+    return autenticar_equipo(Caudalimetro.objects.all(), codigo, token)
+
+
+# ---------------------------------------------------------------
+# AGREGACIÓN POR MINUTO
+# ---------------------------------------------------------------
+def _instante(valor):
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return datetime.fromtimestamp(valor, tz=dt_timezone.utc)
+    if isinstance(valor, str):
+        instante = parse_datetime(valor)
+        if instante is not None:
+            return instante if timezone.is_aware(instante) else timezone.make_aware(instante)
+    raise ValueError
+
+
+def leer_lecturas(lecturas):
+    """[(instante aware, totalizador)] ordenadas por instante."""
+    if not isinstance(lecturas, list):
+        raise ErrorLecturas("'lecturas' debe ser una lista.")
+    if len(lecturas) > MAX_LECTURAS_POR_LOTE:
+        raise ErrorLecturas(f'Máximo {MAX_LECTURAS_POR_LOTE} lecturas por lote.')
+    filas = []
+    for i, lectura in enumerate(lecturas):
+        try:
+            if isinstance(lectura, dict):
+                t, v = lectura['t'], lectura['v']
+            else:
+                t, v = lectura
+            v = float(v)
+            if v < 0 or v != v:
+                raise ValueError
+            filas.append((_instante(t), v))
+        except (KeyError, TypeError, ValueError, OverflowError, OSError):
+            raise ErrorLecturas(f'Lectura {i} inválida: se espera [instante, totalizador_m3].')
+    filas.sort(key=lambda f: f[0])
+    return filas
+
+
+def _minuto(instante):
+    return instante.replace(second=0, microsecond=0)
+
+
+def _repartir(minutos, desde, hasta, volumen):
+    """Suma 'volumen' a los minutos entre 'desde' y 'hasta', proporcional al tiempo."""
+    total = (hasta - desde).total_seconds()
+    if total <= 0 or hasta - desde > MAX_HUECO_REPARTIDO:
+        minutos[_minuto(hasta)] = minutos.get(_minuto(hasta), 0.0) + volumen
+        return
+    inicio = desde
+    while inicio < hasta:
+        fin = min(_minuto(inicio) + MINUTO, hasta)
+        minutos[_minuto(inicio)] = minutos.get(_minuto(inicio), 0.0) + volumen * (fin - inicio).total_seconds() / total
+        inicio = fin
+
+
+def agrupar_por_minuto(lecturas, ultimo_totalizador=None, ultima_lectura_en=None):
+    """
+    Devuelve ({minuto: volumen}, {minuto: muestras}, totalizador final,
+    instante final, descartadas).
+    """
+    volumenes, muestras, descartadas = {}, {}, 0
+    base_v, base_t = ultimo_totalizador, ultima_lectura_en
+    for instante, totalizador in lecturas:
+        if base_t is not None and instante <= base_t:
+            descartadas += 1
+            continue
+        minuto = _minuto(instante)
+        muestras[minuto] = muestras.get(minuto, 0) + 1
+        volumenes.setdefault(minuto, 0.0)
+        if base_v is not None and totalizador > base_v:
+            _repartir(volumenes, base_t, instante, totalizador - base_v)
+        base_v, base_t = totalizador, instante
+    return volumenes, muestras, base_v, base_t, descartadas
+
+
+# ---------------------------------------------------------------
+# ESCRITURA
+# ---------------------------------------------------------------
+def _guardar_minutos(caudalimetro_id, volumenes, muestras):
+    tabla = LecturaCaudal._meta.db_table
+    filas = [
+        (caudalimetro_id, minuto, volumen, muestras.get(minuto, 0))
+        for minuto, volumen in sorted(volumenes.items())
+    ]
+    actualizar = (
+        'ON CONFLICT (caudalimetro_id, minuto) DO UPDATE SET '
+        f'volumen_m3 = {tabla}.volumen_m3 + EXCLUDED.volumen_m3, '
+        f'muestras = {tabla}.muestras + EXCLUDED.muestras'
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # COPY a una tabla temporal y un solo INSERT ... SELECT
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS lectura_caudal_carga '
+                '(caudalimetro_id bigint, minuto timestamptz, volumen_m3 double precision, muestras integer) '
+                'ON COMMIT DELETE ROWS'
+            )
+            datos = io.StringIO(''.join(
+                f'{c}\t{m.isoformat()}\t{v!r}\t{n}\n' for c, m, v, n in filas
+            ))
+            cursor.cursor.copy_expert(
+                'COPY lectura_caudal_carga (caudalimetro_id, minuto, volumen_m3, muestras) FROM STDIN', datos
+            )
+            cursor.execute(
+                f'INSERT INTO {tabla} (caudalimetro_id, minuto, volumen_m3, muestras) '
+                f'SELECT caudalimetro_id, minuto, volumen_m3, muestras FROM lectura_caudal_carga {actualizar}'
+            )
+            cursor.execute('TRUNCATE lectura_caudal_carga')
+        else:
+            cursor.executemany(
+                f'INSERT INTO {tabla} (caudalimetro_id, minuto, volumen_m3, muestras) '
+                f'VALUES (%s, %s, %s, %s) {actualizar}',
+                [
+                    (c, LecturaCaudal._meta.get_field('minuto').get_db_prep_value(m, connection), v, n)
+                    for c, m, v, n in filas
+                ]
+            )
+    return len(filas)
+
+
+# ---------------------------------------------------------------
+# CONCILIACIÓN
+# ---------------------------------------------------------------
+def ventana_riego(riego):
+    """[inicio, fin) del riego como datetimes aware (hora local)."""
+    inicio = timezone.make_aware(datetime.combine(riego.fecha, riego.horario_inicio))
+    fin = timezone.make_aware(datetime.combine(riego.fecha, riego.horario_fin))
+    if fin <= inicio:
+        fin += timedelta(days=1)
+    return inicio, fin
+
+
+def conciliar_riegos(cuartel_id, desde, hasta):
+    """
+    Recalcula 'volumen_medido_m3' de los riegos (no cancelados) del cuartel
+    cuyo horario toca [desde, hasta). Devuelve cuántos se actualizaron.
+    """
+    desde_local, hasta_local = timezone.localtime(desde).date(), timezone.localtime(hasta).date()
+    candidatos = ControlRiego.objects.filter(
+        cuartel_id=cuartel_id, fecha__range=[desde_local - timedelta(days=1), hasta_local]
+    ).exclude(estado=ControlRiego.EstadoRiego.CANCELADO).only(
+        'id', 'cuartel_id', 'estado', 'fecha', 'horario_inicio', 'horario_fin',
+        'volumen_total_m3', 'volumen_medido_m3',
+    )
+    riegos = []
+    for riego in candidatos:
+        inicio, fin = ventana_riego(riego)
+        if inicio < hasta and desde < fin:
+            riegos.append((riego, inicio, fin))
+    if not riegos:
+        return 0
+
+    minutos = list(LecturaCaudal.objects.filter(
+        caudalimetro__cuartel_id=cuartel_id,
+        minuto__gte=min(i for _, i, _ in riegos),
+        minuto__lt=max(f for _, _, f in riegos),
+    ).values_list('minuto', 'volumen_m3'))
+
+    consumo_cambiado = []
+    for riego, inicio, fin in riegos:
+        anterior = volumen_riego(riego)
+        volumen = sum(v for m, v in minutos if inicio <= m < fin)
+        riego.volumen_medido_m3 = Decimal(str(round(volumen, 2)))
+        if riego.estado == ControlRiego.EstadoRiego.REALIZADO and volumen_riego(riego) != anterior:
+            consumo_cambiado.append((riego.cuartel_id, riego.fecha))
+    ControlRiego.objects.bulk_update([r for r, _, _ in riegos], ['volumen_medido_m3'])
+    # El presupuesto y los agregados de fundos / sectores ya sumaron el volumen anterior de los REALIZADOS
+    reconstruir_por_riegos(consumo_cambiado)
+    if consumo_cambiado:
+        agrupaciones_de_cuarteles_al_confirmar([cuartel_id])
+    return len(riegos)
+
+
+# ---------------------------------------------------------------
+# LOTE COMPLETO
+# ---------------------------------------------------------------
+def registrar_lecturas(caudalimetro, lecturas):
+    """
+    Agrega y guarda un lote de lecturas del caudalímetro. Devuelve un dict
+    con 'recibidas', 'descartadas', 'minutos' y 'riegos_conciliados'.
+    """
+    filas = leer_lecturas(lecturas)
+    resultado = {'recibidas': len(filas), 'descartadas': 0, 'minutos': 0, 'riegos_conciliados': 0}
+    if not filas:
+        return resultado
+
+    with transaction.atomic():
+        # Bloquea el medidor: dos lotes simultáneos no deben usar la misma base
+        cm = Caudalimetro.objects.select_for_update().only(
+            'id', 'cuartel_id', 'ultimo_totalizador_m3', 'ultima_lectura_en'
+        ).get(pk=caudalimetro.pk)
+        volumenes, muestras, totalizador, instante, descartadas = agrupar_por_minuto(
+            filas, cm.ultimo_totalizador_m3, cm.ultima_lectura_en
+        )
+        resultado['descartadas'] = descartadas
+        if not volumenes:
+            return resultado
+
+        resultado['minutos'] = _guardar_minutos(cm.pk, volumenes, muestras)
+        Caudalimetro.objects.filter(pk=cm.pk).update(
+            ultimo_totalizador_m3=totalizador, ultima_lectura_en=instante
+        )
+        resultado['riegos_conciliados'] = conciliar_riegos(
+            cm.cuartel_id, min(volumenes), max(volumenes) + MINUTO
+        )
+    return resultado
@@ -0,0 +1,139 @@
+# riego/conflictos.py
+"""
+Detección de riegos que se topan en el mismo cuartel o con el mismo encargado.
+
+- Cada riego se convierte en un intervalo [inicio, fin) en minutos absolutos
+  (fecha + hora). Si 'horario_fin' es menor que 'horario_inicio' el riego
+  cruza la medianoche y termina al día siguiente, igual que en
+  'ControlRiego.save'.
+- Los riegos de la ventana se cargan con UNA consulta (desde el día anterior,
+  por los que cruzan la medianoche) y se arma un árbol de intervalos por
+  cuartel y otro por encargado.
+- ArbolIntervalos: intervalos ordenados por inicio + árbol de segmentos con
+  el máximo 'fin' de cada rango. Consultar cuesta O(log n + k) (k = topes
+  encontrados); construirlo, O(n log n).
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Q
+
+from .models import ControlRiego
+
+MINUTOS_DIA = 24 * 60
+
+
+def intervalo(fecha, horario_inicio, horario_fin):
+    """(inicio, fin) en minutos desde el día 1 del calendario."""
+    inicio = fecha.toordinal() * MINUTOS_DIA + horario_inicio.hour * 60 + horario_inicio.minute
+    duracion = (horario_fin.hour * 60 + horario_fin.minute) - (horario_inicio.hour * 60 + horario_inicio.minute)
+    if duracion < 0:
+        duracion += MINUTOS_DIA
+    return inicio, inicio + duracion
+
+
+class ArbolIntervalos:
+    """Árbol de intervalos estático sobre una lista de (inicio, fin, id)."""
+
+    def __init__(self, intervalos):
+        self.intervalos = sorted(intervalos)
+        self.inicios = [i[0] for i in self.intervalos]
+        n = len(self.intervalos)
+        self.tamano = 1
+        while self.tamano < max(n, 1):
+            self.tamano *= 2
+        # Hojas en [tamano, tamano + n); cada nodo guarda el mayor 'fin' de su rango
+        self.max_fin = [float('-inf')] * (2 * self.tamano)
+        for i, (_, fin, _) in enumerate(self.intervalos):
+            self.max_fin[self.tamano + i] = fin
+        for nodo in range(self.tamano - 1, 0, -1):
+            self.max_fin[nodo] = max(self.max_fin[2 * nodo], self.max_fin[2 * nodo + 1])
+
+    def __len__(self):
+        return len(self.intervalos)
+
+    def solapados(self, inicio, fin):
+        """Intervalos que se topan con [inicio, fin) (los de duración 0 no se topan con nada)."""
+        if fin <= inicio or not self.intervalos:
+            return []
+        # Candidatos: los que empiezan antes de 'fin' (un prefijo del orden por inicio)...
+        limite = bisect_left(self.inicios, fin)
+        resultado = []
+        # ...y de esos, los que terminan después de 'inicio' (se poda con max_fin)
+        pendientes = [(1, 0, self.tamano)]
+        while pendientes:
+            nodo, desde, hasta = pendientes.pop()
+            if desde >= limite or self.max_fin[nodo] <= inicio:
+                continue
+            if nodo >= self.tamano:
+                i_inicio, i_fin, pk = self.intervalos[nodo - self.tamano]
+                if i_fin > i_inicio:
+                    resultado.append((i_inicio, i_fin, pk))
+                continue
+            medio = (desde + hasta) // 2
+            pendientes.append((2 * nodo + 1, medio, hasta))
+            pendientes.append((2 * nodo, desde, medio))
+        return resultado
+
+
+class AgendaRiego:
+    """Riegos vigentes (no cancelados) de una ventana de fechas, indexados por cuartel y por encargado."""
+
+    def __init__(self, desde, hasta, cuarteles=None, encargados=None):
+        riegos = ControlRiego.objects.filter(
+            fecha__range=[desde - timedelta(days=1), hasta]
+        ).exclude(estado=ControlRiego.EstadoRiego.CANCELADO)
+        # Para validar riegos puntuales basta con sus cuarteles y sus encargados
+        if cuarteles or encargados:
+            riegos = riegos.filter(
+                Q(cuartel_id__in=cuarteles or []) | Q(encargado_riego_id__in=encargados or [])
+            )
+
+        self.riegos = {}
+        por_cuartel, por_encargado = defaultdict(list), defaultdict(list)
+        for pk, c_id, e_id, fecha, inicio, fin in riegos.order_by().values_list(
+            'id', 'cuartel_id', 'encargado_riego_id', 'fecha', 'horario_inicio', 'horario_fin'
+        ):
+            i_inicio, i_fin = intervalo(fecha, inicio, fin)
+            self.riegos[pk] = {
+                'id': pk, 'cuartel_id': c_id, 'encargado_id': e_id,
+                'fecha': fecha, 'horario_inicio': inicio, 'horario_fin': fin,
+            }
+            por_cuartel[c_id].append((i_inicio, i_fin, pk))
+            if e_id:
+                por_encargado[e_id].append((i_inicio, i_fin, pk))
+        self.por_cuartel = {k: ArbolIntervalos(v) for k, v in por_cuartel.items()}
+        self.por_encargado = {k: ArbolIntervalos(v) for k, v in por_encargado.items()}
+
+    def conflictos(self, cuartel_id, encargado_id, fecha, horario_inicio, horario_fin, excluir_id=None):
+        """[(motivo, id del riego)] con los que se topa el riego dado ('cuartel' o 'encargado')."""
+        inicio, fin = intervalo(fecha, horario_inicio, horario_fin)
+        resultado = []
+        for motivo, arbol in (
+            ('cuartel', self.por_cuartel.get(cuartel_id)),
+            ('encargado', self.por_encargado.get(encargado_id) if encargado_id else None),
+        ):
+            if arbol is None:
+                continue
+            resultado.extend((motivo, pk) for _, _, pk in arbol.solapados(inicio, fin) if pk != excluir_id)
+        return resultado
+
+    def describir(self, pk):
+        r = self.riegos[pk]
+        return (f"riego #{pk} del {r['fecha']:%d/%m/%Y}, "
+                f"{r['horario_inicio']:%H:%M}–{r['horario_fin']:%H:%M}")
+
+    def todos_los_conflictos(self, desde):
+        """Pares (motivo, id_a, id_b) con id_a < id_b, de riegos que empiezan desde 'desde'."""
+        minimo = desde.toordinal() * MINUTOS_DIA
+        pares = []
+        for motivo, arboles in (('cuartel', self.por_cuartel), ('encargado', self.por_encargado)):
+            for arbol in arboles.values():
+                for inicio, fin, pk in arbol.intervalos:
+                    for otro_inicio, _, otro in arbol.solapados(inicio, fin):
+                        # Cada par una vez; dos riegos del día anterior no son de esta ventana
+                        if otro > pk and max(inicio, otro_inicio) >= minimo:
+                            pares.append((motivo, pk, otro))
+        return pares
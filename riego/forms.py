@@ -1,8 +1,14 @@
+from datetime import datetime, timedelta
+
 from django import forms
-from .models import ControlRiego, FertilizanteRiego
-from cuarteles.models import Cuartel
+from django.utils import timezone
+from .models import ControlRiego, FertilizanteRiego, ProgramaRiego, FertilizanteProgramaRiego
+from .conflictos import AgendaRiego
+from .programas import SEMANAS_MAX
 from autenticacion.models import Usuario
-from inventario.models import Producto
+from cuarteles.models import Cuartel
+from AgroControl.opciones import OpcionesCacheadasField
+from aplicaciones.restricciones import describir_reingreso, reingreso_restringido
 
 # ---------------------------------------------------------------
 # Formulario Principal (ControlRiego)
@@ -10,9 +16,17 @@ from inventario.models import Producto
 class ControlRiegoForm(forms.ModelForm):
     """Formulario para ControlRiego con ForeignKey"""
     
-    # Inicializamos el campo vacío, se llena en __init__
-    encargado_riego = forms.ModelChoiceField(
-        queryset=Usuario.objects.none(),
+    # Listas desde el caché compartido (ver AgroControl/opciones.py)
+    cuartel = OpcionesCacheadasField(
+        'cuarteles_con_numero',
+        label='Sector/Cuartel',
+        empty_label="Seleccione un cuartel",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    # Se ajusta en __init__ según el usuario
+    encargado_riego = OpcionesCacheadasField(
+        'regadores',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
 
@@ -30,7 +44,6 @@ class ControlRiegoForm(forms.ModelForm):
             'observaciones'
         ]
         widgets = {
-            'cuartel': forms.Select(attrs={'class': 'form-select'}),
             'estado': forms.Select(attrs={'class': 'form-select'}),
             'fecha': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
             'horario_inicio': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
@@ -45,10 +58,7 @@ class ControlRiegoForm(forms.ModelForm):
         self.usuario_actual = kwargs.pop('usuario_actual', None)
         super().__init__(*args, **kwargs)
         
-        # 1. Configurar cuarteles
-        self.fields['cuartel'].queryset = Cuartel.objects.all().order_by('nombre')
-        self.fields['cuartel'].empty_label = "Seleccione un cuartel"
-        self.fields['cuartel'].label_from_instance = lambda obj: f"{obj.nombre} (Cuartel {obj.numero})"
+        # 1. Cuarteles: declarados arriba (etiqueta "Nombre (Cuartel N)")
         
         # ==========================================================
         # --- 2. LÓGICA DE FILTRADO DE REGADORES (RF014) ---
@@ -56,10 +66,7 @@ class ControlRiegoForm(forms.ModelForm):
         if self.usuario_actual:
             # Si es Admin: Ve a TODOS los regadores activos
             if self.usuario_actual.es_administrador:
-                self.fields['encargado_riego'].queryset = Usuario.objects.filter(
-                    esta_activo=True,
-                    rol__nombre='regador'
-                ).order_by('nombres')
+                self.fields['encargado_riego'].usar_lista('regadores')
             
             # Si es Regador: Solo se ve a sí mismo
             else:
@@ -79,28 +86,62 @@ class ControlRiegoForm(forms.ModelForm):
         elif hasattr(Usuario, 'nombres'):
              self.fields['encargado_riego'].label_from_instance = lambda obj: f"{obj.nombres} {obj.apellidos}"
 
+    def clean(self):
+        """
+        Rechaza horarios que se topan con otro riego del mismo cuartel o del
+        mismo encargado, y riegos que empiezan durante el reingreso
+        restringido del cuartel.
+        """
+        cleaned_data = super().clean()
+        cuartel = cleaned_data.get('cuartel')
+        encargado = cleaned_data.get('encargado_riego')
+        fecha = cleaned_data.get('fecha')
+        inicio, fin = cleaned_data.get('horario_inicio'), cleaned_data.get('horario_fin')
+        if not (cuartel and fecha and inicio and fin) or cleaned_data.get('estado') == ControlRiego.EstadoRiego.CANCELADO:
+            return cleaned_data
+
+        # Hasta el día siguiente: el riego puede cruzar la medianoche
+        agenda = AgendaRiego(
+            fecha, fecha + timedelta(days=1), cuarteles=[cuartel.pk], encargados=[encargado.pk] if encargado else None
+        )
+        conflictos = agenda.conflictos(
+            cuartel.pk, encargado.pk if encargado else None, fecha, inicio, fin, excluir_id=self.instance.pk
+        )
+        for motivo, pk in conflictos:
+            if motivo == 'cuartel':
+                mensaje = f'El cuartel ya tiene un riego en ese horario ({agenda.describir(pk)}).'
+            else:
+                mensaje = f'El encargado ya tiene un riego en ese horario ({agenda.describir(pk)}).'
+            self.add_error(None, mensaje)
+
+        momento = timezone.make_aware(datetime.combine(fecha, inicio))
+        restriccion = reingreso_restringido([cuartel.pk], momento).get(cuartel.pk)
+        if restriccion:
+            self.add_error(None, f'El cuartel tiene {describir_reingreso(restriccion)}.')
+        return cleaned_data
+
 
 # ---------------------------------------------------------------
 # Formulario Secundario (FertilizanteRiego)
 # ---------------------------------------------------------------
 class FertilizanteRiegoForm(forms.ModelForm):
     """Formulario simple para un solo fertilizante"""
+
+    # Una sola consulta para todas las filas del formset
+    producto = OpcionesCacheadasField(
+        'fertilizantes_activos',
+        label='Producto',
+        empty_label="Seleccione fertilizante",
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+
     class Meta:
         model = FertilizanteRiego
         fields = ['producto', 'cantidad_kg']
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-select form-select-sm'}),
             'cantidad_kg': forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'step': '0.01'}),
         }
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        
-        self.fields['producto'].queryset = Producto.objects.filter(
-            tipo='fertilizante',
-            esta_activo=True
-        ).order_by('nombre')
-        self.fields['producto'].empty_label = "Seleccione fertilizante"
+
 
 # ---------------------------------------------------------------
 # FormSet
@@ -112,4 +153,122 @@ FertilizanteRiegoFormSet = forms.inlineformset_factory(
     extra=1, 
     can_delete=True,
     fk_name='control_riego'
-)
\ No newline at end of file
+)
+
+
+# ---------------------------------------------------------------
+# Programas de Riego Recurrentes
+# ---------------------------------------------------------------
+class ProgramaRiegoForm(forms.ModelForm):
+    """Formulario para ProgramaRiego (cuarteles, días y horario fijo)"""
+
+    cuarteles = forms.ModelMultipleChoiceField(
+        queryset=Cuartel.objects.order_by('nombre'),
+        label='Cuarteles',
+        widget=forms.SelectMultiple(attrs={'class': 'form-select', 'size': 8})
+    )
+    dias_semana = forms.TypedMultipleChoiceField(
+        choices=ProgramaRiego.DIAS_SEMANA,
+        coerce=int,
+        label='Días de riego',
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'})
+    )
+    encargado_riego = OpcionesCacheadasField(
+        'regadores',
+        required=False,
+        label='Encargado de Riego',
+        empty_label="Sin encargado",
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+
+    class Meta:
+        model = ProgramaRiego
+        fields = [
+            'nombre',
+            'cuarteles',
+            'dias_semana',
+            'horario_inicio',
+            'horario_fin',
+            'caudal_m3h',
+            'encargado_riego',
+            'fecha_inicio',
+            'fecha_fin',
+            'activo',
+            'observaciones'
+        ]
+        widgets = {
+            'nombre': forms.TextInput(attrs={'class': 'form-control'}),
+            'horario_inicio': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+            'horario_fin': forms.TimeInput(attrs={'type': 'time', 'class': 'form-control'}),
+            'caudal_m3h': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+            'fecha_inicio': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}, format='%Y-%m-%d'),
+            'fecha_fin': forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}, format='%Y-%m-%d'),
+            'activo': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 2}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        self.usuario_actual = kwargs.pop('usuario_actual', None)
+        super().__init__(*args, **kwargs)
+
+        # Un regador solo programa sus propios riegos (misma regla que ControlRiegoForm)
+        if self.usuario_actual and not self.usuario_actual.es_administrador:
+            self.fields['encargado_riego'].queryset = Usuario.objects.filter(pk=self.usuario_actual.pk)
+            self.fields['encargado_riego'].initial = self.usuario_actual
+            self.fields['encargado_riego'].required = True
+            self.fields['encargado_riego'].empty_label = None
+            self.fields['encargado_riego'].label_from_instance = lambda obj: obj.get_full_name()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        inicio, fin = cleaned_data.get('horario_inicio'), cleaned_data.get('horario_fin')
+        if inicio and fin and inicio == fin:
+            self.add_error('horario_fin', 'El término debe ser distinto del inicio.')
+        desde, hasta = cleaned_data.get('fecha_inicio'), cleaned_data.get('fecha_fin')
+        if desde and hasta and hasta < desde:
+            self.add_error('fecha_fin', 'Debe ser posterior a la fecha de inicio.')
+        return cleaned_data
+
+
+class FertilizanteProgramaForm(forms.ModelForm):
+    """Un fertilizante de la plantilla del programa"""
+
+    producto = OpcionesCacheadasField(
+        'fertilizantes_activos',
+        label='Producto',
+        empty_label="Seleccione fertilizante",
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'})
+    )
+
+    class Meta:
+        model = FertilizanteProgramaRiego
+        fields = ['producto', 'cantidad_kg']
+        widgets = {
+            'cantidad_kg': forms.NumberInput(attrs={'class': 'form-control form-control-sm', 'step': '0.01'}),
+        }
+
+
+FertilizanteProgramaFormSet = forms.inlineformset_factory(
+    ProgramaRiego,
+    FertilizanteProgramaRiego,
+    form=FertilizanteProgramaForm,
+    extra=2,
+    can_delete=True,
+    fk_name='programa'
+)
+
+
+class GenerarProgramaForm(forms.Form):
+    """Cuántas semanas materializar y desde qué fecha"""
+
+    desde = forms.DateField(
+        label='Desde',
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    semanas = forms.IntegerField(
+        label='Semanas',
+        min_value=1,
+        max_value=SEMANAS_MAX,
+        initial=4,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
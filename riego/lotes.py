@@ -0,0 +1,123 @@
+# riego/lotes.py
+"""
+Finalización / cancelación de varios riegos PROGRAMADOS en una transacción
+(ver AgroControl/acciones_masivas.py).
+
+- Riegos bloqueados en orden de id, luego los productos (ReservaStock).
+- Los fertilizantes de todos los riegos se leen con UNA consulta.
+- Un riego sin stock suficiente falla solo; los demás se finalizan.
+- Las salidas de los riegos finalizados van en UN MovimientoInventario con
+  un detalle por producto (la suma de todos los riegos) y una sola
+  actualización de stock por producto.
+- El volumen de los finalizados se suma a los presupuestos de agua y,
+  después del commit, a los agregados de sus fundos / sectores (el
+  UPDATE en bloque no emite post_save).
+"""
+
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from AgroControl.acciones_masivas import ResultadoLote
+from cuarteles.jerarquia import recalcular_agrupaciones
+from cuarteles.models import Cuartel
+from inventario.models import DetalleMovimiento, MovimientoInventario
+from inventario.salidas import ReservaStock
+from .models import ControlRiego, FertilizanteRiego
+from .presupuesto import registrar_consumo, volumen_riego
+
+
+def _motivo(ids):
+    motivo = f"Salida por Riegos ID: {', '.join(map(str, ids))}"
+    return motivo if len(motivo) <= 200 else motivo[:199] + '…'
+
+
+def procesar_riegos(ids, accion, usuario, es_admin=False):
+    """
+    Aplica 'finalizar' o 'cancelar' a los riegos 'ids'. Quien no es
+    administrador solo puede procesar los riegos que tiene a cargo.
+    Devuelve un ResultadoLote.
+    """
+    resultado = ResultadoLote()
+    with transaction.atomic():
+        riegos = {
+            r.id: r for r in ControlRiego.objects.select_for_update().filter(pk__in=ids)
+            .order_by('id').only(
+                'id', 'estado', 'incluye_fertilizante', 'encargado_riego_id',
+                'cuartel_id', 'fecha', 'volumen_total_m3', 'volumen_medido_m3',
+            )
+        }
+        pendientes = []
+        for pk in sorted(ids):
+            riego = riegos.get(pk)
+            if riego is None:
+                resultado.error(pk, 'No existe.')
+            elif not es_admin and riego.encargado_riego_id != usuario.id:
+                resultado.error(pk, f'No tienes permiso para {accion} riegos de otros.')
+            elif riego.estado != ControlRiego.EstadoRiego.PROGRAMADO:
+                resultado.error(pk, f'Está {riego.get_estado_display().lower()}: no se puede {accion}.')
+            else:
+                pendientes.append(riego)
+
+        if accion == 'cancelar':
+            aceptados = [r.id for r in pendientes]
+            ControlRiego.objects.filter(pk__in=aceptados).update(estado=ControlRiego.EstadoRiego.CANCELADO)
+            resultado.correctos = aceptados
+            return resultado
+
+        lineas = defaultdict(list)
+        for riego_id, producto_id, cantidad in FertilizanteRiego.objects.filter(
+            control_riego_id__in=[r.id for r in pendientes if r.incluye_fertilizante]
+        ).order_by('control_riego_id', 'producto_id').values_list('control_riego_id', 'producto_id', 'cantidad_kg'):
+            lineas[riego_id].append((producto_id, cantidad))
+
+        reserva = ReservaStock(p for filas in lineas.values() for p, _ in filas)
+        aceptados, detalles = [], {}
+        for riego in pendientes:
+            if riego.incluye_fertilizante:
+                if not lineas[riego.id]:
+                    resultado.error(riego.id, 'No se puede finalizar un riego sin fertilizantes.')
+                    continue
+                try:
+                    for producto, cantidad, anterior, posterior in reserva.reservar(lineas[riego.id]):
+                        # Un detalle por producto: stock antes del primer riego y después del último
+                        detalle = detalles.setdefault(producto.id, [producto, 0, anterior, posterior])
+                        detalle[1] += cantidad
+                        detalle[3] = posterior
+                except ValidationError as e:
+                    resultado.error(riego.id, e.message)
+                    continue
+            aceptados.append(riego.id)
+
+        movimiento = None
+        if detalles:
+            con_fertilizante = [pk for pk in aceptados if lineas[pk]]
+            movimiento = MovimientoInventario.objects.create(
+                tipo_movimiento='salida',
+                fecha_movimiento=timezone.now(),
+                motivo=_motivo(con_fertilizante),
+                realizado_por=usuario,
+            )
+            DetalleMovimiento.objects.bulk_create([
+                DetalleMovimiento(
+                    movimiento=movimiento, producto=producto, cantidad=cantidad,
+                    stock_anterior=anterior, stock_posterior=posterior,
+                )
+                for producto, cantidad, anterior, posterior in detalles.values()
+            ])
+        reserva.guardar(movimiento)
+        ControlRiego.objects.filter(pk__in=aceptados).update(estado=ControlRiego.EstadoRiego.REALIZADO)
+        finalizados = set(aceptados)
+        registrar_consumo([
+            (riego.cuartel_id, riego.fecha, volumen_riego(riego))
+            for riego in pendientes if riego.id in finalizados
+        ])
+        rutas = set(Cuartel.objects.filter(
+            pk__in={riego.cuartel_id for riego in pendientes if riego.id in finalizados}
+        ).exclude(ruta_agrupacion='').values_list('ruta_agrupacion', flat=True))
+        if rutas:
+            transaction.on_commit(lambda: recalcular_agrupaciones(*rutas))
+        resultado.correctos = aceptados
+    return resultado
@@ -0,0 +1,55 @@
+# Guardar en: riego/management/commands/generar_riegos_programados.py
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from riego.models import ProgramaRiego
+from riego.programas import SEMANAS_MAX, generar_riegos
+
+class Command(BaseCommand):
+    help = (
+        'Genera los riegos PROGRAMADOS de los programas activos para las próximas '
+        'semanas (pensado para un cron semanal). Los (cuartel, fecha) ya generados '
+        'se omiten y los que se topan con otros riegos se informan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semanas', type=int, default=4, help='Semanas a generar (default: 4)')
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD (default: hoy)')
+        parser.add_argument('--programa', type=int, help='Solo este programa (id)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo mostrar lo que se generaría')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['semanas'] <= SEMANAS_MAX:
+            raise CommandError(f'--semanas debe estar entre 1 y {SEMANAS_MAX}.')
+        try:
+            desde = datetime.strptime(options['desde'], '%Y-%m-%d').date() if options['desde'] else None
+        except ValueError:
+            raise CommandError('--desde debe tener formato YYYY-MM-DD.')
+
+        programas = ProgramaRiego.objects.filter(activo=True)
+        if options['programa']:
+            programas = programas.filter(pk=options['programa'])
+            if not programas.exists():
+                raise CommandError(f"No existe un programa activo con id {options['programa']}.")
+
+        total = 0
+        for programa in programas:
+            resultado = generar_riegos(
+                programa, desde, options['semanas'], simular=options['dry_run']
+            )
+            total += len(resultado['riegos'])
+            self.stdout.write(
+                f"{programa.nombre}: {len(resultado['riegos'])} riegos, "
+                f"{resultado['existentes']} ya existían, {len(resultado['conflictos'])} con topes."
+            )
+            for conflicto in resultado['conflictos']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {conflicto['fecha']:%d/%m/%Y} {conflicto['cuartel']}: {'; '.join(conflicto['motivos'])}"
+                ))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Simulación: {total} riegos se generarían. No se guardó nada.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{total} riegos programados generados.'))
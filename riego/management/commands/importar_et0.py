@@ -0,0 +1,34 @@
+# Guardar en: riego/management/commands/importar_et0.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from riego.recomendaciones import ErrorRecomendacion, calcular_recomendaciones, importar_et0
+
+class Command(BaseCommand):
+    help = (
+        'Importa la ET0 diaria desde el CSV de la estación meteorológica '
+        '(columnas fecha, et0 y opcionalmente precipitacion). Las fechas que ya '
+        'existen se actualizan. Con --recomendar recalcula las recomendaciones de hoy.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV')
+        parser.add_argument('--fuente', default='', help='Nombre de la estación o fuente')
+        parser.add_argument('--recomendar', action='store_true', help='Recalcular las recomendaciones de hoy')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                cantidad = importar_et0(archivo, options['fuente'])
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {e}')
+        except ErrorRecomendacion as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'{cantidad} días de ET0 importados.'))
+
+        if options['recomendar']:
+            try:
+                recomendaciones = calcular_recomendaciones()
+            except ErrorRecomendacion as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'{len(recomendaciones)} recomendaciones calculadas.'))
@@ -0,0 +1,26 @@
+# Guardar en: riego/management/commands/recalcular_presupuestos_agua.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from riego.models import PresupuestoAgua
+from riego.presupuesto import reconstruir_curvas
+
+class Command(BaseCommand):
+    help = (
+        'Rehace las curvas acumuladas (m³/ha) y el consumo de los presupuestos de agua '
+        'desde los riegos REALIZADOS. Normalmente se mantienen solos al finalizar '
+        'riegos; sirve después de cargar datos históricos o corregir riegos a mano.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--temporada', type=int, help='Solo esta temporada (año de inicio)')
+
+    def handle(self, *args, **options):
+        presupuestos = PresupuestoAgua.objects.order_by('id')
+        if options['temporada']:
+            presupuestos = presupuestos.filter(temporada=options['temporada'])
+            if not presupuestos.exists():
+                raise CommandError(f"No hay presupuestos para la temporada {options['temporada']}.")
+
+        cantidad = reconstruir_curvas(presupuestos.select_for_update())
+        self.stdout.write(self.style.SUCCESS(f'{cantidad} presupuestos recalculados.'))
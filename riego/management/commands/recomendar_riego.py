@@ -0,0 +1,44 @@
+# Guardar en: riego/management/commands/recomendar_riego.py
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cuarteles.models import Cuartel
+from riego.recomendaciones import ErrorRecomendacion, calcular_recomendaciones
+
+class Command(BaseCommand):
+    help = (
+        'Calcula la recomendación de riego diaria de todos los cuarteles activos '
+        '(ET0 × Kc, menos lo ya aplicado en el período) y la guarda para el '
+        'dashboard. Pensado para un cron diario después de importar la ET0.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha YYYY-MM-DD (default: hoy)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo mostrar, sin guardar')
+
+    def handle(self, *args, **options):
+        try:
+            fecha = datetime.strptime(options['fecha'], '%Y-%m-%d').date() if options['fecha'] else None
+        except ValueError:
+            raise CommandError('--fecha debe tener formato YYYY-MM-DD.')
+        try:
+            recomendaciones = calcular_recomendaciones(fecha, guardar=not options['dry_run'])
+        except ErrorRecomendacion as e:
+            raise CommandError(str(e))
+
+        if options['verbosity'] > 1 or options['dry_run']:
+            nombres = dict(Cuartel.objects.filter(
+                pk__in=[r.cuartel_id for r in recomendaciones]
+            ).values_list('id', 'nombre'))
+            for r in recomendaciones:
+                duracion = f'{r.duracion_sugerida_minutos} min' if r.duracion_sugerida_minutos is not None else 'sin caudal de referencia'
+                self.stdout.write(
+                    f'{nombres[r.cuartel_id]}: {r.volumen_recomendado_m3} m³ '
+                    f'(demanda {r.demanda_m3}, aplicado {r.aplicado_m3}, Kc {r.kc}) · {duracion}'
+                )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Simulación: {len(recomendaciones)} recomendaciones. No se guardó nada.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(recomendaciones)} recomendaciones guardadas.'))
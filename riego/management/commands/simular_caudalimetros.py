@@ -0,0 +1,116 @@
+# Guardar en: riego/management/commands/simular_caudalimetros.py
+
+import json
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from cuarteles.models import Cuartel
+from riego.caudalimetros import MAX_LECTURAS_POR_LOTE, registrar_lecturas
+from riego.models import Caudalimetro, LecturaCaudal
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de la ingesta de caudalímetros: genera flujos de lecturas '
+        'de alta frecuencia (totalizador creciente) y los envía en lotes. '
+        'Con --url los envía por HTTP a un servidor en marcha, un flujo en paralelo '
+        'por cada --codigo/--token; sin --url los procesa en este proceso con un '
+        'caudalímetro temporal y deshace todo al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='URL del endpoint (p. ej. http://localhost:8000/riego/api/caudalimetros/lecturas/)')
+        parser.add_argument('--codigo', nargs='+', default=[], help='Códigos de los caudalímetros (con --url); un flujo por medidor')
+        parser.add_argument('--token', nargs='+', default=[], help='Tokens, en el mismo orden que --codigo')
+        parser.add_argument('--hz', type=float, default=1.0, help='Lecturas por segundo de cada flujo (default: 1)')
+        parser.add_argument('--minutos', type=int, default=60, help='Minutos de flujo simulado (default: 60)')
+        parser.add_argument('--lote', type=int, default=300, help='Lecturas por envío (default: 300)')
+        parser.add_argument('--caudal', type=float, default=20.0, help='Caudal medio en m³/h (default: 20)')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['lote'] <= MAX_LECTURAS_POR_LOTE:
+            raise CommandError(f'--lote debe estar entre 1 y {MAX_LECTURAS_POR_LOTE}.')
+        if options['url'] and (not options['codigo'] or len(options['codigo']) != len(options['token'])):
+            raise CommandError('Con --url se requieren --codigo y --token (uno por medidor).')
+
+        flujos = max(len(options['codigo']), 1)
+        lotes = [self._lotes(options) for _ in range(flujos)]
+        total = sum(len(l) for flujo in lotes for l in flujo)
+        self.stdout.write(f'{total} lecturas de {flujos} medidores en lotes de hasta {options["lote"]}.')
+
+        inicio = time.perf_counter()
+        if options['url']:
+            latencias = self._por_http(lotes, options)
+        else:
+            latencias = self._en_proceso(lotes[0])
+        segundos = time.perf_counter() - inicio
+
+        latencias.sort()
+        p95 = latencias[max(0, int(len(latencias) * 0.95) - 1)]
+        self.stdout.write(
+            f'{total / segundos:,.0f} lecturas/s · lote p50 {statistics.median(latencias):.1f} ms, '
+            f'p95 {p95:.1f} ms, máx {latencias[-1]:.1f} ms'
+        )
+        self.stdout.write(self.style.SUCCESS('Simulación terminada.'))
+
+    def _lotes(self, options):
+        """Un flujo: totalizador que sube con un caudal con ruido, cortado en lotes."""
+        paso = 1.0 / options['hz']
+        t = time.time() - options['minutos'] * 60
+        fin = time.time()
+        totalizador = random.uniform(0, 10000)
+        lecturas = []
+        while t < fin:
+            caudal = max(0.0, random.gauss(options['caudal'], options['caudal'] * 0.1))
+            totalizador += caudal * paso / 3600
+            lecturas.append([round(t, 3), round(totalizador, 4)])
+            t += paso
+        return [lecturas[i:i + options['lote']] for i in range(0, len(lecturas), options['lote'])]
+
+    def _por_http(self, lotes, options):
+        def enviar(codigo, token, lote):
+            cuerpo = json.dumps({'caudalimetro': codigo, 'lecturas': lote}).encode()
+            peticion = urllib.request.Request(options['url'], data=cuerpo, method='POST', headers={
+                'Content-Type': 'application/json', 'Authorization': f'Token {token}',
+            })
+            inicio = time.perf_counter()
+            try:
+                with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+                    respuesta.read()
+            except urllib.error.HTTPError as e:
+                raise CommandError(f'HTTP {e.code}: {e.read().decode(errors="replace")[:200]}')
+            return (time.perf_counter() - inicio) * 1000
+
+        def flujo(codigo, token, lotes_flujo):
+            # Los lotes de un medidor van en orden, como los enviaría su controlador
+            return [enviar(codigo, token, lote) for lote in lotes_flujo]
+
+        with ThreadPoolExecutor(max_workers=len(lotes)) as hilos:
+            resultados = hilos.map(flujo, options['codigo'], options['token'], lotes)
+            return [ms for latencias in resultados for ms in latencias]
+
+    def _en_proceso(self, lotes):
+        """Sin HTTP: mide el procesamiento (agregación + escritura + conciliación)."""
+        with transaction.atomic():
+            cuartel = Cuartel.objects.first()
+            if cuartel is None:
+                raise CommandError('Se necesita al menos un cuartel para el caudalímetro temporal.')
+            caudalimetro = Caudalimetro.objects.create(codigo=f'__simulacion_{timezone.now():%H%M%S}__', cuartel=cuartel)
+
+            latencias = []
+            for lote in lotes:
+                inicio = time.perf_counter()
+                registrar_lecturas(caudalimetro, lote)
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+            minutos = LecturaCaudal.objects.filter(caudalimetro=caudalimetro).count()
+            self.stdout.write(f'{minutos} filas por minuto escritas (se deshacen al terminar).')
+            transaction.set_rollback(True)
+        return latencias
@@ -0,0 +1,70 @@
+# Guardar en: riego/management/commands/verificar_indices_riego.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from riego.models import ControlRiego
+from riego.views import ORDEN_DASHBOARD
+
+
+def consultas_dashboard():
+    """[(nombre, índice esperado, queryset)] de las consultas del dashboard de riego."""
+    inicio_mes = timezone.localdate().replace(day=1)
+    inicio_mes_siguiente = (inicio_mes + timedelta(days=32)).replace(day=1)
+    riegos = ControlRiego.objects.all()
+    cuartel_id = riegos.values_list('cuartel_id', flat=True).first() or 1
+    return [
+        ('Volumen del mes', 'riego_estado_fecha_idx',
+         riegos.filter(estado='REALIZADO', fecha__gte=inicio_mes, fecha__lt=inicio_mes_siguiente)
+         .values('estado').annotate(total=Sum('volumen_total_m3'))),
+        ('Listado por estado', 'riego_estado_fecha_idx',
+         riegos.filter(estado='PROGRAMADO').order_by(*ORDEN_DASHBOARD)[:26]),
+        ('Listado por cuartel', 'riego_cuartel_fecha_idx',
+         riegos.filter(cuartel_id=cuartel_id).order_by(*ORDEN_DASHBOARD)[:26]),
+        ('Listado sin filtros', 'riego_orden_idx',
+         riegos.order_by(*ORDEN_DASHBOARD)[:26]),
+    ]
+
+
+def desactivar_seqscan():
+    """Con tablas chicas el planificador prefiere un seq scan aunque el índice sirva (dentro de una transacción)."""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta EXPLAIN sobre las consultas del dashboard de riego (volumen del '
+        'mes, listado por estado, por cuartel y sin filtros) y verifica que cada '
+        'una use su índice compuesto. Falla si alguna no lo usa. '
+        'La misma verificación corre en riego/tests.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mostrar', action='store_true', help='Imprimir el plan de cada consulta')
+
+    def handle(self, *args, **options):
+        fallas = []
+        with transaction.atomic():
+            desactivar_seqscan()
+            for nombre, indice, consulta in consultas_dashboard():
+                plan = consulta.explain()
+                if options['mostrar']:
+                    self.stdout.write(f'--- {nombre}\n{plan}')
+                if indice in plan:
+                    self.stdout.write(f'  {nombre}: usa {indice}')
+                else:
+                    fallas.append(nombre)
+                    self.stdout.write(self.style.WARNING(f'  {nombre}: NO usa {indice}'))
+
+        if fallas:
+            raise CommandError(
+                f"{len(fallas)} consultas no usan su índice: {', '.join(fallas)}. "
+                'Revise que los índices de AgroControlDataBase.sql estén creados.'
+            )
+        self.stdout.write(self.style.SUCCESS('Todas las consultas del dashboard usan sus índices.'))
@@ -1,5 +1,6 @@
 # riego/models.py
 
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 from decimal import Decimal  # ⬅️ IMPORTANTE para cálculos precisos
@@ -9,6 +10,26 @@ from cuarteles.models import Cuartel
 from autenticacion.models import Usuario
 from inventario.models import Producto 
 
+def calcular_duracion_volumen(horario_inicio, horario_fin, caudal_m3h):
+    """
+    (duración en minutos, volumen en m³). Si el término es menor que el
+    inicio, el riego cruza la medianoche. El volumen es None si no hay caudal
+    o la duración es 0.
+    """
+    inicio = timezone.datetime.combine(timezone.now().date(), horario_inicio)
+    fin = timezone.datetime.combine(timezone.now().date(), horario_fin)
+
+    if fin < inicio:
+        fin += timezone.timedelta(days=1)
+
+    duracion_minutos = int((fin - inicio).total_seconds() / 60)
+    volumen = None
+    if caudal_m3h and duracion_minutos:
+        duracion_horas = Decimal(duracion_minutos) / Decimal('60.0')
+        volumen = caudal_m3h * duracion_horas
+    return duracion_minutos, volumen
+
+
 # -----------------------------------------------------------------
 # MODELO PRINCIPAL (Cumple RF014, RF015, RF016)
 # -----------------------------------------------------------------
@@ -52,6 +73,15 @@ class ControlRiego(models.Model):
         null=True,
         blank=True
     )
+    # Volumen real según los caudalímetros del cuartel (ver riego/caudalimetros.py)
+    volumen_medido_m3 = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Volumen Medido (m³)',
+        editable=False,
+        null=True,
+        blank=True
+    )
     
     # RF016: ¿Incluye fertilizante?
     incluye_fertilizante = models.BooleanField(
@@ -83,31 +113,47 @@ class ControlRiego(models.Model):
         related_name='riegos_creados'
     )
 
+    # Programa recurrente que generó el riego (si aplica)
+    programa = models.ForeignKey(
+        'ProgramaRiego',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='riegos',
+        verbose_name='Programa de Riego'
+    )
+
     class Meta:
         db_table = 'control_riego'
         verbose_name = 'Control de Riego'
         verbose_name_plural = 'Controles de Riego'
         ordering = ['-fecha', '-horario_inicio']
+        indexes = [
+            models.Index(fields=['programa', 'fecha'], name='riego_programa_fecha_idx'),
+            # Dashboard: filtros por estado / cuartel + rango de fechas, y el orden del listado
+            models.Index(fields=['estado', 'fecha'], name='riego_estado_fecha_idx'),
+            models.Index(fields=['cuartel', 'fecha'], name='riego_cuartel_fecha_idx'),
+            models.Index(fields=['fecha', 'horario_inicio', 'id'], name='riego_orden_idx'),
+        ]
 
     def __str__(self):
         return f"Riego {self.cuartel.nombre} - {self.fecha}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        riego = super().from_db(db, field_names, values)
+        # Cuartel leído: si el riego cambia de cuartel se recalculan ambas jerarquías (ver cuarteles/jerarquia.py)
+        riego._cuartel_leido = riego.__dict__.get('cuartel_id')
+        return riego
+
     def save(self, *args, **kwargs):
-        # Calcular duración en minutos
+        # Calcular duración en minutos y volumen total (con Decimal)
         if self.horario_inicio and self.horario_fin:
-            inicio = timezone.datetime.combine(timezone.now().date(), self.horario_inicio)
-            fin = timezone.datetime.combine(timezone.now().date(), self.horario_fin)
-            
-            if fin < inicio:
-                fin += timezone.timedelta(days=1)
-            
-            duracion = fin - inicio
-            self.duracion_minutos = int(duracion.total_seconds() / 60)
-            
-            # Calcular volumen total (con Decimal)
-            if self.caudal_m3h and self.duracion_minutos:
-                duracion_horas = Decimal(self.duracion_minutos) / Decimal('60.0')
-                self.volumen_total_m3 = self.caudal_m3h * duracion_horas
+            self.duracion_minutos, volumen = calcular_duracion_volumen(
+                self.horario_inicio, self.horario_fin, self.caudal_m3h
+            )
+            if volumen is not None:
+                self.volumen_total_m3 = volumen
         
         super().save(*args, **kwargs)
 
@@ -157,4 +203,363 @@ class FertilizanteRiego(models.Model):
         unique_together = ('control_riego', 'producto')
 
     def __str__(self):
-        return f"{self.cantidad_kg} kg de {self.producto.nombre}"
\ No newline at end of file
+        return f"{self.cantidad_kg} kg de {self.producto.nombre}"
+
+
+# -----------------------------------------------------------------
+# PROGRAMAS DE RIEGO RECURRENTES
+# -----------------------------------------------------------------
+class ProgramaRiego(models.Model):
+    """
+    Riego semanal que se repite en varios cuarteles. 'riego.programas'
+    genera los ControlRiego (y sus fertilizantes) de las semanas pedidas.
+    """
+
+    DIAS_SEMANA = [
+        (0, 'Lunes'), (1, 'Martes'), (2, 'Miércoles'), (3, 'Jueves'),
+        (4, 'Viernes'), (5, 'Sábado'), (6, 'Domingo'),
+    ]
+
+    nombre = models.CharField(max_length=100, verbose_name='Nombre')
+    cuarteles = models.ManyToManyField(
+        Cuartel,
+        related_name='programas_riego',
+        verbose_name='Cuarteles'
+    )
+    # Días en que se riega (0 = lunes ... 6 = domingo)
+    dias_semana = models.JSONField(default=list, verbose_name='Días de la semana')
+    horario_inicio = models.TimeField(verbose_name='Horario de Inicio')
+    horario_fin = models.TimeField(verbose_name='Horario de Término')
+    caudal_m3h = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Caudal (m³/h)'
+    )
+    encargado_riego = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name='Encargado de Riego',
+        related_name='programas_riego'
+    )
+
+    fecha_inicio = models.DateField(default=timezone.now, verbose_name='Vigente desde')
+    fecha_fin = models.DateField(null=True, blank=True, verbose_name='Vigente hasta')
+    activo = models.BooleanField(default=True, verbose_name='Activo')
+    observaciones = models.TextField(blank=True, null=True)
+
+    # Último día para el que ya se generaron riegos
+    generado_hasta = models.DateField(null=True, blank=True, editable=False)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    creado_por = models.ForeignKey(
+        Usuario,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='programas_riego_creados'
+    )
+
+    class Meta:
+        db_table = 'programa_riego'
+        verbose_name = 'Programa de Riego'
+        verbose_name_plural = 'Programas de Riego'
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+    def get_dias_display(self):
+        nombres = dict(self.DIAS_SEMANA)
+        return ', '.join(nombres[d] for d in sorted(self.dias_semana) if d in nombres)
+
+
+class FertilizanteProgramaRiego(models.Model):
+    """Fertilizantes que se copian a cada riego generado por el programa."""
+
+    programa = models.ForeignKey(
+        ProgramaRiego,
+        on_delete=models.CASCADE,
+        related_name='fertilizantes'
+    )
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.PROTECT,
+        verbose_name='Producto'
+    )
+    cantidad_kg = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name='Cantidad (kg)'
+    )
+
+    class Meta:
+        db_table = 'programa_riego_fertilizantes'
+        verbose_name = 'Fertilizante del Programa'
+        verbose_name_plural = 'Fertilizantes del Programa'
+        unique_together = ('programa', 'producto')
+
+    def __str__(self):
+        return f"{self.cantidad_kg} kg de {self.producto.nombre}"
+
+
+# -----------------------------------------------------------------
+# CAUDALÍMETROS (lecturas reales de los controladores de riego)
+# -----------------------------------------------------------------
+class Caudalimetro(models.Model):
+    """
+    Caudalímetro de un cuartel. El controlador envía lecturas de su
+    totalizador (m³ acumulados) autenticándose con un token propio.
+    """
+
+    codigo = models.CharField(max_length=50, unique=True, verbose_name='Código')
+    nombre = models.CharField(max_length=100, blank=True, verbose_name='Nombre')
+    cuartel = models.ForeignKey(
+        Cuartel,
+        on_delete=models.CASCADE,
+        related_name='caudalimetros',
+        verbose_name='Sector/Cuartel'
+    )
+    activo = models.BooleanField(default=True, verbose_name='Activo')
+    # SHA-256 del token (el token solo se muestra al generarlo)
+    token_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    # Última lectura aceptada: base para calcular el volumen de la siguiente
+    ultimo_totalizador_m3 = models.FloatField(null=True, blank=True, editable=False)
+    ultima_lectura_en = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        db_table = 'riego_caudalimetro'
+        verbose_name = 'Caudalímetro'
+        verbose_name_plural = 'Caudalímetros'
+        ordering = ['codigo']
+
+    def __str__(self):
+        return f"{self.codigo} ({self.cuartel.nombre})"
+
+
+class LecturaCaudal(models.Model):
+    """
+    Volumen medido por minuto (las lecturas crudas llegan cada pocos
+    segundos y se agregan antes de escribir). Una fila por caudalímetro y
+    minuto; los lotes que caen en el mismo minuto se suman.
+    """
+
+    caudalimetro = models.ForeignKey(
+        Caudalimetro,
+        on_delete=models.CASCADE,
+        related_name='lecturas'
+    )
+    minuto = models.DateTimeField()
+    volumen_m3 = models.FloatField(default=0)
+    muestras = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'riego_lectura_caudal'
+        verbose_name = 'Lectura de Caudal (por minuto)'
+        verbose_name_plural = 'Lecturas de Caudal (por minuto)'
+        constraints = [
+            models.UniqueConstraint(fields=['caudalimetro', 'minuto'], name='riego_lectura_minuto_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.caudalimetro_id} {self.minuto:%Y-%m-%d %H:%M}: {self.volumen_m3:.3f} m³"
+
+
+# -----------------------------------------------------------------
+# RECOMENDACIONES POR EVAPOTRANSPIRACIÓN (ET0 × Kc)
+# -----------------------------------------------------------------
+class RegistroET0(models.Model):
+    """ET0 diaria de la estación meteorológica (importada desde CSV)."""
+
+    fecha = models.DateField(unique=True, verbose_name='Fecha')
+    et0_mm = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='ET0 (mm/día)')
+    precipitacion_mm = models.DecimalField(
+        max_digits=6, decimal_places=2, default=Decimal('0'), verbose_name='Precipitación (mm)'
+    )
+    fuente = models.CharField(max_length=100, blank=True, verbose_name='Fuente')
+    importado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'riego_et0_diaria'
+        verbose_name = 'ET0 Diaria'
+        verbose_name_plural = 'ET0 Diaria'
+        ordering = ['-fecha']
+
+    def __str__(self):
+        return f"{self.fecha:%d/%m/%Y}: {self.et0_mm} mm"
+
+
+class CoeficienteCultivo(models.Model):
+    """
+    Kc por tipo de planta y variedad. Una fila con variedad vacía vale
+    para todas las variedades del tipo que no tengan la suya.
+    """
+
+    tipo_planta = models.CharField(max_length=100, verbose_name='Tipo de planta')
+    variedad = models.CharField(max_length=100, blank=True, verbose_name='Variedad')
+    kc = models.DecimalField(max_digits=4, decimal_places=2, verbose_name='Kc')
+
+    class Meta:
+        db_table = 'riego_coeficiente_cultivo'
+        verbose_name = 'Coeficiente de Cultivo (Kc)'
+        verbose_name_plural = 'Coeficientes de Cultivo (Kc)'
+        ordering = ['tipo_planta', 'variedad']
+        unique_together = ('tipo_planta', 'variedad')
+
+    def __str__(self):
+        return f"{self.tipo_planta} {self.variedad or '(todas)'}: Kc {self.kc}"
+
+
+class RecomendacionRiego(models.Model):
+    """
+    Recomendación diaria por cuartel (ver riego/recomendaciones.py). Se
+    recalcula completa para la fecha; el dashboard la lee con una consulta.
+    """
+
+    cuartel = models.ForeignKey(
+        Cuartel,
+        on_delete=models.CASCADE,
+        related_name='recomendaciones_riego',
+        verbose_name='Sector/Cuartel'
+    )
+    fecha = models.DateField(verbose_name='Fecha')
+    et0_mm = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='ET0 (mm)')
+    kc = models.DecimalField(max_digits=4, decimal_places=2, verbose_name='Kc')
+    kc_por_defecto = models.BooleanField(default=False, verbose_name='Kc por defecto')
+    demanda_m3 = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Demanda del período (m³)')
+    aplicado_m3 = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Aplicado en el período (m³)')
+    volumen_recomendado_m3 = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Volumen Recomendado (m³)')
+    caudal_m3h = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='Caudal de referencia (m³/h)'
+    )
+    duracion_sugerida_minutos = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name='Duración Sugerida (minutos)'
+    )
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'riego_recomendacion'
+        verbose_name = 'Recomendación de Riego'
+        verbose_name_plural = 'Recomendaciones de Riego'
+        ordering = ['-fecha', 'cuartel__nombre']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'cuartel'], name='riego_recomendacion_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.cuartel.nombre} {self.fecha:%d/%m/%Y}: {self.volumen_recomendado_m3} m³"
+
+
+# -----------------------------------------------------------------
+# PRESUPUESTO DE AGUA POR TEMPORADA
+# -----------------------------------------------------------------
+class PresupuestoAgua(models.Model):
+    """
+    Presupuesto de agua (m³/ha) de un cuartel para una temporada. El
+    consumo acumulado se mantiene al finalizar riegos y se rehace si uno ya
+    realizado cambia de volumen o se borra (riego/presupuesto.py).
+    """
+
+    cuartel = models.ForeignKey(
+        Cuartel,
+        on_delete=models.CASCADE,
+        related_name='presupuestos_agua',
+        verbose_name='Sector/Cuartel'
+    )
+    temporada = models.PositiveSmallIntegerField(
+        verbose_name='Temporada',
+        help_text='Año en que empieza la temporada (p. ej. 2025 para 2025-2026).'
+    )
+    fecha_inicio = models.DateField(verbose_name='Inicio de temporada')
+    fecha_fin = models.DateField(verbose_name='Fin de temporada')
+    presupuesto_m3_ha = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Presupuesto (m³/ha)')
+    # Copia del área del cuartel al crear el presupuesto: la curva m³/ha no cambia si se edita el cuartel
+    area_hectareas = models.DecimalField(max_digits=10, decimal_places=2, blank=True, verbose_name='Área (ha)')
+
+    consumido_m3 = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0'), editable=False, verbose_name='Consumido (m³)'
+    )
+    ultimo_riego = models.DateField(null=True, blank=True, editable=False)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'riego_presupuesto_agua'
+        verbose_name = 'Presupuesto de Agua'
+        verbose_name_plural = 'Presupuestos de Agua'
+        ordering = ['-temporada', 'cuartel__nombre']
+        constraints = [
+            models.UniqueConstraint(fields=['temporada', 'cuartel'], name='riego_presupuesto_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.cuartel.nombre} {self.temporada}: {self.presupuesto_m3_ha} m³/ha"
+
+    def clean(self):
+        if self.fecha_inicio and self.fecha_fin and self.fecha_fin <= self.fecha_inicio:
+            raise ValidationError({'fecha_fin': 'El fin de temporada debe ser posterior al inicio.'})
+        if self.cuartel_id and self.fecha_inicio and self.fecha_fin:
+            # Un riego solo puede sumar a un presupuesto: las temporadas de un cuartel no se solapan
+            solapado = PresupuestoAgua.objects.filter(
+                cuartel_id=self.cuartel_id, fecha_inicio__lte=self.fecha_fin, fecha_fin__gte=self.fecha_inicio
+            ).exclude(pk=self.pk).first()
+            if solapado:
+                raise ValidationError(
+                    f'Se solapa con la temporada {solapado.temporada} del cuartel '
+                    f'({solapado.fecha_inicio:%d/%m/%Y} – {solapado.fecha_fin:%d/%m/%Y}).'
+                )
+
+    def save(self, *args, **kwargs):
+        if self.area_hectareas is None and self.cuartel_id:
+            self.area_hectareas = self.cuartel.area_hectareas
+        super().save(*args, **kwargs)
+
+    # --- Indicadores (sin consultas: usan las columnas cacheadas) ---
+    @property
+    def consumido_m3_ha(self):
+        if not self.area_hectareas:
+            return Decimal('0')
+        return (self.consumido_m3 / self.area_hectareas).quantize(Decimal('0.01'))
+
+    @property
+    def porcentaje_consumido(self):
+        if not self.presupuesto_m3_ha:
+            return 0.0
+        return float(self.consumido_m3_ha / self.presupuesto_m3_ha * 100)
+
+    def proyeccion_m3_ha(self, hoy=None):
+        """Uso al final de la temporada si sigue el ritmo promedio de lo que va de ella."""
+        hoy = hoy or timezone.localdate()
+        if hoy < self.fecha_inicio:
+            return Decimal('0')
+        transcurridos = (min(hoy, self.fecha_fin) - self.fecha_inicio).days + 1
+        total = (self.fecha_fin - self.fecha_inicio).days + 1
+        return (self.consumido_m3_ha * total / transcurridos).quantize(Decimal('0.01'))
+
+
+class CurvaAguaDiaria(models.Model):
+    """
+    Un punto de la curva acumulada de un presupuesto: solo los días con
+    riego. Entre dos puntos el acumulado no cambia.
+    """
+
+    presupuesto = models.ForeignKey(
+        PresupuestoAgua,
+        on_delete=models.CASCADE,
+        related_name='curva'
+    )
+    fecha = models.DateField()
+    m3_dia = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    m3_ha_acumulado = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+
+    class Meta:
+        db_table = 'riego_curva_agua'
+        verbose_name = 'Punto de Curva de Agua'
+        verbose_name_plural = 'Curva de Agua'
+        ordering = ['presupuesto', 'fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['presupuesto', 'fecha'], name='riego_curva_agua_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.presupuesto_id} {self.fecha:%d/%m/%Y}: {self.m3_ha_acumulado} m³/ha"
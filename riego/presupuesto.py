@@ -0,0 +1,201 @@
+# riego/presupuesto.py
+"""
+Presupuesto de agua por cuartel y temporada (PresupuestoAgua) y su curva
+acumulada en m³/ha (CurvaAguaDiaria).
+
+- La curva tiene un punto por día con riego: m³ del día y m³/ha acumulados
+  desde el inicio de la temporada.
+- registrar_consumo(): se llama al finalizar riegos (uno o un lote) y suma
+  su volumen al presupuesto que cubre cada (cuartel, fecha). Lee las curvas
+  de los presupuestos tocados con UNA consulta, recalcula los acumulados
+  desde el primer día cambiado y escribe con bulk_create / bulk_update.
+  El total queda en 'PresupuestoAgua.consumido_m3'.
+- reconstruir_curvas(): recalcula desde los riegos REALIZADOS (al crear un
+  presupuesto o cambiar sus fechas, o con 'recalcular_presupuestos_agua').
+- reconstruir_por_riegos(): rehace solo los presupuestos que cubren ciertos
+  (cuartel, fecha). Se usa cuando un riego ya REALIZADO cambia de volumen
+  (conciliación con el caudalímetro) o se borra.
+- El tablero lee todos los presupuestos de una temporada con UNA consulta:
+  % consumido y proyección salen de las columnas cacheadas.
+
+Volumen de un riego: el medido por caudalímetro si lo hay, si no el calculado.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ControlRiego, CurvaAguaDiaria, PresupuestoAgua
+
+CENTESIMOS = Decimal('0.01')
+
+
+def volumen_riego(riego):
+    if riego.volumen_medido_m3 is not None:
+        return riego.volumen_medido_m3
+    return riego.volumen_total_m3 or Decimal('0')
+
+
+def _acumular(presupuesto, curva, desde=None):
+    """
+    Recalcula 'm3_ha_acumulado' de los puntos de 'curva' ({fecha: punto}) en
+    orden. Devuelve los puntos desde 'desde' (los que pueden haber cambiado).
+    """
+    area = presupuesto.area_hectareas or Decimal('0')
+    acumulado_m3 = Decimal('0')
+    tocados = []
+    for fecha in sorted(curva):
+        punto = curva[fecha]
+        acumulado_m3 += punto.m3_dia
+        # Se divide el total (no se suman m³/ha redondeados): sin deriva por redondeo
+        punto.m3_ha_acumulado = (acumulado_m3 / area).quantize(CENTESIMOS) if area else Decimal('0')
+        if desde is None or fecha >= desde:
+            tocados.append(punto)
+    return tocados
+
+
+def _presupuestos_que_cubren(consumos):
+    cuarteles = {c for c, _, _ in consumos}
+    fechas = [f for _, f, _ in consumos]
+    presupuestos = defaultdict(list)
+    for presupuesto in PresupuestoAgua.objects.select_for_update().filter(
+        cuartel_id__in=cuarteles, fecha_inicio__lte=max(fechas), fecha_fin__gte=min(fechas)
+    ).order_by('id'):
+        presupuestos[presupuesto.cuartel_id].append(presupuesto)
+    return presupuestos
+
+
+def registrar_consumo(consumos):
+    """
+    Suma [(cuartel_id, fecha, volumen_m3)] de riegos recién finalizados a
+    las curvas de sus presupuestos. Devuelve cuántos presupuestos cambiaron.
+    """
+    consumos = [(c, f, Decimal(v)) for c, f, v in consumos if v]
+    if not consumos:
+        return 0
+
+    with transaction.atomic():
+        por_cuartel = _presupuestos_que_cubren(consumos)
+        sumas = defaultdict(lambda: defaultdict(Decimal))   # presupuesto -> fecha -> m³
+        for cuartel_id, fecha, volumen in consumos:
+            for presupuesto in por_cuartel.get(cuartel_id, []):
+                if presupuesto.fecha_inicio <= fecha <= presupuesto.fecha_fin:
+                    sumas[presupuesto][fecha] += volumen
+                    break
+        if not sumas:
+            return 0
+
+        curvas = defaultdict(dict)
+        for punto in CurvaAguaDiaria.objects.filter(presupuesto__in=list(sumas)).order_by():
+            curvas[punto.presupuesto_id][punto.fecha] = punto
+
+        nuevos, cambiados = [], []
+        for presupuesto, por_fecha in sumas.items():
+            curva = curvas[presupuesto.id]
+            for fecha, volumen in por_fecha.items():
+                if fecha not in curva:
+                    curva[fecha] = CurvaAguaDiaria(presupuesto=presupuesto, fecha=fecha)
+                    nuevos.append(curva[fecha])
+                curva[fecha].m3_dia += volumen
+            cambiados.extend(p for p in _acumular(presupuesto, curva, min(por_fecha)) if p.pk)
+
+            presupuesto.consumido_m3 += sum(por_fecha.values())
+            ultimo = max(por_fecha)
+            if presupuesto.ultimo_riego is None or ultimo > presupuesto.ultimo_riego:
+                presupuesto.ultimo_riego = ultimo
+            presupuesto.actualizado_en = timezone.now()
+
+        CurvaAguaDiaria.objects.bulk_create(nuevos, batch_size=1000)
+        CurvaAguaDiaria.objects.bulk_update(cambiados, ['m3_dia', 'm3_ha_acumulado'], batch_size=1000)
+        PresupuestoAgua.objects.bulk_update(list(sumas), ['consumido_m3', 'ultimo_riego', 'actualizado_en'])
+    return len(sumas)
+
+
+def reconstruir_curvas(presupuestos):
+    """Rehace curva y total de los presupuestos desde los riegos REALIZADOS."""
+    presupuestos = list(presupuestos)
+    if not presupuestos:
+        return 0
+
+    with transaction.atomic():
+        volumenes = defaultdict(dict)   # cuartel -> fecha -> m³
+        for cuartel_id, fecha, total in ControlRiego.objects.filter(
+            estado=ControlRiego.EstadoRiego.REALIZADO,
+            cuartel_id__in={p.cuartel_id for p in presupuestos},
+            fecha__gte=min(p.fecha_inicio for p in presupuestos),
+            fecha__lte=max(p.fecha_fin for p in presupuestos),
+        ).order_by().values('cuartel_id', 'fecha').annotate(
+            total=Sum(Coalesce('volumen_medido_m3', 'volumen_total_m3'))
+        ).values_list('cuartel_id', 'fecha', 'total'):
+            volumenes[cuartel_id][fecha] = Decimal(total or 0)
+
+        CurvaAguaDiaria.objects.filter(presupuesto__in=presupuestos).delete()
+        puntos = []
+        for presupuesto in presupuestos:
+            curva = {
+                fecha: CurvaAguaDiaria(presupuesto=presupuesto, fecha=fecha, m3_dia=volumen)
+                for fecha, volumen in volumenes[presupuesto.cuartel_id].items()
+                if presupuesto.fecha_inicio <= fecha <= presupuesto.fecha_fin and volumen
+            }
+            puntos.extend(_acumular(presupuesto, curva))
+            presupuesto.consumido_m3 = sum((p.m3_dia for p in curva.values()), Decimal('0'))
+            presupuesto.ultimo_riego = max(curva) if curva else None
+            presupuesto.actualizado_en = timezone.now()
+
+        CurvaAguaDiaria.objects.bulk_create(puntos, batch_size=1000)
+        PresupuestoAgua.objects.bulk_update(presupuestos, ['consumido_m3', 'ultimo_riego', 'actualizado_en'])
+    return len(presupuestos)
+
+
+def reconstruir_por_riegos(riegos):
+    """
+    Rehace los presupuestos que cubren alguno de [(cuartel_id, fecha)].
+    Devuelve cuántos presupuestos se recalcularon.
+    """
+    filtro = Q()
+    for cuartel_id, fecha in set(riegos):
+        filtro |= Q(cuartel_id=cuartel_id, fecha_inicio__lte=fecha, fecha_fin__gte=fecha)
+    if not filtro:
+        return 0
+    with transaction.atomic():
+        return reconstruir_curvas(PresupuestoAgua.objects.select_for_update().filter(filtro).order_by('id'))
+
+
+@receiver(post_delete, sender=ControlRiego)
+def presupuesto_por_riego_borrado(sender, instance, **kwargs):
+    # Un riego pendiente o cancelado nunca sumó al presupuesto
+    if instance.estado != ControlRiego.EstadoRiego.REALIZADO:
+        return
+    riego = (instance.cuartel_id, instance.fecha)
+    transaction.on_commit(lambda: reconstruir_por_riegos([riego]))
+
+
+def tablero_temporada(temporada, hoy=None):
+    """
+    Presupuestos de la temporada (UNA consulta) con sus indicadores, los
+    excedidos primero y luego por % consumido.
+    """
+    hoy = hoy or timezone.localdate()
+    filas = []
+    for presupuesto in PresupuestoAgua.objects.filter(temporada=temporada).select_related('cuartel'):
+        consumido = presupuesto.consumido_m3_ha
+        proyeccion = presupuesto.proyeccion_m3_ha(hoy)
+        filas.append({
+            'presupuesto': presupuesto,
+            'consumido_m3_ha': consumido,
+            'porcentaje': presupuesto.porcentaje_consumido,
+            'proyeccion_m3_ha': proyeccion,
+            'porcentaje_proyectado': (
+                float(proyeccion / presupuesto.presupuesto_m3_ha * 100) if presupuesto.presupuesto_m3_ha else 0.0
+            ),
+            'excedido': consumido > presupuesto.presupuesto_m3_ha,
+            'en_riesgo': proyeccion > presupuesto.presupuesto_m3_ha,
+        })
+    filas.sort(key=lambda f: (not f['excedido'], -f['porcentaje'], f['presupuesto'].cuartel.nombre))
+    return filas
@@ -0,0 +1,151 @@
+# riego/programas.py
+"""
+Generación de riegos a partir de programas recurrentes (ProgramaRiego).
+
+- Una consulta por programa para los cuarteles, otra para los fertilizantes,
+  otra para los riegos ya generados y otra para la agenda (conflictos).
+- Duración y volumen se calculan una vez por programa (todos los riegos
+  tienen el mismo horario y caudal) con 'calcular_duracion_volumen', la
+  misma regla de 'ControlRiego.save'.
+- Los riegos y sus fertilizantes se insertan con bulk_create.
+- Conflictos: cada riego nuevo se revisa contra la agenda existente
+  (AgendaRiego) y contra los nuevos ya aceptados del mismo programa. Los
+  que se topan no se crean y se informan.
+- Es idempotente: un (cuartel, fecha) que ya tiene un riego del programa no
+  se vuelve a generar.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .conflictos import AgendaRiego, ArbolIntervalos, intervalo
+from .models import ControlRiego, FertilizanteRiego, ProgramaRiego, calcular_duracion_volumen
+
+SEMANAS_MAX = 12
+
+
+def fechas_programa(programa, desde, hasta):
+    """Fechas entre 'desde' y 'hasta' (inclusive) en que corresponde regar."""
+    desde = max(desde, programa.fecha_inicio)
+    if programa.fecha_fin:
+        hasta = min(hasta, programa.fecha_fin)
+    dias = set(programa.dias_semana)
+    fechas = []
+    fecha = desde
+    while fecha <= hasta:
+        if fecha.weekday() in dias:
+            fechas.append(fecha)
+        fecha += timedelta(days=1)
+    return fechas
+
+
+def generar_riegos(programa, desde=None, semanas=4, usuario=None, simular=False):
+    """
+    Materializa 'semanas' semanas del programa desde 'desde' (hoy por defecto).
+    Devuelve un dict con 'desde', 'hasta', 'riegos' (los que se crean),
+    'por_fecha' (nombres de cuarteles por fecha), 'conflictos', 'existentes'
+    y 'aplicado'.
+    """
+    desde = desde or timezone.localdate()
+    hasta = desde + timedelta(days=7 * semanas - 1)
+    resultado = {
+        'programa': programa, 'desde': desde, 'hasta': hasta,
+        'riegos': [], 'por_fecha': [], 'conflictos': [], 'existentes': 0, 'aplicado': False,
+    }
+    fechas = fechas_programa(programa, desde, hasta)
+    if not programa.activo or not fechas:
+        return resultado
+
+    with transaction.atomic():
+        if not simular:
+            # Dos generaciones simultáneas del mismo programa no deben duplicar riegos
+            ProgramaRiego.objects.select_for_update().filter(pk=programa.pk).exists()
+
+        cuarteles = dict(programa.cuarteles.order_by('nombre').values_list('id', 'nombre'))
+        fertilizantes = list(programa.fertilizantes.values_list('producto_id', 'cantidad_kg'))
+        existentes = set(
+            ControlRiego.objects.filter(programa=programa, fecha__range=[fechas[0], fechas[-1]])
+            .order_by().values_list('cuartel_id', 'fecha')
+        )
+        encargado_id = programa.encargado_riego_id
+        # Hasta el día siguiente al último: el horario puede cruzar la medianoche
+        agenda = AgendaRiego(
+            fechas[0], fechas[-1] + timedelta(days=1),
+            cuarteles=list(cuarteles), encargados=[encargado_id] if encargado_id else None,
+        )
+
+        candidatos = []
+        for fecha in fechas:
+            for cuartel_id in cuarteles:
+                if (cuartel_id, fecha) in existentes:
+                    resultado['existentes'] += 1
+                else:
+                    candidatos.append((cuartel_id, fecha))
+
+        # Los nuevos entre sí: solo pueden toparse por encargado (un riego por cuartel y día)
+        arbol_nuevos = None
+        if encargado_id:
+            arbol_nuevos = ArbolIntervalos([
+                intervalo(fecha, programa.horario_inicio, programa.horario_fin) + (i,)
+                for i, (_, fecha) in enumerate(candidatos)
+            ])
+
+        aceptados = set()
+        for i, (cuartel_id, fecha) in enumerate(candidatos):
+            motivos = [
+                (motivo, agenda.describir(pk))
+                for motivo, pk in agenda.conflictos(
+                    cuartel_id, encargado_id, fecha, programa.horario_inicio, programa.horario_fin
+                )
+            ]
+            if arbol_nuevos is not None:
+                inicio, fin = intervalo(fecha, programa.horario_inicio, programa.horario_fin)
+                motivos.extend(
+                    ('encargado', f'riego nuevo del cuartel {cuarteles[candidatos[j][0]]}')
+                    for _, _, j in arbol_nuevos.solapados(inicio, fin) if j in aceptados
+                )
+            if motivos:
+                resultado['conflictos'].append({
+                    'cuartel': cuarteles[cuartel_id], 'fecha': fecha,
+                    'motivos': [f'{motivo}: {detalle}' for motivo, detalle in motivos],
+                })
+            else:
+                aceptados.add(i)
+
+        duracion, volumen = calcular_duracion_volumen(
+            programa.horario_inicio, programa.horario_fin, programa.caudal_m3h
+        )
+        riegos = [
+            ControlRiego(
+                cuartel_id=cuartel_id, fecha=fecha, programa=programa,
+                horario_inicio=programa.horario_inicio, horario_fin=programa.horario_fin,
+                caudal_m3h=programa.caudal_m3h, duracion_minutos=duracion, volumen_total_m3=volumen,
+                incluye_fertilizante=bool(fertilizantes), encargado_riego_id=encargado_id,
+                estado=ControlRiego.EstadoRiego.PROGRAMADO, creado_por=usuario,
+                observaciones=f'Generado por el programa "{programa.nombre}"',
+            )
+            for i, (cuartel_id, fecha) in enumerate(candidatos) if i in aceptados
+        ]
+        resultado['riegos'] = riegos
+        por_fecha = {}
+        for riego in riegos:
+            por_fecha.setdefault(riego.fecha, []).append(cuarteles[riego.cuartel_id])
+        resultado['por_fecha'] = list(por_fecha.items())
+        if simular or not riegos:
+            return resultado
+
+        ControlRiego.objects.bulk_create(riegos, batch_size=500)
+        FertilizanteRiego.objects.bulk_create([
+            FertilizanteRiego(control_riego=riego, producto_id=producto_id, cantidad_kg=cantidad)
+            for riego in riegos
+            for producto_id, cantidad in fertilizantes
+        ], batch_size=1000)
+
+        programa.generado_hasta = fechas[-1]
+        ProgramaRiego.objects.filter(pk=programa.pk).update(generado_hasta=programa.generado_hasta)
+
+    resultado['aplicado'] = True
+    return resultado
+
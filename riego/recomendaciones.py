@@ -0,0 +1,256 @@
+# riego/recomendaciones.py
+"""
+Recomendación de riego diaria por cuartel a partir de la evapotranspiración.
+
+    demanda (m³) = max(ET0 × Kc − lluvia efectiva, 0) [mm] × área [ha] × 10 / eficiencia
+
+(1 mm sobre 1 ha son 10 m³; la eficiencia depende del tipo de riego.)
+
+- ET0 y precipitación diarias vienen de RegistroET0, importadas desde el
+  CSV de la estación con el comando 'importar_et0'.
+- Kc de CoeficienteCultivo por (tipo_planta, variedad), luego por
+  tipo_planta con variedad vacía, y si no hay, KC_DEFECTO.
+- Balance de DIAS_BALANCE días hasta la fecha (inclusive): lo recomendado
+  es la demanda del período menos lo aplicado en riegos REALIZADOS del
+  período (volumen medido por caudalímetro si lo hay, si no el calculado).
+  El déficit más antiguo no se arrastra: el suelo no lo almacena.
+- La duración sugerida usa el caudal medio de los riegos del cuartel de
+  los últimos DIAS_CAUDAL días.
+- Todos los cuarteles se calculan en una pasada con numpy (cuartel × día):
+  una consulta por tabla de entrada, sin consultas por cuartel. El
+  resultado se guarda en RecomendacionRiego (se reemplaza la fecha completa).
+"""
+
+import math
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Avg, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from AgroControl.planillas import ErrorPlanilla, filas_csv, indices_columnas
+from cuarteles.models import Cuartel
+from .models import CoeficienteCultivo, ControlRiego, RecomendacionRiego, RegistroET0
+
+DIAS_BALANCE = 7
+DIAS_CAUDAL = 90
+KC_DEFECTO = 0.8
+PRECIPITACION_EFECTIVA = 0.8   # Fracción de la lluvia que queda disponible para el cultivo
+EFICIENCIA_RIEGO = {
+    'goteo': 0.90,
+    'microaspersion': 0.85,
+    'aspersion': 0.75,
+    'inundacion': 0.60,
+}
+EFICIENCIA_DEFECTO = 0.75
+ESTADOS_CULTIVO = ('activo', 'en_desarrollo')
+
+COLUMNAS_ET0 = {
+    'fecha': ('fecha', 'date', 'dia', 'día'),
+    'et0': ('et0', 'eto', 'et0_mm', 'eto_mm', 'et0 (mm)', 'evapotranspiracion', 'evapotranspiración'),
+    'precipitacion': ('precipitacion', 'precipitación', 'precipitacion_mm', 'pp', 'pp_mm', 'lluvia'),
+}
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y')
+
+
+class ErrorRecomendacion(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------
+# IMPORTACIÓN DE ET0 (CSV de la estación)
+# ---------------------------------------------------------------
+def _fecha(texto):
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    raise ValueError
+
+
+def _decimal(texto):
+    # Las estaciones locales exportan con coma decimal
+    valor = Decimal(texto.replace(',', '.'))
+    if not valor.is_finite() or valor < 0:
+        raise ValueError
+    return valor
+
+
+def leer_csv_et0(archivo):
+    """
+    [(fecha, et0_mm, precipitacion_mm)] del CSV (archivo binario). Columnas
+    'fecha' y 'et0' obligatorias, 'precipitacion' opcional.
+    """
+    filas = filas_csv(archivo)
+    registros, errores = {}, []
+    try:
+        indices = indices_columnas(next(filas, []), COLUMNAS_ET0, obligatorias=('fecha', 'et0'))
+        for linea, fila in enumerate(filas, start=2):
+            if not any(c.strip() for c in fila):
+                continue
+            try:
+                fecha = _fecha(fila[indices['fecha']].strip())
+                et0 = _decimal(fila[indices['et0']].strip())
+                pp = fila[indices['precipitacion']].strip() if indices['precipitacion'] is not None else ''
+                precipitacion = _decimal(pp) if pp else Decimal('0')
+            except (IndexError, ValueError, ArithmeticError):
+                errores.append(linea)
+                continue
+            # Si una fecha se repite, vale la última fila
+            registros[fecha] = (fecha, et0, precipitacion)
+    except ErrorPlanilla as e:
+        raise ErrorRecomendacion(str(e)) from None
+    finally:
+        filas.close()
+
+    if errores:
+        muestra_lineas = ', '.join(map(str, errores[:10]))
+        raise ErrorRecomendacion(f'Filas inválidas (línea {muestra_lineas}{"…" if len(errores) > 10 else ""}).')
+    return sorted(registros.values())
+
+
+def importar_et0(archivo, fuente=''):
+    """Guarda (o actualiza) las ET0 del CSV con un solo INSERT ... ON CONFLICT. Devuelve cuántas."""
+    registros = leer_csv_et0(archivo)
+    RegistroET0.objects.bulk_create(
+        [RegistroET0(fecha=f, et0_mm=e, precipitacion_mm=p, fuente=fuente) for f, e, p in registros],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['fecha'],
+        update_fields=['et0_mm', 'precipitacion_mm', 'fuente', 'importado_en'],
+    )
+    return len(registros)
+
+
+# ---------------------------------------------------------------
+# CÁLCULO (cuartel × día)
+# ---------------------------------------------------------------
+def _serie_et0(desde, fecha):
+    """
+    Vectores (et0, precipitación) de desde..fecha. Un día sin registro toma
+    la ET0 del último día conocido (y sin lluvia): el CSV suele llegar con
+    uno o dos días de atraso.
+    """
+    dias = (fecha - desde).days + 1
+    ultimo = (RegistroET0.objects.filter(fecha__lt=desde).order_by('-fecha')
+              .values_list('et0_mm', flat=True).first())
+    registros = dict(
+        (f, (e, p)) for f, e, p in RegistroET0.objects.filter(fecha__range=[desde, fecha]).order_by()
+        .values_list('fecha', 'et0_mm', 'precipitacion_mm')
+    )
+    if ultimo is None and not registros:
+        raise ErrorRecomendacion(f'No hay ET0 registrada hasta el {fecha:%d/%m/%Y}.')
+
+    et0 = np.full(dias, np.nan)
+    lluvia = np.zeros(dias)
+    for f, (e, p) in registros.items():
+        et0[(f - desde).days] = float(e)
+        lluvia[(f - desde).days] = float(p)
+    # Relleno hacia adelante (con el registro anterior a la ventana como semilla)
+    if np.isnan(et0[0]) and ultimo is not None:
+        et0[0] = float(ultimo)
+    indices = np.where(np.isnan(et0), 0, np.arange(dias))
+    np.maximum.accumulate(indices, out=indices)
+    et0 = et0[indices]
+    # Sin semilla, los primeros días toman el primer valor conocido
+    et0[np.isnan(et0)] = et0[~np.isnan(et0)][0]
+    return et0, lluvia
+
+
+def _tabla_kc():
+    exactos, por_tipo = {}, {}
+    for tipo, variedad, kc in CoeficienteCultivo.objects.values_list('tipo_planta', 'variedad', 'kc'):
+        tipo, variedad = tipo.strip().lower(), variedad.strip().lower()
+        if variedad:
+            exactos[(tipo, variedad)] = float(kc)
+        else:
+            por_tipo[tipo] = float(kc)
+    return exactos, por_tipo
+
+
+def calcular_recomendaciones(fecha=None, guardar=True):
+    """
+    Recomendaciones de 'fecha' (hoy por defecto) para los cuarteles activos o
+    en desarrollo. Devuelve la lista de RecomendacionRiego (guardadas si
+    'guardar').
+    """
+    fecha = fecha or timezone.localdate()
+    desde = fecha - timedelta(days=DIAS_BALANCE - 1)
+
+    cuarteles = list(
+        Cuartel.objects.filter(estado_cultivo__in=ESTADOS_CULTIVO).order_by('id')
+        .values_list('id', 'tipo_planta', 'variedad', 'area_hectareas', 'tipo_riego')
+    )
+    if not cuarteles:
+        return []
+    et0, lluvia = _serie_et0(desde, fecha)
+
+    fila_de = {c[0]: i for i, c in enumerate(cuarteles)}
+    exactos, por_tipo = _tabla_kc()
+    kc = np.empty(len(cuarteles))
+    kc_defecto = np.zeros(len(cuarteles), dtype=bool)
+    for i, (_, tipo, variedad, _, _) in enumerate(cuarteles):
+        tipo, variedad = tipo.strip().lower(), variedad.strip().lower()
+        valor = exactos.get((tipo, variedad), por_tipo.get(tipo))
+        kc_defecto[i] = valor is None
+        kc[i] = KC_DEFECTO if valor is None else valor
+    area = np.array([float(c[3]) for c in cuarteles])
+    eficiencia = np.array([EFICIENCIA_RIEGO.get(c[4], EFICIENCIA_DEFECTO) for c in cuarteles])
+
+    # Aplicado por (cuartel, día): UNA consulta agrupada
+    aplicado = np.zeros((len(cuarteles), len(et0)))
+    filas = list(
+        ControlRiego.objects.filter(
+            estado=ControlRiego.EstadoRiego.REALIZADO, fecha__range=[desde, fecha], cuartel_id__in=fila_de,
+        ).order_by().values('cuartel_id', 'fecha')
+        .annotate(total=Sum(Coalesce('volumen_medido_m3', 'volumen_total_m3')))
+        .values_list('cuartel_id', 'fecha', 'total')
+    )
+    if filas:
+        np.add.at(
+            aplicado,
+            ([fila_de[c] for c, _, _ in filas], [(f - desde).days for _, f, _ in filas]),
+            [float(t or 0) for _, _, t in filas],
+        )
+
+    # Caudal de referencia: UNA consulta agrupada
+    caudales = dict(
+        ControlRiego.objects.filter(
+            cuartel_id__in=fila_de, fecha__range=[fecha - timedelta(days=DIAS_CAUDAL), fecha],
+        ).exclude(estado=ControlRiego.EstadoRiego.CANCELADO)
+        .order_by().values('cuartel_id').annotate(caudal=Avg('caudal_m3h'))
+        .values_list('cuartel_id', 'caudal')
+    )
+    caudal = np.array([float(caudales.get(c[0]) or 0) for c in cuarteles])
+
+    # --- Pasada vectorizada ---
+    neta_mm = np.maximum(kc[:, None] * et0[None, :] - PRECIPITACION_EFECTIVA * lluvia[None, :], 0)
+    demanda = (neta_mm * (area * 10 / eficiencia)[:, None]).sum(axis=1)
+    aplicado_total = aplicado.sum(axis=1)
+    recomendado = np.maximum(demanda - aplicado_total, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        duracion = np.where(caudal > 0, np.ceil(recomendado / caudal * 60), np.nan)
+
+    def dec(valor):
+        return Decimal(str(round(float(valor), 2)))
+
+    recomendaciones = [
+        RecomendacionRiego(
+            cuartel_id=c[0], fecha=fecha,
+            et0_mm=dec(et0[-1]), kc=dec(kc[i]), kc_por_defecto=bool(kc_defecto[i]),
+            demanda_m3=dec(demanda[i]), aplicado_m3=dec(aplicado_total[i]),
+            volumen_recomendado_m3=dec(recomendado[i]),
+            caudal_m3h=dec(caudal[i]) if caudal[i] > 0 else None,
+            duracion_sugerida_minutos=None if math.isnan(duracion[i]) else int(duracion[i]),
+        )
+        for i, c in enumerate(cuarteles)
+    ]
+    if guardar:
+        with transaction.atomic():
+            RecomendacionRiego.objects.filter(fecha=fecha).delete()
+            RecomendacionRiego.objects.bulk_create(recomendaciones, batch_size=1000)
+    return recomendaciones
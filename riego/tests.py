@@ -1,3 +1,29 @@
+from datetime import date, time
+from decimal import Decimal
 from django.test import TestCase
 
-# Create your tests here.
+from cuarteles.models import Cuartel
+from riego.management.commands.verificar_indices_riego import consultas_dashboard, desactivar_seqscan
+from riego.models import ControlRiego
+
+
+class IndicesDashboardRiegoTests(TestCase):
+    """Las consultas del dashboard de riego deben usar sus índices compuestos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cuartel = Cuartel.objects.create(
+            numero='T1', nombre='Prueba', ubicacion='-', variedad='-', tipo_planta='-',
+            año_plantacion=2020, area_hectareas=1,
+        )
+        ControlRiego.objects.create(
+            cuartel=cuartel, fecha=date.today(), horario_inicio=time(8), horario_fin=time(9),
+            caudal_m3h=Decimal('10'),
+        )
+
+    def test_consultas_usan_sus_indices(self):
+        # TestCase corre dentro de una transacción: en PostgreSQL el SET LOCAL aplica a este test
+        desactivar_seqscan()
+        for nombre, indice, consulta in consultas_dashboard():
+            with self.subTest(consulta=nombre):
+                self.assertIn(indice, consulta.explain())
@@ -19,4 +19,21 @@ urlpatterns = [
     # Acciones
     path('<int:pk>/cancelar/', views.cancelar_riego, name='cancelar_riego'), 
     path('<int:pk>/finalizar/', views.finalizar_riego, name='finalizar_riego'),
+    path('acciones-masivas/', views.acciones_masivas_riego, name='acciones_masivas'),
+
+    # Programas recurrentes
+    path('programas/', views.lista_programas, name='programas'),
+    path('programas/crear/', views.crear_programa, name='crear_programa'),
+    path('programas/<int:pk>/editar/', views.editar_programa, name='editar_programa'),
+    path('programas/<int:pk>/generar/', views.generar_programa, name='generar_programa'),
+
+    # Presupuesto de agua por temporada
+    path('presupuesto/', views.presupuesto_agua, name='presupuesto_agua'),
+    path('presupuesto/<int:pk>/curva/', views.api_curva_presupuesto, name='api_curva_presupuesto'),
+
+    # Revisión de topes de horario (semana completa)
+    path('conflictos/', views.api_conflictos_semana, name='api_conflictos_semana'),
+
+    # Ingesta de lecturas de los caudalímetros (token por medidor, sin sesión)
+    path('api/caudalimetros/lecturas/', views.api_lecturas_caudalimetro, name='api_lecturas_caudalimetro'),
 ]
\ No newline at end of file
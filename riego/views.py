@@ -1,24 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse
 from django.contrib import messages
 from django.core.paginator import Paginator
 from django.db.models import Q, Sum, Count, F
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 from django.db import transaction
 from django.core.exceptions import ValidationError
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
+import json
 
 # Modelos de esta app
-from .models import ControlRiego, FertilizanteRiego
+from .models import ControlRiego, FertilizanteRiego, ProgramaRiego, RecomendacionRiego, PresupuestoAgua
 
 # Modelos de otras apps
 from autenticacion.models import Usuario 
 from cuarteles.models import Cuartel
 from inventario.models import MovimientoInventario, DetalleMovimiento, Producto
+from inventario.alertas import evaluar_alertas_stock
 from autenticacion.views import regador_required
+from AgroControl.paginacion import paginar_keyset
+from AgroControl.acciones_masivas import error_peticion, leer_peticion, pide_json, responder
+from AgroControl.tokens import token_de_cabecera
 
 # Formularios
+from .conflictos import AgendaRiego
 from .forms import ControlRiegoForm, FertilizanteRiegoFormSet, FertilizanteRiegoForm
+from .forms import ProgramaRiegoForm, FertilizanteProgramaFormSet, GenerarProgramaForm
+from .programas import generar_riegos
+from .caudalimetros import ErrorLecturas, autenticar, registrar_lecturas
+from .lotes import procesar_riegos
+from .presupuesto import registrar_consumo, tablero_temporada, volumen_riego
 
 def _crear_movimiento_salida_riego(riego, usuario_logueado):
     """
@@ -72,10 +85,18 @@ def _crear_movimiento_salida_riego(riego, usuario_logueado):
         producto.stock_actual = stock_posterior
         producto.save(update_fields=['stock_actual', 'fecha_actualizacion'])
 
+    # 4. Re-evaluar alertas de los productos descontados
+    evaluar_alertas_stock(
+        [fert.producto_id for fert in productos_a_descontar], movimiento=movimiento_header
+    )
+
 
 # ===============================================================
 #  VISTA PRINCIPAL: dashboard_riego
 # ===============================================================
+# Orden del listado (y del cursor); índices en ControlRiego.Meta
+ORDEN_DASHBOARD = ['-fecha', '-horario_inicio', '-id']
+
 @regador_required
 def dashboard_riego(request):
     """
@@ -85,36 +106,52 @@ def dashboard_riego(request):
     
     # --- 1. LÓGICA DE ESTADÍSTICAS ---
     todos_los_riegos = ControlRiego.objects.all()
-    riegos_realizados = todos_los_riegos.filter(estado='REALIZADO')
-
-    total_riegos = todos_los_riegos.count()
-    riegos_programados = todos_los_riegos.filter(estado='PROGRAMADO').count()
-    riegos_realizados_count = riegos_realizados.count()
+    conteos = todos_los_riegos.aggregate(
+        total=Count('id'),
+        programados=Count('id', filter=Q(estado='PROGRAMADO')),
+        realizados=Count('id', filter=Q(estado='REALIZADO')),
+    )
 
     # --- CÁLCULO DE VOLUMEN MES ---
-    riegos_mes = riegos_realizados.filter(fecha__month=hoy.month, fecha__year=hoy.year)
-    volumen_mes = riegos_mes.aggregate(total=Sum('volumen_total_m3'))['total'] or 0
+    # Rango de fechas (no fecha__month/__year): usa el índice (estado, fecha)
+    inicio_mes = hoy.replace(day=1)
+    inicio_mes_siguiente = (inicio_mes + timedelta(days=32)).replace(day=1)
+    volumen_mes = todos_los_riegos.filter(
+        estado='REALIZADO', fecha__gte=inicio_mes, fecha__lt=inicio_mes_siguiente
+    ).aggregate(total=Sum('volumen_total_m3'))['total'] or 0
     
+    # Recomendaciones del día (las calcula 'recomendar_riego'): UNA consulta
+    recomendaciones = list(
+        RecomendacionRiego.objects.filter(fecha=timezone.localdate())
+        .select_related('cuartel').order_by('-volumen_recomendado_m3', 'cuartel__nombre')
+    )
+
     # --- 2. LÓGICA DE FILTROS ---
     cuartel_id = request.GET.get('cuartel', '')
     estado_filtro = request.GET.get('estado', '')
     
-    riegos_list = todos_los_riegos.select_related(
-        'cuartel', 'encargado_riego'
-    ).order_by('-fecha', '-horario_inicio')
+    riegos_list = todos_los_riegos.select_related('cuartel', 'encargado_riego')
     
     if cuartel_id:
         riegos_list = riegos_list.filter(cuartel_id=cuartel_id)
     if estado_filtro:
         riegos_list = riegos_list.filter(estado=estado_filtro)
+
+    # --- 3. PAGINACIÓN POR CURSOR ---
+    pagina = paginar_keyset(riegos_list, ORDEN_DASHBOARD, request.GET.get('cursor'))
+    filtros = request.GET.copy()
+    filtros.pop('cursor', None)
     
     # --- 4. CONTEXTO PARA LA PLANTILLA ---
     context = {
-        'total_riegos': total_riegos,
-        'riegos_programados': riegos_programados,
-        'riegos_realizados': riegos_realizados_count,
+        'total_riegos': conteos['total'],
+        'riegos_programados': conteos['programados'],
+        'riegos_realizados': conteos['realizados'],
         'volumen_mes': volumen_mes,
-        'riegos_list': riegos_list, 
+        'recomendaciones': recomendaciones,
+        'riegos_list': pagina,
+        'pagina': pagina,
+        'filtros_query': filtros.urlencode(),
         'cuarteles': Cuartel.objects.all().order_by('nombre'),
         'cuartel_id': cuartel_id,
         'estado_filtro': estado_filtro, 
@@ -124,6 +161,46 @@ def dashboard_riego(request):
     return render(request, 'riego/dashboard.html', context)
 
 
+@regador_required
+def api_conflictos_semana(request):
+    """
+    Riegos que se topan (mismo cuartel o mismo encargado) en una semana.
+    GET ?desde=YYYY-MM-DD (por defecto el lunes de esta semana)[&dias=7]
+    """
+    try:
+        desde = (datetime.strptime(request.GET['desde'], '%Y-%m-%d').date()
+                 if request.GET.get('desde') else None)
+        dias = min(max(int(request.GET.get('dias', 7)), 1), 31)
+    except ValueError:
+        return JsonResponse({'error': "Parámetro 'desde' (YYYY-MM-DD) o 'dias' inválido."}, status=400)
+    if desde is None:
+        hoy = timezone.localdate()
+        desde = hoy - timedelta(days=hoy.weekday())
+    hasta = desde + timedelta(days=dias - 1)
+
+    agenda = AgendaRiego(desde, hasta)
+    pares = agenda.todos_los_conflictos(desde)
+
+    def resumen(pk):
+        r = agenda.riegos[pk]
+        return {
+            'id': pk, 'cuartel_id': r['cuartel_id'], 'encargado_id': r['encargado_id'],
+            'fecha': r['fecha'].isoformat(),
+            'horario_inicio': r['horario_inicio'].strftime('%H:%M'),
+            'horario_fin': r['horario_fin'].strftime('%H:%M'),
+        }
+
+    return JsonResponse({
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'riegos_revisados': len(agenda.riegos),
+        'conflictos': [
+            {'motivo': motivo, 'riegos': [resumen(a), resumen(b)]}
+            for motivo, a, b in pares
+        ],
+    })
+
+
 # ===============================================================
 #  VISTAS CRUD (Lógica de Aplicaciones)
 # ===============================================================
@@ -321,6 +398,7 @@ def finalizar_riego(request, pk):
             
             riego.estado = 'REALIZADO'
             riego.save(update_fields=['estado'])
+            registrar_consumo([(riego.cuartel_id, riego.fecha, volumen_riego(riego))])
         
         messages.success(request, f'Riego ID {riego.id} finalizado. Stock descontado.')
     
@@ -351,4 +429,217 @@ def cancelar_riego(request, pk):
     
     except (ValidationError, Exception) as e:
         messages.error(request, f'Error al cancelar: {str(e)}')
-        return redirect('riego:dashboard')
\ No newline at end of file
+        return redirect('riego:dashboard')
+
+
+@regador_required
+@require_POST
+def acciones_masivas_riego(request):
+    """
+    Finaliza o cancela varios riegos PROGRAMADOS en un solo POST
+    ('accion' + 'ids', o JSON). Los que fallan se informan uno a uno.
+    """
+    es_json = pide_json(request)
+    try:
+        accion, ids = leer_peticion(request)
+    except ValueError as e:
+        return error_peticion(request, es_json, str(e), 'riego:dashboard')
+
+    usuario_logueado = _usuario_logueado(request)
+    if usuario_logueado is None:
+        return error_peticion(request, es_json, 'Error de autenticación. Inicia sesión de nuevo.', 'login')
+
+    resultado = procesar_riegos(
+        ids, accion, usuario_logueado, es_admin=bool(request.session.get('es_administrador'))
+    )
+    return responder(request, es_json, resultado, 'riego:dashboard', lambda pk: f'Riego ID {pk}')
+
+
+# ===============================================================
+#  PROGRAMAS DE RIEGO RECURRENTES
+# ===============================================================
+
+def _usuario_logueado(request):
+    try:
+        return Usuario.objects.get(id=request.session.get('usuario_id'))
+    except (Usuario.DoesNotExist, TypeError):
+        return None
+
+
+@regador_required
+def lista_programas(request):
+    """Programas de riego con el día hasta el que ya se generaron riegos."""
+    programas = ProgramaRiego.objects.select_related('encargado_riego').annotate(
+        cantidad_cuarteles=Count('cuarteles', distinct=True)
+    ).order_by('-activo', 'nombre')
+
+    context = {
+        'programas': programas,
+        'titulo': 'Programas de Riego',
+    }
+    return render(request, 'riego/programas.html', context)
+
+
+def _guardar_programa(request, programa=None):
+    usuario_logueado = _usuario_logueado(request)
+    if usuario_logueado is None:
+        messages.error(request, 'Error de autenticación. Inicia sesión de nuevo.')
+        return redirect('login')
+
+    if request.method == 'POST':
+        form = ProgramaRiegoForm(request.POST, instance=programa, usuario_actual=usuario_logueado)
+        formset = FertilizanteProgramaFormSet(request.POST, instance=programa or ProgramaRiego())
+        if form.is_valid() and formset.is_valid():
+            with transaction.atomic():
+                nuevo = form.save(commit=False)
+                if programa is None:
+                    nuevo.creado_por = usuario_logueado
+                nuevo.save()
+                form.save_m2m()
+                formset.instance = nuevo
+                formset.save()
+            messages.success(request, f'Programa "{nuevo.nombre}" guardado. Genere sus riegos desde la lista.')
+            return redirect('riego:programas')
+        messages.error(request, 'Por favor corrige los errores del formulario.')
+    else:
+        form = ProgramaRiegoForm(instance=programa, usuario_actual=usuario_logueado)
+        formset = FertilizanteProgramaFormSet(instance=programa or ProgramaRiego())
+
+    context = {
+        'form': form,
+        'formset': formset,
+        'programa': programa,
+        'titulo': 'Editar Programa de Riego' if programa else 'Nuevo Programa de Riego',
+        'boton_texto': 'Actualizar Programa' if programa else 'Guardar Programa',
+    }
+    return render(request, 'riego/programa_form.html', context)
+
+
+@regador_required
+def crear_programa(request):
+    return _guardar_programa(request)
+
+
+@regador_required
+def editar_programa(request, pk):
+    return _guardar_programa(request, get_object_or_404(ProgramaRiego, pk=pk))
+
+
+@regador_required
+def generar_programa(request, pk):
+    """
+    Vista previa de los riegos que se generarían (y los conflictos);
+    con accion=generar los crea con bulk_create.
+    """
+    programa = get_object_or_404(ProgramaRiego, pk=pk)
+    usuario_logueado = _usuario_logueado(request)
+    if usuario_logueado is None:
+        messages.error(request, 'Error de autenticación. Inicia sesión de nuevo.')
+        return redirect('login')
+
+    inicial = {'desde': max(timezone.localdate(), programa.fecha_inicio), 'semanas': 4}
+    if programa.generado_hasta and programa.generado_hasta >= inicial['desde']:
+        inicial['desde'] = programa.generado_hasta + timedelta(days=1)
+
+    resultado = None
+    if request.method == 'POST':
+        form = GenerarProgramaForm(request.POST)
+        if form.is_valid():
+            simular = request.POST.get('accion') != 'generar'
+            resultado = generar_riegos(
+                programa, form.cleaned_data['desde'], form.cleaned_data['semanas'],
+                usuario=usuario_logueado, simular=simular,
+            )
+            if not simular:
+                if resultado['conflictos']:
+                    messages.warning(request, f"{len(resultado['conflictos'])} riegos no se generaron por topes de horario.")
+                messages.success(request, f"{len(resultado['riegos'])} riegos programados generados para \"{programa.nombre}\".")
+                return redirect('riego:programas')
+    else:
+        form = GenerarProgramaForm(initial=inicial)
+        resultado = generar_riegos(programa, inicial['desde'], inicial['semanas'], simular=True)
+
+    context = {
+        'programa': programa,
+        'form': form,
+        'resultado': resultado,
+        'titulo': f'Generar riegos - {programa.nombre}',
+    }
+    return render(request, 'riego/programa_generar.html', context)
+
+
+# ===============================================================
+#  PRESUPUESTO DE AGUA POR TEMPORADA
+# ===============================================================
+
+@regador_required
+def presupuesto_agua(request):
+    """
+    Tablero de la temporada: % consumido, proyección al fin de temporada y
+    cuarteles excedidos (una consulta para todos los presupuestos).
+    """
+    hoy = timezone.localdate()
+    temporadas = list(
+        PresupuestoAgua.objects.order_by('-temporada').values_list('temporada', flat=True).distinct()
+    )
+    try:
+        temporada = int(request.GET['temporada'])
+    except (KeyError, ValueError):
+        # La más reciente que ya empezó (por año); si no, la más reciente
+        temporada = next((t for t in temporadas if t <= hoy.year), temporadas[0] if temporadas else hoy.year)
+
+    filas = tablero_temporada(temporada, hoy)
+    context = {
+        'filas': filas,
+        'temporada': temporada,
+        'temporadas': temporadas,
+        'excedidos': sum(1 for f in filas if f['excedido']),
+        'en_riesgo': sum(1 for f in filas if f['en_riesgo'] and not f['excedido']),
+        'titulo': f'Presupuesto de Agua - Temporada {temporada}',
+    }
+    return render(request, 'riego/presupuesto_agua.html', context)
+
+
+@regador_required
+def api_curva_presupuesto(request, pk):
+    """Curva acumulada (m³/ha) de un presupuesto, para el gráfico del tablero."""
+    presupuesto = get_object_or_404(PresupuestoAgua.objects.select_related('cuartel'), pk=pk)
+    puntos = presupuesto.curva.order_by('fecha').values_list('fecha', 'm3_ha_acumulado')
+    return JsonResponse({
+        'cuartel': presupuesto.cuartel.nombre,
+        'temporada': presupuesto.temporada,
+        'fecha_inicio': presupuesto.fecha_inicio.isoformat(),
+        'fecha_fin': presupuesto.fecha_fin.isoformat(),
+        'presupuesto_m3_ha': float(presupuesto.presupuesto_m3_ha),
+        'puntos': [[fecha.isoformat(), float(acumulado)] for fecha, acumulado in puntos],
+    })
+
+
+# ===============================================================
+#  API DE CAUDALÍMETROS (controladores de riego, sin sesión)
+# ===============================================================
+
+@csrf_exempt
+@require_POST
+def api_lecturas_caudalimetro(request):
+    """
+    Lote de lecturas de un caudalímetro (ver riego/caudalimetros.py).
+    Header 'Authorization: Token <token>'; body {caudalimetro, lecturas}.
+    """
+    try:
+        datos = json.loads(request.body or b'{}')
+        if not isinstance(datos, dict):
+            raise ErrorLecturas('Se esperaba un objeto JSON.')
+    except (ValueError, ErrorLecturas) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    caudalimetro = autenticar(str(datos.get('caudalimetro') or ''), token_de_cabecera(request))
+    if caudalimetro is None:
+        return JsonResponse({'error': 'Caudalímetro o token inválido.'}, status=401)
+
+    try:
+        resultado = registrar_lecturas(caudalimetro, datos.get('lecturas') or [])
+    except ErrorLecturas as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(resultado)
+